@@ -1,42 +1,56 @@
-
-
 def physiolabxr():
-    import multiprocessing
+    import os
     import sys
 
-    from PyQt6 import QtWidgets
-    from PyQt6.QtGui import QIcon
-    from PyQt6.QtWidgets import QSystemTrayIcon, QMenu
+    from physiolabxr.startup.startup_profiler import StartupProfiler, is_startup_profiling_requested, profile_startup_exit_env
+    profiler = StartupProfiler()
+    if is_startup_profiling_requested(sys.argv):
+        profiler.enable()
+
+    with profiler.phase('import qt'):
+        import multiprocessing
+
+        from PyQt6 import QtWidgets
+        from PyQt6.QtCore import QTimer
+        from PyQt6.QtGui import QIcon
+        from PyQt6.QtWidgets import QSystemTrayIcon, QMenu
 
-    from physiolabxr.configs.configs import AppConfigs
-    from physiolabxr.ui.SplashScreen import SplashScreen
+    with profiler.phase('app configs'):
+        from physiolabxr.configs.configs import AppConfigs
+        from physiolabxr.ui.SplashScreen import SplashScreen
 
-    AppConfigs(_reset=False)  # create the singleton app configs object
+        AppConfigs(_reset=False)  # create the singleton app configs object
 
     app = None
 
     multiprocessing.freeze_support()  # for built exe
 
     # load the qt application
-    app = QtWidgets.QApplication(sys.argv)
-    app.setStyle("fusion")
-    tray_icon = QSystemTrayIcon(QIcon(AppConfigs()._app_logo), parent=app)
-    tray_icon.setToolTip('PhysioLabXR')
-    tray_icon.show()
+    with profiler.phase('qt application'):
+        app = QtWidgets.QApplication(sys.argv)
+        app.setStyle("fusion")
+        tray_icon = QSystemTrayIcon(QIcon(AppConfigs()._app_logo), parent=app)
+        tray_icon.setToolTip('PhysioLabXR')
+        tray_icon.show()
 
     # create the splash screen
-    splash = SplashScreen()
-    splash.show()
+    with profiler.phase('splash screen'):
+        splash = SplashScreen()
+        splash.show()
 
     # load default settings
-    from physiolabxr.utils.setup_utils import run_setup_check
-    run_setup_check()
-    from physiolabxr.startup.startup import load_settings
-    load_settings(revert_to_default=False, reload_presets=False)
+    with profiler.phase('setup check'):
+        from physiolabxr.utils.setup_utils import run_setup_check
+        run_setup_check()
+    with profiler.phase('load settings'):
+        from physiolabxr.startup.startup import load_settings
+        load_settings(revert_to_default=False, reload_presets=False)
     # main window init
     print("Creating main window")
-    from physiolabxr.ui.MainWindow import MainWindow
-    window = MainWindow(app=app)
+    with profiler.phase('import main window'):
+        from physiolabxr.ui.MainWindow import MainWindow
+    with profiler.phase('create main window'):
+        window = MainWindow(app=app)
 
     window.setWindowIcon(QIcon(AppConfigs()._app_logo))
     # make tray menu
@@ -46,8 +60,17 @@ def physiolabxr():
 
     print("Closing splash screen, showing main window")
     # splash screen destroy
-    splash.close()
-    window.show()
+    with profiler.phase('show main window'):
+        splash.close()
+        window.show()
+    if profiler.is_enabled:  # the window is drawn by the time the first event is processed
+        QTimer.singleShot(0, profiler.on_first_window_shown)
+        if os.environ.get(profile_startup_exit_env, '0') == '1':
+            def exit_after_startup():
+                window.ask_to_close = False
+                window.close()
+                app.quit()
+            QTimer.singleShot(0, exit_after_startup)
 
     print("Entering exec loop")
     try:
@@ -1,6 +1,7 @@
 import json
 import os
 import platform
+import threading
 import warnings
 from dataclasses import dataclass, fields
 from enum import Enum
@@ -31,6 +32,40 @@ class RecordingFileFormat(Enum):
         return cls.dats.get_file_extension()
 
 
+class VideoRecordingCodec(Enum):
+    """
+    How webcam and screen capture frames are recorded. Except for raw, the frames are encoded to a sidecar video file
+    next to the recording, and the recording itself only keeps a table of frame indices and timestamps.
+    """
+    raw = "uncompressed, in the recording file"
+    mp4v = "MPEG-4 (.mp4)"
+    mjpg = "motion JPEG (.avi)"
+
+    def get_file_extension(self):
+        return self.value.split('(')[1].strip(')')
+
+    def get_fourcc(self):
+        if self == VideoRecordingCodec.mp4v:
+            return 'mp4v'
+        elif self == VideoRecordingCodec.mjpg:
+            return 'MJPG'
+        else:
+            raise ValueError(f'{self} does not have a fourcc')
+
+
+class PullDataMode(Enum):
+    """
+    How stream workers get their data.
+
+    timer: the stream widget ticks the worker every pull_data_interval milliseconds, and the worker pulls whatever has
+    arrived.
+    wait: the worker waits for data on its own thread and only emits when data has arrived, at most once every
+    pull_data_coalesce_interval milliseconds. Workers that can't wait on their source fall back to the timer.
+    """
+    timer = "poll on a timer"
+    wait = "wait for data"
+
+
 class AppConfigsEncoder(json.JSONEncoder):
     """
     JSON encoder that can handle enums and objects whose metaclass is SubPreset.
@@ -90,13 +125,24 @@ class AppConfigs(metaclass=Singleton):
 
     # recording configs
     recording_file_format: RecordingFileFormat = RecordingFileFormat.dats
+    video_recording_codec: VideoRecordingCodec = VideoRecordingCodec.mp4v
     eviction_interval: int = 1000
 
     # data worker configs
     pull_data_interval: int = 2  # in milliseconds, how often does the sensor/LSL pulls data from their designated sources
+    pull_data_mode: PullDataMode = PullDataMode.wait
+    pull_data_coalesce_interval: int = 5  # in milliseconds, in wait mode, the minimal interval between two emits of a worker
+    pull_data_wait_timeout: int = 100  # in milliseconds, in wait mode, how long a worker waits for data before checking if it should stop
+    dsp_worker_num: int = 0  # number of worker processes that run the data processors, 0 runs them on the GUI thread
+    dsp_worker_timeout: int = 100  # in milliseconds, how long a frame may take in a DSP worker process before the worker is restarted
+
+    # preset configs
+    preset_save_debounce_interval: int = 500  # in milliseconds, how long the presets must be left unchanged before they are saved
+    preset_save_max_delay: int = 5000  # in milliseconds, the longest a preset save is delayed while the presets keep changing
 
     # monitor capture
     is_monitor_available: bool = True
+    screen_capture_frame_rate: int = 30  # the frame rate screen capture aims for, it can't be higher than the rate set by video_device_refresh_interval
     monitor_error_message: str = None
 
     # audio
@@ -162,15 +208,13 @@ class AppConfigs(metaclass=Singleton):
         self._rena_base_script = open(self._rena_base_script, "r").read()
         reload_enums(self)
 
-        # check if screen capture is available
-        try:
-            import pyscreeze
-            self.apply_pyscreeze_patches()
-            img = pyscreeze.screenshot()
-            self.is_monitor_available = True
-        except NotImplementedError as e:
-            self.is_monitor_available = False
-            self.monitor_error_message = str(e)
+        # check if screen capture is available, on a background thread so it doesn't hold up the startup
+        self._monitor_check_thread = None
+        self._monitor_check_lock = threading.Lock()
+        self._is_monitor_check_running = False
+        self._is_monitor_recheck_requested = False
+        self._screen_capture_size = None
+        self.check_monitor_availability()
 
         # load style sheets
         for theme, style_sheet_path in self._style_sheets.items():
@@ -207,6 +251,59 @@ class AppConfigs(metaclass=Singleton):
 
         return ui_file_paths
 
+    def check_monitor_availability(self):
+        """
+        start checking if screen capture is available, the screen capture size is found along the way.
+        The results in is_monitor_available, monitor_error_message and get_screen_capture_size are only valid after
+        wait_monitor_check returns. Calling this again invalidates the previous results, for example, when the
+        monitors are changed. If a check is running, it is not waited for, the new check is chained after it on the
+        same thread.
+        """
+        with self._monitor_check_lock:
+            if self._is_monitor_check_running:
+                self._is_monitor_recheck_requested = True
+                return
+            self._is_monitor_check_running = True
+        self._monitor_check_thread = threading.Thread(target=self._run_monitor_checks, daemon=True)
+        self._monitor_check_thread.start()
+
+    def _run_monitor_checks(self):
+        while True:
+            self._check_monitor_availability()
+            with self._monitor_check_lock:
+                if not self._is_monitor_recheck_requested:
+                    self._is_monitor_check_running = False
+                    return
+                self._is_monitor_recheck_requested = False
+
+    def _check_monitor_availability(self):
+        try:
+            from physiolabxr.utils.screen_capture_utils import create_screen_capture
+            screen_capture = create_screen_capture()
+            try:
+                self._screen_capture_size = screen_capture.get_screen_size()
+            finally:
+                screen_capture.close()
+            self.is_monitor_available = True
+            self.monitor_error_message = None
+        except Exception as e:  # pyscreeze raises a generic exception when no screenshot tool is found
+            self._screen_capture_size = None
+            self.is_monitor_available = False
+            self.monitor_error_message = str(e)
+
+    def is_monitor_check_done(self):
+        return not self._is_monitor_check_running
+
+    def wait_monitor_check(self):
+        self._monitor_check_thread.join()
+
+    def get_screen_capture_size(self):
+        """
+        @return: height and width of the screen capture, None if the monitor is not available
+        """
+        self.wait_monitor_check()
+        return self._screen_capture_size
+
     @staticmethod
     def apply_pyscreeze_patches():
         """
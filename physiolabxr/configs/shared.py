@@ -32,6 +32,7 @@ SCRIPT_STOP_REQUEST = 'stop'
 SCRIPT_STOP_SUCCESS = 'stopsuccess'
 SCRIPT_INFO_REQUEST = 'i'
 DATA_BUFFER_PREFIX = 'd'.encode('utf-8')
+TRACE_PREFIX = 'trace!'.encode('utf-8')  # separates the traces of the chunks from the data in a script's input and info messages
 SCRIPT_PARAM_CHANGE = 'p'
 
 # try:
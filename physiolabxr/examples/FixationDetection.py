@@ -2,7 +2,7 @@ import cv2
 import numpy as np
 
 from physiolabxr.scripting.RenaScript import RenaScript
-from physiolabxr.scripting.physio.eyetracking import gap_fill, fixation_detection_idt
+from physiolabxr.scripting.physio.eyetracking import gap_fill, IDTFixationDetector
 from physiolabxr.scripting.physio.utils import time_to_index
 from physiolabxr.utils.buffers import DataBuffer
 
@@ -25,7 +25,8 @@ class FixationDetection(RenaScript):
 
         self.fixation_timestamp_head = 0  # the timestamp of the beginning of the last fixation window
 
-        self.processed_gaze_buffer = DataBuffer(stream_buffer_sizes={'fixations': 1000, 'gap_filled_xyz': 1000})  # buffer to store the preprocessed gaze data, including the gap-filled gaze vectors and the fixation sequences
+        self.processed_gaze_buffer = DataBuffer(stream_buffer_sizes={'fixations': 1000})  # buffer to store the fixation sequences
+        self.fixation_detector = IDTFixationDetector()  # keeps the gap-filled gaze of the idt windows that are not complete yet, so each loop only processes the new gaze samples
         self.frame_gaze_pixel_stream_name = 'Example-Video-Gaze-Pixel'  # the name of the frame gaze pixel stream, the stream tells us where the gaze is on the 400x400 video frame
 
         self.video_stream_name = 'Example-Video'  # the name of the video stream
@@ -46,16 +47,17 @@ class FixationDetection(RenaScript):
 
             if gaze_status[-1] == self.gaze_status['valid']:  # if the sequence starts out invalid, we must wait until the end of the invalid
                 gap_filled_xyz = gap_fill(gaze_xyz, gaze_status, self.gaze_status['valid'], gaze_timestamps, max_gap_time=self.max_gap_time, verbose=False)  # fill the gaps!
-                self.processed_gaze_buffer.update_buffer({'stream_name': 'gap_filled_xyz', 'frames': gap_filled_xyz, 'timestamps': gaze_timestamps})  # add the gap filled data to the buffer, so we can use it for fixation detection
                 self.outputs['gap_filled_xyz'] = gap_filled_xyz  # send the gap-filled data so we can see it in the plotter
                 self.inputs.clear_stream_buffer(self.gaze_stream_name)  # clear the gaze stream, so we don't process the same data again, the fixation detection will act on the gap filled data
 
-            # up to the point of the last gap filled index, we detect fixation. The idt window ends at the gap filled index
-            fixations, last_window_start = fixation_detection_idt(*self.processed_gaze_buffer['gap_filled_xyz'], window_size=self.params['idt_window_size'], dispersion_threshold_degree=self.params['dispersion_threshold_degree'], return_last_window_start=True)
-            self.processed_gaze_buffer.update_buffer({'stream_name': 'fixations', 'frames': fixations[0:1], 'timestamps': fixations[1]})  # add the gap filled data to the buffer, so we can use it for fixation detection
-            self.outputs['fixations'] = fixations[0:1]  # send the fixations, we grab the first column of the result, the second column are the timestamps
-            self.fixation_timestamp_head = self.processed_gaze_buffer['gap_filled_xyz'][1][last_window_start]  # update the gaze timestamp head, so we can release video frames up to this timestamp
-            self.processed_gaze_buffer.clear_stream_up_to_index('gap_filled_xyz', last_window_start)  # now clear the gap filled data up to the last window start, so we don't process the same data again
+                # detect fixation in the idt windows that the new gap-filled gaze completes, a window is complete when the gaze has reached its end
+                self.fixation_detector.window_size = self.params['idt_window_size']
+                self.fixation_detector.dispersion_threshold_degree = self.params['dispersion_threshold_degree']
+                fixations = self.fixation_detector.process(gap_filled_xyz, gaze_timestamps)
+                if fixations.shape[1] > 0:
+                    self.processed_gaze_buffer.update_buffer({'stream_name': 'fixations', 'frames': fixations[0:1], 'timestamps': fixations[1]})  # add the fixations to the buffer, so we can match them with the video frames
+                    self.outputs['fixations'] = fixations[0:1]  # send the fixations, we grab the first column of the result, the second column are the timestamps
+                    self.fixation_timestamp_head = self.fixation_detector.last_window_start_timestamp  # update the gaze timestamp head, so we can release video frames up to this timestamp
 
         # release video frames up to the processed gaze timestamp, but we only release one video frame per loop
         # we loop through the video frames, if the timestamp of the video frame is less than the timestamp of the last fixation, we release the video frame and remove it from the buffer
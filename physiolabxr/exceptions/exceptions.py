@@ -191,6 +191,15 @@ class DataProcessorInvalidBufferSizeError(DataProcessorEvokeFailedError):
     def __str__(self):
         return self.error #+ 'DataProcessorInvalidBufferSizeError'
 
+class DSPWorkerError(RenaError):
+    """Raised when a DSP worker process fails to process a frame, or doesn't return it in time"""
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+    def __str__(self):
+        return 'DSPWorkerError: ' + self.error
+
 class InvalidStreamMetaInfoError(RenaError):
     """Raised when the stream meta info is invalid"""
     def __init__(self, error):
@@ -1,26 +1,140 @@
-import time
+import threading
 import numpy as np
-import pyaudio
 
 from physiolabxr.interfaces.DeviceInterface.DeviceInterface import DeviceInterface
-from physiolabxr.presets.PresetEnums import PresetType
+from physiolabxr.presets.PresetEnums import PresetType, AudioInputDataType
 from physiolabxr.presets.presets_utils import get_audio_device_index, get_stream_num_channels, \
     get_audio_device_data_type, get_audio_device_frames_per_buffer, get_audio_device_sampling_rate, \
     get_stream_nominal_sampling_rate
 from physiolabxr.utils.time_utils import get_clock_time
 
+# numpy dtype of the samples for each PortAudio format, 24 bit samples are unpacked to int32, see frames_from_bytes
+audio_data_format_dtypes = {AudioInputDataType.paFloat32.value: np.float32,
+                            AudioInputDataType.paInt32.value: np.int32,
+                            AudioInputDataType.paInt24.value: np.int32,
+                            AudioInputDataType.paInt16.value: np.int16,
+                            AudioInputDataType.paInt8.value: np.int8,
+                            AudioInputDataType.paUInt8.value: np.uint8}
+
+
+def frames_from_bytes(in_data, num_channels, audio_device_data_format):
+    """
+    de-interleave the raw bytes PortAudio gives into channels x frames. Except for 24 bit samples, this is a view on
+    in_data (reshape and transpose), no copy is made
+
+    @param in_data: interleaved samples, i.e., frame 0 channel 0, frame 0 channel 1, ..., frame 1 channel 0, ...
+    @return: array of shape (num_channels, num_frames)
+    """
+    if audio_device_data_format == AudioInputDataType.paInt24.value:  # little-endian 3-byte samples
+        samples = np.frombuffer(in_data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = (samples[:, 0] | (samples[:, 1] << 8) | (samples[:, 2] << 16)) << 8 >> 8  # sign extend
+    else:
+        samples = np.frombuffer(in_data, dtype=audio_data_format_dtypes[audio_device_data_format])
+    return samples.reshape(-1, num_channels).T
+
+
+class AudioRingBuffer:
+    """
+    Preallocated per-channel ring buffer, written by the PortAudio callback thread and read by the worker thread.
+
+    If the reader falls behind by more than the capacity, the oldest samples are overwritten and counted in
+    overflow_count.
+    """
+    def __init__(self, num_channels, capacity, dtype):
+        self.num_channels = num_channels
+        self.capacity = capacity
+        self.frames = np.zeros((num_channels, capacity), dtype=dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.write_index = 0  # total number of frames written
+        self.read_index = 0  # total number of frames read
+        self.overflow_count = 0
+        self.lock = threading.Lock()
+        self.data_available = threading.Condition(self.lock)
+
+    def write(self, frames, timestamps):
+        """
+        @param frames: channels x frames
+        @param timestamps: one timestamp per frame
+        """
+        n = frames.shape[-1]
+        with self.lock:
+            if n > self.capacity:  # only the latest samples fit, the skipped ones are counted as overflow below
+                self.write_index += n - self.capacity
+                frames, timestamps = frames[:, -self.capacity:], timestamps[-self.capacity:]
+                n = self.capacity
+            start = self.write_index % self.capacity
+            first_part = min(n, self.capacity - start)
+            self.frames[:, start:start + first_part] = frames[:, :first_part]
+            self.timestamps[start:start + first_part] = timestamps[:first_part]
+            if first_part < n:  # wrap around
+                self.frames[:, :n - first_part] = frames[:, first_part:]
+                self.timestamps[:n - first_part] = timestamps[first_part:]
+            self.write_index += n
+            if self.write_index - self.read_index > self.capacity:
+                self.overflow_count += self.write_index - self.read_index - self.capacity
+                self.read_index = self.write_index - self.capacity
+            self.data_available.notify_all()
+
+    def wait_for_data(self, timeout):
+        """
+        block until there are unread frames or <timeout> seconds have passed
+        @return: whether there are unread frames
+        """
+        with self.data_available:
+            return self.data_available.wait_for(lambda: self.write_index > self.read_index, timeout=timeout)
+
+    def read(self):
+        """
+        read all the frames that have not been read
+        @return: frames (channels x frames) and timestamps, both are copies
+        """
+        with self.lock:
+            n = self.write_index - self.read_index
+            start = self.read_index % self.capacity
+            if start + n <= self.capacity:
+                frames = self.frames[:, start:start + n].copy()
+                timestamps = self.timestamps[start:start + n].copy()
+            else:
+                indices = np.arange(start, start + n) % self.capacity
+                frames = self.frames[:, indices]
+                timestamps = self.timestamps[indices]
+            self.read_index = self.write_index
+        return frames, timestamps
+
+    def get_num_available(self):
+        with self.lock:
+            return self.write_index - self.read_index
+
 
 class AudioInputInterface(DeviceInterface):
+    """
+    In callback mode (the default), PortAudio calls _stream_callback from its own thread whenever a buffer of
+    audio_device_frames_per_buffer frames is captured. The frames are written into an AudioRingBuffer, and
+    process_frames only needs to read out what has accumulated since the last call. Timestamps are derived from the
+    ADC time of the first frame in each buffer.
 
+    In blocking mode, process_frames reads whatever is available from the stream, and timestamps are counted back from
+    the time of the read.
+    """
     def __init__(self,
                  _device_name,
                  _audio_device_index,
                  _audio_device_channel,
                  _device_type,
-                 audio_device_data_format=pyaudio.paInt16,
+                 audio_device_data_format=AudioInputDataType.paInt16.value,
                  audio_device_frames_per_buffer=128,
                  audio_device_sampling_rate=4000,
-                 device_nominal_sampling_rate=4000):
+                 device_nominal_sampling_rate=4000,
+                 use_callback=True,
+                 ring_buffer_duration=2.,
+                 clock_offset_window=10.):
+        """
+        @param use_callback: whether to capture with a PortAudio callback, otherwise the stream is read in blocking mode
+        @param ring_buffer_duration: in seconds, how much audio the ring buffer holds in callback mode before the oldest
+        samples are overwritten
+        @param clock_offset_window: in seconds, how often the offset between the stream's clock and the local clock is
+        re-estimated, see get_buffer_timestamps
+        """
         super(AudioInputInterface, self).__init__(_device_name=_device_name,
                                                   _device_type=_device_type,
                                                   device_nominal_sampling_rate=device_nominal_sampling_rate)
@@ -30,19 +144,31 @@ class AudioInputInterface(DeviceInterface):
         self.audio_device_data_format = audio_device_data_format
         self.audio_device_frames_per_buffer = audio_device_frames_per_buffer
         self.audio_device_sampling_rate = audio_device_sampling_rate
+        self.use_callback = use_callback
+        self.ring_buffer_duration = ring_buffer_duration
+        self.clock_offset_window = clock_offset_window
 
-        # self.audio_device_index = audio_device_index
-        # self.frames_per_buffer = frames_per_buffer
-        # self.format = data_format
-        # self.channels = channels
-        #
         self.frame_duration = 1 / self.audio_device_sampling_rate
 
         self.audio = None
         self.stream = None
+        self.ring_buffer = None
+        self._callback_continue_flag = None
+        self._stream_clock_offset = None
+        self._window_clock_offset = None  # the smallest offset measured in the current window
+        self._window_start_time = None
 
     def start_stream(self):
+        import pyaudio  # imported here so PortAudio is only loaded when an audio stream is started
         self.audio = pyaudio.PyAudio()
+        self._callback_continue_flag = pyaudio.paContinue
+        self._stream_clock_offset = None
+        self._window_clock_offset = None
+        self._window_start_time = None
+
+        if self.use_callback:
+            ring_buffer_capacity = max(int(self.ring_buffer_duration * self.audio_device_sampling_rate), self.audio_device_frames_per_buffer)
+            self.ring_buffer = AudioRingBuffer(self._audio_device_channel, ring_buffer_capacity, audio_data_format_dtypes[self.audio_device_data_format])
 
         # open stream
         self.stream = self.audio.open(format=self.audio_device_data_format,
@@ -50,34 +176,68 @@ class AudioInputInterface(DeviceInterface):
                                       rate=self.audio_device_sampling_rate,
                                       frames_per_buffer=self.audio_device_frames_per_buffer,
                                       input=True,
-                                      input_device_index=self._audio_device_index)
+                                      input_device_index=self._audio_device_index,
+                                      stream_callback=self._stream_callback if self.use_callback else None)
         # start stream
         self.stream.start_stream()
 
-    def process_frames(self):
-        # read all data from the buffer
-        # try:
-        frames = self.stream.read(self.stream.get_read_available(), exception_on_overflow=False)
-        # except IOError as e:
-        #     if e[1] != pyaudio.paInputOverflowed:
-        #         raise
-        #     data = b'\x00' * self.frames_per_buffer
-        #     print("Buffer Error")
+    def _stream_callback(self, in_data, frame_count, time_info, status_flags):
+        """
+        called by PortAudio from its own thread, keep it short
+        """
+        callback_time = get_clock_time()
+        frames = frames_from_bytes(in_data, self._audio_device_channel, self.audio_device_data_format)
+        timestamps = self.get_buffer_timestamps(frame_count, time_info, callback_time)
+        self.ring_buffer.write(frames, timestamps)
+        return None, self._callback_continue_flag
 
-        current_time = time.time()
+    def get_buffer_timestamps(self, frame_count, time_info, callback_time):
+        """
+        the timestamps of the frames in a buffer given to the callback. Some host APIs don't report the ADC time (it's 0),
+        then the last frame is assumed to have been captured at the time of the callback.
 
-        samples = len(frames) // (
-                    self._audio_device_channel * self.audio.get_sample_size(self.audio_device_data_format))
-        timestamps = np.array([current_time - (samples - i) * self.frame_duration for i in range(samples)])
-        timestamps = timestamps - timestamps[-1] + get_clock_time() if len(frames) > 0 else np.array([])
+        time_info's times are in the stream's clock. The offset to the local clock is measured on every callback, the
+        callback can only be late, so the smallest offset seen is the closest to the true one. Using it instead of the
+        latest measurement keeps the timestamps contiguous across buffers. The two clocks drift apart, so the smallest
+        offset is found again over every clock_offset_window seconds and replaces the one in use at the end of the window.
+        A smaller offset is used right away.
+        """
+        adc_time = time_info.get('input_buffer_adc_time', 0) if time_info else 0
+        if adc_time > 0:
+            self.update_stream_clock_offset(callback_time - time_info['current_time'], callback_time)
+            first_frame_time = adc_time + self._stream_clock_offset
+        else:
+            first_frame_time = callback_time - (frame_count - 1) * self.frame_duration
+        return first_frame_time + np.arange(frame_count) * self.frame_duration
 
-        # byte frames to numpy
-        frames = np.frombuffer(frames, dtype=np.int16)
+    def update_stream_clock_offset(self, measured_offset, callback_time):
+        if self._stream_clock_offset is None or measured_offset < self._stream_clock_offset:
+            self._stream_clock_offset = measured_offset
+        if self._window_clock_offset is None or measured_offset < self._window_clock_offset:
+            self._window_clock_offset = measured_offset
+        if self._window_start_time is None:
+            self._window_start_time = callback_time
+        elif callback_time - self._window_start_time >= self.clock_offset_window:
+            self._stream_clock_offset = self._window_clock_offset
+            self._window_clock_offset = None
+            self._window_start_time = callback_time
 
-        # frames to channel frames
-        frames = np.array_split(frames, self._audio_device_channel)
+    def wait_for_data(self, timeout):
+        if self.use_callback:
+            return self.ring_buffer.wait_for_data(timeout)
+        return True  # blocking reads take the data, so there's nothing to wait on
 
-        return np.array(frames), timestamps
+    def process_frames(self):
+        if self.use_callback:
+            return self.ring_buffer.read()
+
+        # read all data from the buffer
+        frames = self.stream.read(self.stream.get_read_available(), exception_on_overflow=False)
+        current_time = get_clock_time()
+        frames = frames_from_bytes(frames, self._audio_device_channel, self.audio_device_data_format)
+        samples = frames.shape[-1]
+        timestamps = current_time - np.arange(samples - 1, -1, -1) * self.frame_duration  # the last frame is read just now
+        return frames, timestamps
 
     def stop_stream(self):
         if self.stream:
@@ -85,6 +245,12 @@ class AudioInputInterface(DeviceInterface):
             self.stream.close()
             self.audio.terminate()
 
+    def get_overflow_count(self):
+        """
+        number of frames overwritten in the ring buffer because they were not read in time, always 0 in blocking mode
+        """
+        return self.ring_buffer.overflow_count if self.ring_buffer is not None else 0
+
     def is_stream_available(self):
 
         return True
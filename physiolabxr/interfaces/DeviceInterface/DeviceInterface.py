@@ -16,6 +16,17 @@ class DeviceInterface:
         pass
         # return np.array(frames), timestamps
 
+    def wait_for_data(self, timeout):
+        """
+        override this if the device can block until it has new data, e.g., on a queue or a socket. It's called on the
+        worker's wait-pull thread, see RenaWorker. Don't take the data here, process_frames is called afterward.
+
+        By default, it returns right away and process_frames is polled every AppConfigs().pull_data_coalesce_interval.
+        @param timeout: in seconds
+        @return: whether there may be data to process
+        """
+        return True
+
     def stop_stream(self):
         pass
 
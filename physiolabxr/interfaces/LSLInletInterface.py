@@ -33,6 +33,7 @@ class LSLInletInterface:
         self.streams = None
         self.inlet = None
         self.data_type = None
+        self._pending_frames, self._pending_timestamps = [], []  # pulled in wait_for_data, returned by the next process_frames
 
     def start_stream(self):
         # connect to the sensor
@@ -57,6 +58,21 @@ class LSLInletInterface:
         available_streams = [x.name() for x in lsl_continuous_resolver.results()] + [x.type() for x in lsl_continuous_resolver.results()]
         return self.lsl_stream_name in available_streams
 
+    def wait_for_data(self, timeout):
+        """
+        block until at least one sample arrives or <timeout> seconds have passed. LSL has no way to wait without
+        pulling, so the sample pulled here is kept and returned by the next call to process_frames. Only one sample is
+        pulled because pull_chunk with a timeout otherwise waits for max_samples
+        """
+        if len(self._pending_timestamps) > 0:
+            return True
+        try:
+            self._pending_frames, self._pending_timestamps = self.inlet.pull_chunk(timeout=timeout, max_samples=1)
+        except LostError:
+            time.sleep(timeout)
+            return False
+        return len(self._pending_timestamps) > 0
+
     def process_frames(self):
         """
         @return: one or more frames of the sensor
@@ -66,6 +82,9 @@ class LSLInletInterface:
         except LostError:
             frames, timestamps = [], []
             pass  # TODO handle stream lost
+        if len(self._pending_timestamps) > 0:
+            frames, timestamps = self._pending_frames + frames, self._pending_timestamps + timestamps
+            self._pending_frames, self._pending_timestamps = [], []
         try:
             return np.transpose(frames), timestamps
         except:
@@ -73,6 +92,7 @@ class LSLInletInterface:
             return frames, timestamps
 
     def stop_stream(self):
+        self._pending_frames, self._pending_timestamps = [], []
         if self.inlet:
             self.inlet.close_stream()
         print('LSLInletInterface: inlet stream closed.')
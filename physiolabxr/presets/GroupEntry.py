@@ -36,6 +36,7 @@ class GroupEntry(metaclass=SubPreset):
     _is_image_only: bool = None  # this attribute is not serialized to json
 
     data_processors: List[DataProcessor] = field(default_factory=list)
+    data_processor_backend: DataProcessorBackend = DataProcessorBackend.numpy
 
     def __post_init__(self):
         """
@@ -12,15 +12,14 @@ except:
     cf_float32 = 1
     cf_double64 = 2
 
-try:
-    from pyaudio import paFloat32, paInt32, paInt24, paInt16, paInt8, paUInt8
-except:
-    paFloat32 = 1
-    paInt32 = 2
-    paInt24 = 4
-    paInt16 = 8
-    paInt8 = 16
-    paUInt8 = 32
+# PortAudio sample formats, the same values as pyaudio.paFloat32 etc. They are not imported from pyaudio, so that
+# loading the enums doesn't load PortAudio
+paFloat32 = 1
+paInt32 = 2
+paInt24 = 4
+paInt16 = 8
+paInt8 = 16
+paUInt8 = 32
 
 class CustomPresetType(Enum):
     UnicornHybridBlackBluetooth = 'UnicornHybridBlackBluetooth'
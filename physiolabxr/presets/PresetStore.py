@@ -0,0 +1,342 @@
+"""
+On-disk store of the presets in the app data folder. Every preset is kept in its own json file, so an edit to one preset
+only rewrites that preset's file, and the presets are loaded lazily, each one only when it is first accessed.
+
+The layout is <store_path>/<category>/<preset file>, where category is the name of the Presets attribute holding the
+preset, e.g., stream_presets, and the preset file name is the url-quoted preset key followed by a hash of the key, so
+keys only differing by case don't collide on case-insensitive file systems.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from urllib.parse import quote, unquote
+
+_preset_file_extension = '.json'
+
+
+def get_preset_file_name(key):
+    return f'{quote(key, safe=" ")}-{zlib.crc32(key.encode("utf-8")):08x}{_preset_file_extension}'
+
+
+def get_preset_key(preset_file_name):
+    return unquote(preset_file_name[:-len(_preset_file_extension)].rsplit('-', 1)[0])
+
+
+def write_file_atomic(path, content):
+    """
+    write to a temporary file in the same folder then replace the target with it, so the target is never left half
+    written if the application is closed or crashes in the middle of the write
+    @param content: str or bytes
+    """
+    file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') if isinstance(content, bytes) else os.fdopen(file_descriptor, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class PresetStore:
+    """
+    Reads and writes the per-preset files. The store remembers what it last wrote to each file, and skips writing a
+    preset whose serialization has not changed.
+    """
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self._written_texts = {}
+
+    def exists(self):
+        return os.path.isdir(self.store_path)
+
+    def get_category_path(self, category):
+        return os.path.join(self.store_path, category)
+
+    def get_preset_path(self, category, key):
+        return os.path.join(self.get_category_path(category), get_preset_file_name(key))
+
+    def get_preset_paths(self, category):
+        """
+        @return: dict of preset key to the path of the preset's file, ordered by key
+        """
+        category_path = self.get_category_path(category)
+        if not os.path.isdir(category_path):
+            return {}
+        preset_paths = {get_preset_key(file_name): os.path.join(category_path, file_name)
+                        for file_name in os.listdir(category_path) if file_name.endswith(_preset_file_extension) and not file_name.startswith('.')}
+        return dict(sorted(preset_paths.items()))
+
+    def write_preset(self, category, key, text):
+        """
+        @return: True if the preset's file is written, False if the preset has not changed since it was last written
+        """
+        path = self.get_preset_path(category, key)
+        if self._written_texts.get(path) == text and os.path.exists(path):
+            return False
+        os.makedirs(self.get_category_path(category), exist_ok=True)
+        write_file_atomic(path, text)
+        self._written_texts[path] = text
+        return True
+
+    def remove_preset(self, category, key):
+        path = self.get_preset_path(category, key)
+        self._written_texts.pop(path, None)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def remove_presets_not_in(self, category, keys):
+        """
+        remove the files of the presets in <category> whose key is not in <keys>
+        """
+        for key in self.get_preset_paths(category).keys() - set(keys):
+            self.remove_preset(category, key)
+
+
+class _UnloadedPreset:
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = path
+
+
+class LazyPresetDict(dict):
+    """
+    A dict of presets that reads a preset from its file the first time it is accessed. The keys are known from the file
+    names, so the membership checks and listing the preset names do not load anything.
+
+    A preset whose file fails to load, e.g., because the preset attributes were changed in an update, is removed from
+    the dict when it is accessed, the same way such presets were skipped when all presets were loaded at once.
+
+    The loader takes the preset's key and its json value, and returns the preset. When pickled, e.g., along with the
+    presets sent to a script process, all the presets are loaded and the dict is unpickled as a plain dict.
+    """
+    def __init__(self, loader, preset_paths=None):
+        super().__init__()
+        self._loader = loader
+        for key, path in (preset_paths or {}).items():
+            dict.__setitem__(self, key, _UnloadedPreset(path))
+
+    def _load(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, _UnloadedPreset):
+            try:
+                with open(value.path, 'r', encoding='utf-8') as f:
+                    value = self._loader(key, json.load(f))
+            except (OSError, json.decoder.JSONDecodeError, TypeError, KeyError, ValueError) as e:
+                print(f'LazyPresetDict: preset {key} will not be loaded from {value.path}: {e}')
+                value = None
+            if value is None:
+                dict.__delitem__(self, key)
+                raise KeyError(key)
+            dict.__setitem__(self, key, value)
+        return value
+
+    def is_loaded(self, key):
+        return not isinstance(dict.__getitem__(self, key), _UnloadedPreset)
+
+    def loaded_items(self):
+        """
+        the presets that have been accessed, presets that are not loaded are unchanged on disk
+        """
+        return [(key, value) for key, value in list(dict.items(self)) if not isinstance(value, _UnloadedPreset)]
+
+    def __getitem__(self, key):
+        return self._load(key)
+
+    def __iter__(self):  # also keeps dict(d) and {**d} from reading the unloaded values directly
+        return iter(list(dict.keys(self)))
+
+    def get(self, key, default=None):
+        try:
+            return self._load(key)
+        except KeyError:
+            return default
+
+    def items(self):
+        rtn = []
+        for key in list(dict.keys(self)):
+            try:
+                rtn.append((key, self._load(key)))
+            except KeyError:
+                pass
+        return rtn
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def pop(self, key, *default):
+        try:
+            self._load(key)
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        return dict.pop(self, key)
+
+    def popitem(self):
+        key = next(reversed(dict.keys(self)))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        try:
+            return self._load(key)
+        except KeyError:
+            dict.__setitem__(self, key, default)
+            return default
+
+    def copy(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return isinstance(other, dict) and dict(self.items()) == dict(other.items())
+
+    def __repr__(self):
+        return f'LazyPresetDict({list(dict.keys(self))})'
+
+    def __reduce_ex__(self, protocol):
+        return dict, (self.items(),)
+
+
+class SerializedPresets:
+    """
+    The changed presets serialized to json, made on the thread that edits the presets so the thread writing them never
+    reads a preset while it is being changed. Later serializations of the same preset replace the earlier ones.
+    """
+    def __init__(self, texts=None, kept_keys=None):
+        """
+        @param texts: dict of (category, key) to the preset's json text, or to None if the preset's file is removed
+        @param kept_keys: dict of category to the keys of all its saved presets, only for the categories that are saved
+        as a whole. The files of the other presets in these categories are removed.
+        """
+        self.texts = texts or {}
+        self.kept_keys = kept_keys or {}
+
+    def update(self, other):
+        for category, keys in other.kept_keys.items():  # saving a whole category supersedes its earlier presets
+            self.kept_keys[category] = set(keys)
+            self.texts = {(text_category, key): text for (text_category, key), text in self.texts.items() if text_category != category}
+        for (category, key), text in other.texts.items():
+            self.texts[(category, key)] = text
+            if category in self.kept_keys and text is not None:
+                self.kept_keys[category].add(key)
+
+    def is_empty(self):
+        return len(self.texts) == 0 and len(self.kept_keys) == 0
+
+    def write(self, preset_store: PresetStore):
+        for category, keys in self.kept_keys.items():
+            preset_store.remove_presets_not_in(category, keys)
+        for (category, key), text in self.texts.items():
+            if text is None:
+                preset_store.remove_preset(category, key)
+            else:
+                preset_store.write_preset(category, key, text)
+
+
+class DebouncedPresetSaver:
+    """
+    Saves the presets on a background thread, after the edits have settled. Every save request restarts the wait, so a
+    burst of edits, e.g., dragging channels between groups, is written once. A save is delayed by at most
+    max_delay seconds from the first request, so a continuous stream of edits is still written.
+
+    The requests carry the presets that changed as (category, key) tuples. They are serialized when requested, on the
+    requesting thread, and only the SerializedPresets are handed to the background thread, where they are accumulated
+    until they are written. A request without them serializes all presets.
+    """
+    def __init__(self, serialize_function, write_function, debounce_interval, max_delay):
+        """
+        @param serialize_function: function serializing the presets, called with the changed (category, key) tuples, or
+        None for all presets, and returning SerializedPresets
+        @param write_function: function writing the SerializedPresets
+        @param debounce_interval: in seconds, how long the presets must be left unchanged before they are saved
+        @param max_delay: in seconds, the longest a save request waits
+        """
+        self.serialize_function = serialize_function
+        self.write_function = write_function
+        self.debounce_interval = debounce_interval
+        self.max_delay = max_delay
+
+        self._condition = threading.Condition()
+        self._save_lock = threading.Lock()
+        self._is_pending = False
+        self._serialized_presets = SerializedPresets()
+        self._first_request_time = None
+        self._last_request_time = None
+        self._is_stopped = False
+        self._thread = None
+
+    def request_save(self, dirty_presets=None):
+        serialized_presets = self.serialize_function(dirty_presets)
+        with self._condition:
+            self._serialized_presets.update(serialized_presets)
+            now = time.monotonic()
+            if not self._is_pending:
+                self._first_request_time = now
+            self._is_pending = True
+            self._last_request_time = now
+            if self._thread is None or not self._thread.is_alive():
+                self._is_stopped = False
+                self._thread = threading.Thread(target=self._run, name='DebouncedPresetSaver', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _take_serialized_presets(self):
+        serialized_presets = self._serialized_presets
+        self._serialized_presets = SerializedPresets()
+        self._is_pending = False
+        return serialized_presets
+
+    def _get_wait_time(self):
+        now = time.monotonic()
+        return min(self._last_request_time + self.debounce_interval, self._first_request_time + self.max_delay) - now
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._is_stopped and (not self._is_pending or self._get_wait_time() > 0):
+                    self._condition.wait(timeout=self._get_wait_time() if self._is_pending else None)
+                if self._is_stopped:
+                    return
+            self._write_pending()
+
+    def _write_pending(self):
+        """
+        the batch is taken while holding the save lock, so that a batch taken earlier is never written after a newer one
+        """
+        with self._save_lock:
+            with self._condition:
+                serialized_presets = self._take_serialized_presets()
+            if not serialized_presets.is_empty():
+                self.write_function(serialized_presets)
+
+    def is_pending(self):
+        return self._is_pending
+
+    def flush(self, dirty_presets=None):
+        """
+        save the pending requests along with <dirty_presets> now, on the calling thread
+        """
+        serialized_presets = self.serialize_function(dirty_presets)
+        with self._condition:
+            self._serialized_presets.update(serialized_presets)
+        self._write_pending()
+
+    def stop(self):
+        """
+        save any pending requests and stop the background thread
+        """
+        with self._condition:
+            self._is_stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._is_pending:
+            self._write_pending()
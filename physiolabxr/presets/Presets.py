@@ -1,6 +1,9 @@
 import copy
 import json
 import os
+import pickle
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from enum import Enum
 from multiprocessing import Process
@@ -13,6 +16,7 @@ from physiolabxr.configs.config import default_group_name
 from physiolabxr.configs.configs import AppConfigs
 from physiolabxr.presets.GroupEntry import GroupEntry
 from physiolabxr.presets.PresetEnums import PresetType, DataType, VideoDeviceChannelOrder, AudioInputDataType
+from physiolabxr.presets.PresetStore import PresetStore, LazyPresetDict, DebouncedPresetSaver, SerializedPresets, write_file_atomic
 from physiolabxr.presets.ScriptPresets import ScriptPreset, ScriptParam
 from physiolabxr.presets.preset_class_helpers import SubPreset
 from physiolabxr.ui.SplashScreen import SplashLoadingTextNotifier
@@ -25,6 +29,10 @@ from physiolabxr.presets.load_user_preset import process_plot_group_json_preset,
 from physiolabxr.utils.video_capture_utils import get_working_camera_ports
 
 
+_device_presets_cache_file_name = '_device_presets.json'
+_preset_files_cache_file_name = '_preset_files_cache.pickle'
+
+
 def is_monotonically_increasing(lst):
     differences = np.diff(np.array(lst))
     return np.all(differences >= 0)
@@ -151,6 +159,8 @@ class VideoPreset(metaclass=SubPreset):
     attributes:
         stream_name: name of the stream
         video_type: can be webcam or monitor
+        capture_region: for monitors, (left, top, width, height) of the screen to capture, the whole screen if None.
+            The width and height of the preset are those of the region when it is set.
     """
     stream_name: str
     preset_type: PresetType
@@ -163,6 +173,7 @@ class VideoPreset(metaclass=SubPreset):
     nominal_sampling_rate: int = 30
     video_scale: float = 1.0
     channel_order: VideoDeviceChannelOrder = VideoDeviceChannelOrder.RGB
+    capture_region: List[int] = None
 
     def __post_init__(self):
         """
@@ -171,6 +182,8 @@ class VideoPreset(metaclass=SubPreset):
         """
         # convert any enum attribute loaded as string to the corresponding enum value
         reload_enums(self)
+        if self.capture_region is not None:
+            self.width, self.height = self.capture_region[2], self.capture_region[3]
         self.num_channels = int(self.height * self.width * self.nchannels)
 
 @dataclass(init=True, repr=True, eq=True, order=False, unsafe_hash=False, frozen=False)
@@ -283,17 +296,112 @@ class FMRIPreset(metaclass=SubPreset):
 
 
 def _load_stream_presets(presets, dirty_presets):
-    for category, dirty_preset_paths in dirty_presets.items():
-        for dirty_preset_path in dirty_preset_paths:
-            loaded_preset_dict = json.load(open(dirty_preset_path))
-
-            if category == PresetType.LSL.value or category == PresetType.ZMQ.value or category == PresetType.CUSTOM.value:
-                stream_preset_dict = preprocess_stream_preset(loaded_preset_dict, category)
-                presets.add_stream_preset(stream_preset_dict)
-            elif category == PresetType.EXPERIMENT.value:
-                presets.add_experiment_preset(loaded_preset_dict['ExperimentName'], loaded_preset_dict['PresetStreamNames'])
-            else:
-                raise ValueError(f'unknown category {category} for preset {dirty_preset_path}')
+    """
+    add the presets from the changed preset files in the preset roots.
+
+    The presets created from a preset file are cached in the app data folder with the file's modified time and size,
+    see _read_preset_files_cache, so when all the preset files are reloaded, e.g., after the presets are reset, the
+    unchanged ones are loaded from the cache in one read. The files not in the cache are parsed in a thread pool.
+    @param dirty_presets: dict of preset category (a PresetType value) to the paths of the changed preset files
+    """
+    preset_files = [(category, preset_path) for category, preset_paths in dirty_presets.items() for preset_path in preset_paths]
+    if len(preset_files) == 0:
+        return
+    cache_version = _get_preset_files_cache_version()
+    cached_files = _read_preset_files_cache(presets._app_data_path, cache_version)
+
+    loaded_presets = {}
+    missed_files = []
+    for category, preset_path in preset_files:
+        file_stat = os.stat(preset_path)
+        file_key = category, file_stat.st_mtime_ns, file_stat.st_size
+        cached_file = cached_files.get(os.path.abspath(preset_path))
+        if cached_file is not None and cached_file[0] == file_key:
+            loaded_presets[preset_path] = cached_file[1]
+        else:
+            missed_files.append((category, preset_path, file_key))
+    if len(missed_files) > 0:
+        with ThreadPoolExecutor() as executor:
+            parsed_presets = list(executor.map(lambda missed_file: _load_preset_file(*missed_file[:2]), missed_files))
+        for (category, preset_path, file_key), preset in zip(missed_files, parsed_presets):
+            loaded_presets[preset_path] = preset
+            cached_files[os.path.abspath(preset_path)] = file_key, preset
+        _save_preset_files_cache(presets._app_data_path, cache_version, cached_files)  # before the presets are added and can be changed
+
+    for category, preset_path in preset_files:
+        if category == PresetType.EXPERIMENT.value:
+            presets.add_experiment_preset(*loaded_presets[preset_path])
+        else:
+            presets.stream_presets[loaded_presets[preset_path].stream_name] = loaded_presets[preset_path]
+
+
+def _load_preset_file(category, preset_path):
+    """
+    @return: the StreamPreset for a stream preset file, or the experiment name and its stream names for an experiment
+    preset file
+    """
+    with open(preset_path, 'r') as f:
+        loaded_preset_dict = json.load(f)
+
+    if category == PresetType.LSL.value or category == PresetType.ZMQ.value or category == PresetType.CUSTOM.value:
+        return create_stream_preset(preprocess_stream_preset(loaded_preset_dict, category))
+    elif category == PresetType.EXPERIMENT.value:
+        return loaded_preset_dict['ExperimentName'], loaded_preset_dict['PresetStreamNames']
+    else:
+        raise ValueError(f'unknown category {category} for preset {preset_path}')
+
+
+def _get_preset_files_cache_version():
+    """
+    the cached presets are discarded when the package is updated, when the code creating the presets changes, or when
+    a config the presets are created with changes
+    """
+    from physiolabxr.version.version import get_project_version
+    with os.scandir(os.path.dirname(os.path.abspath(__file__))) as entries:
+        module_mod_times = sorted((entry.name, entry.stat().st_mtime_ns) for entry in entries if entry.name.endswith('.py'))
+    return (get_project_version(), module_mod_times, config.MAX_TS_CHANNEL_NUM, AppConfigs().default_channel_display_num,
+            AppConfigs().viz_display_duration)
+
+
+def _read_preset_files_cache(app_data_path, cache_version):
+    """
+    @return: dict of preset file path to ((category, modified time in ns, size), preset), empty if there is no cache
+    or the cache is of a different version
+    """
+    cache_path = os.path.join(app_data_path, _preset_files_cache_file_name)
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'rb') as f:
+            cache = pickle.load(f)
+    except Exception as e:  # unpickling a corrupted or incompatible cache can raise about anything
+        print(f'Preset files cache will not be loaded: {e}')
+        return {}
+    return cache['files'] if cache.get('version') == cache_version else {}
+
+
+def _save_preset_files_cache(app_data_path, cache_version, cached_files):
+    if not os.path.exists(app_data_path):
+        os.makedirs(app_data_path)
+    cached_files = {preset_path: cached_file for preset_path, cached_file in cached_files.items() if os.path.exists(preset_path)}
+    write_file_atomic(os.path.join(app_data_path, _preset_files_cache_file_name),
+                      pickle.dumps({'version': cache_version, 'files': cached_files}, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def create_stream_preset(stream_preset_dict: Dict[str, Any]):
+    """
+    checks for any attributes in the stream_preset_dict that are not in the StreamPreset class. These are assumed
+    to be device specific attributes and it is recommended to give some prefix for these attributes (e.g. '_', '_device_')
+    :param stream_preset_dict: dictionary containing the stream preset
+    :return: the StreamPreset
+    """
+    device_info = {}
+    device_specific_attribute_names = [attribute_name for attribute_name, attribute_value in stream_preset_dict.items() if attribute_name not in StreamPreset.__annotations__]
+    for attribute_name in device_specific_attribute_names:
+        device_info[attribute_name] = stream_preset_dict.pop(attribute_name)
+    stream_preset_dict['device_info'] = device_info
+    return StreamPreset(**stream_preset_dict)
+
 
 def preprocess_stream_preset(stream_preset_dict, category):
     """
@@ -357,6 +465,48 @@ def _load_audio_device_presets():
         return []
 
 
+def save_device_presets_cache(preset_type: PresetType, device_presets: list):
+    """
+    keep the result of a device discovery, so the next startup can show the devices right away while they are being
+    discovered again in the background
+    """
+    cache_path = os.path.join(AppConfigs().app_data_path, _device_presets_cache_file_name)
+    cache = _read_device_presets_cache(cache_path)
+    cache[preset_type.name] = device_presets
+    save_presets_locally(AppConfigs().app_data_path, cache, _device_presets_cache_file_name)
+
+
+def load_device_presets_cache(preset_type: PresetType):
+    """
+    @return: the presets found by the last discovery of devices of <preset_type>, an empty list if there is no cache.
+    preset_type can be PresetType.WEBCAM or PresetType.AUDIO
+    """
+    cache = _read_device_presets_cache(os.path.join(AppConfigs().app_data_path, _device_presets_cache_file_name))
+    preset_class = VideoPreset if preset_type == PresetType.WEBCAM else AudioPreset
+    try:
+        return [preset_class(**preset_dict) for preset_dict in cache.get(preset_type.name, [])]
+    except (TypeError, KeyError, ValueError):
+        print(f'Cached {preset_type.name} devices will not be loaded, because the preset attributes was changed during the last update')
+        invalidate_device_presets_cache()
+        return []
+
+
+def invalidate_device_presets_cache():
+    cache_path = os.path.join(AppConfigs().app_data_path, _device_presets_cache_file_name)
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+
+def _read_device_presets_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except json.decoder.JSONDecodeError:
+        return {}
+
+
 def create_default_audio_preset(stream_name, audio_device_index, num_channels):
     group_info = create_default_group_info(num_channels)
 
@@ -395,6 +545,37 @@ def _load_param_presets_recursive(param_preset_dict):
             return ScriptParam(**param_preset_dict)
     return rtn
 
+def _load_saved_stream_preset(stream_name, stream_preset_dict):
+    """
+    only the LSL, ZMQ and custom stream presets are reloaded, the device presets are discovered again on every startup
+    """
+    if PresetType.is_lsl_zmq_custom_preset(stream_preset_dict['preset_type']):
+        return StreamPreset(**stream_preset_dict)
+    return None
+
+
+def _load_saved_script_preset(script_id, script_preset_dict):
+    try:
+        script_preset_dict['param_presets'] = [_load_param_presets_recursive(param_preset) for param_preset in script_preset_dict['param_presets']]
+        return ScriptPreset(**script_preset_dict)
+    except (TypeError, KeyError):
+        print(f'Script with key {script_id} will not be loaded, because the script preset attributes was changed during the last update')
+        return None
+
+
+def _load_saved_experiment_preset(experiment_name, stream_names):
+    return stream_names
+
+
+_saved_preset_loaders = {'stream_presets': _load_saved_stream_preset,
+                         'script_presets': _load_saved_script_preset,
+                         'experiment_presets': _load_saved_experiment_preset}
+
+
+def _is_preset_saved(category, preset):
+    return category != 'stream_presets' or PresetType.is_lsl_zmq_custom_preset(preset.preset_type)
+
+
 def save_presets_locally(app_data_path, preset_dict, file_name) -> None:
     """
     sync the presets to the local disk. This will create a _presets.json file in the app data folder if it doesn't exist.
@@ -418,7 +599,10 @@ class Presets(metaclass=Singleton):
         stream_presets: dictionary containing all the stream presets. The key is the stream name and the value is the StreamPreset object
         experiment_presets: dictionary containing all the experiment presets. The key is the experiment name and the value is a list of stream names
 
-        _reset: if true, reload the presets. This is done in post_init by removing files at _last_mod_time_path and _preset_path.
+        _reset: if true, reload the presets. This is done in post_init by removing files at _last_mod_time_path, _preset_path and _preset_store_path.
+
+    The presets are saved in the app data folder, one file per preset, see PresetStore. They are loaded lazily, a saved
+    preset is only read when it is first accessed.
 
     Note: presets must not have multiprocessing.Process in the dataclass attributes. This will cause the program to crash.
     """
@@ -438,13 +622,15 @@ class Presets(metaclass=Singleton):
     _app_data_path: str = AppConfigs().app_data_path
     _last_mod_time_path: str = os.path.join(_app_data_path, 'last_mod_times.json')
     _preset_path: str = os.path.join(_app_data_path, '_presets.json')
+    _preset_store_path: str = os.path.join(_app_data_path, '_presets')
 
     def __post_init__(self):
         """
         The post init of presets does the following:
-        1. if reset is true, remove the last mod time and preset json files
+        1. if reset is true, remove the last mod time and the saved presets
         2. set the private path variables based on the given preset root, which makes the preset root a mandatory argument when first time initializing _presets globally.
-        3. load the presets from the local disk if it exists
+        3. load the presets from the local disk if it exists, each preset is read when first accessed. Presets saved in a
+        single _presets.json by an earlier version are loaded and saved again one file per preset
         4. check if any presets are dirty and load them
         5. save the presets to the local disk
         """
@@ -458,6 +644,8 @@ class Presets(metaclass=Singleton):
                 os.remove(self._last_mod_time_path)
             if os.path.exists(self._preset_path):
                 os.remove(self._preset_path)
+            if os.path.exists(self._preset_store_path):
+                shutil.rmtree(self._preset_store_path)
 
         self._lsl_preset_root = os.path.join(self._preset_root, self._lsl_preset_root)
         self._zmq_preset_root = os.path.join(self._preset_root, self._zmq_preset_root)
@@ -465,30 +653,21 @@ class Presets(metaclass=Singleton):
         self._experiment_preset_root = os.path.join(self._preset_root, self._experiment_preset_root)
         self._preset_roots = [self._lsl_preset_root, self._zmq_preset_root, self._device_preset_root, self._experiment_preset_root]
 
-        if os.path.exists(self._preset_path):
+        self._preset_store = PresetStore(self._preset_store_path)
+        self._preset_saver = DebouncedPresetSaver(self._serialize_presets, self._write_presets, AppConfigs().preset_save_debounce_interval / 1e3, AppConfigs().preset_save_max_delay / 1e3)
+        if self._preset_store.exists():
+            SplashLoadingTextNotifier().set_loading_text(f'Reloading presets from {self._app_data_path}')
+            for category, loader in _saved_preset_loaders.items():
+                setattr(self, category, LazyPresetDict(loader, self._preset_store.get_preset_paths(category)))
+        elif os.path.exists(self._preset_path):  # presets saved by an earlier version in a single file
             SplashLoadingTextNotifier().set_loading_text(f'Reloading presets from {self._app_data_path}')
             with open(self._preset_path, 'r') as f:
                 preset_dict = json.load(f)
-                preset_dict = {k: v for k, v in preset_dict.items() if not k.startswith('_')}  # don't load private variables
-                if 'stream_presets' in preset_dict.keys():
-                    for key, value in preset_dict['stream_presets'].items():
-                        if PresetType.is_lsl_zmq_custom_preset(value['preset_type']):
-                            preset = StreamPreset(**value)
-                            preset_dict['stream_presets'][key] = preset
-                        # elif PresetType.is_video_preset(value['preset_type']):  # video presets won't be loaded
-                        #     preset = VideoPreset(**value)
-                        #     preset_dict['stream_presets'][key] = preset
-                    preset_dict['stream_presets'] = {k: v for k, v in preset_dict['stream_presets'].items() if isinstance(v, (StreamPreset, VideoPreset))}
-                if 'script_presets' in preset_dict.keys():
-                    for key, value in preset_dict['script_presets'].items():
-                        try:
-                            value['param_presets'] = [_load_param_presets_recursive(param_preset) for param_preset in value['param_presets']]
-                            preset = ScriptPreset(**value)
-                            preset_dict['script_presets'][key] = preset
-                        except (TypeError, KeyError):
-                            print(f'Script with key {key} will not be loaded, because the script preset attributes was changed during the last update')
-                    preset_dict['script_presets'] = {k: v for k, v in preset_dict['script_presets'].items() if isinstance(v, ScriptPreset)}
-                self.__dict__.update(preset_dict)
+            for category, loader in _saved_preset_loaders.items():
+                loaded_presets = {key: loader(key, value) for key, value in preset_dict.get(category, {}).items()}
+                setattr(self, category, {key: value for key, value in loaded_presets.items() if value is not None})
+            self._preset_saver.flush()
+            os.remove(self._preset_path)
         dirty_presets = self._record_presets_last_modified_times()
 
         _load_stream_presets(self, dirty_presets)
@@ -497,12 +676,6 @@ class Presets(metaclass=Singleton):
             self.save(is_async=False)
         SplashLoadingTextNotifier().set_loading_text("_presets instance successfully initialized")
 
-    def _get_all_presets(self):
-        """
-        this function needs to be modified if new preset dict are added
-        """
-        return {**self.stream_presets, **self.experiment_presets}
-
     def _record_presets_last_modified_times(self):
         """
         get all the dirty presets and record their last modified times to the last_mod_times.json file.
@@ -531,31 +704,28 @@ class Presets(metaclass=Singleton):
         """
         save the presets to the local disk when the application is closed
         """
-        save_presets_locally(self._app_data_path, self.__dict__, '_presets.json')
-        print(f"_presets instance successfully deleted with its contents saved to {self._app_data_path}")
+        if getattr(self, '_preset_saver', None) is None:  # a copy of the presets, e.g., in a script process, doesn't save
+            return
+        self._preset_saver.stop()
+        self._preset_saver.flush()
+        print(f"_presets instance successfully deleted with its contents saved to {self._preset_store_path}")
         # if self._load_video_device_process is not None and self._load_video_device_process.is_alive():
         #     self._load_video_device_process.terminate()
 
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k not in ('_preset_store', '_preset_saver')}
+
     def add_stream_preset(self, stream_preset_dict: Dict[str, Any]):
         """
-        add a stream preset to the presets
-
-        checks for any attributes in the stream_preset_dict that are not in the StreamPreset class. These are assumed
-        to be device specific attributes and it is recommended to give some prefix for these attributes (e.g. '_', '_device_')
+        add a stream preset to the presets, see create_stream_preset
         :param stream_preset_dict: dictionary containing the stream preset
         :return: None
         """
-        device_info = {}
-        device_specific_attribute_names = [attribute_name for attribute_name, attribute_value in stream_preset_dict.items() if attribute_name not in StreamPreset.__annotations__]
-        for attribute_name in device_specific_attribute_names:
-            device_info[attribute_name] = stream_preset_dict.pop(attribute_name)
-        stream_preset_dict['device_info'] = device_info
-
-        stream_preset = StreamPreset(**stream_preset_dict)
+        stream_preset = create_stream_preset(stream_preset_dict)
         self.stream_presets[stream_preset.stream_name] = stream_preset
 
-    def add_video_preset_by_fields(self, stream_name, video_type, video_id, width, height, nchannels):
-        video_preset = VideoPreset(stream_name, video_type, video_id, width=width, height=height, nchannels=nchannels)
+    def add_video_preset_by_fields(self, stream_name, video_type, video_id, width, height, nchannels, capture_region=None):
+        video_preset = VideoPreset(stream_name, video_type, video_id, width=width, height=height, nchannels=nchannels, capture_region=capture_region)
         self.stream_presets[video_preset.stream_name] = video_preset
 
     def add_video_presets(self, video_presets: List[VideoPreset]):
@@ -585,24 +755,64 @@ class Presets(metaclass=Singleton):
         """
         self.experiment_presets[experiment_name] = stream_names
 
-    def save(self, is_async=False) -> None:
+    def save(self, is_async=False, dirty_presets=None) -> None:
         """
-        save the presets to the local disk asynchronously.
+        save the presets to the local disk. Each preset is saved to its own file, see PresetStore.
+        @param is_async: if true, the presets are serialized now and written on a background thread once the edits have
+        settled, see DebouncedPresetSaver. Otherwise they are saved now, along with any pending asynchronous saves.
+        @param dirty_presets: the presets that changed, as an iterable of (category, key) tuples, where category is the
+        name of the attribute holding the preset, e.g., ('stream_presets', stream_name). All presets are saved if None.
         @return: None
         """
+        if is_async:
+            self._preset_saver.request_save(dirty_presets)
+        else:
+            self._preset_saver.flush(dirty_presets)
+
+    def _serialize_presets(self, dirty_presets) -> SerializedPresets:
+        """
+        serialize the presets in <dirty_presets>, or all the loaded presets if it is None. Presets that are not loaded
+        are unchanged since they were read and are left as they are on disk.
+        Called on the thread editing the presets, the returned SerializedPresets are then written on the saver's thread.
+        """
+        categories = {category: getattr(self, category) for category in _saved_preset_loaders.keys()}
+        serialized_presets = SerializedPresets()
+        if dirty_presets is None:
+            for category, presets in categories.items():
+                unsaved_keys = set()
+                for key, preset in self._get_loaded_presets(presets):
+                    if _is_preset_saved(category, preset):
+                        serialized_presets.texts[(category, key)] = json.dumps(preset, indent=4, cls=PresetsEncoder)
+                    else:
+                        unsaved_keys.add(key)
+                serialized_presets.kept_keys[category] = set(presets.keys()) - unsaved_keys
+        else:
+            for category, key in dirty_presets:
+                preset = categories[category].get(key, None)
+                if preset is not None and _is_preset_saved(category, preset):
+                    serialized_presets.texts[(category, key)] = json.dumps(preset, indent=4, cls=PresetsEncoder)
+                else:
+                    serialized_presets.texts[(category, key)] = None
+        return serialized_presets
+
+    def _write_presets(self, serialized_presets: SerializedPresets):
+        serialized_presets.write(self._preset_store)
 
-        # if is_async:
-        #     self_dict = copy.deepcopy(self.__dict__)
-        #     p = multiprocessing.Process(target=save_presets_locally, args=(self._app_data_path, self_dict, '_presets.json'))
-        #     p.start()
-        # else:
-        save_presets_locally(self._app_data_path, self.__dict__, '_presets.json')
+    @staticmethod
+    def _get_loaded_presets(presets):
+        return presets.loaded_items() if isinstance(presets, LazyPresetDict) else list(presets.items())
 
     def __getitem__(self, key):
-        return self._get_all_presets()[key]
+        if key in self.experiment_presets:
+            return self.experiment_presets[key]
+        return self.stream_presets[key]
 
     def keys(self):
-        return self._get_all_presets().keys()
+        """
+        the names of all the presets, without loading the presets.
+        This function and __getitem__ need to be modified if new preset dict are added
+        """
+        return {**dict.fromkeys(self.stream_presets.keys()), **dict.fromkeys(self.experiment_presets.keys())}.keys()
 
     def reload_stream_presets(self):
         """
@@ -629,16 +839,30 @@ class Presets(metaclass=Singleton):
     #     _load_video_device_process.start()
     #     return _load_video_device_process
 
+    def _remove_stream_presets(self, stream_presets, is_removed):
+        for stream_name, stream_preset in stream_presets:
+            if is_removed(stream_preset):
+                self.stream_presets.pop(stream_name)
+
     def remove_video_presets(self):
         """
-        remove all the video presets
+        remove all the video presets. The stream presets that are not loaded yet are saved LSL, ZMQ or custom presets, so
+        they are not checked.
+        :return: None
+        """
+        self._remove_stream_presets(self._get_loaded_presets(self.stream_presets), lambda stream_preset: stream_preset.preset_type.is_self_video_preset())
+
+    def remove_presets_by_type(self, preset_type: PresetType):
+        """
+        remove all the presets of the given type
         :return: None
         """
-        self.stream_presets = {stream_name: stream_preset for stream_name, stream_preset in self.stream_presets.items() if not stream_preset.preset_type.is_self_video_preset()}
+        stream_presets = self.stream_presets.items() if PresetType.is_lsl_zmq_custom_preset(preset_type) else self._get_loaded_presets(self.stream_presets)
+        self._remove_stream_presets(stream_presets, lambda stream_preset: stream_preset.preset_type == preset_type)
 
     def remove_audio_presets(self):
         """
         remove all the audio presets
         :return: None
         """
-        self.stream_presets = {stream_name: stream_preset for stream_name, stream_preset in self.stream_presets.items() if not stream_preset.preset_type.is_self_audio_preset()}
\ No newline at end of file
+        self._remove_stream_presets(self._get_loaded_presets(self.stream_presets), lambda stream_preset: stream_preset.preset_type.is_self_audio_preset())
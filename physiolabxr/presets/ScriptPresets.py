@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import List, Union
+from dataclasses import dataclass, field
+from typing import Dict, List, Union
 
 from physiolabxr.presets.PresetEnums import PresetType, DataType
 from physiolabxr.presets.preset_class_helpers import SubPreset
@@ -42,6 +42,7 @@ class ScriptPreset(metaclass=SubPreset):
     time_window: int
     script_path: str
     is_simulate: bool
+    input_sampling_rates: Dict[str, float] = field(default_factory=dict)  # the inputs resampled for the script, the rest are at their nominal rate
 
     def __post_init__(self):
         self.output_presets = [ScriptOutput(**output) if isinstance(output, dict) else output for output in self.output_presets ]
@@ -0,0 +1,83 @@
+from typing import Dict
+
+import numpy as np
+
+from physiolabxr.presets.GroupEntry import GroupEntry
+from physiolabxr.presets.Presets import Presets
+from physiolabxr.utils.dsp_utils.dsp_pipeline import DataProcessorPipeline
+
+
+def get_channel_index(channel_indices):
+    """
+    the index to take a group's channels from the stream data. Contiguous channels are indexed with a slice, so that
+    data[index] is a view instead of a copy.
+    @return: a slice or an integer numpy array
+    """
+    channel_indices = np.asarray(channel_indices, dtype=np.intp)
+    if len(channel_indices) > 0 and np.all(np.diff(channel_indices) == 1):
+        return slice(int(channel_indices[0]), int(channel_indices[-1]) + 1)
+    return channel_indices
+
+
+class GroupRenderPlan:
+    """
+    What a group needs on every visualization refresh and data processor run, compiled once from its GroupEntry.
+
+    The plot configs and data processors are references to the preset's objects, the preset setters change them in
+    place, so they are always up to date. The channel indices are copied, so the plan must be recompiled when the
+    group's channels change.
+    """
+    def __init__(self, group_name, group_entry: GroupEntry, nominal_sampling_rate):
+        self.group_name = group_name
+        self.group_entry = group_entry
+        self.nominal_sampling_rate = nominal_sampling_rate
+
+        if group_entry.channel_indices is None:
+            start, end = group_entry.channel_indices_start_end
+            self.channel_indices = np.arange(start, end)
+            self.channel_index = slice(start, end)
+        else:
+            self.channel_indices = np.asarray(group_entry.channel_indices, dtype=np.intp)
+            self.channel_index = get_channel_index(self.channel_indices)
+        self.num_channels = len(self.channel_indices)
+
+        self.time_series_config = group_entry.plot_configs.time_series_config
+        self.image_config = group_entry.plot_configs.image_config
+        self.barchart_config = group_entry.plot_configs.barchart_config
+        self.spectrogram_config = group_entry.plot_configs.spectrogram_config
+        self.data_processors = group_entry.data_processors
+        self.data_processor_pipeline = DataProcessorPipeline(self.data_processors)
+
+        self._time_vectors = {}
+
+    def get_time_vector(self, num_points):
+        """
+        the time axis of a line chart plotting <num_points> points
+        """
+        if num_points not in self._time_vectors:
+            self._time_vectors[num_points] = np.linspace(0., num_points / self.nominal_sampling_rate, num_points)
+        return self._time_vectors[num_points]
+
+    @property
+    def data_processor_backend(self):
+        return self.group_entry.data_processor_backend
+
+
+class StreamRenderPlan:
+    """
+    Per-stream compiled render plan, so the visualization refresh and the data processors do not need to look up the
+    presets. The owner of the plan must drop it whenever the stream's preset changes in a way the plan can't see, i.e.,
+    when groups are added, removed, reordered, renamed or regrouped, or when the nominal sampling rate or display
+    duration changes. See BaseStreamWidget.invalidate_render_plan.
+    """
+    def __init__(self, stream_name):
+        self.stream_name = stream_name
+        self.stream_preset = Presets().stream_presets[stream_name]
+        self.nominal_sampling_rate = self.stream_preset.nominal_sampling_rate
+        self.display_duration = self.stream_preset.display_duration
+        self.num_points_to_plot = int(self.display_duration * self.nominal_sampling_rate)
+        self.groups: Dict[str, GroupRenderPlan] = {group_name: GroupRenderPlan(group_name, group_entry, self.nominal_sampling_rate)
+                                                   for group_name, group_entry in self.stream_preset.group_info.items()}
+
+    def is_data_processor_only_applied_to_visualization(self):
+        return self.stream_preset.data_processor_only_apply_to_visualization
@@ -7,7 +7,7 @@ from physiolabxr.presets.Cmap import Cmap
 from physiolabxr.presets.GroupEntry import GroupEntry, PlotFormat
 from physiolabxr.presets.Presets import Presets, preprocess_stream_preset
 from physiolabxr.presets.PresetEnums import PresetType, DataType, VideoDeviceChannelOrder, AudioInputDataType
-from physiolabxr.utils.dsp_utils.dsp_modules import DataProcessor
+from physiolabxr.utils.dsp_utils.dsp_modules import DataProcessor, DataProcessorBackend
 
 
 # def get_presets_path():
@@ -157,8 +157,11 @@ def get_group_channel_indices_start_end(stream_name, group_name) -> List[int]:
     return Presets().stream_presets[stream_name].group_info[group_name].channel_indices_start_end
 
 
-def save_preset(is_async=True):
-    Presets().save(is_async=is_async)
+def save_preset(is_async=True, stream_name=None):
+    """
+    @param stream_name: the stream whose preset changed, all presets are saved if None
+    """
+    Presets().save(is_async=is_async, dirty_presets=None if stream_name is None else [('stream_presets', stream_name)])
 
 
 def create_default_lsl_preset(stream_name, num_channels, nominal_sample_rate: int=None, data_type=DataType.float32, **kwargs):
@@ -372,6 +375,9 @@ def get_video_scale(video_device_name) -> float:
 def get_video_channel_order(video_device_name) -> VideoDeviceChannelOrder:
     return Presets().stream_presets[video_device_name].channel_order
 
+def get_video_capture_region(video_device_name):
+    return Presets().stream_presets[video_device_name].capture_region
+
 def is_video_webcam(stream_name) -> bool:
     return Presets().stream_presets[stream_name].preset_type == PresetType.WEBCAM
 
@@ -388,6 +394,12 @@ def add_data_processor_to_group_entry(stream_name, group_name, data_processor:Da
 def remove_data_processor_to_group_entry(stream_name, group_name, data_processor: DataProcessor) ->None:
     Presets().stream_presets[stream_name].group_info[group_name].data_processors.remove(data_processor)
 
+def get_group_data_processor_backend(stream_name, group_name) -> DataProcessorBackend:
+    return Presets().stream_presets[stream_name].group_info[group_name].data_processor_backend
+
+def set_group_data_processor_backend(stream_name, group_name, backend: DataProcessorBackend) -> None:
+    Presets().stream_presets[stream_name].group_info[group_name].data_processor_backend = backend
+
 def get_fmri_data_shape(stream_name) ->tuple[int, int, int]:
     return Presets().stream_presets[stream_name].data_shape
 
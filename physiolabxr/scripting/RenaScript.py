@@ -33,7 +33,9 @@ from physiolabxr.sub_process.TCPInterface import RenaTCPInterface
 from physiolabxr.utils.data_utils import validate_output
 from physiolabxr.utils.buffers import get_fps, DataBuffer
 from physiolabxr.utils.lsl_utils import create_lsl_outlet
-from physiolabxr.utils.networking_utils import recv_string_router, send_string_router, send_router, recv_data_dict
+from physiolabxr.utils.networking_utils import recv_string_router, send_string_router, send_router, recv_data_dict, \
+    traces_to_frames
+from physiolabxr.utils.performance_utils import TraceHop, stamp_traces
 
 
 class RenaScript(ABC, threading.Thread):
@@ -48,46 +50,23 @@ class RenaScript(ABC, threading.Thread):
         :param inputs:
         :param outputs:
         :param params:
-        :param port: the port to which we bind the
+        :param port: the port to which we bind the sockets talking to the main app. If None, the script runs headless:
+            no sockets or output outlets are created and the caller drives init/loop/cleanup in-process
         """
         super().__init__()
         self.sim_clock = time.time()
         print('RenaScript: RenaScript Thread started on process {0}'.format(os.getpid()))
-        try:
-            self.stdout_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_STDOUT',
-                                                            port_id=port,
-                                                            identity='server',
-                                                            pattern='router-dealer')
-            self.info_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_INFO',
-                                                          port_id=port + 1,
-                                                          identity='server',
-                                                          pattern='router-dealer')
-            self.input_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_INPUT',
-                                                           port_id=port + 2,
-                                                           identity='server',
-                                                           pattern='router-dealer')
-            self.command_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_COMMAND',
-                                                             port_id=port + 3,
-                                                             identity='server',
-                                                             pattern='router-dealer')
-        except zmq.error.ZMQError as e:
-            print("script failed to set up sockets {0}".format(e))
+        self.is_headless = port is None  # headless scripts are driven in-process by scripting.headless_runner, without sockets
+        if not self.is_headless and not self._setup_main_app_sockets(port):
             return
-        print('RenaScript: Waiting for stdout routing ID from main app')
-        _, self.stdout_routing_id = recv_string_router(self.stdout_socket_interface, True)
-        # send_string_router_dealer(str(os.getpid()), self.stdout_routing_id, self.stdout_socket_interface)
-        print('RenaScript: Waiting for info routing ID from main app')
-        _, self.info_routing_id = recv_string_router(self.info_socket_interface, True)
-        print('RenaScript: Waiting for command routing ID from main app')
-        _, self.command_routing_id = recv_string_router(self.command_socket_interface, True)
-        # redirect stdout
-        sys.stdout = self.redirect_stdout = RedirectStdout(socket_interface=self.stdout_socket_interface, routing_id=self.stdout_routing_id)
-        sys.stderr = self.redirect_stderr = RedirectStderr(socket_interface=self.stdout_socket_interface, routing_id=self.stdout_routing_id)
 
         # set up measuring realtime performance
         self.loop_durations = deque(maxlen=run_frequency * 2)
         self.max_loop_duration = 0
         self.run_while_start_times = deque(maxlen=run_frequency * 2)
+        self.num_unreported_loops = 0  # the loops since the last info request, their durations are sent with the reply
+        self.unreported_traces = {}  # input stream name -> the traces of the chunks processed since the last info request
+        self.max_unreported_traces = 1024
         # setup inputs and outputs
         self.input_names = inputs
         self.inputs = DataBuffer(stream_buffer_sizes=buffer_sizes)
@@ -103,7 +82,8 @@ class RenaScript(ABC, threading.Thread):
         self.output_outlets = {}
 
         try:
-            self._create_output_streams()
+            if not self.is_headless:
+                self._create_output_streams()
         except RenaError as e:
             print('Error setting up output streams: {0}'.format(e))
             traceback.print_exc()
@@ -120,6 +100,39 @@ class RenaScript(ABC, threading.Thread):
 
         print('RenaScript: Script init completed')
 
+    def _setup_main_app_sockets(self, port):
+        try:
+            self.stdout_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_STDOUT',
+                                                            port_id=port,
+                                                            identity='server',
+                                                            pattern='router-dealer')
+            self.info_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_INFO',
+                                                          port_id=port + 1,
+                                                          identity='server',
+                                                          pattern='router-dealer')
+            self.input_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_INPUT',
+                                                           port_id=port + 2,
+                                                           identity='server',
+                                                           pattern='router-dealer')
+            self.command_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_COMMAND',
+                                                             port_id=port + 3,
+                                                             identity='server',
+                                                             pattern='router-dealer')
+        except zmq.error.ZMQError as e:
+            print("script failed to set up sockets {0}".format(e))
+            return False
+        print('RenaScript: Waiting for stdout routing ID from main app')
+        _, self.stdout_routing_id = recv_string_router(self.stdout_socket_interface, True)
+        # send_string_router_dealer(str(os.getpid()), self.stdout_routing_id, self.stdout_socket_interface)
+        print('RenaScript: Waiting for info routing ID from main app')
+        _, self.info_routing_id = recv_string_router(self.info_socket_interface, True)
+        print('RenaScript: Waiting for command routing ID from main app')
+        _, self.command_routing_id = recv_string_router(self.command_socket_interface, True)
+        # redirect stdout
+        sys.stdout = self.redirect_stdout = RedirectStdout(socket_interface=self.stdout_socket_interface, routing_id=self.stdout_routing_id)
+        sys.stderr = self.redirect_stderr = RedirectStderr(socket_interface=self.stdout_socket_interface, routing_id=self.stdout_routing_id)
+        return True
+
     @abstractmethod
     def init(self):
         """
@@ -152,7 +165,9 @@ class RenaScript(ABC, threading.Thread):
         print('Entering loop')
         while True:
             self.outputs = dict([(s_name, None) for s_name in self.output_outlets.keys()])  # reset the output to be default values
-            data_dict = recv_data_dict(self.input_socket_interface)
+            data_dict, traces = recv_data_dict(self.input_socket_interface, return_traces=True)
+            for stream_traces in traces.values():
+                stamp_traces(stream_traces, TraceHop.script_receive)
             self.update_input_buffer(data_dict)
             loop_start_time = time.time()
             try:
@@ -166,13 +181,19 @@ class RenaScript(ABC, threading.Thread):
             self.loop_durations.append(this_loop_outputs)
             self.max_loop_duration = max(this_loop_outputs, self.max_loop_duration)
             self.run_while_start_times.append(loop_start_time)
+            self.num_unreported_loops += 1
             # receive info request from main process
             info_msg_routing_id = recv_string_router(self.info_socket_interface, is_block=False)
             if info_msg_routing_id is not None:
                 request = info_msg_routing_id[0]
                 if request == SCRIPT_INFO_REQUEST:
-                    send_router(np.array([get_fps(self.run_while_start_times), np.mean(self.loop_durations), self.max_loop_duration]),
-                                self.info_routing_id, self.info_socket_interface)
+                    unreported_loop_durations = list(self.loop_durations)[len(self.loop_durations) - min(self.num_unreported_loops, len(self.loop_durations)):]
+                    trace_frames = traces_to_frames({stream_name: np.array(stream_traces) for stream_name, stream_traces in self.unreported_traces.items()}) \
+                        if len(self.unreported_traces) > 0 else ()
+                    send_router(np.array([get_fps(self.run_while_start_times), np.mean(self.loop_durations), self.max_loop_duration, *unreported_loop_durations]),
+                                self.info_routing_id, self.info_socket_interface, trace_frames)
+                    self.num_unreported_loops = 0
+                    self.unreported_traces = {}
                 else:
                     print('unknown info request: ' + request)
             # receive command from main process
@@ -231,6 +252,9 @@ class RenaScript(ABC, threading.Thread):
                         else:
                             print('Unknown error occurred when trying to send output data: {0}'.format(str(e)))
                         traceback.print_exc()
+            for stream_name, stream_traces in traces.items():
+                stamp_traces(stream_traces, TraceHop.output_send)
+                self.unreported_traces.setdefault(stream_name, deque(maxlen=self.max_unreported_traces)).extend(stream_traces)
         # exiting the script loop
         try:
             self.cleanup()
@@ -241,6 +265,8 @@ class RenaScript(ABC, threading.Thread):
         send_string_router(SCRIPT_STOP_SUCCESS, self.command_routing_id, self.command_socket_interface)
 
     def __del__(self):
+        if self.is_headless:
+            return
         self.stdout_socket_interface.socket.close()
         self.input_socket_interface.socket.close()
         self.info_socket_interface.socket.close()
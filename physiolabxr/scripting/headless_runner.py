@@ -0,0 +1,248 @@
+"""
+Run a RenaScript outside the GUI over recorded sessions.
+
+In the GUI, ScriptingWidget.run_signal forwards every sample that arrived since the previous tick to the script process
+at <run frequency>, and the script keeps the latest <buffer size> samples of each input in its DataBuffer. The functions
+here replay a recording through the same windows in-process: init() is called once, loop() once per simulated tick and
+cleanup() at the end. Whatever the script sets with set_output (or self.outputs[...]) is collected into a buffer with
+the same layout as a recording, i.e., {stream_name: [data (channels x time), timestamps]}.
+
+Example:
+    outputs = run_script_headless('MyScript.py', 'session1.dats', run_frequency=10, time_window=4,
+                                  outputs=[ScriptOutput('prediction', 2, PresetType.LSL, DataType.float32)],
+                                  output_path='session1_prediction.dats')
+
+Several sessions or parameter sets can be evaluated in parallel with run_scripts_headless, which fans the jobs out
+over a process pool.
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+import traceback
+from multiprocessing import Pool
+from typing import List, Dict
+
+import numpy as np
+
+from physiolabxr.exceptions.exceptions import BadOutputError
+from physiolabxr.presets.PresetEnums import PresetType, DataType
+from physiolabxr.presets.ScriptPresets import ScriptOutput
+from physiolabxr.scripting.script_utils import get_target_class
+from physiolabxr.utils.RNStream import RNStream
+from physiolabxr.utils.data_utils import validate_output
+from physiolabxr.utils.video_recording_utils import decode_video_streams
+from physiolabxr.utils.xdf_utils import load_xdf
+
+
+def load_recording(file_path):
+    """
+    load a recording the same way ReplayServer does, no jitter removal is applied so the timestamps are as recorded
+    @param file_path: path to a .dats, .p or .xdf recording
+    @return: dict of stream name to [data, timestamps], the last axis of data is time
+    """
+    if file_path.endswith('.dats'):
+        stream_data = RNStream(file_path).stream_in(jitter_removal=False)
+    elif file_path.endswith('.p'):
+        stream_data = pickle.load(open(file_path, 'rb'))
+    elif file_path.endswith('.xdf'):
+        stream_data = load_xdf(file_path)
+    else:
+        raise ValueError(f'Unsupported recording file type: {file_path}')
+    return decode_video_streams(file_path, stream_data)
+
+
+def get_run_signal_tick_times(stream_data: dict, run_frequency):
+    """
+    the times at which run_signal would have fired, if the script was started at the first sample of the recording
+    and kept running until the last sample arrived
+    """
+    start_time = min([timestamps[0] for _, timestamps in stream_data.values() if len(timestamps) > 0])
+    end_time = max([timestamps[-1] for _, timestamps in stream_data.values() if len(timestamps) > 0])
+    tick_interval = 1 / run_frequency
+    return np.arange(start_time + tick_interval, end_time + tick_interval, tick_interval)
+
+
+def get_run_signal_windows(stream_data: dict, tick_times: np.ndarray):
+    """
+    for each stream, find the samples that would have been forwarded on each tick of run_signal
+
+    @return: dict of stream name to an array of length len(tick_times) + 1. The samples forwarded on the i-th tick are
+    indexed by [windows[i], windows[i + 1]).
+    """
+    return {stream_name: np.concatenate([[0], np.searchsorted(timestamps, tick_times, side='right')])
+            for stream_name, (_, timestamps) in stream_data.items()}
+
+
+def get_buffer_sizes_from_time_window(stream_data: dict, time_window):
+    """
+    the script's input buffer sizes when they are not given, the GUI uses the preset's nominal sampling rate, here we
+    use the effective sampling rate of the recording
+    """
+    buffer_sizes = {}
+    for stream_name, (_, timestamps) in stream_data.items():
+        duration = timestamps[-1] - timestamps[0] if len(timestamps) > 1 else 0
+        srate = len(timestamps) / duration if duration > 0 else 1
+        buffer_sizes[stream_name] = max(int(time_window * srate), 1)
+    return buffer_sizes
+
+
+def run_script_headless(script_path, recording_path, run_frequency, time_window, inputs: List[str] = None,
+                        outputs: List[ScriptOutput] = None, params: dict = None, buffer_sizes: Dict[str, int] = None,
+                        presets=None, output_path=None):
+    """
+    drive the RenaScript at <script_path> over the recording at <recording_path>, without the GUI
+
+    @param script_path: path to the script, same as the one given in the scripting tab
+    @param recording_path: path to a .dats, .p or .xdf recording
+    @param run_frequency: how many times per (recording) second loop() is called
+    @param time_window: input buffer duration in seconds, used to compute buffer sizes if they are not given
+    @param inputs: names of the streams in the recording to feed to the script, all streams if None
+    @param outputs: the output streams of the script, data set to other streams is ignored like in the GUI
+    @param params: the script's parameters
+    @param buffer_sizes: number of samples kept in the script's input buffer for each input
+    @param presets: passed to the script for get_stream_info, can be None if the script doesn't use it
+    @param output_path: if given, the collected outputs are saved here. Saved as .dats if the path ends with .dats,
+    otherwise pickled
+    @return: dict of output stream name to [data (channels x time), timestamps]
+    """
+    stream_data = load_recording(recording_path)
+    inputs = list(stream_data.keys()) if inputs is None else inputs
+    for input_name in inputs:
+        if input_name not in stream_data:
+            raise ValueError(f'Input stream {input_name} is not found in recording {recording_path}')
+    # scripts receive channels x time, like the GUI, multi-dimensional streams such as video are flattened
+    stream_data = {input_name: (stream_data[input_name][0].reshape(-1, stream_data[input_name][0].shape[-1]),
+                                np.array(stream_data[input_name][1])) for input_name in inputs}
+    outputs = [] if outputs is None else outputs
+    params = dict() if params is None else params
+    buffer_sizes = get_buffer_sizes_from_time_window(stream_data, time_window) if buffer_sizes is None else buffer_sizes
+    input_shapes = {input_name: (data.shape[0], buffer_sizes[input_name]) for input_name, (data, _) in stream_data.items()}
+
+    target_class = get_target_class(script_path)
+    script = target_class(inputs=inputs, input_shapes=input_shapes, buffer_sizes=buffer_sizes, outputs=outputs,
+                          params=params, port=None, run_frequency=run_frequency, time_window=time_window,
+                          script_path=script_path, is_simulate=False, presets=presets)
+
+    tick_times = get_run_signal_tick_times(stream_data, run_frequency)
+    windows = get_run_signal_windows(stream_data, tick_times)
+    output_buffer = {o.stream_name: ([], []) for o in outputs}
+
+    try:
+        script.init()
+    except Exception:
+        traceback.print_exc()
+    for i, tick_time in enumerate(tick_times):
+        script.outputs = dict(script._output_default)  # reset the output to be default values
+        data_dict = {stream_name: (data[:, windows[stream_name][i]:windows[stream_name][i + 1]],
+                                   timestamps[windows[stream_name][i]:windows[stream_name][i + 1]])
+                     for stream_name, (data, timestamps) in stream_data.items() if windows[stream_name][i + 1] > windows[stream_name][i]}
+        script.update_input_buffer(data_dict)
+        loop_start_time = time.time()
+        try:
+            script.loop()
+        except Exception:
+            traceback.print_exc()
+        this_loop_duration = time.time() - loop_start_time
+        script.loop_durations.append(this_loop_duration)
+        script.max_loop_duration = max(this_loop_duration, script.max_loop_duration)
+        script.run_while_start_times.append(loop_start_time)
+        _collect_outputs(script, tick_time, output_buffer)
+    try:
+        script.cleanup()
+    except Exception:
+        traceback.print_exc()
+
+    rtn = {}
+    for stream_name, (data_list, timestamps_list) in output_buffer.items():
+        data_type = script.output_presets[stream_name].data_type.get_data_type()
+        if len(data_list) > 0:
+            rtn[stream_name] = [np.concatenate(data_list, axis=-1).astype(data_type), np.concatenate(timestamps_list)]
+        else:
+            rtn[stream_name] = [np.empty((script.output_num_channels[stream_name], 0), dtype=data_type), np.empty(0)]
+    if output_path is not None:
+        save_headless_outputs(rtn, output_path)
+    return rtn
+
+
+def _collect_outputs(script, tick_time, output_buffer):
+    for stream_name, data in script.outputs.items():
+        if stream_name not in output_buffer:
+            print(f'RenaScript: output stream with name {stream_name} not found')
+            continue
+        if data is None:
+            continue
+        try:
+            _data, timestamp, is_data_chunk, is_timestamp_chunk = validate_output(data, script.output_num_channels[stream_name])
+        except BadOutputError as e:
+            print('Bad output data is given to stream {0}: {1}'.format(stream_name, str(e)))
+            continue
+        _data = _data if is_data_chunk else _data[np.newaxis, :]  # frames x channels
+        if is_timestamp_chunk:
+            timestamps = np.array(timestamp, dtype=np.float64)
+        else:  # the tick time stands in for the local clock the GUI would use
+            timestamps = np.full(len(_data), tick_time if timestamp is None else timestamp, dtype=np.float64)
+        output_buffer[stream_name][0].append(np.transpose(_data))
+        output_buffer[stream_name][1].append(timestamps)
+
+
+def save_headless_outputs(outputs: dict, output_path):
+    if output_path.endswith('.dats'):
+        if os.path.exists(output_path):
+            os.remove(output_path)  # RNStream appends to existing files
+        RNStream(output_path).stream_out(outputs)
+    else:
+        pickle.dump(outputs, open(output_path, 'wb'))
+
+
+def _run_script_headless_job(job: dict):
+    return run_script_headless(**job)
+
+
+def run_scripts_headless(jobs: List[dict], num_processes=None):
+    """
+    run several headless scripts in parallel, for example one per session, or one per parameter set
+
+    @param jobs: each job is a dict of keyword arguments to run_script_headless
+    @param num_processes: size of the process pool, defaults to the number of cpus
+    @return: list of the outputs of each job, in the same order as jobs
+    """
+    with Pool(processes=num_processes) as pool:
+        return pool.map(_run_script_headless_job, jobs)
+
+
+def parse_output_arg(output_arg: str):
+    """
+    parse an output given as <stream name>:<number of channels>[:<data type>], e.g., prediction:2:float32
+    """
+    stream_name, num_channels, *data_type = output_arg.split(':')
+    data_type = DataType[data_type[0]] if len(data_type) > 0 else DataType.float32
+    return ScriptOutput(stream_name=stream_name, num_channels=int(num_channels), interface_type=PresetType.LSL, data_type=data_type)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a RenaScript headless over recorded sessions.")
+    parser.add_argument("script_path", help="path to the script")
+    parser.add_argument("recording_paths", nargs='+', help="one or more .dats, .p or .xdf recordings")
+    parser.add_argument("--run-frequency", type=int, required=True, help="how many times loop() is called per second")
+    parser.add_argument("--time-window", type=float, required=True, help="input buffer duration in seconds")
+    parser.add_argument("--inputs", nargs='*', default=None, help="input stream names, all streams in the recording if not given")
+    parser.add_argument("--outputs", nargs='*', default=[], help="outputs as <stream name>:<number of channels>[:<data type>]")
+    parser.add_argument("--params", default=None, help="script parameters as a json string")
+    parser.add_argument("--output-dir", default='.', help="where the outputs are saved, one .dats file per recording")
+    parser.add_argument("--num-processes", type=int, default=None, help="size of the process pool")
+    args = parser.parse_args()
+
+    outputs = [parse_output_arg(o) for o in args.outputs]
+    params = json.loads(args.params) if args.params is not None else None
+    script_name = os.path.splitext(os.path.basename(args.script_path))[0]
+    jobs = [{'script_path': args.script_path, 'recording_path': recording_path, 'run_frequency': args.run_frequency,
+             'time_window': args.time_window, 'inputs': args.inputs, 'outputs': outputs, 'params': params,
+             'output_path': os.path.join(args.output_dir, f'{os.path.splitext(os.path.basename(recording_path))[0]}_{script_name}.dats')}
+            for recording_path in args.recording_paths]
+    run_scripts_headless(jobs, num_processes=args.num_processes)
+
+
+if __name__ == '__main__':
+    main()
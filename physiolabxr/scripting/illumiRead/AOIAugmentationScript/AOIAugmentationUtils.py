@@ -350,6 +350,11 @@ class GazeAttentionMatrixTorch():
         self._attention_patch_average_kernel = torch.tensor(
             np.ones(shape=attention_patch_shape) / (attention_patch_shape[0] * attention_patch_shape[1]), device=device)
 
+        # pixel indices of each patch, cropped to the whole patches as the strided conv2d does, for update_attention_grid_buffer
+        self._patch_row_indices = torch.arange(self.attention_grid_shape[0] * attention_patch_shape[0], dtype=torch.float64, device=device).view(self.attention_grid_shape[0], attention_patch_shape[0])
+        self._patch_col_indices = torch.arange(self.attention_grid_shape[1] * attention_patch_shape[1], dtype=torch.float64, device=device).view(self.attention_grid_shape[1], attention_patch_shape[1])
+        self._filter_map_min = np.exp(-np.sum((self.image_shape - 1) ** 2) / (2 * self.sigma ** 2))  # at the corners of the filter map, relative to its center
+
         # # clutter removal
         # self._attention_grid_clutter_removal = ClutterRemoval(signal_clutter_ratio=0.1)
         # self._attention_grid_clutter_removal.evoke_data_processor()
@@ -381,6 +386,19 @@ class GazeAttentionMatrixTorch():
             stride=(self._attention_patch_average_kernel.shape[0], self._attention_patch_average_kernel.shape[1])).view(
             (self.attention_grid_shape[0], self.attention_grid_shape[1]))
 
+    def update_attention_grid_buffer(self, attention_center_location):
+        """
+        Gives the same attention grid as get_image_attention_buffer followed by convolve_attention_grid_buffer, without
+        the image-sized attention buffer and the convolution.
+
+        The gaussian in the filter map is separable, so its average over a patch is the outer product of the row and
+        column gaussians averaged over the patch's rows and columns. Those are evaluated at grid resolution, and rescaled
+        the same way the filter map is normalized.
+        """
+        row_gaussian = torch.exp(-(self._patch_row_indices - attention_center_location[0]) ** 2 / (2 * self.sigma ** 2)).mean(dim=1)
+        col_gaussian = torch.exp(-(self._patch_col_indices - attention_center_location[1]) ** 2 / (2 * self.sigma ** 2)).mean(dim=1)
+        self._attention_grid_buffer = (torch.outer(row_gaussian, col_gaussian) - self._filter_map_min) / (1 - self._filter_map_min)
+
     # def return_attention_grid(self):
     #     return self._attention_grid_clutter_removal.process_sample(self._attention_grid_buffer)
     def gaze_attention_grid_map_clutter_removal(self, attention_clutter_ratio=0.1):
@@ -6,7 +6,6 @@ import numpy as np
 from imblearn.over_sampling import SMOTE
 from numpy.lib.stride_tricks import sliding_window_view
 from sklearn import metrics
-from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import StratifiedShuffleSplit
 from sklearn.preprocessing import LabelEncoder
@@ -21,19 +20,18 @@ def z_norm_hdca(x, _mean=None, _std=None):
     return (x - _mean) / _std
 
 def compute_forward(x_windowed, y, projection):
-    num_train_trials, num_channels, num_windows, num_timepoints_per_window = x_windowed.shape
-    activation = np.empty((2, num_channels, num_windows, num_timepoints_per_window))
-    for class_index in np.sort(np.unique(y)):  # for test set, in increasing order
-        this_x = x_windowed[y == class_index]
-        this_projection = projection[y == class_index]
-        for j in range(num_windows):
-            this_x_window = this_x[:, :, j, :].reshape(this_x.shape[0], -1).T
-            # z_window = np.array([np.dot(weights_channelWindow[j], this_x[trial_index, :, j, :].reshape(-1)) for trial_index in range(this_x.shape[0])])
-            # z_window = z_window.reshape((-1, 1)) # change to a col vector
-            this_projection_window = this_projection[:, j]
-            a = (np.matmul(this_x_window, this_projection_window) / np.matmul(this_projection_window.T, this_projection_window).item()).reshape((num_channels, num_timepoints_per_window))
-            activation[class_index, :, j] = a
-    return activation
+    """
+    the forward model (activation) of each class and window: the data of the class's trials regressed on their window
+    projections, a = X^T p / (p^T p), for all classes and windows in one einsum.
+    :param x_windowed: shape = #trials, #channels, #windows, #time points per window
+    :param y: encoded labels, 0 or 1
+    :param projection: shape = #trials, #windows
+    :return: shape = 2, #channels, #windows, #time points per window, zeros for the classes not in y
+    """
+    class_projection = (y[:, None, None] == np.arange(2)[:, None]) * projection[:, None, :]  # #trials, 2, #windows, zero for the other class
+    activation = np.einsum('nkw,ncwt->kcwt', class_projection, x_windowed, optimize=True)
+    projection_power = np.sum(np.square(class_projection), axis=0)
+    return np.divide(activation, projection_power[:, None, :, None], out=np.zeros_like(activation), where=projection_power[:, None, :, None] != 0)
 
 def _train_compute_window_projections(x_train_windowed, x_test_windowed, y_train):
     weights_channelWindow, projection_train_window_trial, ldas = _train_window_lda(x_train_windowed, y_train)
@@ -42,6 +40,9 @@ def _train_compute_window_projections(x_train_windowed, x_test_windowed, y_train
 
 
 def _compute_window_lda_projections(x_windowed, ldas):
+    if isinstance(ldas, WindowLDA):
+        return ldas.transform(x_windowed)
+    # a list of per-window LinearDiscriminantAnalysis, from models trained before WindowLDA
     num_trials, num_channels, num_windows, num_timepoints_per_window = x_windowed.shape
     projections = np.empty((num_trials, num_windows))
     for k in range(num_windows):  # iterate over different windows
@@ -50,20 +51,88 @@ def _compute_window_lda_projections(x_windowed, ldas):
     return projections
 
 def _train_window_lda(x_train_windowed, y_train):
-    num_train_trials, num_channels, num_windows, num_timepoints_per_window = x_train_windowed.shape
+    lda = WindowLDA()
+    projection_train_window_trial = lda.fit_transform(x_train_windowed, y_train)
+    return lda.coef_, projection_train_window_trial, lda
 
-    weights_channelWindow = np.empty((num_windows, num_channels * num_timepoints_per_window))
-    projection_train_window_trial = np.empty((num_train_trials, num_windows))
 
-    ldas = []
-    for k in range(num_windows):  # iterate over different windows
-        this_x_train = x_train_windowed[:, :, k, :].reshape((num_train_trials, -1))
-        lda = LinearDiscriminantAnalysis(solver='svd')
-        projection_train_window_trial[:, k] = lda.fit_transform(this_x_train, y_train).squeeze(axis=1)
-        ldas.append(lda)
-        _weights = np.squeeze(lda.coef_, axis=0)
-        weights_channelWindow[k] = _weights
-    return weights_channelWindow, projection_train_window_trial, ldas
+class WindowLDA:
+    """
+    Two-class Fisher's linear discriminant of every temporal window, all windows solved at once.
+
+    It follows sklearn's LinearDiscriminantAnalysis(solver='svd'): the within-class scatter of each window is scaled by
+    the feature's std and whitened, keeping the directions whose singular values are above tol, and the data is
+    projected onto the whitened class mean difference, so the projections have unit within-class variance. Instead of
+    one SVD per window, the whitening comes from a stacked eigendecomposition of the windows' within-class covariances,
+    or of their Gram matrices when there are fewer trials than features.
+
+    The projections are the same as the ones from sklearn up to sign. Here the sign is fixed so that the second class
+    projects higher, which keeps the forward models of different folds in the same orientation.
+    """
+    def __init__(self, tol=1e-4):
+        """
+        :param tol: singular values of the scaled within-class data below this are treated as zero, same as in sklearn
+        """
+        self.tol = tol
+        self.classes_ = None
+        self.xbar_ = None  # shape = #windows, #features, the prior-weighted mean of the class means
+        self.scalings_ = None  # shape = #windows, #features, the projection of each window
+        self.coef_ = None  # shape = #windows, #features
+        self._window_shape = None
+
+    def fit(self, x_windowed, y):
+        """
+        :param x_windowed: shape = #trials, #channels, #windows, #time points per window
+        :param y: labels of the trials, must have two classes
+        """
+        num_trials, num_channels, num_windows, num_timepoints_per_window = x_windowed.shape
+        self.classes_, y = np.unique(y, return_inverse=True)
+        assert len(self.classes_) == 2, f"WindowLDA: expected two classes, got {len(self.classes_)}"
+        x = np.transpose(x_windowed, (0, 2, 1, 3)).reshape((num_trials, num_windows, -1))  # features are in the order of channels then time points, same as reshaping each window
+        num_features = x.shape[-1]
+
+        priors = np.bincount(y, minlength=2) / num_trials
+        means = np.stack([np.mean(x[y == class_index], axis=0) for class_index in range(2)])  # 2, #windows, #features
+        self.xbar_ = np.tensordot(priors, means, axes=1)
+        mean_difference = means[1] - means[0]
+
+        x_within = x - means[y]
+        std = np.std(x_within, axis=0)
+        std[std == 0] = 1.
+        x_within /= std * np.sqrt(num_trials)
+
+        # stacked eigendecomposition of the smaller of the covariance and the Gram matrix, their eigenvalues are the squared singular values of x_within
+        x_within = np.transpose(x_within, (1, 0, 2))  # #windows, #trials, #features
+        if num_trials >= num_features:
+            eigenvalues, right_vectors = np.linalg.eigh(np.matmul(np.transpose(x_within, (0, 2, 1)), x_within))
+            singular_values = np.sqrt(np.clip(eigenvalues, 0, None))
+        else:
+            eigenvalues, left_vectors = np.linalg.eigh(np.matmul(x_within, np.transpose(x_within, (0, 2, 1))))
+            singular_values = np.sqrt(np.clip(eigenvalues, 0, None))
+            right_vectors = np.matmul(np.transpose(x_within, (0, 2, 1)), left_vectors) / np.where(singular_values > self.tol, singular_values, 1)[:, None, :]
+        inverse_singular_values = np.divide(1., singular_values, out=np.zeros_like(singular_values), where=singular_values > self.tol)
+        whitening = right_vectors * inverse_singular_values[:, None, :] / std[:, :, None]  # #windows, #features, #components
+
+        # project onto the whitened mean difference, the only discriminant direction with two classes
+        direction = np.einsum('wf,wfk->wk', mean_difference, whitening)
+        direction_norm = np.linalg.norm(direction, axis=1, keepdims=True)
+        direction /= np.where(direction_norm == 0, 1, direction_norm)
+        self.scalings_ = np.einsum('wfk,wk->wf', whitening, direction)
+        self.coef_ = np.sum(mean_difference * self.scalings_, axis=1, keepdims=True) * self.scalings_
+        self._window_shape = num_channels, num_timepoints_per_window
+        return self
+
+    def transform(self, x_windowed):
+        """
+        :param x_windowed: shape = #trials, #channels, #windows, #time points per window
+        :return: the projections, shape = #trials, #windows
+        """
+        num_windows = self.scalings_.shape[0]
+        scalings = self.scalings_.reshape((num_windows,) + self._window_shape)
+        return np.einsum('ncwt,wct->nw', x_windowed, scalings, optimize=True) - np.sum(self.xbar_ * self.scalings_, axis=1)
+
+    def fit_transform(self, x_windowed, y):
+        return self.fit(x_windowed, y).transform(x_windowed)
 
 def eval_crossbin_model(x_project, y, model):
     y_pred = model.predict(x_project)
@@ -138,6 +207,65 @@ def rebalance_classes(x, y, by_channel=False, random_seed=None):
 
     return x, y
 
+def _fit_fold(x_eeg, x_eeg_transformed, x_pupil, y, train, test, split_size_eeg, split_size_pupil, fold_index, num_folds, verbose=0):
+    """
+    trains and tests the window LDAs and the cross-bin models on one cross-validation fold. It only depends on its
+    arguments, so that the folds can run in parallel processes.
+    :return: dict of the fold's models and results
+    """
+    if verbose: print(f"Working on {fold_index + 1} fold of {num_folds}")
+    use_pupil = x_pupil is not None
+    fold = {}
+
+    x_eeg_transformed_train, x_eeg_transformed_test, y_train, y_test = x_eeg_transformed[train], x_eeg_transformed[test], y[train], y[test]
+    x_eeg_transformed_train, y_train_eeg = rebalance_classes(x_eeg_transformed_train, y_train)  # rebalance by class
+    if use_pupil:
+        x_pupil_train, x_pupil_test = x_pupil[train], x_pupil[test]
+        x_pupil_train, y_train_pupil = rebalance_classes(x_pupil_train, y_train)  # rebalance by class
+        assert np.all(y_train_eeg == y_train_pupil)
+
+    y_train = y_train_eeg
+    x_eeg_test = x_eeg[test]
+
+    x_eeg_transformed_train_windowed = split_by_window(x_eeg_transformed_train, split_size_eeg)  # shape = #trials, #channels, #windows, #time points per window
+    x_eeg_transformed_test_windowed = split_by_window(x_eeg_transformed_test, split_size_eeg)  # shape = #trials, #channels, #windows, #time points per window
+    x_eeg_test_windowed = split_by_window(x_eeg_test, split_size_eeg)  # shape = #trials, #channels, #windows, #time points per window
+    num_windows_eeg = x_eeg_transformed_train_windowed.shape[2]
+
+    # compute Fisher's LD for each temporal window
+    if verbose >= 2: print("Computing windowed LDA per channel, and project per window and trial")
+    lda_weights_eeg, projection_train_eeg, projection_test_eeg, fold['window_eeg_ldas'] = _train_compute_window_projections(x_eeg_transformed_train_windowed, x_eeg_transformed_test_windowed, y_train)
+    if verbose >= 2: print('Computing forward model from window projections for test set')
+    fold['activation'] = compute_forward(x_eeg_test_windowed, y_test, projection_test_eeg)
+    # train classifier, use gradient descent to find the cross-window weights
+
+    if use_pupil:
+        x_pupil_train_windowed = split_by_window(x_pupil_train, split_size_pupil)  # shape = #trials, #channels, #windows, #time points per window
+        x_pupil_test_windowed = split_by_window(x_pupil_test, split_size_pupil)  # shape = #trials, #channels, #windows, #time points per window
+        num_windows_pupil = x_pupil_train_windowed.shape[2]
+        lda_weights_pupil, projection_train_pupil, projection_test_pupil, fold['window_pupil_ldas'] = _train_compute_window_projections(x_pupil_train_windowed, x_pupil_test_windowed, y_train)
+        # z-norm the projections
+        projection_train_pupil, projection_test_pupil, fold['pupil_mean'], fold['pupil_std'] = z_norm_projection(projection_train_pupil, projection_test_pupil)
+
+    projection_train_eeg, projection_test_eeg, fold['eeg_mean'], fold['eeg_std'] = z_norm_projection(projection_train_eeg, projection_test_eeg)
+
+    if verbose >= 2: print('Solving cross bin weights')
+    fold['cw_weights_eeg'], fold['roc_auc_eeg'], fold['fpr_eeg'], fold['tpr_eeg'], fold['crossbin_model_eeg'] = solve_crossbin_weights(projection_train_eeg, projection_test_eeg, y_train, y_test, num_windows_eeg)
+
+    if use_pupil:
+        fold['cw_weights_pupil'], fold['roc_auc_pupil'], fold['fpr_pupil'], fold['tpr_pupil'], fold['crossbin_model_pupil'] = solve_crossbin_weights(projection_train_pupil, projection_test_pupil, y_train, y_test, num_windows_pupil)
+        projection_combined_train = np.concatenate([projection_train_eeg, projection_train_pupil], axis=1)
+        projection_combined_test = np.concatenate([projection_test_eeg, projection_test_pupil], axis=1)
+        _, fold['roc_auc_combined'], _, _, fold['crossbin_model_combined'] = solve_crossbin_weights(projection_combined_train, projection_combined_test, y_train, y_test, num_windows_pupil)
+    else:
+        fold['roc_auc_pupil'] = None
+        fold['roc_auc_combined'] = fold['roc_auc_eeg']
+    return fold
+
+
+def split_by_window(data, window_shape):
+    return sliding_window_view(data, window_shape=window_shape, axis=2)[:, :, 0::window_shape, :]  # shape = #trials, #channels, #windows, #time points per window
+
 def z_norm_projection(x_train, x_test):
     assert len(x_train.shape) == len(x_test.shape) == 2
     projection_mean = np.mean(np.concatenate((x_train, x_test), axis=0), axis=0, keepdims=True)
@@ -205,7 +333,11 @@ class HDCA():
         self.num_eeg_windows = None
         self.num_pupil_windows = None
 
-    def fit(self, x_eeg, x_eeg_pca_ica, x_pupil, y, is_plots=False, notes="", num_folds=10, exg_srate=200, split_window_eeg=100e-3, split_window_pupil=500e-3, eyetracking_srate=20, random_seed=None, verbose=0, eeg_montage=None, out_dir=None, *args, **kwargs):
+    def fit(self, x_eeg, x_eeg_pca_ica, x_pupil, y, is_plots=False, notes="", num_folds=10, exg_srate=200, split_window_eeg=100e-3, split_window_pupil=500e-3, eyetracking_srate=20, random_seed=None, verbose=0, eeg_montage=None, out_dir=None, n_jobs=1, *args, **kwargs):
+        """
+        :param n_jobs: number of processes the cross-validation folds run in, as in joblib, -1 for all the cores. The
+        folds run one after another in this process with the default 1
+        """
         self._use_pupil = x_pupil is not None
         label_encoder = LabelEncoder()
         label_encoder.fit(y)
@@ -237,82 +369,43 @@ class HDCA():
 
         # x_eeg_transformed, pca, ica = compute_pca_ica(x[0], num_top_compoenents)
         x_eeg_transformed = x_eeg_pca_ica
-        best_auc = 0
-        for i, (train, test) in enumerate(cross_val_folds.split(x_eeg, y)):  # cross-validation; group arguement is not necessary unless using grouped folds
-            if verbose: print(f"Working on {i + 1} fold of {num_folds}")
-
-            x_eeg_transformed_train, x_eeg_transformed_test, y_train, y_test = x_eeg_transformed[train],  x_eeg_transformed[test], y[train], y[test]
-            x_eeg_transformed_train, y_train_eeg = rebalance_classes(x_eeg_transformed_train,y_train)  # rebalance by class
-            if self._use_pupil:
-                x_pupil_train, x_pupil_test, _, _ = x_pupil[train], x_pupil[test], y[train], y[test]
-                x_pupil_train, y_train_pupil = rebalance_classes(x_pupil_train, y_train)  # rebalance by class
-                assert np.all(y_train_eeg == y_train_pupil)
-
-            y_train = y_train_eeg
-            x_eeg_test = x_eeg[test]
-
-            # x_eeg_transformed_train_windowed = sliding_window_view(x_eeg_transformed_train, window_shape=self.split_size_eeg,axis=2)[:, :, 0::self.split_size_eeg,:]  # shape = #trials, #channels, #windows, #time points per window
-            # x_eeg_transformed_test_windowed = sliding_window_view(x_eeg_transformed_test, window_shape=self.split_size_eeg,axis=2)[:, :, 0::self.split_size_eeg,:]  # shape = #trials, #channels, #windows, #time points per window
-            # x_eeg_test_windowed = sliding_window_view(x_eeg_test, window_shape=self.split_size_eeg, axis=2)[:, :, 0::self.split_size_eeg, :]  # shape = #trials, #channels, #windows, #time points per window
-
-            x_eeg_transformed_train_windowed = self._split_by_window(x_eeg_transformed_train, self.split_size_eeg)  # shape = #trials, #channels, #windows, #time points per window
-            x_eeg_transformed_test_windowed = self._split_by_window(x_eeg_transformed_test, self.split_size_eeg)  # shape = #trials, #channels, #windows, #time points per window
-            x_eeg_test_windowed = self._split_by_window(x_eeg_test, self.split_size_eeg)  # shape = #trials, #channels, #windows, #time points per window
-
-            num_train_trials, self.num_channels_eeg, self.num_windows_eeg, self.num_timepoints_per_window_eeg = x_eeg_transformed_train_windowed.shape
-
-            # compute Fisher's LD for each temporal window
-            if verbose >= 2: print("Computing windowed LDA per channel, and project per window and trial")
-            lda_weights_eeg, projection_train_eeg, projection_test_eeg, window_eeg_ldas = _train_compute_window_projections(x_eeg_transformed_train_windowed, x_eeg_transformed_test_windowed, y_train)
-            if verbose >= 2: print('Computing forward model from window projections for test set')
-            activation = compute_forward(x_eeg_test_windowed, y_test, projection_test_eeg)
-            # train classifier, use gradient descent to find the cross-window weights
-
-            # x_pupil_train_windowed = sliding_window_view(x_pupil_train, window_shape=self.split_size_pupil, axis=2)[:, :,0::self.split_size_pupil,:]  # shape = #trials, #channels, #windows, #time points per window
-            # x_pupil_test_windowed = sliding_window_view(x_pupil_test, window_shape=self.split_size_pupil, axis=2)[:, :,0::self.split_size_pupil,:]  # shape = #trials, #channels, #windows, #time points per window
-            if self._use_pupil:
-                x_pupil_train_windowed = self._split_by_window(x_pupil_train, self.split_size_pupil)  # shape = #trials, #channels, #windows, #time points per window
-                x_pupil_test_windowed = self._split_by_window(x_pupil_test, self.split_size_pupil)  # shape = #trials, #channels, #windows, #time points per window
-                _, self.num_channels_pupil, self.num_windows_pupil, self.num_timepoints_per_window_pupil = x_pupil_train_windowed.shape
-                lda_weights_pupil, projection_train_pupil, projection_test_pupil, window_pupil_ldas = _train_compute_window_projections(x_pupil_train_windowed, x_pupil_test_windowed, y_train)
-                # z-norm the projections
-                projection_train_pupil, projection_test_pupil, self.pupil_mean, self.pupil_std = z_norm_projection(projection_train_pupil, projection_test_pupil)
-
-            projection_train_eeg, projection_test_eeg, self.eeg_mean, self.eeg_std = z_norm_projection(projection_train_eeg, projection_test_eeg)
+        _, self.num_channels_eeg, self.num_windows_eeg, self.num_timepoints_per_window_eeg = self._split_by_window(x_eeg_transformed, self.split_size_eeg).shape
+        if self._use_pupil:
+            _, self.num_channels_pupil, self.num_windows_pupil, self.num_timepoints_per_window_pupil = self._split_by_window(x_pupil, self.split_size_pupil).shape
 
-            if verbose >= 2: print('Solving cross bin weights')
-            cw_weights_eeg, roc_auc_eeg, fpr_eeg, tpr_eeg, crossbin_model_eeg = solve_crossbin_weights(projection_train_eeg, projection_test_eeg,y_train, y_test, self.num_windows_eeg)
+        # the folds are independent, with n_jobs other than 1 they run in parallel processes
+        from joblib import Parallel, delayed
+        folds = Parallel(n_jobs=n_jobs)(delayed(_fit_fold)(x_eeg, x_eeg_transformed, x_pupil if self._use_pupil else None, y, train, test, self.split_size_eeg, self.split_size_pupil, i, num_folds, verbose)
+                                        for i, (train, test) in enumerate(cross_val_folds.split(x_eeg, y)))  # cross-validation; group arguement is not necessary unless using grouped folds
 
+        best_auc = 0
+        for i, fold in enumerate(folds):
+            roc_auc_eeg, roc_auc_pupil, roc_auc_combined = fold['roc_auc_eeg'], fold['roc_auc_pupil'], fold['roc_auc_combined']
+            self.eeg_mean, self.eeg_std = fold['eeg_mean'], fold['eeg_std']
             if self._use_pupil:
-                cw_weights_pupil, roc_auc_pupil, fpr_pupil, tpr_pupil, crossbin_model_pupil = solve_crossbin_weights( projection_train_pupil, projection_test_pupil, y_train, y_test, self.num_windows_pupil)
-                projection_combined_train = np.concatenate([projection_train_eeg, projection_train_pupil], axis=1)
-                projection_combined_test = np.concatenate([projection_test_eeg, projection_test_pupil], axis=1)
-                cw_weights_combined, roc_auc_combined, fpr_combined, tpr_combined, crossbin_model_combined = solve_crossbin_weights(projection_combined_train, projection_combined_test, y_train, y_test,self.num_windows_pupil)
-            else:
-                roc_auc_pupil = None
-                roc_auc_combined = roc_auc_eeg
+                self.pupil_mean, self.pupil_std = fold['pupil_mean'], fold['pupil_std']
 
             if roc_auc_combined > best_auc:  # save the weights of the best model across folds
                 best_auc = roc_auc_combined
-                self.window_eeg_ldas = window_eeg_ldas
-                self.crossbin_model_eeg = crossbin_model_eeg
+                self.window_eeg_ldas = fold['window_eeg_ldas']
+                self.crossbin_model_eeg = fold['crossbin_model_eeg']
                 if self._use_pupil:
-                    self.window_pupil_ldas = window_pupil_ldas
-                    self.crossbin_model_pupil = crossbin_model_pupil
-                    self.crossbin_model_combined = crossbin_model_combined
+                    self.window_pupil_ldas = fold['window_pupil_ldas']
+                    self.crossbin_model_pupil = fold['crossbin_model_pupil']
+                    self.crossbin_model_combined = fold['crossbin_model_combined']
 
             if self._use_pupil:
-                cw_weights_pupil_folds[i] = cw_weights_pupil
+                cw_weights_pupil_folds[i] = fold['cw_weights_pupil']
                 roc_auc_folds_pupil[i] = roc_auc_pupil
-                fpr_folds_pupil.append(fpr_pupil)
-                tpr_folds_pupil.append(tpr_pupil)
+                fpr_folds_pupil.append(fold['fpr_pupil'])
+                tpr_folds_pupil.append(fold['tpr_pupil'])
 
-            cw_weights_eeg_folds[i] = cw_weights_eeg
-            activations_folds[i] = activation
+            cw_weights_eeg_folds[i] = fold['cw_weights_eeg']
+            activations_folds[i] = fold['activation']
 
             roc_auc_folds_eeg[i] = roc_auc_eeg
-            fpr_folds_eeg.append(fpr_eeg)
-            tpr_folds_eeg.append(tpr_eeg)
+            fpr_folds_eeg.append(fold['fpr_eeg'])
+            tpr_folds_eeg.append(fold['tpr_eeg'])
             # print(f'Fold {i}, auc is {roc_auc_folds[i]}')
 
         if eeg_montage is not None:
@@ -432,5 +525,5 @@ class HDCA():
 
 
     def _split_by_window(self, data, window_shape):
-        return  sliding_window_view(data, window_shape=window_shape, axis=2)[:, :,0::window_shape, :]  # shape = #trials, #channels, #windows, #time points per window
+        return split_by_window(data, window_shape)
 
@@ -1,4 +1,3 @@
-import copy
 import os
 from collections import defaultdict
 from typing import Union, Dict, List
@@ -7,6 +6,8 @@ import numpy as np
 import scipy
 from scipy.signal import spectrogram
 
+from physiolabxr.scripting.physio.utils import times_to_indices
+
 
 def get_event_locked_data(event_marker, data, events_of_interest, tmin, tmax, srate, return_last_event_time=False, event_channel=0, verbose=None, **kwargs):
     """
@@ -54,8 +55,11 @@ def get_event_locked_data(event_marker, data, events_of_interest, tmin, tmax, sr
 
 def _get_event_locked_data(event_marker, event_channel, data, events_of_interest, tmin, tmax, srate, return_last_event_time=False, verbose=None, reject=None):
     """
+    All the events are placed in the data at once with np.searchsorted, and the epochs of each event marker are taken
+    from a sliding window view of the data with a single fancy index.
+
     @param event_marker: tuple of event marker and its timestamps
-    @param data: tuple of data and its timestamps
+    @param data: tuple of data and its timestamps, the timestamps must be sorted
     @param events_of_interest: iterable of event markers with which to get event aligned data
     @param return_last_event_time: whether to return the time of the last found in the data
 
@@ -65,25 +69,29 @@ def _get_event_locked_data(event_marker, event_channel, data, events_of_interest
     event_marker, event_marker_time = event_marker
     event_marker = event_marker[event_channel]
     data, data_time = data
+    data_time = np.asarray(data_time)
     events_of_interest = [e for e in events_of_interest if e in event_marker]
-    rtn = {e: [] for e in events_of_interest}
+    rtn = {}
     latest_event_start_time = -1
     epoch_length = int((tmax - tmin) * srate)
     reject_count = defaultdict(int)
+    # (times, channels, epoch_length) view of every epoch the data can have
+    epoch_windows = np.lib.stride_tricks.sliding_window_view(data, epoch_length, axis=1).transpose(1, 0, 2) if 0 < epoch_length < len(data_time) else None
     for e in events_of_interest:
-        this_event_marker_time = event_marker_time[event_marker == e]
-        data_event_starts = [np.argmin(abs(data_time - (s+tmin))) for s in this_event_marker_time]
-        data_event_ends = [epoch_length + s for s in data_event_starts]
-        for i, j, e_time in zip(data_event_starts, data_event_ends, this_event_marker_time):
-            if j < len(data_time):  # if the epoch is not cut off by the end of the data
-                if reject is not None:
-                    if np.max(np.max(data[:, i:j], axis=0) - np.min(data[:, i:j], axis=0)) > reject:
-                        reject_count[e] += 1
-                        continue
-                rtn[e].append(data[:, i:j])
-                latest_event_start_time = max(latest_event_start_time, e_time)
-    # convert to numpy arrays
-    rtn = {k: np.array(v) for k, v in rtn.items() if len(v) > 0}
+        this_event_marker_time = np.asarray(event_marker_time)[event_marker == e]
+        data_event_starts = times_to_indices(data_time, this_event_marker_time + tmin)
+        is_complete = data_event_starts + epoch_length < len(data_time)  # if the epoch is not cut off by the end of the data
+        data_event_starts, this_event_marker_time = data_event_starts[is_complete], this_event_marker_time[is_complete]
+        if len(data_event_starts) == 0 or epoch_windows is None:
+            continue
+        epochs = epoch_windows[data_event_starts]
+        if reject is not None:
+            is_rejected = np.max(np.max(epochs, axis=1) - np.min(epochs, axis=1), axis=1) > reject
+            reject_count[e] = np.count_nonzero(is_rejected)
+            epochs, this_event_marker_time = epochs[~is_rejected], this_event_marker_time[~is_rejected]
+        if len(epochs) > 0:
+            rtn[e] = epochs
+            latest_event_start_time = max(latest_event_start_time, np.max(this_event_marker_time))
     if verbose:
         [print(f"Found {len(v)} events for event marker {k}{f', rejected {reject_count[k]}' if reject is not None else ''}") for k, v in rtn.items()]
     if return_last_event_time:
@@ -92,44 +100,105 @@ def _get_event_locked_data(event_marker, event_channel, data, events_of_interest
         return rtn
 
 
+class EpochBuffer:
+    """
+    Epochs that are appended along the first axis without copying the ones already buffered. The storage grows by
+    doubling, so appending n epochs one call at a time copies each epoch a constant number of times on average.
+
+    The array returned by append and get is a view of the buffered epochs. Appending never changes the epochs in the
+    views returned before.
+    """
+    def __init__(self, epochs, min_capacity=16):
+        epochs = np.asarray(epochs)
+        self._storage = np.empty((max(len(epochs), min_capacity), *epochs.shape[1:]), dtype=epochs.dtype)
+        self._storage[:len(epochs)] = epochs
+        self._size = len(epochs)
+
+    def append(self, epochs):
+        epochs = np.asarray(epochs)
+        if epochs.shape[1:] != self._storage.shape[1:]:
+            raise ValueError(f"EpochBuffer: can't append epochs of shape {epochs.shape[1:]} to epochs of shape {self._storage.shape[1:]}")
+        dtype = np.result_type(self._storage.dtype, epochs.dtype)
+        if self._size + len(epochs) > len(self._storage) or dtype != self._storage.dtype:
+            storage = np.empty((max(2 * len(self._storage), self._size + len(epochs)), *self._storage.shape[1:]), dtype=dtype)
+            storage[:self._size] = self._storage[:self._size]
+            self._storage = storage
+        self._storage[self._size:self._size + len(epochs)] = epochs
+        self._size += len(epochs)
+        return self.get()
+
+    def get(self):
+        return self._storage[:self._size]
+
+    def __len__(self):
+        return self._size
+
+
+class EventLockedDataBuffer(dict):
+    """
+    Dictionary of event marker and its buffered event locked data, as returned by buffer_event_locked_data. The values
+    are arrays of (n_epochs, n_channels, n_times), or, for multi-modal data, dictionaries of modality and such arrays.
+    New epochs are appended in place with EpochBuffer.
+    """
+    def __init__(self, buffer=None):
+        super().__init__()
+        self._epoch_buffers = {}
+        for event_name, v in ({} if buffer is None else buffer).items():
+            if isinstance(v, dict):
+                for modality, modality_v in v.items():
+                    self.append(event_name, modality_v, modality)
+            else:
+                self.append(event_name, v)
+
+    def append(self, event_name, epochs, modality=None):
+        """
+        @param modality: the modality of the epochs for multi-modal data, None for single-modal
+        """
+        key = event_name, modality
+        if key in self._epoch_buffers:
+            epochs = self._epoch_buffers[key].append(epochs)
+        else:
+            self._epoch_buffers[key] = EpochBuffer(epochs)
+            epochs = self._epoch_buffers[key].get()
+        if modality is None:
+            self[event_name] = epochs
+        else:
+            self.setdefault(event_name, {})[modality] = epochs
+
+
 def buffer_event_locked_data(event_locked_data: dict, buffer: dict):
     """
+    The event locked data is appended to the buffer in place if buffer is one returned by this function before,
+    otherwise, the buffer is copied into a new EventLockedDataBuffer first. Keep the returned buffer and pass it back
+    on the next call, so the buffered epochs are not copied every call.
+
     @param event_locked_data: can be either single-modal or multi-modal:
         single-modal: dictionary of event marker and its corresponding event locked data. The keys are the event markers
         multi-modal
     @param buffer: dictionary of event marker and its corresponding buffer. The keys are the event markers
     @return: dictionary of event marker and its corresponding event locked data. The keys are the event markers
     """
+    if not isinstance(buffer, EventLockedDataBuffer):
+        buffer = EventLockedDataBuffer(buffer)
+    if len(event_locked_data) == 0:
+        return buffer
     # check if is multi-modal
-    rtn = copy.deepcopy(buffer)
     if isinstance(event_locked_data[list(event_locked_data.keys())[0]], dict):
-        assert len(event_locked_data) > 0, 'data must be a non-empty dictionary'
         for event_name, modality_data in event_locked_data.items():
-            if event_name in rtn and type(rtn[event_name]) is not dict:
+            if event_name in buffer and type(buffer[event_name]) is not dict:
                 raise ValueError(f"modality_data must be a dictionary, got {type(modality_data)}. "
                                  f"Did you call buffer_event_locked_data with a single-modal event_locked_data?")
             for modality, v in modality_data.items():
-                if event_name in rtn:
-                    if modality in rtn[event_name]:
-                        rtn[event_name][modality] = np.concatenate([rtn[event_name][modality], v], axis=0)
-                    else:
-                        rtn[event_name][modality] = v
-                else:
-                    rtn[event_name] = {modality: v}
-        return rtn
+                buffer.append(event_name, v, modality)
+        return buffer
     else:
-        return _buffer_event_locked_data(event_locked_data, rtn)
+        return _buffer_event_locked_data(event_locked_data, buffer)
 
 
-def _buffer_event_locked_data(event_locked_data: dict, buffer: dict):
-    rtn = copy.deepcopy(buffer)
+def _buffer_event_locked_data(event_locked_data: dict, buffer: EventLockedDataBuffer):
     for k, v in event_locked_data.items():
-        if k in buffer:
-            v = np.concatenate([buffer[k], v], axis=0)
-        else:
-            v = np.array(v)
-        rtn[k] = v
-    return rtn
+        buffer.append(k, v)
+    return buffer
 
 
 def get_baselined_event_locked_data(event_locked_data, baseline_t, srate, pick: int = None):
@@ -1,6 +1,6 @@
 import numpy as np
 
-from physiolabxr.scripting.physio.utils import interpolate_array_nan, time_to_index
+from physiolabxr.scripting.physio.utils import interpolate_array_nan, times_to_indices
 
 
 def gap_fill(gaze_xyz, gaze_status, valid_status, gaze_timestamps, max_gap_time=0.075, verbose=True):
@@ -74,8 +74,48 @@ def _compute_dispersion(angles):
     return np.std(angles)
 
 
+def _compute_window_dispersions(angles, starts, ends):
+    """
+    computes the dispersion, i.e., np.std, of angles[start:end] for every window from the prefix sums of the angles.
+    Windows with nan angles have nan dispersion.
+    @param angles: (timesteps, )
+    @param starts: (windows, ) the start indices of the windows
+    @param ends: (windows, ) the end indices of the windows, exclusive, must be greater than the starts
+    @return: (windows, )
+    """
+    is_nan = np.isnan(angles)
+    if np.all(is_nan):
+        return np.full(len(starts), np.nan)
+    # center the angles to keep the precision of the prefix sums of the squares
+    centered = np.where(is_nan, 0., angles - np.nanmean(angles))
+    sums = np.concatenate([[0.], np.cumsum(centered)])
+    square_sums = np.concatenate([[0.], np.cumsum(centered ** 2)])
+    nan_counts = np.concatenate([[0], np.cumsum(is_nan)])
+
+    window_lengths = ends - starts
+    means = (sums[ends] - sums[starts]) / window_lengths
+    variances = np.maximum((square_sums[ends] - square_sums[starts]) / window_lengths - means ** 2, 0.)
+    return np.where(nan_counts[ends] - nan_counts[starts] > 0, np.nan, np.sqrt(variances))
+
+
+def _detect_fixations_idt(gaze_angles_degree, timestamps, num_windows, window_size, dispersion_threshold_degree, saccade_min_sample):
+    """
+    classifies the windows starting at the first num_windows samples
+    @return: fixations of shape (2, windows): whether each window is a fixation and the center time of the window, and
+    the start indices of the windows
+    """
+    starts = np.arange(num_windows)
+    ends = times_to_indices(timestamps, timestamps[:num_windows] + window_size)
+    starts, ends = starts[ends - starts >= saccade_min_sample], ends[ends - starts >= saccade_min_sample]
+    dispersions = _compute_window_dispersions(gaze_angles_degree, starts, ends)
+    is_fixation = (dispersions < dispersion_threshold_degree).astype(float)  # 1 for fixation, nan dispersion is not a fixation
+    return np.stack([is_fixation, timestamps[starts] + window_size / 2]), starts
+
+
 def fixation_detection_idt(gaze_xyz, timestamps, window_size=0.175, dispersion_threshold_degree=0.5, saccade_min_sample=2, return_last_window_start=False):
     """
+    Each sample starts a window that ends at the sample closest to window_size later. The windows at the end of the
+    data are cut short by it, use IDTFixationDetector to only classify windows that are complete.
 
     @param gaze_xyz:
     @param timestamps:
@@ -85,22 +125,57 @@ def fixation_detection_idt(gaze_xyz, timestamps, window_size=0.175, dispersion_t
     @return:
     """
     assert window_size > 0, "fixation_detection_idt: window size must be positive"
+    timestamps = np.asarray(timestamps)
     gaze_angles_degree = _calculate_gaze_angles(gaze_xyz)
-    windows = [(i, time_to_index(timestamps, t + window_size)) for i, t in enumerate(timestamps)]
-    last_window_start = 0
-    fixations = []
-    for start, end in windows:
-        if end >= len(timestamps):
-            break
-        if end - start < saccade_min_sample:
-            continue
-        center_time = timestamps[start] + window_size / 2
-        if _compute_dispersion(gaze_angles_degree[start:end]) < dispersion_threshold_degree:
-            fixations.append([1, center_time])  # 1 for fixation
-        else:
-            fixations.append([0, center_time])
-        last_window_start = start
+    fixations, starts = _detect_fixations_idt(gaze_angles_degree, timestamps, len(timestamps), window_size, dispersion_threshold_degree, saccade_min_sample)
     if return_last_window_start:
-        return np.array(fixations).T, last_window_start
+        return fixations, starts[-1] if len(starts) > 0 else 0
     else:
-        return np.array(fixations).T
\ No newline at end of file
+        return fixations
+
+
+class IDTFixationDetector:
+    """
+    Incremental fixation_detection_idt for gaze that comes in chunks, for example, in the loop of a script. Each call to
+    process takes the new gaze samples only, and classifies the windows that the new samples complete. A window is
+    complete once a sample at or after its start time plus the window size has arrived. Only the samples of the windows
+    yet to be classified are kept between calls.
+
+    The fixations are the same as fixation_detection_idt's on all the gaze at once, except that the windows at the end
+    are not cut short, they are classified when they are complete.
+
+    window_size and dispersion_threshold_degree can be changed between calls.
+    """
+    def __init__(self, window_size=0.175, dispersion_threshold_degree=0.5, saccade_min_sample=2):
+        assert window_size > 0, "IDTFixationDetector: window size must be positive"
+        self.window_size = window_size
+        self.dispersion_threshold_degree = dispersion_threshold_degree
+        self.saccade_min_sample = saccade_min_sample
+
+        self.gaze_angles_degree = np.empty(0)
+        self.timestamps = np.empty(0)
+        self.last_window_start_timestamp = None  # the start time of the last classified window
+
+    def process(self, gaze_xyz, timestamps):
+        """
+        @param gaze_xyz: ndarray of shape (3, timesteps) of the new gaze samples, see fixation_detection_idt
+        @param timestamps: (timesteps, ) timestamps of the new gaze samples, after the ones given before
+        @return: fixations of shape (2, windows) of the windows completed by the new samples, see fixation_detection_idt
+        """
+        self.gaze_angles_degree = np.concatenate([self.gaze_angles_degree, _calculate_gaze_angles(gaze_xyz)])
+        self.timestamps = np.concatenate([self.timestamps, timestamps])
+        if len(self.timestamps) == 0:
+            return np.empty((2, 0))
+        num_complete_windows = np.count_nonzero(self.timestamps + self.window_size <= self.timestamps[-1])
+        fixations, starts = _detect_fixations_idt(self.gaze_angles_degree, self.timestamps, num_complete_windows, self.window_size,
+                                                  self.dispersion_threshold_degree, self.saccade_min_sample)
+        if len(starts) > 0:
+            self.last_window_start_timestamp = self.timestamps[starts[-1]]
+        self.gaze_angles_degree = self.gaze_angles_degree[num_complete_windows:]
+        self.timestamps = self.timestamps[num_complete_windows:]
+        return fixations
+
+    def reset(self):
+        self.gaze_angles_degree = np.empty(0)
+        self.timestamps = np.empty(0)
+        self.last_window_start_timestamp = None
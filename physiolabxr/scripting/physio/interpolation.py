@@ -1,14 +1,61 @@
 import numpy as np
-from scipy.interpolate import interp1d
+
+max_interpolated_elements = 2 ** 22  # the number of elements interpolated at once, bounds the memory of the index arrays
+
+
+def interpolate_nan_batched(data):
+    """
+    Linearly interpolates the nan of every series along the last axis, the nan before the first and after the last
+    valid value are linearly extrapolated from the first and last two valid values. Same as interpolate_nan, for all
+    the series at once.
+
+    A series is rejected, and returned as it is, if more than half of it is nan, or it has less than two valid values.
+    @param data: (..., time), e.g., (epochs, channels, time)
+    @return: the interpolated data as floats, and the rejection mask of shape data.shape[:-1]
+    """
+    data = np.array(data, dtype=float)
+    series = data.reshape(-1, data.shape[-1])
+    length = series.shape[-1]
+    is_nan = np.isnan(series)
+    nan_counts = np.count_nonzero(is_nan, axis=-1)
+    rejected = (nan_counts / max(length, 1) > 0.5) | (length - nan_counts < 2)
+
+    to_interpolate = np.flatnonzero((nan_counts > 0) & ~rejected)
+    chunk_size = max(1, max_interpolated_elements // max(length, 1))
+    for chunk in np.array_split(to_interpolate, np.arange(chunk_size, len(to_interpolate), chunk_size)):
+        series[chunk] = _interpolate_nan_series(series[chunk], is_nan[chunk])
+    return data, rejected.reshape(data.shape[:-1])
+
+
+def _interpolate_nan_series(series, is_nan):
+    """
+    @param series: (n, time), each has at least two valid values
+    """
+    length = series.shape[-1]
+    indices = np.arange(length)
+    # the closest valid index at or before and at or after each index, -1 and length if there is none
+    previous_valid = np.maximum.accumulate(np.where(is_nan, -1, indices), axis=-1)
+    next_valid = np.minimum.accumulate(np.where(is_nan, length, indices)[:, ::-1], axis=-1)[:, ::-1]
+
+    # interpolate between the valid values around each nan, extrapolate from the first or last two valid values
+    rows, nan_indices = np.nonzero(is_nan)
+    low, high = previous_valid[rows, nan_indices], next_valid[rows, nan_indices]
+    is_before_first, is_after_last = low == -1, high == length
+    low[is_before_first] = high[is_before_first]
+    high[is_before_first] = next_valid[rows[is_before_first], high[is_before_first] + 1]
+    high[is_after_last] = low[is_after_last]
+    low[is_after_last] = previous_valid[rows[is_after_last], low[is_after_last] - 1]
+
+    low_values, high_values = series[rows, low], series[rows, high]
+    series[rows, nan_indices] = (high_values - low_values) / (high - low) * (nan_indices - low) + low_values
+    return series
 
 
 def interpolate_nan(x):
-    not_nan = np.logical_not(np.isnan(x))
-    if np.sum(np.logical_not(not_nan)) / len(x) > 0.5:  # if more than half are nan
+    interpolated, rejected = interpolate_nan_batched(x)
+    if rejected:
         raise ValueError("More than half of the given data array is nan")
-    indices = np.arange(len(x))
-    interp = interp1d(indices[not_nan], x[not_nan], fill_value="extrapolate")
-    return interp(indices)
+    return interpolated
 
 
 def interpolate_zeros(x):
@@ -21,30 +68,27 @@ def interpolate_array_nan(data_array):
     """
     :param data_array: channel first, time last
     """
-    return np.array([interpolate_nan(x) for x in data_array])
+    interpolated, rejected = interpolate_nan_batched(data_array)
+    if np.any(rejected):
+        raise ValueError("More than half of the given data array is nan")
+    return interpolated
 
 
-def interpolate_epochs_nan(epoch_array):
+def interpolate_epochs_nan(epoch_array, return_rejection_mask=False):
     """
-    :param data_array: channel first, time last
+    :param epoch_array: (epochs, channels, time)
+    :param return_rejection_mask: whether to also return the (epochs, ) mask of the rejected epochs, an epoch is
+        rejected if more than half of any of its channels is nan
     """
-    rtn = []
-    rejected_count = 0
-    for e in epoch_array:
-        temp = []
-        try:
-            for x in e:
-                temp.append(interpolate_nan(x))
-        except ValueError:  # something wrong with this epoch, maybe more than half are nan
-            rejected_count += 1
-            continue  # reject this epoch
-        rtn.append(temp)
-    print("Rejected {0} epochs of {1} total".format(rejected_count, len(epoch_array)))
-    return np.array(rtn)
-
-
-def interpolate_epoch_zeros(e):
+    interpolated, rejected = interpolate_nan_batched(epoch_array)
+    rejected = np.any(rejected, axis=-1)
+    print("Rejected {0} epochs of {1} total".format(np.count_nonzero(rejected), len(epoch_array)))
+    if return_rejection_mask:
+        return interpolated[~rejected], rejected
+    return interpolated[~rejected]
+
+
+def interpolate_epoch_zeros(e, return_rejection_mask=False):
     copy = np.copy(e)
     copy[copy == 0] = np.nan
-    return interpolate_epochs_nan(copy)
-
+    return interpolate_epochs_nan(copy, return_rejection_mask=return_rejection_mask)
@@ -1,25 +1,22 @@
 import numpy as np
-from scipy.interpolate import interp1d
 
+from physiolabxr.scripting.physio.interpolation import interpolate_nan, interpolate_array_nan
 
-def interpolate_nan(x):
-    not_nan = np.logical_not(np.isnan(x))
-    if np.sum(np.logical_not(not_nan)) / len(x) > 0.5:  # if more than half are nan
-        raise ValueError("More than half of the given data array is nan")
-    indices = np.arange(len(x))
-    interp = interp1d(indices[not_nan], x[not_nan], fill_value="extrapolate")
-    return interp(indices)
 
+def time_to_index(timestamps, time):
+    return np.argmin(np.abs(timestamps - time))
 
-def interpolate_array_nan(data_array):
+
+def times_to_indices(timestamps, times):
     """
-    :param data_array: channel first, time last
+    vectorized time_to_index for sorted timestamps, finds the index of the closest timestamp for each of the given times.
+    Same as time_to_index, ties go to the earlier index.
     """
-    return np.array([interpolate_nan(x) for x in data_array])
-
-
-def time_to_index(timestamps, time):
-    return np.argmin(np.abs(timestamps - time))
+    indices = np.searchsorted(timestamps, times)
+    before = np.maximum(indices - 1, 0)
+    after = np.minimum(indices, len(timestamps) - 1)
+    indices = np.where(np.abs(timestamps[after] - times) < np.abs(timestamps[before] - times), after, before)
+    return np.searchsorted(timestamps, timestamps[indices])  # the first of repeated timestamps
 
 def string_to_enum(enum_type, string_value):
     try:
@@ -0,0 +1,139 @@
+"""
+Startup profiling. Run the app with --profile-startup, or set the environment variable PHYSIOLABXR_PROFILE_STARTUP=1,
+to record how long each startup phase and each first-time module import takes until the main window is shown.
+
+The report is printed and saved as startup_profile.json in the app data folder, or to the path given in
+PHYSIOLABXR_PROFILE_STARTUP_REPORT. Set PHYSIOLABXR_PROFILE_STARTUP_EXIT=1 to exit as soon as the main window is shown,
+this is what the cold-start benchmark under tests/ uses.
+"""
+import builtins
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from physiolabxr.utils.Singleton import Singleton
+
+profile_startup_arg = '--profile-startup'
+profile_startup_env = 'PHYSIOLABXR_PROFILE_STARTUP'
+profile_startup_report_env = 'PHYSIOLABXR_PROFILE_STARTUP_REPORT'
+profile_startup_exit_env = 'PHYSIOLABXR_PROFILE_STARTUP_EXIT'
+startup_profile_file_name = 'startup_profile.json'
+
+
+def is_startup_profiling_requested(argv):
+    """
+    also removes the profiling argument from argv, so it's not passed to Qt
+    """
+    if profile_startup_arg in argv:
+        argv.remove(profile_startup_arg)
+        return True
+    return os.environ.get(profile_startup_env, '0') == '1'
+
+
+class StartupProfiler(metaclass=Singleton):
+    """
+    Records the duration of the startup phases, and the inclusive and self time of every module imported for the first
+    time while it is enabled. Imports are timed by wrapping builtins.__import__, each thread keeps its own import stack
+    so imports in background threads, e.g., the monitor check, are attributed correctly.
+
+    When it is not enabled, phase() does nothing.
+    """
+    def __init__(self):
+        self.is_enabled = False
+        self.start_time = None
+        self.phases = []
+        self.imports = []
+        self.time_to_first_window = None
+
+        self._original_import = None
+        self._thread_local = threading.local()
+        self._imports_lock = threading.Lock()
+
+    def enable(self):
+        if self.is_enabled:
+            return
+        self.is_enabled = True
+        self.start_time = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def disable(self):
+        if not self.is_enabled:
+            return
+        builtins.__import__ = self._original_import
+        self.is_enabled = False
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        try:
+            module_name = importlib.util.resolve_name('.' * level + name, globals.get('__package__')) if level > 0 else name
+        except (ImportError, ValueError, AttributeError):
+            module_name = name
+        if module_name in sys.modules:  # only first-time imports are timed
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        import_stack = getattr(self._thread_local, 'import_stack', None)
+        if import_stack is None:
+            import_stack = self._thread_local.import_stack = []
+        import_stack.append(0.)  # time spent in the nested imports
+        start_time = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            inclusive_time = time.perf_counter() - start_time
+            nested_time = import_stack.pop()
+            if len(import_stack) > 0:
+                import_stack[-1] += inclusive_time
+            with self._imports_lock:
+                self.imports.append({'module': module_name, 'inclusive_time': inclusive_time, 'self_time': inclusive_time - nested_time,
+                                     'depth': len(import_stack), 'thread': threading.current_thread().name})
+
+    @contextmanager
+    def phase(self, name):
+        if not self.is_enabled:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({'phase': name, 'start_time': start_time - self.start_time, 'duration': time.perf_counter() - start_time})
+
+    def on_first_window_shown(self):
+        """
+        call this when the main window is shown, that is, on the first iteration of the event loop after window.show()
+        """
+        if not self.is_enabled:
+            return
+        self.time_to_first_window = time.perf_counter() - self.start_time
+        self.disable()
+        self.save_report(os.environ.get(profile_startup_report_env, None))
+        self.print_report()
+
+    def get_report(self):
+        return {'time_to_first_window': self.time_to_first_window,
+                'phases': self.phases,
+                'imports': sorted(self.imports, key=lambda x: x['self_time'], reverse=True)}
+
+    def save_report(self, path=None):
+        if path is None:
+            from physiolabxr.configs.configs import AppConfigs
+            path = os.path.join(AppConfigs().app_data_path, startup_profile_file_name)
+        if os.path.dirname(path) != '' and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            json.dump(self.get_report(), f, indent=4)
+        print(f"StartupProfiler: startup profile saved to {path}")
+        return path
+
+    def print_report(self, num_imports=20):
+        report = self.get_report()
+        print(f"StartupProfiler: time to first window {report['time_to_first_window']:.3f}s")
+        for phase in report['phases']:
+            print(f"    {phase['phase']:<32}{phase['duration']:.3f}s (started at {phase['start_time']:.3f}s)")
+        print(f"StartupProfiler: top {num_imports} imports by self time, out of {len(report['imports'])}")
+        for module_import in report['imports'][:num_imports]:
+            print(f"    {module_import['module']:<48}self {module_import['self_time']:.3f}s, inclusive {module_import['inclusive_time']:.3f}s")
@@ -23,6 +23,7 @@ from physiolabxr.presets.PresetEnums import PresetType
 from physiolabxr.sub_process.TCPInterface import RenaTCPInterface
 from physiolabxr.utils.RNStream import RNStream
 from physiolabxr.utils.time_utils import get_clock_time
+from physiolabxr.utils.video_recording_utils import decode_video_streams
 from physiolabxr.utils.xdf_utils import load_xdf
 
 
@@ -92,6 +93,7 @@ class ReplayServer(threading.Thread):
                                 self.original_stream_data = load_xdf(file_location)
                             else:
                                 raise ValueError('Unsupported file type')
+                            decode_video_streams(file_location, self.original_stream_data)  # compressed video streams are recorded to sidecar video files
                         except Exception as e:
                             self.send_string(shared.FAIL_INFO + f'Failed to load file {e}')
                             self.reset_replay()
@@ -1,34 +1,371 @@
-import os
+import atexit
+import multiprocessing
+import threading
 import time
+from multiprocessing import shared_memory
 
 import numpy as np
-from physiolabxr.sub_process.TCPInterface import RenaTCPServer, RenaTCPInterface
 
-# send a processing object
-from physiolabxr.utils.realtime_DSP import *
+from physiolabxr.exceptions.exceptions import DSPWorkerError
+from physiolabxr.utils.dsp_utils.dsp_modules import DataProcessorBackend, ButterworthBandpassFilter, RootMeanSquare, \
+    ClutterRemoval
+from physiolabxr.utils.dsp_utils.dsp_pipeline import DataProcessorPipeline
 
 
-# if __name__ == '__main__':
-#     print("Server Created")
+def dsp_processor(connection):
+    """
+    Main loop of a DSP worker process. The worker owns a copy of the data processor pipeline of every stream group
+    given to it, and processes the group's frames in place in the group's shared memory.
 
+    Messages from the pool, all tuples starting with the command and the pipeline key:
+        ('pipeline', key, [(version, data_processor)]): replaces the pipeline of the key. A data processor is None if the
+        worker already has it with the same version, so that it keeps its state
+        ('shared_memory', key, name): the frames of the key are in this shared memory from now on
+        ('process', key, shape, dtype, activations, backend): processes the frame in the key's shared memory with the
+        backend, with the pipeline's data processors activated as given. Replies (key, None) when done, or
+        (key, error message)
+        ('remove', key): drops the pipeline and the shared memory of the key
+    and None to exit. The worker sends None once, before any reply, when it has warmed up the kernels, see
+    _warm_up_kernels.
+    """
+    _warm_up_kernels()
+    connection.send(None)
+    pipelines = {}
+    compiled_pipelines = {}
+    shared_memories = {}
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        command, key = message[:2]
+        if command == 'pipeline':
+            data_processors = dict(pipelines.get(key, []))
+            pipelines[key] = [(version, data_processors[version] if data_processor is None else data_processor) for version, data_processor in message[2]]
+            compiled_pipelines[key] = DataProcessorPipeline([data_processor for _, data_processor in pipelines[key]])
+        elif command == 'shared_memory':
+            if key in shared_memories:
+                shared_memories[key].close()
+            shared_memories[key] = shared_memory.SharedMemory(name=message[2])
+        elif command == 'process':
+            try:
+                _process_frame(shared_memories[key], compiled_pipelines[key], *message[2:])
+                connection.send((key, None))
+            except Exception as e:
+                connection.send((key, f'{type(e).__name__}: {e}'))
+        elif command == 'remove':
+            pipelines.pop(key, None)
+            compiled_pipelines.pop(key, None)
+            if key in shared_memories:
+                shared_memories.pop(key).close()
+    for _shared_memory in shared_memories.values():
+        _shared_memory.close()
+    connection.close()
 
-def dsp_processor(stream_name, port_id=None, identity='server'):
-    def exit_process():
+
+def _warm_up_kernels():
+    """
+    runs a small pipeline with the IIR, RMS and clutter kernels on every backend, so that the numba kernel is compiled, or
+    loaded from its cache, before the worker takes frames
+    """
+    data_processors = [ButterworthBandpassFilter(lowcut=1, highcut=10, fs=100, order=2), RootMeanSquare(fs=100, window=50), ClutterRemoval(signal_clutter_ratio=0.1)]
+    for data_processor in data_processors:
+        data_processor.set_channel_num(1)
+        data_processor.evoke_data_processor()
+        data_processor.activate_data_processor()
+    try:
+        for backend in DataProcessorBackend:
+            DataProcessorPipeline(data_processors).run(np.zeros((1, 2)), backend=backend)
+    except Exception as e:  # the frames still run, paying for the warm-up on the first frame
+        print(f"DSP worker: failed to warm up the kernels: {type(e).__name__}: {e}")
+
+
+def _process_frame(_shared_memory, pipeline: DataProcessorPipeline, shape, dtype, activations, backend):
+    """
+    the frame view is dropped when this returns, a shared memory with views on it can't be closed
+    """
+    frame = np.ndarray(shape, dtype=dtype, buffer=_shared_memory.buf)
+    for data_processor, activated in zip(pipeline.data_processors, activations):
+        data_processor.data_processor_activated = activated
+    frame[:] = pipeline.run(frame, backend=backend)
+
+
+class _DSPWorker:
+    def __init__(self, context):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=dsp_processor, args=(worker_connection,), daemon=True)
+        self.process.start()
+        worker_connection.close()
+
+        self.is_ready = False  # whether the worker has warmed up, see dsp_processor
+        self.warm_keys = set()  # (key, backend) the worker has processed a frame of, the first frame may compile more
+        self.pipeline_versions = {}  # key -> version of the pipeline the worker has
+        self.shared_memory_names = {}  # key -> name of the shared memory the worker has
+        self.replies = {}  # key -> reply, the replies received while waiting for another key
+
+    def wait_until_ready(self, timeout):
+        """
+        waits for the message the worker sends when it has warmed up, which comes before any reply
+        @return: whether the worker is ready
+        """
+        if not self.is_ready:
+            try:
+                if self.connection.poll(timeout):
+                    self.is_ready = self.connection.recv() is None
+            except (EOFError, OSError):
+                pass
+        return self.is_ready
+
+    def send(self, message):
+        try:
+            self.connection.send(message)
+        except (BrokenPipeError, EOFError, OSError) as e:
+            raise DSPWorkerError(f'DSP worker process {self.process.pid} has exited: {e}')
+
+    def stop(self, timeout=1.):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+def get_data_processor_version(data_processor):
+    """
+    a data processor is sent to its worker again when it is evoked, which also resets its state. Activating and
+    deactivating is sent with every frame, so that it doesn't reset the state.
+    """
+    return id(data_processor), getattr(data_processor, '_evoke_id', 0)
+
+
+class DSPWorkerPool:
+    """
+    Persistent worker processes that run the data processor pipelines of stream groups out of the GUI process.
+
+    Each pipeline, identified by a key such as (stream name, group name), is given to one worker, which keeps its own
+    copy of the data processors and their filter states. A frame goes to the worker through a shared memory block of the
+    key, which the worker processes in place, so only a few small control messages are pickled per frame. The frames
+    of pipelines on different workers are processed in parallel between submit and collect.
+
+    The pool is not thread-safe, submit and collect are expected to be called from one thread.
+    """
+    def __init__(self, num_workers, timeout=0.1, startup_timeout=60., first_frame_timeout=5.):
+        """
+        @param num_workers: number of worker processes
+        @param timeout: in seconds, how long collect waits for a frame after it is submitted. A worker that doesn't
+        return the frame in time is restarted
+        @param startup_timeout: in seconds, how long to wait for a new worker to import and warm up the kernels
+        @param first_frame_timeout: in seconds, the timeout of the first frame of a pipeline and backend on a worker,
+        which may compile more than the warm-up did
+        """
+        assert num_workers > 0, f"DSPWorkerPool: num_workers must be greater than 0, got {num_workers}"
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.first_frame_timeout = first_frame_timeout
+        self._context = multiprocessing.get_context('spawn')  # forking a process with Qt threads is not safe
+        self._workers = [_DSPWorker(self._context) for _ in range(num_workers)]
+        for worker in self._workers:  # the workers warm up in parallel
+            if not worker.wait_until_ready(startup_timeout):
+                print(f"DSPWorkerPool: DSP worker process {worker.process.pid} failed to start")
+        self._worker_indices = {}  # key -> index of the worker owning the key's pipeline
+        self._shared_memories = {}  # key -> shared memory of the key's frames
+        self._pending = {}  # key -> (frame, worker index, deadline), worker index is None when the frame is not sent
+
+    def get_num_workers(self):
+        return len(self._workers)
+
+    def submit(self, key, data, data_processors, backend=DataProcessorBackend.python):
+        """
+        starts processing a frame with the pipeline of the key, call collect to get the processed frame. Only one frame
+        of a key can be in process at a time.
+        @param data: the frame, shape = #channels, #samples
+        @param data_processors: the pipeline, the data processors are sent to the worker when the pipeline changes
+        @param backend: the DataProcessorBackend the worker runs the pipeline with
+        """
+        if key in self._pending:
+            raise DSPWorkerError(f'a frame of {key} is already in process, collect it first')
+        if not any(data_processor.data_processor_valid and data_processor.data_processor_activated for data_processor in data_processors):
+            self._pending[key] = data, None, None  # nothing to run
+            return
+        worker_index = self._get_worker_index(key)
+        worker = self._workers[worker_index]
+        if not worker.wait_until_ready(self.startup_timeout):
+            self._restart_worker(worker_index)
+            raise DSPWorkerError('the DSP worker failed to start, the worker is restarted')
+        try:
+            pipeline_version = tuple(get_data_processor_version(data_processor) for data_processor in data_processors)
+            worker_pipeline_version = worker.pipeline_versions.get(key, ())
+            if worker_pipeline_version != pipeline_version:  # only the new or evoked data processors are sent
+                worker.send(('pipeline', key, [(version, None if version in worker_pipeline_version else data_processor) for version, data_processor in zip(pipeline_version, data_processors)]))
+                worker.pipeline_versions[key] = pipeline_version
+            frame = self._get_frame(key, worker, data.shape, data.dtype)
+            frame[:] = data
+            worker.send(('process', key, data.shape, data.dtype.str, tuple(data_processor.data_processor_activated for data_processor in data_processors), backend))
+        except DSPWorkerError:
+            self._restart_worker(worker_index)
+            raise
+        timeout = self.timeout if (key, backend) in worker.warm_keys else self.first_frame_timeout
+        worker.warm_keys.add((key, backend))
+        self._pending[key] = frame, worker_index, time.perf_counter() + timeout
+
+    def collect(self, key):
+        """
+        waits for the frame of the key submitted last
+        @return: the processed frame
+        @raise DSPWorkerError: if the worker fails to process the frame, or doesn't return it in time
+        """
+        frame, worker_index, deadline = self._pending.pop(key)
+        if worker_index is None:
+            return frame
+        error = self._receive(worker_index, key, deadline)
+        if error is not None:
+            raise DSPWorkerError(f'failed to process {key}: {error}')
+        return np.array(frame)
+
+    def run_data_processors(self, key, data, data_processors, backend=DataProcessorBackend.python):
+        """
+        same as dsp_modules.run_data_processors, with the pipeline run in the key's worker
+        """
+        self.submit(key, data, data_processors, backend=backend)
+        return self.collect(key)
+
+    def remove(self, key):
+        """
+        drops the pipeline of the key from its worker, a later submit of the key starts from the data processors' states
+        in this process
+        """
+        if key in self._pending:
+            try:
+                self.collect(key)
+            except DSPWorkerError:
+                pass
+        worker_index = self._worker_indices.pop(key, None)
+        if worker_index is not None:
+            worker = self._workers[worker_index]
+            worker.pipeline_versions.pop(key, None)
+            worker.shared_memory_names.pop(key, None)
+            try:
+                worker.send(('remove', key))
+            except DSPWorkerError:
+                pass
+        if key in self._shared_memories:
+            _release_shared_memory(self._shared_memories.pop(key))
+
+    def remove_stream(self, stream_name):
+        """
+        drops the pipelines whose keys are (stream_name, group_name)
+        """
+        for key in [key for key in self._worker_indices if isinstance(key, tuple) and key[0] == stream_name]:
+            self.remove(key)
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        for _shared_memory in self._shared_memories.values():
+            _release_shared_memory(_shared_memory)
+        self._workers = []
+        self._worker_indices = {}
+        self._shared_memories = {}
+        self._pending = {}
+
+    def _get_worker_index(self, key):
+        if key not in self._worker_indices:  # to the worker with the fewest pipelines
+            num_pipelines = np.bincount(list(self._worker_indices.values()), minlength=len(self._workers))
+            self._worker_indices[key] = int(np.argmin(num_pipelines))
+        return self._worker_indices[key]
+
+    def _get_frame(self, key, worker, shape, dtype):
+        """
+        a view of the key's shared memory for a frame of the given shape, the shared memory is reallocated with room to
+        spare when the frame doesn't fit
+        """
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        _shared_memory = self._shared_memories.get(key)
+        if _shared_memory is None or _shared_memory.size < nbytes:
+            if _shared_memory is not None:
+                _release_shared_memory(_shared_memory)
+            _shared_memory = self._shared_memories[key] = shared_memory.SharedMemory(create=True, size=max(2 * nbytes, 4096))
+        if worker.shared_memory_names.get(key) != _shared_memory.name:
+            worker.send(('shared_memory', key, _shared_memory.name))
+            worker.shared_memory_names[key] = _shared_memory.name
+        return np.ndarray(shape, dtype=dtype, buffer=_shared_memory.buf)
+
+    def _receive(self, worker_index, key, deadline):
+        worker = self._workers[worker_index]
+        while key not in worker.replies:
+            try:
+                if not worker.connection.poll(max(deadline - time.perf_counter(), 0)):
+                    self._restart_worker(worker_index)
+                    return 'the DSP worker did not return the frame in time, the worker is restarted'
+                reply_key, error = worker.connection.recv()
+            except (EOFError, OSError):
+                self._restart_worker(worker_index)
+                return 'the DSP worker process has exited, the worker is restarted'
+            worker.replies[reply_key] = error
+        return worker.replies.pop(key)
+
+    def _restart_worker(self, worker_index):
+        """
+        the new worker gets the pipelines again on their next submit, starting from the data processors' states in this
+        process. The frames pending on the old worker fail. The next submit to the new worker waits for it to warm up
+        before the frame's timeout starts, so that the timed out frame doesn't wait for the warm-up too
+        """
+        old_worker = self._workers[worker_index]
+        old_worker.process.terminate()
+        old_worker.stop()
+        print(f"DSPWorkerPool: restarted DSP worker process {old_worker.process.pid}")
+        worker = self._workers[worker_index] = _DSPWorker(self._context)
+        for key, (_, pending_worker_index, _) in self._pending.items():
+            if pending_worker_index == worker_index:
+                worker.replies[key] = 'the DSP worker was restarted'
+
+
+def _release_shared_memory(_shared_memory):
+    try:
+        _shared_memory.close()
+    except BufferError:  # a frame view is still around, the memory is freed when it is garbage collected
         pass
+    _shared_memory.unlink()
+
+
+_dsp_worker_pool = None
+_dsp_worker_pool_lock = threading.Lock()
+
+
+def get_dsp_worker_pool():
+    """
+    the pool shared by the stream widgets, with AppConfigs().dsp_worker_num workers, it is restarted when the number
+    of workers or the timeout changes
+    @return: the pool, None if dsp_worker_num is 0 so the data processors run in this process
+    """
+    from physiolabxr.configs.configs import AppConfigs
+    global _dsp_worker_pool
+    num_workers, timeout = AppConfigs().dsp_worker_num, AppConfigs().dsp_worker_timeout / 1e3
+    with _dsp_worker_pool_lock:
+        if _dsp_worker_pool is not None and (_dsp_worker_pool.get_num_workers() != num_workers or _dsp_worker_pool.timeout != timeout):
+            _dsp_worker_pool.close()
+            _dsp_worker_pool = None
+        if _dsp_worker_pool is None and num_workers > 0:
+            _dsp_worker_pool = DSPWorkerPool(num_workers, timeout=timeout)
+            atexit.register(close_dsp_worker_pool)
+        return _dsp_worker_pool
 
-    if port_id is None:
-        port_id = os.getpid()
-        print('Server PID: ', str(port_id))
-    tcp_interface = RenaTCPInterface(stream_name, port_id, identity=identity)
-    tcp_server = RenaTCPServer(RENATCPInterface=tcp_interface)
-    print('Server Started')
 
-    exit_return = None
-    # start process
-    while exit_return is None:
-        exit_return = tcp_server.process_sample()
-        # if exit_return:
-        #     print('Exit Server')
+def remove_stream_from_dsp_worker_pool(stream_name):
+    """
+    drops the stream's pipelines from the pool, if there is one
+    """
+    with _dsp_worker_pool_lock:
+        if _dsp_worker_pool is not None:
+            _dsp_worker_pool.remove_stream(stream_name)
 
-    print('Exit Server')
 
+def close_dsp_worker_pool():
+    global _dsp_worker_pool
+    with _dsp_worker_pool_lock:
+        if _dsp_worker_pool is not None:
+            _dsp_worker_pool.close()
+            _dsp_worker_pool = None
@@ -1,17 +1,16 @@
 import time
-from collections import deque
-
-import numpy as np
 from PyQt6 import QtCore
 from PyQt6.QtCore import QObject, pyqtSignal, QMutex, QThread
 
 from physiolabxr.interfaces.AudioInputInterface import AudioInputInterface, create_audio_input_interface
 from physiolabxr.threadings.workers import RenaWorker
+from physiolabxr.utils.sampling_rate_utils import SamplingRateEstimator
 
 
 class AudioInputDeviceWorker(QObject, RenaWorker):
     signal_stream_availability = pyqtSignal(bool)
     signal_stream_availability_tick = pyqtSignal()
+    supports_wait_pull = True
 
     def __init__(self, stream_name, *args, **kwargs):
         super(AudioInputDeviceWorker, self).__init__()
@@ -21,7 +20,7 @@ class AudioInputDeviceWorker(QObject, RenaWorker):
         self._audio_device_interface: AudioInputInterface = create_audio_input_interface(stream_name)
         # self._lslInlet_interface = create_lsl_interface(stream_name, num_channels)
         self.is_streaming = False
-        self.timestamp_queue = deque(maxlen=1024)
+        self.sampling_rate_estimator = SamplingRateEstimator()
 
         self.start_time = time.time()
         self.num_samples = 0
@@ -33,17 +32,13 @@ class AudioInputDeviceWorker(QObject, RenaWorker):
 
     @QtCore.pyqtSlot()
     def process_on_tick(self):
-        if QThread.currentThread().isInterruptionRequested():
+        if self.is_interruption_requested():
             return
         if self.is_streaming:
             pull_data_start_time = time.perf_counter()
             self.interface_mutex.lock()
             frames, timestamps = self._audio_device_interface.process_frames()  # get all data and remove it from internal buffer
-            self.timestamp_queue.extend(timestamps)
-            if len(self.timestamp_queue) > 1:
-                sampling_rate = len(self.timestamp_queue) / (np.max(self.timestamp_queue) - np.min(self.timestamp_queue))
-            else:
-                sampling_rate = np.nan
+            sampling_rate = self.sampling_rate_estimator.update(timestamps)
 
             self.interface_mutex.unlock()
 
@@ -53,8 +48,9 @@ class AudioInputDeviceWorker(QObject, RenaWorker):
             self.num_samples += len(timestamps)
 
             data_dict = {'stream_name': self._audio_device_interface._device_name, 'frames': frames, 'timestamps': timestamps, 'sampling_rate': sampling_rate}
+            self.trace_data_dict(data_dict)
             self.signal_data.emit(data_dict)
-            self.pull_data_times.append(time.perf_counter() - pull_data_start_time)
+            self.record_pull_data_time(data_dict, pull_data_start_time)
 
     @QtCore.pyqtSlot()
     def process_stream_availability(self):
@@ -72,6 +68,9 @@ class AudioInputDeviceWorker(QObject, RenaWorker):
                 self.previous_availability = is_stream_availability
                 self.signal_stream_availability.emit(is_stream_availability)
 
+    def wait_for_data(self, timeout):
+        return self._audio_device_interface.wait_for_data(timeout)
+
     def reset_interface(self, stream_name, num_channels):
         self.interface_mutex.lock()
         self._audio_device_interface = create_audio_input_interface(stream_name)
@@ -82,12 +81,23 @@ class AudioInputDeviceWorker(QObject, RenaWorker):
         self.is_streaming = True
 
         self.num_samples = 0
+        self.sampling_rate_estimator.reset()
         self.start_time = time.time()
         self.signal_stream_availability.emit(self._audio_device_interface.is_stream_available())  # extra emit because the signal availability does not change on this call, but stream widget needs update
+        self.start_wait_pull()
 
     def stop_stream(self):
+        self.stop_wait_pull()
         self._audio_device_interface.stop_stream()
         self.is_streaming = False
 
     def is_stream_available(self):
         return self._audio_device_interface.is_stream_available()
+
+    def get_stream_health(self):
+        """
+        adds the number of frames PortAudio captured but were overwritten in the ring buffer before they were pulled
+        """
+        stream_health = super().get_stream_health()
+        stream_health['overflow_count'] = self._audio_device_interface.get_overflow_count()
+        return stream_health
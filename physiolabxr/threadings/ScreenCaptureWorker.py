@@ -1,23 +1,31 @@
+import threading
 import time
 
-import pyscreeze
-import numpy as np
 from PyQt6 import QtCore
 from PyQt6.QtCore import QObject
 
+from physiolabxr.configs.configs import AppConfigs
 from physiolabxr.presets.PresetEnums import VideoDeviceChannelOrder
 from physiolabxr.threadings.workers import RenaWorker
-from physiolabxr.utils.image_utils import process_image
+from physiolabxr.utils.image_utils import FrameConverter
+from physiolabxr.utils.performance_utils import MetricsRegistry, MetricType
+from physiolabxr.utils.screen_capture_utils import create_screen_capture, FrameRateLimiter
 from physiolabxr.utils.time_utils import get_clock_time
 
-def get_screen_capture_size():
-    img = pyscreeze.screenshot()
-    frame = np.array(img)
-    return frame.shape[0], frame.shape[1]
-
 class ScreenCaptureWorker(QObject, RenaWorker):
+    """
+    Captures the screen, or a region of it, with the backend from create_screen_capture, at most at the target frame
+    rate. The backend is created on the worker thread on the first tick, and captures into its own reused buffer, from
+    which the FrameConverter makes the emitted frame.
 
-    def __init__(self, screen_label, video_scale: float, channel_order: VideoDeviceChannelOrder):
+    The emitted frame is (width, height, 3), flipped upside-down in RGB, like the webcam worker's.
+    """
+    def __init__(self, screen_label, video_scale: float, channel_order: VideoDeviceChannelOrder, capture_region=None,
+                 target_frame_rate=None):
+        """
+        @param capture_region: (left, top, width, height) of the screen to capture, the whole screen if None
+        @param target_frame_rate: defaults to AppConfigs().screen_capture_frame_rate
+        """
         super().__init__()
         self.signal_data_tick.connect(self.process_on_tick)
         self.screen_label = screen_label
@@ -25,21 +33,36 @@ class ScreenCaptureWorker(QObject, RenaWorker):
 
         self.video_scale = video_scale
         self.channel_order = channel_order
+        self.capture_region = capture_region
+        self.frame_converter = FrameConverter()
+        self.frame_rate_limiter = FrameRateLimiter(AppConfigs().screen_capture_frame_rate if target_frame_rate is None else target_frame_rate,
+                                                   AppConfigs().video_device_refresh_interval / 1e3)
+        self.screen_capture = None
+        self.capture_lock = threading.Lock()  # the capture is closed from the main thread
 
     def stop_stream(self):
         self.is_streaming = False
+        with self.capture_lock:
+            if self.screen_capture is not None:
+                self.screen_capture.close()
+                self.screen_capture = None
 
     def start_stream(self):
         self.is_streaming = True
 
     @QtCore.pyqtSlot()
     def process_on_tick(self):
-        if self.is_streaming:
-            pull_data_start_time = time.perf_counter()
-            img = pyscreeze.screenshot()
-            frame = np.array(img)
-            frame = frame.astype(np.uint8)
-            frame = process_image(frame, self.channel_order, self.video_scale)
-            frame = np.flip(frame, axis=0)
-            self.pull_data_times.append(time.perf_counter() - pull_data_start_time)
-            self.signal_data.emit({"frame": frame, "timestamp": get_clock_time()})  # uses lsl local clock for syncing
+        if self.is_streaming and self.frame_rate_limiter.is_due(time.perf_counter()):
+            with self.capture_lock:
+                if not self.is_streaming:
+                    return
+                pull_data_start_time = time.perf_counter()
+                if self.screen_capture is None:
+                    self.screen_capture = create_screen_capture(self.capture_region)
+                frame = self.screen_capture.capture()
+                timestamp = get_clock_time()  # uses lsl local clock for syncing
+                frame = self.frame_converter.convert(frame, self.channel_order, self.video_scale)
+            pull_data_time = time.perf_counter() - pull_data_start_time
+            self.pull_data_times.append(pull_data_time)
+            MetricsRegistry().record(str(self.screen_label), MetricType.acquisition, pull_data_time, num_samples=1)
+            self.signal_data.emit({"frame": frame, "timestamp": timestamp})
@@ -1,45 +1,64 @@
 import time
 
-import cv2
-import numpy as np
 from PyQt6 import QtCore
 from PyQt6.QtCore import QObject
 from physiolabxr.presets.PresetEnums import VideoDeviceChannelOrder
 from physiolabxr.threadings.workers import RenaWorker
-from physiolabxr.utils.image_utils import process_image
-from physiolabxr.utils.time_utils import get_clock_time
+from physiolabxr.utils.image_utils import FrameConverter
+from physiolabxr.utils.performance_utils import MetricsRegistry, MetricType
+from physiolabxr.utils.video_capture_utils import LatestFrameGrabber
 
 
 class WebcamWorker(QObject, RenaWorker):
+    """
+    The camera is read by a LatestFrameGrabber on its own thread, each tick only converts and emits the latest frame.
+    When the camera is faster than the ticks, the frames in between are dropped. When the camera is slower, the tick
+    has no new frame and is counted as late.
 
+    The emitted frame is (width, height, 3), flipped upside-down in RGB, ready to be shown, recorded and forwarded.
+    """
     def __init__(self, cam_id, video_scale: float, channel_order: VideoDeviceChannelOrder):
         super().__init__()
         self.cap = None
+        self.frame_grabber = None
         self.cam_id = cam_id
-        self.cap = cv2.VideoCapture(self.cam_id)
+        self.frame_converter = FrameConverter()
         self.signal_data_tick.connect(self.process_on_tick)
-        self.is_streaming = True
 
         self.video_scale = video_scale
         self.channel_order = channel_order
 
+        self.late_frame_count = 0
+        self.start_stream()
+
     def stop_stream(self):
         self.is_streaming = False
+        if self.frame_grabber is not None:
+            self.frame_grabber.stop()  # the grab thread must be done reading before the capture is released
+            self.frame_grabber = None
         if self.cap is not None:
             self.cap.release()
 
     def start_stream(self):
+        import cv2
         self.is_streaming = True
         self.cap = cv2.VideoCapture(self.cam_id)
+        self.late_frame_count = 0
+        self.frame_grabber = LatestFrameGrabber(self.cap)
+        self.frame_grabber.start()
 
     @QtCore.pyqtSlot()
     def process_on_tick(self):
         if self.is_streaming:
             pull_data_start_time = time.perf_counter()
-            ret, cv_img = self.cap.read()
-            if ret:
-                cv_img = cv_img.astype(np.uint8)
-                cv_img = process_image(cv_img, self.channel_order, self.video_scale)
-                cv_img = np.flip(cv_img, axis=0)
-                self.pull_data_times.append(time.perf_counter() - pull_data_start_time)
-                self.signal_data.emit({"camera id": self.cam_id, "frame": cv_img, "timestamp": get_clock_time()})  # uses lsl local clock for syncing
+            cv_img, timestamp = self.frame_grabber.get_latest_frame()
+            if cv_img is None:
+                if self.frame_grabber.grabbed_frame_count > 0:  # not late if the camera is still starting up
+                    self.late_frame_count += 1
+                return
+            frame = self.frame_converter.convert(cv_img, self.channel_order, self.video_scale)
+            pull_data_time = time.perf_counter() - pull_data_start_time
+            self.pull_data_times.append(pull_data_time)
+            MetricsRegistry().record(str(self.cam_id), MetricType.acquisition, pull_data_time, num_samples=1)  # the sources are sorted as strings
+            self.signal_data.emit({"camera id": self.cam_id, "frame": frame, "timestamp": timestamp,
+                                   "dropped_frames": self.frame_grabber.dropped_frame_count, "late_frames": self.late_frame_count})
@@ -1,4 +1,5 @@
 import abc
+import threading
 import time
 from collections import deque
 
@@ -13,7 +14,7 @@ from PyQt6.QtCore import (QObject, pyqtSignal)
 from physiolabxr.exceptions.exceptions import DataPortNotOpenError, InvalidZMQMessageError
 from physiolabxr.configs import config_signal, shared
 from physiolabxr.configs.config import REQUEST_REALTIME_INFO_TIMEOUT
-from physiolabxr.configs.configs import AppConfigs
+from physiolabxr.configs.configs import AppConfigs, PullDataMode
 from physiolabxr.configs.shared import SCRIPT_STDOUT_MSG_PREFIX, SCRIPT_INFO_REQUEST, \
     STOP_COMMAND, STOP_SUCCESS_INFO, TERMINATE_COMMAND, TERMINATE_SUCCESS_COMMAND, PLAY_PAUSE_SUCCESS_INFO, \
     PLAY_PAUSE_COMMAND, SLIDER_MOVED_COMMAND, SLIDER_MOVED_SUCCESS_INFO, SCRIPT_STDERR_MSG_PREFIX
@@ -23,7 +24,9 @@ from physiolabxr.sub_process.TCPInterface import RenaTCPInterface
 # from physiolabxr.utils.buffers import process_preset_create_openBCI_interface_startsensor
 # from physiolabxr.utils.buffers import process_preset_create_UnicornHybridBlack_interface_startsensor
 from physiolabxr.interfaces.LSLInletInterface import create_lsl_interface
-from physiolabxr.utils.networking_utils import recv_string
+from physiolabxr.utils.networking_utils import recv_string, frames_to_traces
+from physiolabxr.utils.performance_utils import MetricsRegistry, MetricType, create_trace
+from physiolabxr.utils.sampling_rate_utils import SamplingRateEstimator
 from physiolabxr.utils.sim import sim_imp, sim_heatmap, sim_detected_points
 from physiolabxr.utils.time_utils import get_clock_time
 from physiolabxr.threadings.Interfaces import QWorker
@@ -33,29 +36,128 @@ class RenaWorkerMeta(type(QtCore.QObject), abc.ABCMeta):
     pass
 
 class RenaWorker(metaclass=RenaWorkerMeta):
+    """
+    Workers either pull on signal_data_tick, emitted by their stream widget's data timer, or, if they support it and
+    AppConfigs().pull_data_mode is wait, on their own wait-pull thread. The wait-pull thread blocks in wait_for_data
+    until the source has data, then calls process_on_tick. Calls are at least pull_data_coalesce_interval apart, data
+    arriving in between is emitted together on the next call.
+
+    Workers supporting wait pull set supports_wait_pull, override wait_for_data if their source can be waited on, and
+    call start_wait_pull and stop_wait_pull in their start_stream and stop_stream.
+
+    In wait mode, the wait-pull thread owns the data path of the source: between start_stream and stop_stream, only it
+    calls wait_for_data and process_on_tick. start_stream opens the source before starting the thread, and stop_stream
+    joins the thread before closing the source, so they never run at the same time as a pull. The availability checks
+    that run on the worker's QThread meanwhile must not pull from the source. process_on_tick checks
+    is_interruption_requested, which is the wait-pull thread's stop event in wait mode, and the QThread's interruption
+    otherwise.
+    """
     signal_data = pyqtSignal(dict)
     signal_data_tick = pyqtSignal()
     pull_data_times = deque(maxlen=100 * AppConfigs().pull_data_interval)
+    supports_wait_pull = False
+    sampling_rate_estimator: SamplingRateEstimator = None
+    _wait_pull_thread = None
+    _wait_pull_stop_event = None
 
     @QtCore.pyqtSlot()
     def process_on_tick(self):
         pass
 
+    def wait_for_data(self, timeout):
+        """
+        block until the source has data or <timeout> seconds have passed, without taking the data. Called on the
+        wait-pull thread.
+
+        The default returns right away, so the worker polls its source every pull_data_coalesce_interval.
+        @return: whether there may be data to process
+        """
+        return True
+
+    def is_interruption_requested(self):
+        """
+        @return: whether the thread running process_on_tick should stop pulling
+        """
+        if self._wait_pull_thread is not None and threading.current_thread() is self._wait_pull_thread:
+            return self._wait_pull_stop_event.is_set()
+        return QThread.currentThread().isInterruptionRequested()
+
+    def is_wait_pull(self):
+        return self.supports_wait_pull and AppConfigs().pull_data_mode == PullDataMode.wait
+
+    def is_wait_pull_running(self):
+        return self._wait_pull_thread is not None
+
+    def start_wait_pull(self):
+        if not self.is_wait_pull() or self.is_wait_pull_running():
+            return
+        self._wait_pull_stop_event = threading.Event()
+        self._wait_pull_thread = threading.Thread(target=self._wait_pull_loop, args=(self._wait_pull_stop_event,), daemon=True)
+        self._wait_pull_thread.start()
+
+    def stop_wait_pull(self):
+        """
+        returns after the wait-pull thread has exited, so the source can be closed safely afterward
+        """
+        if not self.is_wait_pull_running():
+            return
+        self._wait_pull_stop_event.set()
+        self._wait_pull_thread.join()
+        self._wait_pull_thread = None
+
+    def _wait_pull_loop(self, stop_event):
+        coalesce_interval = AppConfigs().pull_data_coalesce_interval / 1e3
+        wait_timeout = AppConfigs().pull_data_wait_timeout / 1e3
+        last_process_time = -np.inf
+        while not stop_event.is_set():
+            if not self.wait_for_data(wait_timeout):
+                continue
+            remaining_interval = last_process_time + coalesce_interval - time.perf_counter()
+            if remaining_interval > 0 and stop_event.wait(remaining_interval):  # let more data arrive
+                break
+            last_process_time = time.perf_counter()
+            self.process_on_tick()
+
     def start_stream(self):
         pass
 
     def stop_stream(self):
         pass
 
+    def trace_data_dict(self, data_dict):
+        """
+        tags the data_dict with a trace stamped with the worker pull when tracing is on, see TraceHop
+        """
+        if MetricsRegistry().is_tracing:
+            data_dict['trace'] = create_trace(data_dict['timestamps'][-1])
+
+    def record_pull_data_time(self, data_dict, pull_data_start_time):
+        """
+        records the time since pull_data_start_time as the acquisition time of the emitted data_dict, see MetricsRegistry
+        """
+        pull_data_time = time.perf_counter() - pull_data_start_time
+        self.pull_data_times.append(pull_data_time)
+        MetricsRegistry().record(data_dict['stream_name'], MetricType.acquisition, pull_data_time, num_samples=len(data_dict['timestamps']))
+
     def get_pull_data_delay(self):
         if len(self.pull_data_times) == 0:
             return 0
         return np.mean(self.pull_data_times)
 
+    def get_stream_health(self):
+        """
+        @return: the stream health metrics since the stream is started, see SamplingRateEstimator.get_health. None if
+        the worker doesn't estimate its sampling rate
+        """
+        if self.sampling_rate_estimator is None:
+            return None
+        return self.sampling_rate_estimator.get_health()
+
 
 class LSLInletWorker(QObject, RenaWorker):
     signal_stream_availability = pyqtSignal(bool)
     signal_stream_availability_tick = pyqtSignal()
+    supports_wait_pull = True
 
     def __init__(self, stream_name, num_channels, RenaTCPInterface=None, *args, **kwargs):
         super(LSLInletWorker, self).__init__()
@@ -65,7 +167,7 @@ class LSLInletWorker(QObject, RenaWorker):
         self._lslInlet_interface = create_lsl_interface(stream_name, num_channels)
         self._rena_tcp_interface = RenaTCPInterface
         self.is_streaming = False
-        self.timestamp_queue = deque(maxlen=1024)
+        self.sampling_rate_estimator = SamplingRateEstimator()
 
         self.start_time = time.time()
         self.num_samples = 0
@@ -77,17 +179,13 @@ class LSLInletWorker(QObject, RenaWorker):
 
     @QtCore.pyqtSlot()
     def process_on_tick(self):
-        if QThread.currentThread().isInterruptionRequested():
+        if self.is_interruption_requested():
             return
         if self.is_streaming:
             pull_data_start_time = time.perf_counter()
             self.interface_mutex.lock()
             frames, timestamps = self._lslInlet_interface.process_frames()  # get all data and remove it from internal buffer
-            self.timestamp_queue.extend(timestamps)
-            if len(self.timestamp_queue) > 1:
-                sampling_rate = len(self.timestamp_queue) / (np.max(self.timestamp_queue) - np.min(self.timestamp_queue))
-            else:
-                sampling_rate = np.nan
+            sampling_rate = self.sampling_rate_estimator.update(timestamps)
 
             self.interface_mutex.unlock()
 
@@ -97,8 +195,9 @@ class LSLInletWorker(QObject, RenaWorker):
             self.num_samples += len(timestamps)
 
             data_dict = {'stream_name': self._lslInlet_interface.lsl_stream_name, 'frames': frames, 'timestamps': timestamps, 'sampling_rate': sampling_rate}
+            self.trace_data_dict(data_dict)
             self.signal_data.emit(data_dict)
-            self.pull_data_times.append(time.perf_counter() - pull_data_start_time)
+            self.record_pull_data_time(data_dict, pull_data_start_time)
 
     @QtCore.pyqtSlot()
     def process_stream_availability(self):
@@ -116,6 +215,9 @@ class LSLInletWorker(QObject, RenaWorker):
                 self.previous_availability = is_stream_availability
                 self.signal_stream_availability.emit(is_stream_availability)
 
+    def wait_for_data(self, timeout):
+        return self._lslInlet_interface.wait_for_data(timeout)
+
     def reset_interface(self, stream_name, num_channels):
         self.interface_mutex.lock()
         self._lslInlet_interface = create_lsl_interface(stream_name, num_channels)
@@ -126,10 +228,13 @@ class LSLInletWorker(QObject, RenaWorker):
         self.is_streaming = True
 
         self.num_samples = 0
+        self.sampling_rate_estimator.reset()
         self.start_time = time.time()
         self.signal_stream_availability.emit(self._lslInlet_interface.is_stream_available())  # extra emit because the signal availability does not change on this call, but stream widget needs update
+        self.start_wait_pull()
 
     def stop_stream(self):
+        self.stop_wait_pull()
         self._lslInlet_interface.stop_stream()
         self.is_streaming = False
 
@@ -258,6 +363,7 @@ class LSLInletWorker(QObject, RenaWorker):
 class CustomDeviceWorker(QObject, RenaWorker):
     signal_stream_availability = pyqtSignal(bool)
     signal_stream_availability_tick = pyqtSignal()
+    supports_wait_pull = True
 
     def __init__(self, stream_name,*args, **kwargs):
         super(CustomDeviceWorker, self).__init__()
@@ -268,7 +374,7 @@ class CustomDeviceWorker(QObject, RenaWorker):
         self._custom_device_interface.device_worker = self
 
         self.is_streaming = False
-        self.timestamp_queue = deque(maxlen=1024)
+        self.sampling_rate_estimator = SamplingRateEstimator()
 
         self.start_time = time.time()
         self.num_samples = 0
@@ -280,17 +386,13 @@ class CustomDeviceWorker(QObject, RenaWorker):
 
     @QtCore.pyqtSlot()
     def process_on_tick(self):
-        if QThread.currentThread().isInterruptionRequested():
+        if self.is_interruption_requested():
             return
         if self.is_streaming:
             pull_data_start_time = time.perf_counter()
             self.interface_mutex.lock()
             frames, timestamps = self._custom_device_interface.process_frames()  # get all data and remove it from internal buffer
-            self.timestamp_queue.extend(timestamps)
-            if len(self.timestamp_queue) > 1:
-                sampling_rate = len(self.timestamp_queue) / (np.max(self.timestamp_queue) - np.min(self.timestamp_queue))
-            else:
-                sampling_rate = np.nan
+            sampling_rate = self.sampling_rate_estimator.update(timestamps)
 
             self.interface_mutex.unlock()
             if frames.shape[-1] == 0:
@@ -299,8 +401,9 @@ class CustomDeviceWorker(QObject, RenaWorker):
             self.num_samples += len(timestamps)
 
             data_dict = {'stream_name': self._custom_device_interface._device_name, 'frames': frames, 'timestamps': timestamps, 'sampling_rate': sampling_rate}
+            self.trace_data_dict(data_dict)
             self.signal_data.emit(data_dict)
-            self.pull_data_times.append(time.perf_counter() - pull_data_start_time)
+            self.record_pull_data_time(data_dict, pull_data_start_time)
 
     @QtCore.pyqtSlot()
     def process_stream_availability(self):
@@ -318,6 +421,9 @@ class CustomDeviceWorker(QObject, RenaWorker):
                 self.previous_availability = is_stream_availability
                 self.signal_stream_availability.emit(is_stream_availability)
 
+    def wait_for_data(self, timeout):
+        return self._custom_device_interface.wait_for_data(timeout)
+
     def reset_interface(self, stream_name, num_channels):
         self.interface_mutex.lock()
         self._custom_device_interface = create_custom_device_interface(stream_name)
@@ -328,10 +434,13 @@ class CustomDeviceWorker(QObject, RenaWorker):
         self.is_streaming = True
 
         self.num_samples = 0
+        self.sampling_rate_estimator.reset()
         self.start_time = time.time()
         self.signal_stream_availability.emit(self._custom_device_interface.is_stream_available())  # extra emit because the signal availability does not change on this call, but stream widget needs update
+        self.start_wait_pull()
 
     def stop_stream(self):
+        self.stop_wait_pull()
         self._custom_device_interface.stop_stream()
         self.is_streaming = False
 
@@ -625,6 +734,7 @@ class ScriptInfoWorker(QWorker):
     abnormal_termination_signal = pyqtSignal()
     tick_signal = pyqtSignal()
     realtime_info_signal = pyqtSignal(list)
+    traces_signal = pyqtSignal(dict)
 
     def __init__(self, info_socket_interface, script_pid):
         super().__init__()
@@ -654,9 +764,11 @@ class ScriptInfoWorker(QWorker):
             events = self.info_socket_interface.poller.poll(REQUEST_REALTIME_INFO_TIMEOUT)
             if len(events):
                 self.send_info_request = False
-                msg = self.info_socket_interface.socket.recv()
+                msg, *trace_frames = self.info_socket_interface.socket.recv_multipart()
                 realtime_info = np.frombuffer(msg)
                 self.realtime_info_signal.emit(list(realtime_info))
+                if len(trace_frames) > 0:  # the traces of the chunks whose loops finished since the last request
+                    self.traces_signal.emit(frames_to_traces(trace_frames))
 
     def deactivate(self):
         self.script_process_active = False
@@ -701,6 +813,7 @@ class ZMQWorker(QObject, RenaWorker):
 
     signal_stream_availability = pyqtSignal(bool)
     signal_stream_availability_tick = pyqtSignal()
+    supports_wait_pull = True
 
     def __init__(self, port_number, subtopic, data_type, poll_stream_availability=False, *args, **kwargs):
         super(ZMQWorker, self).__init__()
@@ -722,10 +835,11 @@ class ZMQWorker(QObject, RenaWorker):
         self.ZQMSocket = RenaTCPInterface
         self.is_streaming = False
         self.interrupted = False
-        self.timestamp_queue = deque(maxlen=1024)
+        self.sampling_rate_estimator = SamplingRateEstimator()
 
         self.previous_availability = None
         self.last_poll_time = None
+        self.last_data_time = None
         self.is_stream_available()
 
     def __del__(self):
@@ -735,7 +849,7 @@ class ZMQWorker(QObject, RenaWorker):
 
     @QtCore.pyqtSlot()
     def process_on_tick(self):
-        if QThread.currentThread().isInterruptionRequested():
+        if self.is_interruption_requested():
             return
         if self.is_streaming and not self.interrupted:
             pull_data_start_time = time.perf_counter()
@@ -748,7 +862,6 @@ class ZMQWorker(QObject, RenaWorker):
                     # timestamp can be 64-bit float or 32-bit float
                     timestamp_list.append(timestamp)
                     data_list.append(data)
-                    self.timestamp_queue.append(timestamp)
                 except zmq.error.Again:
                     break
                 except InvalidZMQMessageError as e:
@@ -758,13 +871,12 @@ class ZMQWorker(QObject, RenaWorker):
 
             if error_message is None:
                 if len(timestamp_list) > 0:
-                    if len(self.timestamp_queue) > 1:
-                        sampling_rate = len(self.timestamp_queue) / (np.max(self.timestamp_queue) - np.min(self.timestamp_queue))
-                    else:
-                        sampling_rate = np.nan
+                    self.last_data_time = time.perf_counter()
+                    sampling_rate = self.sampling_rate_estimator.update(timestamp_list)
                     data_dict = {'stream_name': self.subtopic, 'frames': np.concatenate(data_list, axis=1), 'timestamps': np.array(timestamp_list), 'sampling_rate': sampling_rate}
+                    self.trace_data_dict(data_dict)
                     self.signal_data.emit(data_dict)
-                    self.pull_data_times.append(time.perf_counter() - pull_data_start_time)
+                    self.record_pull_data_time(data_dict, pull_data_start_time)
             else:
                 # send all none dict
                 self.signal_data.emit({'stream_name': None, 'frames': None, 'timestamps': None, 'sampling_rate': None, 'e': error_message})
@@ -782,15 +894,27 @@ class ZMQWorker(QObject, RenaWorker):
                 self.previous_availability = is_stream_availability
                 self.signal_stream_availability.emit(is_stream_availability)
 
+    def wait_for_data(self, timeout):
+        if self.interrupted:  # the messages are not taken after an error, don't wake up on them
+            self._wait_pull_stop_event.wait(timeout)
+            return False
+        return len(self.poller.poll(timeout=timeout * 1e3)) > 0
+
     def start_stream(self):
         self.is_streaming = True
         self.interrupted = False
+        self.last_data_time = time.perf_counter()
+        self.sampling_rate_estimator.reset()
         self.signal_stream_availability.emit(True)  # extra emit because the signal availability does not change on this call, but stream widget needs update
+        self.start_wait_pull()
 
     def stop_stream(self):
+        self.stop_wait_pull()
         self.is_streaming = False
 
     def is_stream_available(self):
+        if self.is_wait_pull_running():  # the socket belongs to the wait-pull thread, zmq sockets are not thread safe
+            return time.perf_counter() - self.last_data_time < AppConfigs().zmq_lost_connection_timeout / 1e3
         poll_results = dict(self.poller.poll(timeout=AppConfigs().zmq_lost_connection_timeout))
         # print(f"pulled stream availability: {len(poll_results)}, at {time.time()}" )
         return len(poll_results) > 0
@@ -12,18 +12,21 @@ from PyQt6.QtWidgets import QDialogButtonBox, QSplitter
 from physiolabxr.configs import config_ui
 from physiolabxr.configs.GlobalSignals import GlobalSignals
 from physiolabxr.configs.configs import AppConfigs, LinechartVizMode
+from physiolabxr.exceptions.exceptions import DSPWorkerError
+from physiolabxr.presets.StreamRenderPlan import StreamRenderPlan
 from physiolabxr.presets.load_user_preset import create_default_group_entry
 from physiolabxr.presets.presets_utils import get_stream_preset_info, set_stream_preset_info, get_stream_group_info, \
     get_is_group_shown, pop_group_from_stream_preset, add_group_entry_to_stream, change_stream_group_order, \
     change_stream_group_name, pop_stream_preset_from_settings, change_group_channels, reset_all_group_data_processors, \
-    get_stream_data_processor_only_apply_to_visualization
+    save_preset
+from physiolabxr.sub_process.processor import get_dsp_worker_pool, remove_stream_from_dsp_worker_pool
 from physiolabxr.ui.GroupPlotWidget import GroupPlotWidget
 from physiolabxr.ui.PoppableWidget import Poppable
 from physiolabxr.ui.StreamOptionsWindow import StreamOptionsWindow
 from physiolabxr.ui.VizComponents import VizComponents
 from physiolabxr.utils.buffers import DataBufferSingleStream
-from physiolabxr.utils.dsp_utils.dsp_modules import run_data_processors
-from physiolabxr.utils.performance_utils import timeit
+from physiolabxr.utils.performance_utils import timeit, MetricsRegistry, MetricType, TraceHop, stamp_traces
+from physiolabxr.utils.sampling_rate_utils import format_stream_health
 from physiolabxr.utils.ui_utils import clear_widget, show_label_movie
 from physiolabxr.ui.dialogs import dialog_popup
 
@@ -110,6 +113,11 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
             self.viz_data_buffer = None
             self.create_buffer()
 
+        # compiled from the preset on first use, see get_render_plan
+        self._render_plan = None
+        GlobalSignals().stream_preset_nominal_srate_changed.connect(self.on_preset_nominal_sampling_rate_changed)
+        GlobalSignals().stream_presets_entry_changed_signal.connect(self.invalidate_render_plan)
+
         # create visualization component, must be after the option window ##################
         self.channel_index_plot_widget_dict = {}
         self.group_name_plot_widget_dict = {}
@@ -136,8 +144,13 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
         self.set_pop_button_icons()
 
     def start_timers(self):
+        """
+        must be called after connect_worker. Workers pulling data on their own thread don't need the data timer, see
+        RenaWorker
+        """
         self.v_timer.start()
-        self.data_timer.start()
+        if not self.data_worker.is_wait_pull():
+            self.data_timer.start()
 
     def connect_worker(self, worker, add_stream_availibility: bool):
         self.worker_thread = QThread(self)
@@ -148,6 +161,7 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
             self.data_worker.signal_stream_availability.connect(self.update_stream_availability)
         else:
             self.is_stream_available = True  # always true for stream that does not have stream availability
+        self.update_worker_nominal_sampling_rate()
         self.data_worker.moveToThread(self.worker_thread)
         self.worker_thread.start()
         self.set_start_stop_button_icon()
@@ -302,11 +316,14 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
             return False
         self.data_timer.stop()
         self.v_timer.stop()
+        GlobalSignals().stream_preset_nominal_srate_changed.disconnect(self.on_preset_nominal_sampling_rate_changed)
+        GlobalSignals().stream_presets_entry_changed_signal.disconnect(self.invalidate_render_plan)
         if self.data_worker.is_streaming:
             self.data_worker.stop_stream()
         self.worker_thread.requestInterruption()
         self.worker_thread.exit()
         self.worker_thread.wait()  # wait for the thread to exit
+        remove_stream_from_dsp_worker_pool(self.stream_name)
 
         self.main_parent.stream_widgets.pop(self.stream_name)
         self.main_parent.remove_stream_widget(self)
@@ -348,6 +365,7 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
         return group_plot_widget_dict
 
     def create_visualization_component(self):
+        self.invalidate_render_plan()
         group_plot_dict = self.init_stream_visualization()
         self.viz_components = VizComponents(self.fs_label, self.ts_label, group_plot_dict)
 
@@ -359,18 +377,23 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
         update the visualization buffer, recording buffer, and scripting buffer
         '''
         if data_dict['frames'].shape[-1] > 0 and not self.in_error_state:  # if there are data in the emitted data dict
+            num_samples = len(data_dict['timestamps'])
+            metrics_registry = MetricsRegistry()
+            if 'trace' in data_dict:
+                stamp_traces(data_dict['trace'], TraceHop.gui_receive)
+                metrics_registry.record_trace_latencies(self.stream_name, data_dict['trace'], [TraceHop.gui_receive])
             # if only applied to visualization, then only update the visualization buffer
-            if get_stream_data_processor_only_apply_to_visualization(self.stream_name):
-                self.main_parent.recording_tab.update_recording_buffer(data_dict)
-                self.main_parent.scripting_tab.forward_data(data_dict)
-                self.run_data_processor(data_dict) # run data processor after updating recording buffer and scripting buffer
-                self.viz_data_head = self.viz_data_head + len(data_dict['timestamps'])
+            if self.get_render_plan().is_data_processor_only_applied_to_visualization():
+                metrics_registry.time(self.stream_name, MetricType.recording, self.main_parent.recording_tab.update_recording_buffer, (data_dict, ), num_samples)
+                metrics_registry.time(self.stream_name, MetricType.script_forwarding, self.main_parent.scripting_tab.forward_data, (data_dict, ), num_samples)
+                metrics_registry.time(self.stream_name, MetricType.processing, self.run_data_processor, (data_dict, ), num_samples) # run data processor after updating recording buffer and scripting buffer
+                self.viz_data_head = self.viz_data_head + num_samples
             else:
                 # run data processor first
-                self.run_data_processor(data_dict)
-                self.main_parent.recording_tab.update_recording_buffer(data_dict)
-                self.main_parent.scripting_tab.forward_data(data_dict)
-                self.viz_data_head = self.viz_data_head + len(data_dict['timestamps'])
+                metrics_registry.time(self.stream_name, MetricType.processing, self.run_data_processor, (data_dict, ), num_samples)
+                metrics_registry.time(self.stream_name, MetricType.recording, self.main_parent.recording_tab.update_recording_buffer, (data_dict, ), num_samples)
+                metrics_registry.time(self.stream_name, MetricType.script_forwarding, self.main_parent.scripting_tab.forward_data, (data_dict, ), num_samples)
+                self.viz_data_head = self.viz_data_head + num_samples
 
 
             # self.run_data_processor(data_dict)
@@ -415,15 +438,21 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
             data_to_plot = self.viz_data_buffer.buffer[0][:, -self.viz_data_head:]
         elif AppConfigs().linechart_viz_mode == LinechartVizMode.CONTINUOUS:
             data_to_plot = self.viz_data_buffer.buffer[0][:, -self.num_points_to_plot:]
-        for plot_group_index, (group_name) in enumerate(get_stream_group_info(self.stream_name).keys()):
-            self.plot_data_times.append(timeit(self.viz_components.group_plots[group_name].plot_data, (data_to_plot, ))[1])  # NOTE performance test scripts, don't include in production code
+        render_plan = self.get_render_plan()
+        render_start_time = time.perf_counter()
+        for group_name, group_plan in render_plan.groups.items():
+            self.plot_data_times.append(timeit(self.viz_components.group_plots[group_name].plot_data, (data_to_plot, group_plan))[1])  # NOTE performance test scripts, don't include in production code
+        MetricsRegistry().record(self.stream_name, MetricType.render, time.perf_counter() - render_start_time, num_samples=data_to_plot.shape[-1])
 
         self.viz_components.fs_label.setText(
             'fps: {:.3f}'.format(round(actual_sampling_rate, config_ui.sampling_rate_decimal_places)))
         self.viz_components.ts_label.setText('timestamp: {:.3f}'.format(self.current_timestamp))
+        stream_health = self.get_stream_health()
+        if stream_health is not None:
+            self.viz_components.fs_label.setToolTip(format_stream_health(stream_health))
 
         self._has_new_viz_data = False
-        if self.viz_data_head > get_stream_preset_info(self.stream_name, 'display_duration') * get_stream_preset_info(self.stream_name, 'nominal_sampling_rate'):  # reset the head if it is out of bound
+        if self.viz_data_head > render_plan.num_points_to_plot:  # reset the head if it is out of bound
             self.viz_data_head = 0
 
     def pull_data_tick(self):
@@ -448,10 +477,12 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
         :param new_display_duration:
         :return:
         '''
+        self.invalidate_render_plan()
         self.create_buffer()
         self.num_points_to_plot = self.get_num_points_to_plot()
         if self.viz_components is not None:
             self.viz_components.update_nominal_sampling_rate()
+        self.update_worker_nominal_sampling_rate()
 
     def bar_chart_range_on_change(self, group_name):
         self.viz_components.group_plots[group_name].update_bar_chart_range()
@@ -478,7 +509,7 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
         # TODO: optimize for changed group reset. Reset visualization buffer after regrouped ?
         reset_all_group_data_processors(self.stream_name)
 
-        # save_preset()
+        save_preset(stream_name=self.stream_name)
         self.reset_viz()
 
     def group_order_changed(self, group_order):
@@ -487,7 +518,7 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
         @param group_order:
         """
         change_stream_group_order(self.stream_name, group_order)
-        # save_preset()
+        save_preset(stream_name=self.stream_name)
         self.reset_viz()
 
     def change_group_name(self, new_group_name, old_group_name):
@@ -495,8 +526,10 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
             change_stream_group_name(self.stream_name, new_group_name, old_group_name)
         except ValueError as e:
             dialog_popup(str(e), mode='modeless')
+        self.invalidate_render_plan()
         self.viz_components.group_plots[new_group_name] = self.viz_components.group_plots.pop(old_group_name)
         self.viz_components.group_plots[new_group_name].change_group_name(new_group_name)
+        save_preset(stream_name=self.stream_name)
 
     def change_channel_name(self, group_name, new_ch_name, old_ch_name, lsl_index):
         # change channel name in the settings
@@ -504,6 +537,7 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
         changing_channel_index = channel_names.index(old_ch_name)
         channel_names[changing_channel_index] = new_ch_name
         set_stream_preset_info(self.stream_name, 'channel_names', channel_names)
+        save_preset(stream_name=self.stream_name)
 
         # change the name in the plots
         self.viz_components.group_plots[group_name].change_channel_name(new_ch_name, old_ch_name, lsl_index)
@@ -515,6 +549,16 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
     def get_pull_data_delay(self):
         return self.data_worker.get_pull_data_delay()
 
+    def get_stream_health(self):
+        return self.data_worker.get_stream_health()
+
+    def update_worker_nominal_sampling_rate(self):
+        """
+        the worker's dropouts and clock drift are estimated against the preset's nominal sampling rate
+        """
+        if self.data_worker.sampling_rate_estimator is not None:
+            self.data_worker.sampling_rate_estimator.set_nominal_sampling_rate(get_stream_preset_info(self.stream_name, 'nominal_sampling_rate'))
+
     def set_spectrogram_cmap(self, group_name):
         self.viz_components.set_spectrogram_cmap(group_name)
 
@@ -523,12 +567,52 @@ class BaseStreamWidget(Poppable, QtWidgets.QWidget):
 
     def run_data_processor(self, data_dict):
         data = data_dict['frames']
-        group_info = get_stream_group_info(self.stream_name)
+        group_plans = [group_plan for group_plan in self.get_render_plan().groups.values() if len(group_plan.data_processors) != 0]
+        dsp_worker_pool = get_dsp_worker_pool() if len(group_plans) != 0 else None
+
+        if dsp_worker_pool is None:
+            metrics_registry = MetricsRegistry()
+            for group_plan in group_plans:
+                pipeline = group_plan.data_processor_pipeline
+                pipeline.profile = metrics_registry.is_profiling_stages
+                processed_data = pipeline.run(data[group_plan.channel_index], backend=group_plan.data_processor_backend)
+                data[group_plan.channel_index] = processed_data
+                if pipeline.profile:
+                    metrics_registry.record_stage_timings(f'{self.stream_name}: {group_plan.group_name}', pipeline.get_stage_timings(), data.shape[-1])
+        else:  # the groups are submitted all at once, so that the groups on different workers are processed in parallel
+            submitted_group_plans = []
+            for group_plan in group_plans:
+                try:
+                    dsp_worker_pool.submit((self.stream_name, group_plan.group_name), data[group_plan.channel_index], group_plan.data_processors, backend=group_plan.data_processor_backend)
+                    submitted_group_plans.append(group_plan)
+                except DSPWorkerError as e:  # the group's data is left unprocessed
+                    warnings.warn(f"BaseStreamWidget: {e}")
+            for group_plan in submitted_group_plans:
+                try:
+                    data[group_plan.channel_index] = dsp_worker_pool.collect((self.stream_name, group_plan.group_name))
+                except DSPWorkerError as e:
+                    warnings.warn(f"BaseStreamWidget: {e}")
+
+    def get_render_plan(self) -> StreamRenderPlan:
+        """
+        the compiled render plan of this stream, used by the visualization refresh and the data processors instead of
+        looking up the presets
+        """
+        if self._render_plan is None:
+            self._render_plan = StreamRenderPlan(self.stream_name)
+        return self._render_plan
+
+    def invalidate_render_plan(self):
+        """
+        call this when the stream's groups, nominal sampling rate or display duration change. The plan is recompiled
+        on next use
+        """
+        self._render_plan = None
 
-        for this_group_info in group_info.values():  # TODO: potentially optimize using pool
-            if len(this_group_info.data_processors) != 0:
-                processed_data = run_data_processors(data[this_group_info.channel_indices], this_group_info.data_processors)
-                data[this_group_info.channel_indices] = processed_data
+    def on_preset_nominal_sampling_rate_changed(self, stream_name_sampling_rate):
+        stream_name, _ = stream_name_sampling_rate
+        if stream_name == self.stream_name:
+            self.invalidate_render_plan()
 
 
     def get_viz_components(self):
@@ -0,0 +1,73 @@
+from PyQt6 import QtWidgets, uic
+from PyQt6.QtCore import QTimer
+
+from physiolabxr.configs.configs import AppConfigs
+from physiolabxr.utils.performance_utils import MetricsRegistry
+
+
+class DiagnosticsWidget(QtWidgets.QWidget):
+    """
+    shows the timings of the streams and scripts in MetricsRegistry, refreshed while the widget is visible
+    """
+    def __init__(self, parent):
+        super().__init__()
+        self.ui = uic.loadUi(AppConfigs()._ui_DiagnosticsWidget, self)
+        self.parent = parent
+
+        self.metricsTable.setColumnCount(len(MetricsRegistry.summary_fields))
+        self.metricsTable.setHorizontalHeaderLabels(MetricsRegistry.summary_fields)
+        self.metricsTable.verticalHeader().setVisible(False)
+
+        self.traceLatencyCheckBox.setChecked(MetricsRegistry().is_tracing)
+        self.traceLatencyCheckBox.stateChanged.connect(self.on_trace_latency_check_box_changed)
+        self.profileStagesCheckBox.setChecked(MetricsRegistry().is_profiling_stages)
+        self.profileStagesCheckBox.stateChanged.connect(self.on_profile_stages_check_box_changed)
+        self.resetBtn.clicked.connect(self.on_reset_btn_clicked)
+        self.exportJSONBtn.clicked.connect(self.on_export_json_btn_clicked)
+        self.exportCSVBtn.clicked.connect(self.on_export_csv_btn_clicked)
+
+        self.refresh_timer = QTimer()
+        self.refresh_timer.setInterval(AppConfigs().main_window_meta_data_refresh_interval)
+        self.refresh_timer.timeout.connect(self.update_metrics_table)
+
+    def showEvent(self, event):
+        self.update_metrics_table()
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def update_metrics_table(self):
+        summaries = MetricsRegistry().get_summaries()
+        self.metricsTable.setRowCount(len(summaries))
+        for row, summary in enumerate(summaries):
+            for column, field in enumerate(MetricsRegistry.summary_fields):
+                value = summary[field]
+                text = '{:.3f}'.format(value) if isinstance(value, float) else str(value)
+                item = self.metricsTable.item(row, column)
+                if item is None:
+                    self.metricsTable.setItem(row, column, QtWidgets.QTableWidgetItem(text))
+                else:
+                    item.setText(text)
+
+    def on_trace_latency_check_box_changed(self):
+        MetricsRegistry().is_tracing = self.traceLatencyCheckBox.isChecked()
+
+    def on_profile_stages_check_box_changed(self):
+        MetricsRegistry().is_profiling_stages = self.profileStagesCheckBox.isChecked()
+
+    def on_reset_btn_clicked(self):
+        MetricsRegistry().reset()
+        self.update_metrics_table()
+
+    def on_export_json_btn_clicked(self):
+        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Export metrics', 'metrics.json', 'JSON (*.json)')
+        if file_path:
+            MetricsRegistry().export_json(file_path)
+
+    def on_export_csv_btn_clicked(self):
+        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Export metrics', 'metrics.csv', 'CSV (*.csv)')
+        if file_path:
+            MetricsRegistry().export_csv(file_path)
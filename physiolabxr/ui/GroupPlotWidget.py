@@ -7,13 +7,12 @@ from physiolabxr.configs import config
 from physiolabxr.configs.configs import AppConfigs
 from physiolabxr.presets.GroupEntry import PlotFormat
 from physiolabxr.presets.PlotConfig import ImageFormat, ChannelFormat
+from physiolabxr.presets.StreamRenderPlan import GroupRenderPlan
 from physiolabxr.presets.presets_utils import get_stream_preset_info, get_is_group_shown, \
     set_stream_a_group_selected_plot_format, \
     is_group_image_only, get_bar_chart_max_min_range, get_selected_plot_format, get_selected_plot_format_index, \
-    get_group_channel_indices, get_group_image_valid, get_group_image_config, spectrogram_time_second_per_segment, \
-    spectrogram_time_second_overlap, get_spectrogram_cmap_lut, get_spectrogram_percentile_level_max, \
-    get_spectrogram_percentile_level_min, get_image_cmap_lut, get_valid_image_levels, \
-    get_group_channel_indices_start_end, get_is_channels_show, get_group_linechart_config
+    get_group_channel_indices, get_spectrogram_cmap_lut, get_image_cmap_lut, get_valid_image_levels, \
+    get_is_channels_show
 from physiolabxr.utils.image_utils import process_image, rotate_image
 from physiolabxr.utils.ui_utils import get_distinct_colors
 
@@ -182,26 +181,25 @@ class GroupPlotWidget(QtWidgets.QWidget):
         num_points_to_plot = int(display_duration * get_stream_preset_info(self.stream_name, 'nominal_sampling_rate'))
         return np.linspace(0., get_stream_preset_info(self.stream_name, 'display_duration'), num_points_to_plot)
 
-    def plot_data(self, data):
-        channel_indices = get_group_channel_indices(self.stream_name, self.group_name)
-        duration = data.shape[1] / get_stream_preset_info(self.stream_name, 'nominal_sampling_rate')
+    def plot_data(self, data, group_plan: GroupRenderPlan):
+        """
+        @param group_plan: this group's compiled render plan, see StreamRenderPlan. Everything needed on a refresh is
+        taken from it, so there are no preset lookups here
+        """
+        channel_index = group_plan.channel_index
+        fs = group_plan.nominal_sampling_rate
+        duration = data.shape[1] / fs
         selected_plot_format = self.get_selected_format()
-        if data.shape[1] != len(self.viz_time_vector):  # num_points_to_plot has been updated
-            self.viz_time_vector = self.get_viz_time_vector()
         if selected_plot_format == 0:  # linechart
-            linechart_config = get_group_linechart_config(self.stream_name, self.group_name)
-            # if line_chat_config.channels_constant_offset!=0:
-            #     data = data +
-
-
-            time_vector = np.linspace(0., duration, data.shape[1])
-            for index_in_group, channel_index in enumerate(channel_indices):
+            channels_constant_offset = group_plan.time_series_config.channels_constant_offset
+            time_vector = group_plan.get_time_vector(data.shape[1])
+            for index_in_group, channel_index in enumerate(group_plan.channel_indices):
                 plot_data_item = self.linechart_widget.plotItem.curves[index_in_group]
                 if plot_data_item.isVisible():
-                    plot_data_item.setData(time_vector, data[channel_index, :]+linechart_config.channels_constant_offset*index_in_group)
+                    plot_data_item.setData(time_vector, data[channel_index, :] + channels_constant_offset * index_in_group)
 
-        elif selected_plot_format == 1 and get_group_image_valid(self.stream_name, self.group_name):
-            image_config = get_group_image_config(self.stream_name, self.group_name)
+        elif selected_plot_format == 1 and group_plan.group_entry.is_image_valid():
+            image_config = group_plan.image_config
             width, height, image_format, channel_format, scaling_percentile, rotation_clockwise_degree = image_config.width, \
                                                                                                          image_config.height, \
                                                                                                          image_config.image_format, \
@@ -209,11 +207,7 @@ class GroupPlotWidget(QtWidgets.QWidget):
                                                                                                          image_config.scaling_percentage, \
                                                                                                          image_config.rotation_clockwise_degree
             depth = image_format.depth_dim()
-            if channel_indices is None:
-                start_end = get_group_channel_indices_start_end(self.stream_name, self.group_name)
-                image_plot_data = data[start_end[0]:start_end[1], -1]
-            else:
-                image_plot_data = data[channel_indices, -1]  # only visualize the last frame
+            image_plot_data = data[channel_index, -1]  # only visualize the last frame
             if image_format == ImageFormat.rgb or image_format == ImageFormat.bgr:
                 if channel_format == ChannelFormat.channel_first:
                     image_plot_data = np.reshape(image_plot_data, (depth, width, height))
@@ -228,7 +222,7 @@ class GroupPlotWidget(QtWidgets.QWidget):
                 #image_plot_data = np.rot90(image_plot_data, k=-1) # rotate 90 degree counter-clockwise IndexPen TODO: delete this line when the indexpen is fixed
 
             if not self.is_auto_level_image:
-                self.image_item.setLevels(get_valid_image_levels(self.stream_name, self.group_name))
+                self.image_item.setLevels(image_config.get_valid_image_levels())
             if scaling_percentile != 100:
                 image_plot_data = process_image(image_plot_data, scale=scaling_percentile/100)
             if rotation_clockwise_degree != 0:
@@ -240,22 +234,20 @@ class GroupPlotWidget(QtWidgets.QWidget):
             self.image_item.setImage(image_plot_data, autoLevels=self.is_auto_level_image)
 
         elif selected_plot_format == 2:
-            bar_chart_plot_data = data[channel_indices, -1]  # only visualize the last frame
+            bar_chart_plot_data = data[channel_index, -1]  # only visualize the last frame
             self.barchart_widget.plotItem.curves[0].setOpts(x=np.arange(len(bar_chart_plot_data)), height=bar_chart_plot_data, width=1, brush='r')
         elif selected_plot_format == 3:
-            spectrogram_plot_data = data[channel_indices, :]
+            spectrogram_plot_data = data[channel_index, :]
             # self.spectrogram_widget.setImage(spectrogram_plot_data, autoLevels=True, autoRange=True, autoHistogramRange=True)
-            fs = get_stream_preset_info(self.stream_name, 'nominal_sampling_rate')
-            nperseg = int(fs * spectrogram_time_second_per_segment(self.stream_name, self.group_name))
-            noverlap = int(fs * spectrogram_time_second_overlap(self.stream_name, self.group_name))
+            spectrogram_config = group_plan.spectrogram_config
+            nperseg = int(fs * spectrogram_config.time_per_segment_second)
+            noverlap = int(fs * spectrogram_config.time_overlap_second)
             if nperseg == 0 or noverlap == 0 or nperseg < noverlap or nperseg > spectrogram_plot_data.shape[1]:
                 return
             f, t, Sxx = signal.spectrogram(spectrogram_plot_data, fs, window=signal.get_window('hann', nperseg),
                                            noverlap=noverlap,
                                            detrend=False, scaling='spectrum')
-            percentile_level_min = get_spectrogram_percentile_level_min(self.stream_name, self.group_name)
-            percentile_level_max = get_spectrogram_percentile_level_max(self.stream_name, self.group_name)
-            self.spectrogram_img.setLevels([np.percentile(Sxx, percentile_level_min), np.percentile(Sxx, percentile_level_max)])
+            self.spectrogram_img.setLevels([np.percentile(Sxx, spectrogram_config.percentile_level_min), np.percentile(Sxx, spectrogram_config.percentile_level_max)])
             Sxx = np.mean(Sxx, axis=0)  # average across channels
             # Sxx = resize(Sxx, (fs/2, Sxx.shape[-1]))
             self.spectrogram_img.setImage(Sxx.T, autoLevels=False)  # average across channels
@@ -16,6 +16,7 @@ from physiolabxr.presets.PresetEnums import PresetType, DataType, CustomPresetTy
 from physiolabxr.ui.AddWiget import AddStreamWidget
 from physiolabxr.ui.BaseStreamWidget import BaseStreamWidget
 from physiolabxr.ui.CloseDialog import CloseDialog
+from physiolabxr.ui.DiagnosticsWidget import DiagnosticsWidget
 from physiolabxr.ui.LSLWidget import LSLWidget
 from physiolabxr.ui.NotificationPane import NotificationPane
 from physiolabxr.ui.ScriptingTab import ScriptingTab
@@ -126,6 +127,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.actionShow_Recordings.triggered.connect(self.fire_action_show_recordings)
         self.actionExit.triggered.connect(self.fire_action_exit)
         self.actionSettings.triggered.connect(self.fire_action_settings)
+        self.actionDiagnostics.triggered.connect(self.fire_action_diagnostics)
 
         # create the settings window
         self.settings_widget = SettingsWidget(self)
@@ -133,6 +135,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.settings_window.get_layout().addWidget(self.settings_widget)
         self.settings_window.hide()
 
+        # create the diagnostics window, showing the stream and script timings
+        self.diagnostics_widget = DiagnosticsWidget(self)
+        self.diagnostics_window = another_window('Diagnostics')
+        self.diagnostics_window.get_layout().addWidget(self.diagnostics_widget)
+        self.diagnostics_window.hide()
+
         # global buffer object for visualization, recording, and scripting
         self.global_stream_buffer = DataBuffer()
 
@@ -302,6 +310,8 @@ class MainWindow(QtWidgets.QMainWindow):
         [x.start_stop_stream_btn_clicked() for x in self.stream_widgets.values() if x.is_widget_streaming and x.is_widget_streaming()]
 
     def init_video_device(self, video_device_name, video_preset_type):
+        if video_preset_type == PresetType.MONITOR:
+            AppConfigs().wait_monitor_check()
         if video_preset_type == PresetType.MONITOR and not AppConfigs().is_monitor_available:
             dialog_popup(AppConfigs().monitor_error_message, title='Error')
             return
@@ -427,6 +437,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.meta_data_update_timer.timeout.disconnect()
             if self.settings_window is not None:
                 self.settings_window.close()
+            self.diagnostics_window.close()
 
             # close other tabs
             stream_close_calls = [s_widgets.try_close for s_widgets in self.stream_widgets.values()]
@@ -473,6 +484,10 @@ class MainWindow(QtWidgets.QMainWindow):
     def fire_action_settings(self):
         self.open_settings_tab()
 
+    def fire_action_diagnostics(self):
+        self.diagnostics_window.show()
+        self.diagnostics_window.activateWindow()
+
     def open_settings_tab(self, tab_name: str='Streams'):
         self.settings_window.show()
         self.settings_window.activateWindow()
@@ -13,7 +13,7 @@ from PyQt6.QtWidgets import QDialogButtonBox
 
 from physiolabxr.ui import ui_shared
 from physiolabxr.configs.config import settings
-from physiolabxr.configs.configs import AppConfigs, RecordingFileFormat
+from physiolabxr.configs.configs import AppConfigs, RecordingFileFormat, VideoRecordingCodec
 from physiolabxr.ui.RecordingConversionDialog import RecordingPostProcessDialog
 from physiolabxr.ui.ui_shared import stop_recording_text, start_recording_text
 from physiolabxr.utils.RNStream import RNStream
@@ -21,6 +21,9 @@ from physiolabxr.ui.dialogs import dialog_popup
 import subprocess
 
 from physiolabxr.utils.buffers import DataBuffer
+from physiolabxr.utils.sampling_rate_utils import save_stream_health
+from physiolabxr.utils.video_recording_utils import VideoRecorder, get_video_sidecar_path, \
+    get_video_frame_table_stream_name
 
 
 class RecordingsTab(QtWidgets.QWidget):
@@ -34,6 +37,7 @@ class RecordingsTab(QtWidgets.QWidget):
         self.settings = QSettings('TeamRena', 'RenaLabApp')  # load the user settings
 
         self.recording_buffer = DataBuffer()
+        self.video_recorders = {}  # video stream name -> VideoRecorder, used when recording video compressed
         self.postprocess_dialog = None
         self.is_recording = False
 
@@ -70,6 +74,7 @@ class RecordingsTab(QtWidgets.QWidget):
         self.save_path = self.generate_save_path()  # get a new save path
         self.save_stream = RNStream(self.save_path)
         self.recording_buffer.clear_buffer()  # clear buffer
+        self.video_recorders = {}
         self.is_recording = True
         self.recording_byte_count = 0
         self.StartStopRecordingBtn.setText(stop_recording_text)
@@ -89,6 +94,12 @@ class RecordingsTab(QtWidgets.QWidget):
 
         self.evict_buffer()
         self.timer.stop()
+        for cam_id, video_recorder in self.video_recorders.items():
+            video_recorder.stop()  # finish encoding the queued frames
+            if video_recorder.dropped_frame_count > 0:
+                print(f'RecordingsTab: the encoder of {cam_id} fell behind, {video_recorder.dropped_frame_count} frames were dropped and recorded as repeats of the previous frame')
+        self.video_recorders = {}
+        self.save_stream_healths()
 
         self.recording_byte_count = 0
         self.update_file_size_label()
@@ -108,6 +119,16 @@ class RecordingsTab(QtWidgets.QWidget):
         self.subjectTagTextEdit.setEnabled(True)
         self.sessionTagTextEdit.setEnabled(True)
 
+    def save_stream_healths(self):
+        """
+        save the health metrics of the streaming streams to a json sidecar next to the recording. The metrics cover the
+        time since each stream is started
+        """
+        stream_healths = {stream_name: stream_health for stream_name, stream_widget in self.parent.stream_widgets.items()
+                          if stream_widget.is_widget_streaming() and (stream_health := stream_widget.get_stream_health()) is not None}
+        if len(stream_healths) > 0:
+            save_stream_health(self.save_path, stream_healths)
+
     def update_recording_buffer(self, data_dict: dict):
         # TODO: change lsl_data_type to stream_name?
         if self.is_recording:
@@ -115,7 +136,15 @@ class RecordingsTab(QtWidgets.QWidget):
 
     def update_camera_screen_buffer(self, cam_id, new_frame, timestamp):
         if self.is_recording:
-            self.recording_buffer.update_buffer({'stream_name': cam_id, 'frames': np.expand_dims(new_frame, axis=-1), 'timestamps': [timestamp]})
+            if AppConfigs().video_recording_codec == VideoRecordingCodec.raw:
+                self.recording_buffer.update_buffer({'stream_name': cam_id, 'frames': np.expand_dims(new_frame, axis=-1), 'timestamps': [timestamp]})
+            else:
+                if cam_id not in self.video_recorders:
+                    self.video_recorders[cam_id] = VideoRecorder(get_video_sidecar_path(self.save_path, cam_id, AppConfigs().video_recording_codec),
+                                                                 AppConfigs().video_recording_codec, 1e3 / AppConfigs().video_device_refresh_interval)
+                    self.video_recorders[cam_id].start()
+                frame_index = self.video_recorders[cam_id].add_frame(new_frame)
+                self.recording_buffer.update_buffer({'stream_name': get_video_frame_table_stream_name(cam_id), 'frames': np.array([[frame_index]]), 'timestamps': [timestamp]})
 
     def update_ui_save_file(self):
         if AppConfigs().recording_file_format == RecordingFileFormat.csv:
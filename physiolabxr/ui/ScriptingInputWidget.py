@@ -1,4 +1,5 @@
 from PyQt6 import QtWidgets, uic
+from PyQt6.QtGui import QDoubleValidator
 
 from physiolabxr.ui import ui_shared
 from physiolabxr.configs.configs import AppConfigs
@@ -13,6 +14,8 @@ class ScriptingInputWidget(QtWidgets.QWidget):
 
         self.label_stream_name.setToolTip(ui_shared.scripting_input_widget_name_label_tooltip)
         self.label_input_shape.setToolTip(ui_shared.scripting_input_widget_shape_label_tooltip)
+        self.sampling_rate_lineEdit.setToolTip(ui_shared.scripting_input_widget_sampling_rate_tooltip)
+        self.sampling_rate_lineEdit.setValidator(QDoubleValidator(bottom=0))
         self.remove_btn.setToolTip(ui_shared.scripting_input_widget_button_tooltip)
         self.remove_btn.setIcon(AppConfigs()._icon_minus)
 
@@ -20,6 +23,22 @@ class ScriptingInputWidget(QtWidgets.QWidget):
     def set_button_callback(self, callback):
         self.remove_btn.clicked.connect(callback)
 
+    def set_sampling_rate_callback(self, callback):
+        self.sampling_rate_lineEdit.textChanged.connect(callback)
+
+    def set_sampling_rate(self, sampling_rate):
+        self.sampling_rate_lineEdit.setText('' if sampling_rate is None else str(sampling_rate))
+
+    def get_sampling_rate(self):
+        """
+        @return: the rate the input is resampled to for the script, None for the stream's nominal rate
+        """
+        try:
+            sampling_rate = float(self.sampling_rate_lineEdit.text())
+        except ValueError:
+            return None
+        return sampling_rate if sampling_rate > 0 else None
+
     def set_input_info_text(self, text):
         self.label_input_shape.setText(text)
 
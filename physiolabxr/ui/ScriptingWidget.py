@@ -34,7 +34,9 @@ from physiolabxr.ui.ParamWidget import ParamWidget
 from physiolabxr.ui.ui_shared import script_realtime_info_text
 from physiolabxr.utils.Validators import NoCommaIntValidator
 from physiolabxr.utils.buffers import DataBuffer, click_on_file
+from physiolabxr.utils.dsp_utils.dsp_modules import PolyphaseResampler
 from physiolabxr.utils.networking_utils import send_data_dict
+from physiolabxr.utils.performance_utils import MetricsRegistry, MetricType, TraceHop, stamp_traces
 from physiolabxr.presets.presets_utils import get_stream_preset_names, get_experiment_preset_streams, \
     get_experiment_preset_names, get_stream_preset_info, is_stream_name_in_presets, remove_script_from_settings
 
@@ -141,6 +143,8 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
             self.export_script_args_to_settings()
 
         self.internal_data_buffer = None
+        self.input_resamplers = {}  # the inputs with a sampling rate set, resampled before they are forwarded to the script
+        self.input_traces = {}  # input stream name -> the traces of the chunks in the internal buffer, see TraceHop
 
         # global signals
         GlobalSignals().stream_preset_nominal_srate_changed.connect(self.on_stream_nominal_sampling_rate_change)
@@ -155,6 +159,7 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
         self.info_worker = workers.ScriptInfoWorker(self.info_socket_interface, script_pid)
         self.info_worker.abnormal_termination_signal.connect(self.kill_script_process)
         self.info_worker.realtime_info_signal.connect(self.show_realtime_info)
+        self.info_worker.traces_signal.connect(self.record_trace_latencies)
         self.info_thread = QThread(
             self.parent)  # set thread to attach to the scriptingtab instead of the widget because it runs a timeout of 2 seconds in the event loop, causing problem when removing the scriptingwidget.
         self.info_worker.moveToThread(self.info_thread)
@@ -193,7 +198,22 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
         del self.command_socket_interface
 
     def show_realtime_info(self, realtime_info: list):
-        self.realtimeInfoLabel.setText(script_realtime_info_text.format(*realtime_info))
+        """
+        @param realtime_info: the loops per second, the mean and the max loop duration, followed by the durations of the
+        loops since the last info request
+        """
+        self.realtimeInfoLabel.setText(script_realtime_info_text.format(*realtime_info[:3]))
+        loop_metric = MetricsRegistry().get_metric(self.scriptNameLabel.text(), MetricType.script_loop)
+        for loop_duration in realtime_info[3:]:
+            loop_metric.add(loop_duration)
+
+    def record_trace_latencies(self, traces: dict):
+        """
+        @param traces: input stream name -> the traces of the chunks the script has sent the outputs for
+        """
+        for stream_name, stream_traces in traces.items():
+            MetricsRegistry().record_trace_latencies(f'{self.scriptNameLabel.text()}: {stream_name}', stream_traces,
+                                                     [TraceHop.forward, TraceHop.script_receive, TraceHop.output_send])
 
     def create_stdout_worker(self):
         self.stdout_socket_interface = RenaTCPInterface(stream_name='RENA_SCRIPTING_STDOUT',
@@ -236,6 +256,7 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
             if not validate_script_path(script_path, RenaScript): return
             try:
                 script_args = self.get_verify_script_args()
+                self.input_resamplers = self.create_input_resamplers()
             except RenaError as e:
                 dialog_popup(str(e), title='Error', main_parent=self.main_window)
                 return
@@ -410,20 +431,22 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
         self.process_add_input(input_preset_name)
         self.export_script_args_to_settings()
 
-    def process_add_input(self, input_preset_name):
+    def process_add_input(self, input_preset_name, input_sampling_rates=None):
         existing_inputs = self.get_inputs()
+        input_sampling_rates = {} if input_sampling_rates is None else input_sampling_rates
         if input_preset_name in get_stream_preset_names():
-            self.add_input_widget(input_preset_name)
+            self.add_input_widget(input_preset_name, input_sampling_rates.get(input_preset_name))
         elif input_preset_name in get_experiment_preset_names():
             stream_names = get_experiment_preset_streams(input_preset_name)
             for s_name in stream_names:
                 if s_name not in existing_inputs:
-                    self.add_input_widget(s_name)
+                    self.add_input_widget(s_name, input_sampling_rates.get(s_name))
 
-    def add_input_widget(self, stream_name):
+    def add_input_widget(self, stream_name, sampling_rate=None):
         input_widget = ScriptingInputWidget(stream_name)
+        input_widget.set_sampling_rate(sampling_rate)
         try:
-            input_widget.set_input_info_text(self.get_preset_input_info_text(stream_name))
+            input_widget.set_input_info_text(self.get_preset_input_info_text(stream_name, sampling_rate))
         except MissingPresetError as e:
             print(str(e))
             return
@@ -437,7 +460,12 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
             self.check_can_add_input()
             self.export_script_args_to_settings()
 
+        def sampling_rate_changed():
+            input_widget.set_input_info_text(self.get_preset_input_info_text(stream_name, input_widget.get_sampling_rate()))
+            self.export_script_args_to_settings()
+
         input_widget.set_button_callback(remove_btn_clicked)
+        input_widget.set_sampling_rate_callback(sampling_rate_changed)
         self.input_widgets.append(input_widget)
         self.check_can_add_input()
         print('Current items are {0}'.format(str(self.get_inputs())))
@@ -506,9 +534,21 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
         rtn = dict()
         for w in self.input_widgets:
             input_preset_name = w.get_input_name_text()
-            rtn[input_preset_name] = self.get_preset_expected_shape(input_preset_name)
+            rtn[input_preset_name] = self.get_preset_expected_shape(input_preset_name, w.get_sampling_rate())
         return rtn
 
+    def get_input_sampling_rates(self):
+        return {w.get_input_name_text(): w.get_sampling_rate() for w in self.input_widgets if w.get_sampling_rate() is not None}
+
+    def create_input_resamplers(self):
+        """
+        new resamplers for the inputs with a sampling rate set, they carry the filter history between the forwarded
+        frames of one run
+        """
+        return {input_name: PolyphaseResampler(fs=get_stream_preset_info(input_name, 'nominal_sampling_rate'), target_fs=sampling_rate,
+                                               channel_num=get_stream_preset_info(input_name, 'num_channels'))
+                for input_name, sampling_rate in self.get_input_sampling_rates().items()}
+
     def get_outputs(self):
         return [w.get_label_text() for w in self.output_widgets]
 
@@ -590,15 +630,19 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
         """
         for w in self.input_widgets:
             input_preset_name = w.get_input_name_text()
-            w.set_input_info_text(self.get_preset_input_info_text(input_preset_name))
+            w.set_input_info_text(self.get_preset_input_info_text(input_preset_name, w.get_sampling_rate()))
 
-    def get_preset_input_info_text(self, preset_name):
+    def get_preset_input_info_text(self, preset_name, sampling_rate=None):
         if not is_stream_name_in_presets(preset_name):
             raise MissingPresetError(preset_name)
-        return '[{0}, {1}]'.format(*self.get_preset_expected_shape(preset_name))
+        return '[{0}, {1}]'.format(*self.get_preset_expected_shape(preset_name, sampling_rate))
 
-    def get_preset_expected_shape(self, preset_name):
-        sampling_rate = get_stream_preset_info(preset_name, 'nominal_sampling_rate')
+    def get_preset_expected_shape(self, preset_name, sampling_rate=None):
+        """
+        @param sampling_rate: the rate the input is resampled to, None for the stream's nominal sampling rate
+        """
+        if sampling_rate is None:
+            sampling_rate = get_stream_preset_info(preset_name, 'nominal_sampling_rate')
         num_channel = get_stream_preset_info(preset_name, 'num_channels')
         return num_channel, int(int(self.timeWindowLineEdit.text()) * sampling_rate)
 
@@ -637,6 +681,13 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
     def send_input(self, data_dict):
         if np.any(np.array(data_dict["timestamps"]) < 100):
             print('skipping input with timestamp < 100')
+        if data_dict['stream_name'] in self.input_resamplers:
+            frames, timestamps = self.input_resamplers[data_dict['stream_name']].process_buffer(data_dict['frames'], data_dict['timestamps'])
+            data_dict = {**data_dict, 'frames': frames, 'timestamps': timestamps}
+        if 'trace' in data_dict:
+            trace = data_dict['trace'].copy()  # the chunk may be forwarded to other scripts too
+            stamp_traces(trace, TraceHop.forward)
+            self.input_traces.setdefault(data_dict['stream_name'], []).append(trace)
         self.internal_data_buffer.update_buffer(data_dict)
         # send_data_dict(data_dict, self.forward_input_socket_interface)
 
@@ -646,8 +697,9 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
         #                    input_name, input_shape in self.input_shape_dict.items()])
         # else:
         buffer = self.internal_data_buffer.buffer
-        send_data_dict(buffer, self.forward_input_socket_interface)
+        send_data_dict(buffer, self.forward_input_socket_interface, {stream_name: np.array(traces) for stream_name, traces in self.input_traces.items()})
         self.internal_data_buffer.clear_buffer()
+        self.input_traces = {}
 
     def notify_script_to_stop(self):
         print("MainApp: sending stop command")
@@ -688,8 +740,10 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
         script_preset = ScriptPreset(id=self.id, inputs=self.get_inputs(), output_presets=self.get_output_presets(),
                                      param_presets=self.get_params_presets_recursive(),
                                      run_frequency=self.frequencyLineEdit.text(), time_window=self.timeWindowLineEdit.text(),
-                                     script_path=self.scriptPathLineEdit.text(), is_simulate=self.simulateCheckbox.isChecked())
+                                     script_path=self.scriptPathLineEdit.text(), is_simulate=self.simulateCheckbox.isChecked(),
+                                     input_sampling_rates=self.get_input_sampling_rates())
         Presets().script_presets[self.id] = script_preset
+        Presets().save(is_async=True, dirty_presets=[('script_presets', self.id)])
 
     def import_script_args(self, script_preset: ScriptPreset):
         self.process_locate_script(script_preset.script_path)
@@ -708,7 +762,7 @@ class ScriptingWidget(Poppable, QtWidgets.QWidget):
         self.simulateCheckbox.stateChanged.connect(self.onSimulationCheckboxChanged)
 
         for input_preset_name in script_preset.inputs:
-            self.process_add_input(input_preset_name)
+            self.process_add_input(input_preset_name, script_preset.input_sampling_rates)
         for output_preset in script_preset.output_presets:
             self.process_add_output(**output_preset.__dict__)
 
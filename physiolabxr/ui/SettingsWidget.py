@@ -2,22 +2,25 @@
 
 import pyqtgraph as pg
 from PyQt6 import QtWidgets, uic
+from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtWidgets import QFileDialog, QDialogButtonBox
 
 from physiolabxr.configs import config
 from physiolabxr.configs.GlobalSignals import GlobalSignals
-from physiolabxr.configs.configs import AppConfigs, LinechartVizMode, RecordingFileFormat
-from physiolabxr.presets.Presets import Presets, _load_video_device_presets, _load_audio_device_presets
+from physiolabxr.configs.configs import AppConfigs, LinechartVizMode, RecordingFileFormat, VideoRecordingCodec
+from physiolabxr.presets.Presets import Presets, _load_video_device_presets, _load_audio_device_presets, \
+    save_device_presets_cache, load_device_presets_cache, invalidate_device_presets_cache
 from physiolabxr.presets.PresetEnums import PresetType
 from physiolabxr.startup.startup import load_settings
-from physiolabxr.threadings.ScreenCaptureWorker import get_screen_capture_size
-from physiolabxr.threadings.WaitThreads import start_wait_process
+from physiolabxr.threadings.WaitThreads import start_wait_process, start_wait_for_target_worker
 from physiolabxr.utils.Validators import NoCommaIntValidator
 from physiolabxr.utils.ui_utils import stream_stylesheet
 from physiolabxr.ui.dialogs import dialog_popup
 
 
 class SettingsWidget(QtWidgets.QWidget):
+    monitor_check_finished_signal = pyqtSignal()
+
     def __init__(self, parent):
         super().__init__()
         self.ui = uic.loadUi(AppConfigs()._ui_SettingsWidget, self)
@@ -44,6 +47,8 @@ class SettingsWidget(QtWidgets.QWidget):
         # resolve recording file format
         self.saveFormatComboBox.addItems([member.value for member in RecordingFileFormat.__members__.values()])
         self.saveFormatComboBox.activated.connect(self.recording_file_format_change)
+        self.video_recording_codec_combobox.addItems([member.value for member in VideoRecordingCodec.__members__.values()])
+        self.video_recording_codec_combobox.activated.connect(self.on_video_recording_codec_changed)
 
         self.reset_default_button.clicked.connect(self.reset_default)
         self.reload_stream_preset_button.clicked.connect(self.reload_stream_presets)
@@ -70,17 +75,24 @@ class SettingsWidget(QtWidgets.QWidget):
         self.wait_load_audio_device_process_thread = None
         self.wait_load_audio_device_process_worker = None
 
+        self.wait_monitor_check_worker = None
+        self.wait_monitor_check_thread = None
+        self.monitor_check_finished_signal.connect(self.on_monitor_check_finished)
+
         self.reload_video_device_button.clicked.connect(self.reload_video_device_presets)
         self.reload_audio_device_button.clicked.connect(self.reload_audio_device_presets)
 
+        # devices found at the last startup are shown right away, they are replaced when the discovery in the background finishes
         self.is_first_time_loading_video_devices = True
-
+        Presets().add_video_presets(load_device_presets_cache(PresetType.WEBCAM))
         self.reload_video_device_presets()
 
+        self.is_first_time_loading_audio_devices = True
         if not AppConfigs().is_audio_available:
             self.reload_audio_device_button.setEnabled(False)
             self.reload_audio_device_button.setText("Audio Unavailable")
         else:
+            Presets().add_audio_presets(load_device_presets_cache(PresetType.AUDIO))
             self.reload_audio_device_presets()
 
 
@@ -91,17 +103,20 @@ class SettingsWidget(QtWidgets.QWidget):
         rtn is the return of the process _presets()._load_video_device_process.
 
         """
-        self.parent.remove_stream_widget_with_preset_type(PresetType.WEBCAM)
-        self.parent.remove_stream_widget_with_preset_type(PresetType.MONITOR)
-
         self.reload_video_device_button.setEnabled(False)
         self.reload_video_device_button.setText("Reloading...")
-        Presets().remove_video_presets()
-
-        screen_cap_height, screen_cap_width = get_screen_capture_size()
-        Presets().add_video_preset_by_fields('monitor 0', PresetType.MONITOR, 0, width=screen_cap_width, height=screen_cap_height, nchannels=3)  # always add the monitor 0 preset
+        if self.is_first_time_loading_video_devices:  # keep the cached devices until the discovery finishes, the monitor is being checked since AppConfigs is created
+            self.is_first_time_loading_video_devices = False
+        else:
+            self.parent.remove_stream_widget_with_preset_type(PresetType.WEBCAM)
+            self.parent.remove_stream_widget_with_preset_type(PresetType.MONITOR)
+            Presets().remove_video_presets()
+            AppConfigs().check_monitor_availability()
         GlobalSignals().stream_presets_entry_changed_signal.emit()
 
+        # the monitor 0 preset is added once its screen capture size is known
+        self.wait_monitor_check_worker, self.wait_monitor_check_thread = start_wait_for_target_worker(AppConfigs().is_monitor_check_done, self.monitor_check_finished_signal)
+
         print("settings widget: creating reload video thread")
         if self.wait_load_video_device_process_thread is not None:
             print("settings widget: quitting wait thread")
@@ -116,12 +131,14 @@ class SettingsWidget(QtWidgets.QWidget):
         an outside qthread must monitor the return of this process and call _presets().add_video_presets(rtn), where
         rtn is the return of the process _presets()._load_video_device_process.
         """
-        # remove all existing audio streams if detected
-        self.parent.remove_stream_widget_with_preset_type(PresetType.AUDIO)
-
         self.reload_audio_device_button.setEnabled(False)
         self.reload_audio_device_button.setText("Reloading...")
-        Presets().remove_audio_presets()
+        if self.is_first_time_loading_audio_devices:  # keep the cached devices until the discovery finishes
+            self.is_first_time_loading_audio_devices = False
+        else:
+            # remove all existing audio streams if detected
+            self.parent.remove_stream_widget_with_preset_type(PresetType.AUDIO)
+            Presets().remove_audio_presets()
 
         # _presets().add_video_preset_by_fields('monitor 0', PresetType.MONITOR, 0)  # always add the monitor 0 preset
 
@@ -144,14 +161,27 @@ class SettingsWidget(QtWidgets.QWidget):
         self.wait_load_audio_device_process_worker, self.wait_load_audio_device_process_thread = start_wait_process(_load_audio_device_presets, finish_call_back=self.on_audio_device_preset_reloaded)
 
 
+    def on_monitor_check_finished(self):
+        screen_capture_size = AppConfigs().get_screen_capture_size()
+        if screen_capture_size is not None:
+            screen_cap_height, screen_cap_width = screen_capture_size
+            Presets().add_video_preset_by_fields('monitor 0', PresetType.MONITOR, 0, width=screen_cap_width, height=screen_cap_height, nchannels=3)  # always add the monitor 0 preset
+            GlobalSignals().stream_presets_entry_changed_signal.emit()
+        else:
+            print(f"settings widget: screen capture is not available: {AppConfigs().monitor_error_message}")
+
     def on_video_device_preset_reloaded(self, video_presets):
+        Presets().remove_presets_by_type(PresetType.WEBCAM)  # cached cameras that are no longer found
         Presets().add_video_presets(video_presets)
+        save_device_presets_cache(PresetType.WEBCAM, video_presets)
         GlobalSignals().stream_presets_entry_changed_signal.emit()
         self.reload_video_device_button.setEnabled(True)
         self.reload_video_device_button.setText("Reload Video Devices")
 
     def on_audio_device_preset_reloaded(self, audio_presets):
+        Presets().remove_audio_presets()  # cached audio devices that are no longer found
         Presets().add_audio_presets(audio_presets)
+        save_device_presets_cache(PresetType.AUDIO, audio_presets)
         GlobalSignals().stream_presets_entry_changed_signal.emit()
         self.reload_audio_device_button.setEnabled(True)
         self.reload_audio_device_button.setText("Reload Audio Devices")
@@ -159,6 +189,7 @@ class SettingsWidget(QtWidgets.QWidget):
     def load_settings_to_ui(self):
         self.linechart_viz_mode_combobox.setCurrentText(AppConfigs().linechart_viz_mode.value)
         self.saveFormatComboBox.setCurrentText(AppConfigs().recording_file_format.value)
+        self.video_recording_codec_combobox.setCurrentText(AppConfigs().video_recording_codec.value)
 
     def switch_to_tab(self, tab_name: str):
         for index in range(self.settings_tabs.count()):
@@ -202,6 +233,10 @@ class SettingsWidget(QtWidgets.QWidget):
         print(f"recording_file_format_change: {AppConfigs().recording_file_format}")
         self.parent.recording_tab.update_ui_save_file()
 
+    def on_video_recording_codec_changed(self):
+        AppConfigs().video_recording_codec = VideoRecordingCodec(self.video_recording_codec_combobox.currentText())
+        print(f"video_recording_codec_change: {AppConfigs().video_recording_codec}")
+
     def reset_default(self):
         # marked for refactor
         config.settings.clear()
@@ -211,6 +246,7 @@ class SettingsWidget(QtWidgets.QWidget):
         self.set_recording_file_location(config.DEFAULT_DATA_DIR)
 
         AppConfigs().revert_to_default()
+        invalidate_device_presets_cache()
 
         self.load_settings_to_ui()
 
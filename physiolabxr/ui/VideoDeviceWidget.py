@@ -10,7 +10,8 @@ from PyQt6.QtCore import QTimer
 import physiolabxr.threadings.ScreenCaptureWorker
 import physiolabxr.threadings.WebcamWorker
 from physiolabxr.configs.configs import AppConfigs
-from physiolabxr.presets.presets_utils import get_video_scale, get_video_channel_order, is_video_webcam, get_video_device_id
+from physiolabxr.presets.presets_utils import get_video_scale, get_video_channel_order, is_video_webcam, get_video_device_id, \
+    get_video_capture_region
 from physiolabxr.ui.PoppableWidget import Poppable
 from physiolabxr.ui.VideoDeviceOptions import VideoDeviceOptions
 from physiolabxr.ui.dialogs import dialog_popup
@@ -68,7 +69,7 @@ class VideoDeviceWidget(Poppable, QtWidgets.QWidget):
         if self.is_webcam:
             self.worker = physiolabxr.threadings.WebcamWorker.WebcamWorker(get_video_device_id(video_device_name), video_scale, channel_order)
         else:
-            self.worker = physiolabxr.threadings.ScreenCaptureWorker.ScreenCaptureWorker(video_device_name, video_scale, channel_order)
+            self.worker = physiolabxr.threadings.ScreenCaptureWorker.ScreenCaptureWorker(video_device_name, video_scale, channel_order, get_video_capture_region(video_device_name))
         self.worker.change_pixmap_signal.connect(self.visualize)
         self.worker.moveToThread(self.worker_thread)
 
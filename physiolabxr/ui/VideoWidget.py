@@ -6,7 +6,8 @@ import pyqtgraph as pg
 
 from physiolabxr.configs.configs import AppConfigs
 from physiolabxr.presets.PresetEnums import PresetType
-from physiolabxr.presets.presets_utils import get_video_scale, get_video_channel_order, get_video_device_id
+from physiolabxr.presets.presets_utils import get_video_scale, get_video_channel_order, get_video_device_id, \
+    get_video_capture_region
 from physiolabxr.ui.BaseStreamWidget import BaseStreamWidget
 from physiolabxr.ui.VideoDeviceOptions import VideoDeviceOptions
 from physiolabxr.threadings.ScreenCaptureWorker import ScreenCaptureWorker
@@ -36,7 +37,7 @@ class VideoWidget(BaseStreamWidget):
         if self.video_preset_type == PresetType.WEBCAM:
             self.worker = WebcamWorker(get_video_device_id(video_device_name), video_scale, channel_order)
         else:
-            self.worker = ScreenCaptureWorker(video_device_name, video_scale, channel_order)
+            self.worker = ScreenCaptureWorker(video_device_name, video_scale, channel_order, get_video_capture_region(video_device_name))
         self.connect_worker(self.worker, False)
         self.is_image_fitted_to_frame = False
         self.data_timer.start()
@@ -51,15 +52,19 @@ class VideoWidget(BaseStreamWidget):
     def process_stream_data(self, cam_id_cv_img_timestamp):
         self.viz_times.append(time.time())
         image, timestamp = cam_id_cv_img_timestamp["frame"], cam_id_cv_img_timestamp["timestamp"]
-        image = np.swapaxes(image, 0, 1)
-        self.image_item.setImage(image)
+        self.image_item.setImage(image)  # the workers emit frames already in (width, height, channels)
 
         if not self.is_image_fitted_to_frame:
             self.plot_widget.setXRange(0, image.shape[0])
             self.plot_widget.setYRange(0, image.shape[1])
             self.is_image_fitted_to_frame = True
+        fps_text = 'fps: {:.2f}'.format(self.get_fps())
+        if "dropped_frames" in cam_id_cv_img_timestamp:  # only the webcam worker drops frames
+            fps_text += ', dropped: {}, late: {}'.format(cam_id_cv_img_timestamp["dropped_frames"], cam_id_cv_img_timestamp["late_frames"])
+        self.fs_label.setText(fps_text)
+        self.ts_label.setText('timestamp: {:.3f}'.format(timestamp))
 
-        data_dict = {"stream_name": self.stream_name, "frames": np.expand_dims(image.reshape(-1), -1), "timestamps": np.array([timestamp])}
+        data_dict = {"stream_name": self.stream_name, "frames": image.reshape(-1, 1), "timestamps": np.array([timestamp])}
         self.main_parent.scripting_tab.forward_data(data_dict)
         self.main_parent.recording_tab.update_camera_screen_buffer(self.stream_name, image, timestamp)
 
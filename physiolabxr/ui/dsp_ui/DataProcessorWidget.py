@@ -462,6 +462,135 @@ class ClutterRemovalWidget(DataProcessorWidget):
         return signal_clutter_ratio
 
 
+class FIRLowpassFilterWidget(DataProcessorWidget):
+    def __init__(self, parent, data_processor=None, adding_data_processor=False):
+        if data_processor is None:
+            data_processor = FIRLowpassFilter()
+            data_processor.fs = float(get_stream_nominal_sampling_rate(parent.stream_name))
+
+        super().__init__(parent, data_processor, adding_data_processor)
+        self.ui = uic.loadUi(AppConfigs()._ui_FIRLowPassFilterWidget, self)
+
+        ####################
+        self.__post_init__()
+
+    def set_data_processor_input_field_value(self):
+        super(FIRLowpassFilterWidget, self).set_data_processor_input_field_value()
+
+        self.cutoffLineEdit.setText(str(self.data_processor.cutoff))
+        self.fsLineEdit.setText(str(self.data_processor.fs))
+        self.numTapsLineEdit.setText(str(self.data_processor.num_taps))
+
+    def set_data_processor_input_field_constrain(self):
+        self.cutoffLineEdit.setValidator(QDoubleValidator())
+        self.fsLineEdit.setValidator(QDoubleValidator())
+        self.numTapsLineEdit.setValidator(NoCommaIntValidator())
+
+    def connect_data_processor_input_field_signal(self):
+        super(FIRLowpassFilterWidget, self).connect_data_processor_input_field_signal()
+        self.cutoffLineEdit.textChanged.connect(self.data_processor_settings_on_changed)
+        self.fsLineEdit.textChanged.connect(self.data_processor_settings_on_changed)
+        self.numTapsLineEdit.textChanged.connect(self.data_processor_settings_on_changed)
+
+    def set_data_processor_params(self):
+        cutoff = self.get_cutoff()
+        fs = self.get_fs()
+        num_taps = self.get_num_taps()
+
+        self.data_processor.set_data_processor_params(cutoff=cutoff, fs=fs, num_taps=num_taps)
+
+    def get_cutoff(self):
+        try:
+            cutoff = abs(float(self.cutoffLineEdit.text()))
+        except ValueError:
+            return 0
+        return cutoff
+
+    def get_fs(self):
+        try:
+            fs = abs(float(self.fsLineEdit.text()))
+        except ValueError:
+            return 0
+        return fs
+
+    def get_num_taps(self):
+        try:
+            num_taps = abs(int(self.numTapsLineEdit.text()))
+        except ValueError:
+            return 0
+        return num_taps
+
+
+class FIRBandpassFilterWidget(DataProcessorWidget):
+    def __init__(self, parent, data_processor=None, adding_data_processor=False):
+        if data_processor is None:
+            data_processor = FIRBandpassFilter()
+            data_processor.fs = float(get_stream_nominal_sampling_rate(parent.stream_name))
+
+        super().__init__(parent, data_processor, adding_data_processor)
+        self.ui = uic.loadUi(AppConfigs()._ui_FIRBandPassFilterWidget, self)
+
+        ####################
+        self.__post_init__()
+
+    def set_data_processor_input_field_value(self):
+        super(FIRBandpassFilterWidget, self).set_data_processor_input_field_value()
+
+        self.lowcutLineEdit.setText(str(self.data_processor.lowcut))
+        self.highcutLineEdit.setText(str(self.data_processor.highcut))
+        self.fsLineEdit.setText(str(self.data_processor.fs))
+        self.numTapsLineEdit.setText(str(self.data_processor.num_taps))
+
+    def set_data_processor_input_field_constrain(self):
+        self.lowcutLineEdit.setValidator(QDoubleValidator())
+        self.highcutLineEdit.setValidator(QDoubleValidator())
+        self.fsLineEdit.setValidator(QDoubleValidator())
+        self.numTapsLineEdit.setValidator(NoCommaIntValidator())
+
+    def connect_data_processor_input_field_signal(self):
+        super(FIRBandpassFilterWidget, self).connect_data_processor_input_field_signal()
+        self.lowcutLineEdit.textChanged.connect(self.data_processor_settings_on_changed)
+        self.highcutLineEdit.textChanged.connect(self.data_processor_settings_on_changed)
+        self.fsLineEdit.textChanged.connect(self.data_processor_settings_on_changed)
+        self.numTapsLineEdit.textChanged.connect(self.data_processor_settings_on_changed)
+
+    def set_data_processor_params(self):
+        lowcut = self.get_lowcut()
+        highcut = self.get_highcut()
+        fs = self.get_fs()
+        num_taps = self.get_num_taps()
+
+        self.data_processor.set_data_processor_params(lowcut=lowcut, highcut=highcut, fs=fs, num_taps=num_taps)
+
+    def get_lowcut(self):
+        try:
+            lowcut = abs(float(self.lowcutLineEdit.text()))
+        except ValueError:
+            return 0
+        return lowcut
+
+    def get_highcut(self):
+        try:
+            highcut = abs(float(self.highcutLineEdit.text()))
+        except ValueError:
+            return 0
+        return highcut
+
+    def get_fs(self):
+        try:
+            fs = abs(float(self.fsLineEdit.text()))
+        except ValueError:
+            return 0
+        return fs
+
+    def get_num_taps(self):
+        try:
+            num_taps = abs(int(self.numTapsLineEdit.text()))
+        except ValueError:
+            return 0
+        return num_taps
+
+
 class DataProcessorWidgetType(Enum):
     NotchFilter = NotchFilterWidget
     ButterworthLowpassFilter = ButterworthLowpassFilterWidget
@@ -469,3 +598,5 @@ class DataProcessorWidgetType(Enum):
     ButterworthBandpassFilter = ButterworthBandPassFilterWidget
     RootMeanSquare = RootMeanSquareWidget
     ClutterRemoval = ClutterRemovalWidget
+    FIRLowpassFilter = FIRLowpassFilterWidget
+    FIRBandpassFilter = FIRBandpassFilterWidget
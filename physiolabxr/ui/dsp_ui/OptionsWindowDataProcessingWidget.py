@@ -6,7 +6,7 @@ from PyQt6.QtCore import Qt
 
 from physiolabxr.configs.configs import AppConfigs
 from physiolabxr.presets.presets_utils import get_group_data_processors, get_stream_data_processor_only_apply_to_visualization, \
-    set_stream_data_processor_only_apply_to_visualization
+    set_stream_data_processor_only_apply_to_visualization, get_group_data_processor_backend, set_group_data_processor_backend
 from physiolabxr.ui.dsp_ui.DataProcessorWidget import DataProcessorWidgetType
 from physiolabxr.utils.dsp_utils.dsp_modules import *
 # class data_processor_widget_type:
@@ -30,21 +30,31 @@ class OptionsWindowDataProcessingWidget(QtWidgets.QWidget):
         self.AddDataProcessorBtn.setIcon(AppConfigs()._icon_add)
 
         self.init_data_processor_combobox()
+        self.init_data_processor_backend_combobox()
 
         # set visualization types
         self.set_data_processor_only_apply_to_visualization_checkbox()
 
         self.DataProcessorsOnlyApplyToVisualizationCheckBox.stateChanged.connect(self.data_processor_only_apply_to_visualization_checkbox_state_changed)
+        self.DataProcessorBackendComboBox.currentIndexChanged.connect(self.data_processor_backend_combobox_changed)
 
 
     def init_data_processor_combobox(self):
         for data_processor_type in DataProcessorType:
             self.DataProcessorComboBox.addItem(data_processor_type.value)
 
+    def init_data_processor_backend_combobox(self):
+        for backend in DataProcessorBackend:
+            self.DataProcessorBackendComboBox.addItem(backend.value)
+
     def set_data_processing_widget_info(self, group_name):
         # set group name
         self.group_name = group_name
 
+        self.DataProcessorBackendComboBox.blockSignals(True)
+        self.DataProcessorBackendComboBox.setCurrentText(get_group_data_processor_backend(self.stream_name, group_name).value)
+        self.DataProcessorBackendComboBox.blockSignals(False)
+
         clear_layout(self.DataProcessorScrollAreaVerticalLayout)
         data_processors = get_group_data_processors(self.stream_name, group_name=group_name)
         for data_processor in data_processors:
@@ -80,7 +90,9 @@ class OptionsWindowDataProcessingWidget(QtWidgets.QWidget):
 
         print('Stream: ', self.stream_name, ' set_data_processor_only_apply_to_visualization_checkbox_state_changed: ', self.DataProcessorsOnlyApplyToVisualizationCheckBox.isChecked())
 
-
-
-
-
+    def data_processor_backend_combobox_changed(self):
+        if self.group_name is None:
+            return
+        backend = DataProcessorBackend(self.DataProcessorBackendComboBox.currentText())
+        set_group_data_processor_backend(self.stream_name, self.group_name, backend)
+        print('Stream: ', self.stream_name, ' group: ', self.group_name, ' data processor backend changed to: ', backend.value)
@@ -47,6 +47,8 @@ scripting_input_widget_shape_label_tooltip = 'The expected shape of this input d
                                              'Second dimension is the number of time points (set by the input time window)'
 scripting_input_widget_button_tooltip = "Remove this input"
 scripting_input_widget_name_label_tooltip = "Name of the input stream"
+scripting_input_widget_sampling_rate_tooltip = 'The sampling rate this input is resampled to for the script. \n' \
+                                               'Leave it empty to receive the stream at its nominal sampling rate'
 
 # StreamGroupView
 CHANNEL_ITEM_IS_DISPLAY_CHANGED = 1
@@ -2,7 +2,6 @@ import os
 import warnings
 from pathlib import Path
 
-import cv2
 import numpy as np
 
 magic = b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f'
@@ -387,6 +386,7 @@ class RNStream:
         frame_size = (data[video_stream_name][0].shape[1], data[video_stream_name][0].shape[0])
         output_path = os.path.join(data_root, '{0}_{1}.avi'.format(data_fn.split('.')[0], video_stream_name)) if output_path == '' else output_path
 
+        import cv2
         out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'DIVX'),frate, frame_size)
 
         for i in range(frame_count):
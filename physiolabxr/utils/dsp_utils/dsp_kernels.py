@@ -0,0 +1,312 @@
+"""
+Whole-buffer kernels of the stateful data processors in dsp_modules.
+
+Each kernel processes a buffer of shape (#channels, #samples) in one call and carries the same state as the data
+processor's process_sample, in the same layout, so that the backends can be switched between buffers. The numpy
+kernels are vectorized over the samples. The numba kernel, run_fused_kernel, runs a chain of data processors in one
+compiled pass over the channels, a single data processor is a chain of one. fir_filter and polyphase_resample are
+the kernels of FIRFilter and PolyphaseResampler, with the numpy kernel only.
+
+numba is optional, the numba kernel is only defined when it can be imported, see is_numba_available.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter, oaconvolve, sosfilt
+
+try:
+    from numba import njit
+    is_numba_available = True
+except ImportError:
+    is_numba_available = False
+
+# the kinds of the stages in run_fused_kernel
+IIR_STAGE = 0
+RMS_STAGE = 1
+CLUTTER_STAGE = 2
+
+
+def _push_history(history, data):
+    """
+    the newest-first history of length history.shape[1] after pushing data
+    @param history: shape = #channels, history length, the newest sample first
+    @param data: shape = #channels, #samples, the oldest sample first
+    """
+    return np.concatenate([history[:, ::-1], data], axis=1)[:, :-history.shape[1] - 1:-1]
+
+
+def sos_filter(data, sos, zi):
+    """
+    filters the buffer with the second-order sections of IIRFilter, starting from its state, which is updated in place
+    @param sos: shape = #sections, 6
+    @param zi: shape = #sections, #channels, 2
+    """
+    output, zi[:] = sosfilt(sos, data, axis=1, zi=zi)
+    return output
+
+
+def window_sums(squares, window_size):
+    """
+    the sums of the sliding windows over the squares, in O(1) per sample. The squares are cut into blocks of the window
+    size, a window is the suffix sum of one block plus the prefix sum of the next. Unlike the difference of a running
+    sum, the sums only add the samples in the window, so a window of small values after large ones is not lost in
+    their rounding error
+    @param squares: shape = #channels, #samples
+    @return: shape = #channels, #samples - window_size + 1, the sums of the windows ending at each sample
+    """
+    num_channels, num_samples = squares.shape
+    num_blocks = -(-num_samples // window_size)
+    blocks = np.zeros((num_channels, num_blocks, window_size))
+    blocks.reshape(num_channels, -1)[:, :num_samples] = squares
+    prefix_sums = np.cumsum(blocks, axis=2).reshape(num_channels, -1)
+    suffix_sums = np.cumsum(blocks[:, :, ::-1], axis=2)[:, :, ::-1]
+    suffix_sums[:, :, 0] = 0  # a window starting at a block is the whole block, in its prefix sum
+    suffix_sums = suffix_sums.reshape(num_channels, -1)
+    return prefix_sums[:, window_size - 1:num_samples] + suffix_sums[:, :num_samples - window_size + 1]
+
+
+def running_rms(data, data_buffer, out=None):
+    """
+    root-mean-square over a sliding window, see window_sums. The window is the data buffer of RootMeanSquare, which
+    is updated in place
+    @param data_buffer: shape = #channels, window length, the newest sample first
+    @param out: the array to write the output to, a new one if None
+    """
+    window_size = data_buffer.shape[1]
+    squares = np.square(np.concatenate([data_buffer[:, ::-1], data], axis=1))
+    data_buffer[:] = _push_history(data_buffer, data)
+    sums = window_sums(squares, window_size)[:, 1:]
+    return np.sqrt(np.divide(sums, window_size, out=sums), out=out)
+
+
+def exponential_smoothing(data, ratio, initial):
+    """
+    clutter[n] = ratio * clutter[n - 1] + (1 - ratio) * data[n], for all samples at once
+    @param initial: shape = #channels, clutter[-1]
+    @return: the clutter of every sample, shape = #channels, #samples
+    """
+    clutter, _ = lfilter([1 - ratio], [1, -ratio], data, axis=1, zi=ratio * initial[:, None])
+    return clutter
+
+
+def clutter_removal(data, ratio, clutter, out=None):
+    """
+    data minus its exponential smoothing, the clutter of ClutterRemoval
+    @param clutter: shape = #channels, the clutter of the last sample, None to start from the first sample
+    @param out: the array to write the output to, a new one if None
+    @return: the output and the clutter of the last sample
+    """
+    if clutter is None:
+        clutter = data[:, 0]
+    clutter = exponential_smoothing(data, ratio, np.asarray(clutter, dtype=float))
+    return np.subtract(data, clutter, out=out), clutter[:, -1].copy()
+
+
+def fir_filter(data, taps, data_buffer, out=None):
+    """
+    filters the buffer with the taps of FIRFilter, starting from its input history, which is updated in place. The
+    convolution is overlap-add, so long filters cost O(log #taps) per sample
+    @param taps: shape = #taps
+    @param data_buffer: shape = #channels, #taps - 1, the newest sample first
+    @param out: the array to write the output to, a new one if None
+    """
+    extended = np.concatenate([data_buffer[:, ::-1], data], axis=1)
+    if data_buffer.shape[1] > 0:
+        data_buffer[:] = _push_history(data_buffer, data)
+    output = oaconvolve(extended, taps[None, :], mode='valid', axes=1)
+    if out is None:
+        return output
+    out[:] = output
+    return out
+
+
+def get_polyphase_taps(taps, up):
+    """
+    the taps of polyphase_resample, phase p has the taps p, p + up, p + 2 * up, ... reversed
+    @return: shape = up, ceil(#taps / up)
+    """
+    num_phase_taps = -(-len(taps) // up)
+    padded_taps = np.zeros(num_phase_taps * up)
+    padded_taps[:len(taps)] = taps
+    return np.ascontiguousarray(padded_taps.reshape(num_phase_taps, up).T[:, ::-1])
+
+
+def polyphase_resample(data, polyphase_taps, data_buffer, next_time, down):
+    """
+    resamples the buffer by up / down, as scipy.signal.upfirdn on the whole stream. The input is upsampled by up,
+    filtered and downsampled by down, without computing the zeros of the upsampling or the dropped samples: the output
+    at upsampled time t is the input history before t // up weighted by the taps of phase t % up.
+    @param polyphase_taps: shape = up, #taps per phase, the taps of the phases, each reversed to run over the history
+    oldest first
+    @param data_buffer: shape = #channels, #taps per phase - 1, the input history, the oldest sample first. Updated in
+    place
+    @param next_time: the upsampled time of the next output, from the first sample of data
+    @return: the output, shape = #channels, #output samples, the upsampled times of the outputs and the next_time of
+    the next buffer
+    """
+    up, num_phase_taps = polyphase_taps.shape
+    num_samples = data.shape[1]
+    num_outputs = max(0, -(-(num_samples * up - next_time) // down))  # the outputs with t // up < #samples
+    times = next_time + down * np.arange(num_outputs)
+    if num_samples == 0:
+        return np.empty((data.shape[0], 0)), times, next_time
+
+    extended = np.concatenate([data_buffer, data], axis=1)
+    windows = sliding_window_view(extended, num_phase_taps, axis=1)  # window i ends at the input sample i
+    output = np.empty((data.shape[0], num_outputs))
+    period = up // np.gcd(up, down)  # the phases of the outputs repeat every period outputs, when the input has moved by step
+    step = period * down // up
+    for offset in range(min(period, num_outputs)):
+        time = times[offset]
+        phase_output = output[:, offset::period]
+        phase_output[:] = windows[:, time // up::step][:, :phase_output.shape[1]] @ polyphase_taps[time % up]
+    if data_buffer.shape[1] > 0:
+        data_buffer[:] = extended[:, extended.shape[1] - data_buffer.shape[1]:]
+    return output, times, next_time + down * num_outputs - num_samples * up
+
+
+if is_numba_available:
+    @njit(cache=True)
+    def _push_row_history(history, row):
+        """
+        same as _push_history, for one channel
+        """
+        num_pushed = min(len(row), len(history))
+        for k in range(len(history) - 1, num_pushed - 1, -1):
+            history[k] = history[k - num_pushed]
+        for k in range(num_pushed):
+            history[k] = row[len(row) - 1 - k]
+
+    @njit(cache=True)
+    def _sos_filter_row(row, sos, zi):
+        """
+        same as sos_filter for one channel, in place. The sections are the inner loop, so that the sections of
+        consecutive samples overlap instead of waiting on each other
+        @param zi: shape = #sections, 2
+        """
+        for n in range(len(row)):
+            x = row[n]
+            for k in range(len(sos)):
+                y = sos[k, 0] * x + zi[k, 0]
+                zi[k, 0] = sos[k, 1] * x - sos[k, 4] * y + zi[k, 1]
+                zi[k, 1] = sos[k, 2] * x - sos[k, 5] * y
+                x = y
+            row[n] = x
+
+    @njit(cache=True)
+    def _rms_row(row, data_buffer):
+        """
+        same as running_rms for one channel, in place
+        """
+        window_size, num_samples = len(data_buffer), len(row)
+        squares = np.empty(window_size + num_samples)
+        for k in range(window_size):
+            squares[k] = data_buffer[window_size - 1 - k] * data_buffer[window_size - 1 - k]
+        for n in range(num_samples):
+            squares[window_size + n] = row[n] * row[n]
+        _push_row_history(data_buffer, row)
+
+        prefix_sums, suffix_sums = np.empty(len(squares)), np.empty(len(squares))
+        total = 0.
+        for k in range(len(squares)):
+            total = squares[k] if k % window_size == 0 else total + squares[k]
+            prefix_sums[k] = total
+        for k in range(len(squares) - 1, -1, -1):
+            total = squares[k] if k == len(squares) - 1 or k % window_size == window_size - 1 else total + squares[k]
+            suffix_sums[k] = total
+        for n in range(num_samples):
+            window_end = window_size + n
+            window_sum = prefix_sums[window_end]
+            if window_end % window_size != window_size - 1:
+                window_sum += suffix_sums[window_end - window_size + 1]
+            row[n] = np.sqrt(window_sum / window_size)
+
+    @njit(cache=True)
+    def _clutter_removal_row(row, ratio, clutter):
+        for n in range(len(row)):
+            clutter[0] = ratio * clutter[0] + (1 - ratio) * row[n]
+            row[n] = row[n] - clutter[0]
+
+    @njit(cache=True)
+    def run_fused_kernel(data, output, kinds, sizes, sos, zis, rms_buffers, clutter_ratios, clutters, clutter_initialized):
+        """
+        runs each channel through all the stages before the next channel, so the intermediate results stay in cache
+        in one row of the output instead of going through a buffer of the whole data per stage. The stage parameters
+        and states are padded to the largest stage, see pack_fused_stages.
+        """
+        output[:] = data
+        for c in range(data.shape[0]):
+            row = output[c]
+            for s in range(len(kinds)):
+                if kinds[s] == IIR_STAGE:
+                    _sos_filter_row(row, sos[s, :sizes[s]], zis[s, c, :sizes[s]])
+                elif kinds[s] == RMS_STAGE:
+                    _rms_row(row, rms_buffers[s, c, :sizes[s]])
+                else:
+                    if not clutter_initialized[s] and len(row) > 0:  # the clutter starts from the first sample
+                        clutters[s, c] = row[0]
+                    _clutter_removal_row(row, clutter_ratios[s], clutters[s, c:c + 1])
+        if data.shape[1] > 0:
+            clutter_initialized[:] = True
+        return output
+
+
+def pack_fused_stages(stages, num_channels):
+    """
+    the arguments of run_fused_kernel after data and output, with the parameters and states of the stages padded to
+    the largest stage
+    @param stages: list of (kind, parameters, states) of the fusable data processors, see
+    DataProcessor.get_fused_stage. The states of a clutter stage is [None] before its first sample
+    """
+    num_stages = len(stages)
+    sizes = np.ones(num_stages, dtype=np.int64)
+    for s, (kind, parameters, states) in enumerate(stages):
+        if kind == IIR_STAGE:
+            sizes[s] = len(parameters[0])
+        elif kind == RMS_STAGE:
+            sizes[s] = states[0].shape[1]
+    num_sections = max([sizes[s] for s, (kind, _, _) in enumerate(stages) if kind == IIR_STAGE], default=1)
+    rms_size = max([sizes[s] for s, (kind, _, _) in enumerate(stages) if kind == RMS_STAGE], default=1)
+
+    kinds = np.array([kind for kind, _, _ in stages], dtype=np.int64)
+    sos, zis = np.zeros((num_stages, num_sections, 6)), np.zeros((num_stages, num_channels, num_sections, 2))
+    rms_buffers = np.zeros((num_stages, num_channels, rms_size))
+    clutter_ratios, clutters = np.zeros(num_stages), np.zeros((num_stages, num_channels))
+    clutter_initialized = np.ones(num_stages, dtype=np.bool_)
+    for s, (kind, parameters, states) in enumerate(stages):
+        if kind == IIR_STAGE:
+            sos[s, :sizes[s]] = parameters[0]
+            zis[s, :, :sizes[s]] = states[0].transpose(1, 0, 2)
+        elif kind == RMS_STAGE:
+            rms_buffers[s, :, :sizes[s]] = states[0]
+        else:
+            clutter_ratios[s] = parameters[0]
+            clutter_initialized[s] = states[0] is not None
+            if clutter_initialized[s]:
+                clutters[s] = states[0]
+    return kinds, sizes, sos, zis, rms_buffers, clutter_ratios, clutters, clutter_initialized
+
+
+def unpack_fused_states(stages, packed):
+    """
+    replaces the states of the stages with the ones run_fused_kernel left in the packed arrays
+    """
+    _, sizes, _, zis, rms_buffers, _, clutters, clutter_initialized = packed
+    for s, (kind, _, states) in enumerate(stages):
+        if kind == IIR_STAGE:
+            states[0] = zis[s, :, :sizes[s]].transpose(1, 0, 2).copy()
+        elif kind == RMS_STAGE:
+            states[0] = rms_buffers[s, :, :sizes[s]].copy()
+        elif clutter_initialized[s]:
+            states[0] = clutters[s].copy()
+
+
+def run_fused_stages(data, stages, out=None):
+    """
+    runs the stages over the data in one call of the numba fused kernel, and updates the stages' states
+    @param data: float64 array, shape = #channels, #samples
+    @param out: the float64 array to write the output to, a new one if None
+    """
+    packed = pack_fused_stages(stages, num_channels=data.shape[0])
+    output = run_fused_kernel(data, np.empty(data.shape) if out is None else out, *packed)
+    unpack_fused_states(stages, packed)
+    return output
@@ -1,9 +1,14 @@
 import numpy as np
-from scipy.signal import butter, freqz, iirnotch, filtfilt
+from scipy.signal import butter, firwin, freqz, iirnotch, filtfilt, sos2tf, tf2sos
 from enum import Enum
+from fractions import Fraction
+from itertools import count
 
 from physiolabxr.exceptions.exceptions import UnsupportedErrorTypeError, DataProcessorEvokeFailedError, \
     DataProcessorInvalidBufferSizeError, DataProcessorInvalidFrequencyError, DaProcessorNotchFilterInvalidQError
+from physiolabxr.utils.dsp_utils import dsp_kernels
+
+_evoke_ids = count(1)
 
 
 class DataProcessorType(Enum):
@@ -13,6 +18,24 @@ class DataProcessorType(Enum):
     ButterworthBandpassFilter = 'ButterworthBandpassFilter'
     RootMeanSquare = 'RootMeanSquare'
     ClutterRemoval = 'ClutterRemoval'
+    FIRLowpassFilter = 'FIRLowpassFilter'
+    FIRBandpassFilter = 'FIRBandpassFilter'
+
+
+class DataProcessorBackend(Enum):
+    """
+    How a group's data processors run over a buffer. The backends give the same output and keep the same states, so a
+    group can switch between them while streaming.
+    """
+    python = 'Per sample'  # process_sample on every sample, the reference
+    numpy = 'NumPy'  # vectorized over the samples of the buffer
+    numba = 'Numba'  # compiled loops, with the consecutive data processors fused into one pass. Falls back to numpy without numba
+
+
+def get_available_backend(backend: DataProcessorBackend):
+    if backend == DataProcessorBackend.numba and not dsp_kernels.is_numba_available:
+        return DataProcessorBackend.numpy
+    return backend
 
 
 # class SubDataProcessor(type):
@@ -28,12 +51,18 @@ class DataProcessor:  # (QObject):
         self.data_processor_activated = False
         self.data_processor_valid = False
         self.channel_num = 0
+        self._evoke_id = 0  # new on every evoke, tells the DSP worker processes when their copy of the data processor is outdated
 
     def process_sample(self, data):
         return data
 
-    def process_buffer(self, data):
+    def process_buffer(self, data, backend: DataProcessorBackend = DataProcessorBackend.python):
         if self.data_processor_valid and self.data_processor_activated:
+            backend = get_available_backend(backend)
+            if backend != DataProcessorBackend.python and data.shape[1] > 0:
+                output_buffer = self.process_buffer_kernel(np.ascontiguousarray(data, dtype=np.float64), use_numba=backend == DataProcessorBackend.numba)
+                if output_buffer is not None:
+                    return output_buffer
             output_buffer = np.empty(shape=data.shape)
             for index in range(0, data.shape[1]):
                 output_buffer[:, index] = self.process_sample(data[:, index])
@@ -41,6 +70,33 @@ class DataProcessor:  # (QObject):
         else:
             return data
 
+    def process_buffer_kernel(self, data, use_numba, out=None):
+        """
+        processes the whole buffer with the kernels in dsp_kernels. The numba kernel is run on the stage from
+        get_fused_stage, override this for the numpy kernel
+        @param out: a float64 array the kernel may write the output to, to save allocating one
+        @return: the output buffer, None if the data processor has no kernel so the buffer is processed per sample
+        """
+        fused_stage = self.get_fused_stage() if use_numba else None
+        if fused_stage is None:
+            return None
+        output_buffer = dsp_kernels.run_fused_stages(data, [fused_stage], out=out)
+        self.set_fused_states(fused_stage[2])
+        return output_buffer
+
+    def get_fused_stage(self):
+        """
+        the stage of this data processor in dsp_kernels.run_fused_kernel, see set_fused_states
+        @return: (stage kind, parameters, states), None if the data processor can't be fused
+        """
+        return None
+
+    def set_fused_states(self, states):
+        """
+        takes the states of the stage from get_fused_stage after the fused kernel has run
+        """
+        pass
+
     def reset_data_processor(self):
         pass
 
@@ -57,6 +113,7 @@ class DataProcessor:  # (QObject):
         pass
 
     def evoke_data_processor(self):
+        self._evoke_id = next(_evoke_ids)
         try:
             self.param_check()
             self.evoke_function()
@@ -91,24 +148,37 @@ class IIRFilter(DataProcessor):
         super().__init__(data_processor_type)
         self._a = None
         self._b = None
-        self._x_tap = None
-        self._y_tap = None
+        self._sos = None  # the filter as second-order sections, shape = #sections, 6
+        self._zi = None  # the state of the sections, shape = #sections, #channels, 2
 
     def process_sample(self, data):
-        # perform realtime filter with tap
-
-        # push x
-        self._x_tap[:, 1:] = self._x_tap[:, : -1]
-        self._x_tap[:, 0] = data
-        # push y
-        self._y_tap[:, 1:] = self._y_tap[:, : -1]
-        # calculate new y
-        self._y_tap[:, 0] = np.sum(np.multiply(self._x_tap, self._b), axis=1) - \
-                            np.sum(np.multiply(self._y_tap[:, 1:], self._a[1:]), axis=1)
-
-        data = self._y_tap[:, 0]
+        # perform realtime filter with the second-order sections, in transposed direct form II as scipy.signal.sosfilt
+        for section, zi in zip(self._sos, self._zi):
+            output = section[0] * data + zi[:, 0]
+            zi[:, 0] = section[1] * data - section[4] * output + zi[:, 1]
+            zi[:, 1] = section[2] * data - section[5] * output
+            data = output
         return data
 
+    def set_sos(self, sos):
+        """
+        sets the filter to the second-order sections, with a zero state. Call this in evoke_function
+        """
+        self._sos = np.asarray(sos, dtype=np.float64)
+        self._b, self._a = sos2tf(self._sos)
+        self._zi = np.zeros((len(self._sos), self.channel_num, 2))
+
+    def process_buffer_kernel(self, data, use_numba, out=None):
+        if use_numba:
+            return super().process_buffer_kernel(data, use_numba, out=out)
+        return dsp_kernels.sos_filter(data, self._sos, self._zi)
+
+    def get_fused_stage(self):
+        return dsp_kernels.IIR_STAGE, (self._sos,), [self._zi]
+
+    def set_fused_states(self, states):
+        self._zi, = states
+
     # def evoke_data_processor(self):
     #     try:
     #         self.evoke_function()
@@ -123,8 +193,7 @@ class IIRFilter(DataProcessor):
         pass
 
     def reset_data_processor(self):
-        self._x_tap.fill(0)
-        self._y_tap.fill(0)
+        self._zi.fill(0)
 
 
 class NotchFilter(IIRFilter):
@@ -141,9 +210,7 @@ class NotchFilter(IIRFilter):
             raise DataProcessorInvalidFrequencyError('w0 must be greater than 0 and less than fs/2 (Niquest Frequency)')
 
     def evoke_function(self):
-        self._b, self._a = iirnotch(w0=self.w0, Q=self.Q, fs=self.fs)
-        self._x_tap = np.zeros((self.channel_num, len(self._b)))
-        self._y_tap = np.zeros((self.channel_num, len(self._a)))
+        self.set_sos(tf2sos(*iirnotch(w0=self.w0, Q=self.Q, fs=self.fs)))
 
     def set_data_processor_params(self, w0, Q, fs):
         self.w0 = w0
@@ -174,12 +241,11 @@ class ButterworthBandpassFilter(IIRFilter):
             raise DataProcessorInvalidFrequencyError('cutoff must be less than fs/2 (Niquest Frequency)')
 
     def evoke_function(self):
-        self._b, self._a = self.butter_bandpass(lowcut=self.lowcut,
-                                                highcut=self.highcut,
-                                                fs=self.fs,
-                                                order=self.order)
-        self._x_tap = np.zeros((self.channel_num, len(self._b)))
-        self._y_tap = np.zeros((self.channel_num, len(self._a)))
+        self.set_sos(self.butter_bandpass(lowcut=self.lowcut,
+                                          highcut=self.highcut,
+                                          fs=self.fs,
+                                          order=self.order,
+                                          output='sos'))
 
     def set_data_processor_params(self, lowcut, highcut, fs, order):
         self.lowcut = lowcut
@@ -189,12 +255,11 @@ class ButterworthBandpassFilter(IIRFilter):
 
         # self.evoke_data_processor()
 
-    def butter_bandpass(self, lowcut, highcut, fs, order):
+    def butter_bandpass(self, lowcut, highcut, fs, order, output='ba'):
         nyq = 0.5 * fs
         low = lowcut / nyq
         high = highcut / nyq
-        b, a = butter(order, [low, high], btype='band')
-        return b, a
+        return butter(order, [low, high], btype='band', output=output)
 
 
 class ButterworthLowpassFilter(IIRFilter):
@@ -217,20 +282,17 @@ class ButterworthLowpassFilter(IIRFilter):
             raise DataProcessorInvalidFrequencyError('cutoff must be less than fs/2 (Niquest Frequency) ')
 
     def evoke_function(self):
-        self._b, self._a = self.butter_lowpass(cutoff=self.cutoff, fs=self.fs, order=self.order)
-        self._x_tap = np.zeros((self.channel_num, len(self._b)))
-        self._y_tap = np.zeros((self.channel_num, len(self._a)))
+        self.set_sos(self.butter_lowpass(cutoff=self.cutoff, fs=self.fs, order=self.order, output='sos'))
 
     def set_data_processor_params(self, cutoff, fs, order):
         self.cutoff = cutoff
         self.fs = fs
         self.order = order
 
-    def butter_lowpass(self, cutoff, fs, order):
+    def butter_lowpass(self, cutoff, fs, order, output='ba'):
         nyq = 0.5 * fs
         normal_cutoff = cutoff / nyq
-        b, a = butter(order, normal_cutoff, btype='low')
-        return b, a
+        return butter(order, normal_cutoff, btype='low', output=output)
 
 
 class ButterworthHighpassFilter(IIRFilter):
@@ -253,20 +315,17 @@ class ButterworthHighpassFilter(IIRFilter):
             raise DataProcessorInvalidFrequencyError('cutoff must be less than fs/2 (Niquest Frequency) ')
 
     def evoke_function(self):
-        self._b, self._a = self.butter_highpass(cutoff=self.cutoff, fs=self.fs, order=self.order)
-        self._x_tap = np.zeros((self.channel_num, len(self._b)))
-        self._y_tap = np.zeros((self.channel_num, len(self._a)))
+        self.set_sos(self.butter_highpass(cutoff=self.cutoff, fs=self.fs, order=self.order, output='sos'))
 
     def set_data_processor_params(self, cutoff, fs, order):
         self.cutoff = cutoff
         self.fs = fs
         self.order = order
 
-    def butter_highpass(self, cutoff, fs, order):
+    def butter_highpass(self, cutoff, fs, order, output='ba'):
         nyq = 0.5 * fs
         normal_cutoff = cutoff / nyq
-        b, a = butter(order, normal_cutoff, btype='high')
-        return b, a
+        return butter(order, normal_cutoff, btype='high', output=output)
 
 
 class RootMeanSquare(DataProcessor):
@@ -301,6 +360,17 @@ class RootMeanSquare(DataProcessor):
         # print(vrms)
         return data
 
+    def process_buffer_kernel(self, data, use_numba, out=None):
+        if use_numba:
+            return super().process_buffer_kernel(data, use_numba, out=out)
+        return dsp_kernels.running_rms(data, self._data_buffer, out=out)
+
+    def get_fused_stage(self):
+        return dsp_kernels.RMS_STAGE, (), [self._data_buffer]
+
+    def set_fused_states(self, states):
+        self._data_buffer, = states
+
     def reset_data_processor(self):
         self._data_buffer.fill(0)
 
@@ -327,6 +397,18 @@ class ClutterRemoval(DataProcessor):
         data = data - self._clutter
         return data
 
+    def process_buffer_kernel(self, data, use_numba, out=None):
+        if use_numba:
+            return super().process_buffer_kernel(data, use_numba, out=out)
+        output, self._clutter = dsp_kernels.clutter_removal(data, self.signal_clutter_ratio, self._clutter, out=out)
+        return output
+
+    def get_fused_stage(self):
+        return dsp_kernels.CLUTTER_STAGE, (self.signal_clutter_ratio,), [self._clutter]
+
+    def set_fused_states(self, states):
+        self._clutter, = states
+
     def set_initial_clutter(self, clutter):
         self._clutter = clutter
 
@@ -334,21 +416,194 @@ class ClutterRemoval(DataProcessor):
         self._clutter = None
 
 
+class FIRFilter(DataProcessor):
+
+    def __init__(self, data_processor_type: DataProcessorType):
+        super().__init__(data_processor_type)
+        self._taps = None
+        self._data_buffer = np.empty((0, 0))  # the last #taps - 1 input samples, shape = #channels, #taps - 1, the newest sample first
+
+    def process_sample(self, data):
+        output = self._taps[0] * data + self._data_buffer @ self._taps[1:]
+        if self._data_buffer.shape[1] > 0:
+            self._data_buffer[:, 1:] = self._data_buffer[:, :-1]
+            self._data_buffer[:, 0] = data
+        return output
+
+    def set_taps(self, taps):
+        """
+        sets the filter to the taps, with a zero history. Call this in evoke_function
+        """
+        self._taps = np.asarray(taps, dtype=np.float64)
+        self._data_buffer = np.zeros((self.channel_num, len(self._taps) - 1))
+
+    def process_buffer_kernel(self, data, use_numba, out=None):
+        # the overlap-add convolution of the numpy kernel beats a compiled loop over the taps, numba uses it as well
+        return dsp_kernels.fir_filter(data, self._taps, self._data_buffer, out=out)
+
+    def param_check_num_taps(self):
+        if self.num_taps <= 0:
+            raise DataProcessorInvalidBufferSizeError('num_taps must be greater than 0 ')
+        if self.fs <= 0:
+            raise DataProcessorInvalidFrequencyError('fs must be greater than 0 ')
+
+    def reset_data_processor(self):
+        self._data_buffer.fill(0)
+
+
+class FIRLowpassFilter(FIRFilter):
+    def __init__(self, cutoff: float = 0, fs: float = 0, num_taps: int = 101):
+        super().__init__(data_processor_type=DataProcessorType.FIRLowpassFilter)
+        self.cutoff = cutoff
+        self.fs = fs
+        self.num_taps = num_taps
+
+    def param_check(self):
+        self.param_check_num_taps()
+        if self.cutoff <= 0:
+            raise DataProcessorInvalidFrequencyError('cutoff must be greater than 0 ')
+        if self.cutoff >= self.fs / 2:
+            raise DataProcessorInvalidFrequencyError('cutoff must be less than fs/2 (Niquest Frequency) ')
+
+    def evoke_function(self):
+        self.set_taps(firwin(self.num_taps, self.cutoff, fs=self.fs))
+
+    def set_data_processor_params(self, cutoff, fs, num_taps):
+        self.cutoff = cutoff
+        self.fs = fs
+        self.num_taps = num_taps
+
+
+class FIRBandpassFilter(FIRFilter):
+    def __init__(self, lowcut: float = 5, highcut: float = 10, fs: float = 0, num_taps: int = 101):
+        super().__init__(data_processor_type=DataProcessorType.FIRBandpassFilter)
+        self.lowcut = lowcut
+        self.highcut = highcut
+        self.fs = fs
+        self.num_taps = num_taps
+
+    def param_check(self):
+        self.param_check_num_taps()
+        if self.lowcut <= 0 or self.highcut <= 0:
+            raise DataProcessorInvalidFrequencyError('lowcut and highcut must be greater than 0')
+        if self.lowcut >= self.highcut:
+            raise DataProcessorInvalidFrequencyError('lowcut must be less than highcut')
+        if self.highcut >= self.fs / 2:
+            raise DataProcessorInvalidFrequencyError('cutoff must be less than fs/2 (Niquest Frequency)')
+
+    def evoke_function(self):
+        self.set_taps(firwin(self.num_taps, [self.lowcut, self.highcut], pass_zero=False, fs=self.fs))
+
+    def set_data_processor_params(self, lowcut, highcut, fs, num_taps):
+        self.lowcut = lowcut
+        self.highcut = highcut
+        self.fs = fs
+        self.num_taps = num_taps
+
+
+class PolyphaseResampler:
+    """
+    Resamples a stream from fs to target_fs in frames, with the filter history carried between the frames, so the
+    resampled frames join up as if the whole stream was resampled at once. The rate is changed by up / down, the
+    closest fraction to target_fs / fs with a denominator of at most max_denominator, with the anti-aliasing filter of
+    scipy.signal.resample_poly.
+
+    Unlike the data processors, the resampler changes the number of samples. The frames of a stream share their
+    timestamps across the groups, so the resampler is not a group's data processor, it resamples whole frames with
+    their timestamps, as the scripts' inputs, see ScriptingWidget.
+    """
+    def __init__(self, fs: float, target_fs: float, channel_num: int, max_denominator: int = 1000):
+        if fs <= 0 or target_fs <= 0:
+            raise DataProcessorInvalidFrequencyError('fs and target_fs must be greater than 0')
+        ratio = Fraction(target_fs / fs).limit_denominator(max_denominator)
+        if ratio == 0:
+            raise DataProcessorInvalidFrequencyError(f'target_fs must be at least fs/{max_denominator}')
+        self.up, self.down = ratio.numerator, ratio.denominator
+        self.fs = fs
+        self.target_fs = fs * self.up / self.down
+        self.channel_num = channel_num
+
+        max_rate = max(self.up, self.down)
+        if max_rate == 1:  # the same rate, passes the stream through
+            self._delay, taps = 0, np.ones(1)
+        else:
+            self._delay = 10 * max_rate  # the group delay of the filter, in upsampled samples
+            taps = firwin(2 * self._delay + 1, 1 / max_rate, window=('kaiser', 5.0)) * self.up
+        self._polyphase_taps = dsp_kernels.get_polyphase_taps(taps, self.up)
+        self._timestamp_buffer_size = self._delay // self.up + 2  # reaches back to the input time of the delayed outputs
+        self.reset()
+
+    def reset(self):
+        self._data_buffer = np.zeros((self.channel_num, self._polyphase_taps.shape[1] - 1))
+        self._next_time = 0
+        self._timestamp_buffer = None
+
+    def process_buffer(self, data, timestamps):
+        """
+        @param data: shape = #channels, #samples
+        @param timestamps: shape = #samples
+        @return: the resampled data and timestamps. The timestamps are shifted back by the delay of the filter, so the
+        output stays aligned with the other streams
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        output, times, self._next_time = dsp_kernels.polyphase_resample(np.asarray(data, dtype=np.float64), self._polyphase_taps,
+                                                                        self._data_buffer, self._next_time, self.down)
+        if len(timestamps) == 0:
+            return output, np.empty(0)
+        if self._timestamp_buffer is None:  # extrapolates the timestamps before the stream at the nominal rate
+            self._timestamp_buffer = timestamps[0] - np.arange(self._timestamp_buffer_size, 0, -1) / self.fs
+        extended_timestamps = np.concatenate([self._timestamp_buffer, timestamps])
+        output_timestamps = np.interp((times - self._delay) / self.up + self._timestamp_buffer_size,
+                                      np.arange(len(extended_timestamps)), extended_timestamps)
+        self._timestamp_buffer = extended_timestamps[-self._timestamp_buffer_size:]
+        return output, output_timestamps
+
+
 data_processor_lookup_table = {
     DataProcessorType.NotchFilter: NotchFilter,
     DataProcessorType.ButterworthLowpassFilter: ButterworthLowpassFilter,
     DataProcessorType.ButterworthHighpassFilter: ButterworthHighpassFilter,
     DataProcessorType.ButterworthBandpassFilter: ButterworthBandpassFilter,
     DataProcessorType.RootMeanSquare: RootMeanSquare,
-    DataProcessorType.ClutterRemoval: ClutterRemoval
+    DataProcessorType.ClutterRemoval: ClutterRemoval,
+    DataProcessorType.FIRLowpassFilter: FIRLowpassFilter,
+    DataProcessorType.FIRBandpassFilter: FIRBandpassFilter
 }
 
 
-def run_data_processors(data, data_processor_pipeline: list[DataProcessor]):
+def run_data_processors(data, data_processor_pipeline: list[DataProcessor], backend: DataProcessorBackend = DataProcessorBackend.python):
+    backend = get_available_backend(backend)
+    if backend == DataProcessorBackend.numba and data.shape[1] > 0:
+        return _run_fused_data_processors(data, data_processor_pipeline)
     for data_processor in data_processor_pipeline:
         # if data_processor.data_processor_valid and data_processor.data_processor_activated:
-        data = data_processor.process_buffer(data)
+        data = data_processor.process_buffer(data, backend=backend)
+
+    return data
+
 
+def _run_fused_data_processors(data, data_processor_pipeline: list[DataProcessor]):
+    """
+    the runs of consecutive data processors that can be fused are each run in one pass of the fused kernel, the
+    inactive data processors in between don't break a run
+    """
+    fused_data_processors = []
+    for data_processor in list(data_processor_pipeline) + [None]:
+        if data_processor is not None and not (data_processor.data_processor_valid and data_processor.data_processor_activated):
+            continue
+        fused_stage = None if data_processor is None else data_processor.get_fused_stage()
+        if fused_stage is not None:
+            fused_data_processors.append((data_processor, fused_stage))
+            continue
+        if len(fused_data_processors) == 1:
+            data = fused_data_processors[0][0].process_buffer(data, backend=DataProcessorBackend.numba)
+        elif len(fused_data_processors) > 1:
+            data = dsp_kernels.run_fused_stages(np.ascontiguousarray(data, dtype=np.float64), [fused_stage for _, fused_stage in fused_data_processors])
+            for fused_data_processor, (_, _, states) in fused_data_processors:
+                fused_data_processor.set_fused_states(states)
+        fused_data_processors = []
+        if data_processor is not None:
+            data = data_processor.process_buffer(data, backend=DataProcessorBackend.numba)
     return data
 
 # if __name__ == '__main__':
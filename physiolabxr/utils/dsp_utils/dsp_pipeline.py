@@ -0,0 +1,216 @@
+"""
+Compiled data processor pipelines.
+
+run_data_processors runs a group's data processors one after another, each making a pass over the whole buffer into a
+new output. DataProcessorPipeline compiles the group's list of data processors into fewer stages:
+    - consecutive IIR filters are merged into one cascade of their second-order sections, filtered in one call
+    - with the numba backend, consecutive fusable data processors, i.e., the filter cascades, RootMeanSquare and
+    ClutterRemoval, run in one pass of the fused kernel
+    - the stages write to scratch buffers kept across runs, instead of allocating an output per stage
+The pipeline is recompiled when the list, the backend, or a data processor's activation or parameters change. The
+states stay in the data processors, so the compiled and uncompiled runs can be mixed.
+"""
+import time
+
+import numpy as np
+from scipy.signal import sosfilt
+
+from physiolabxr.utils.dsp_utils import dsp_kernels
+from physiolabxr.utils.dsp_utils.dsp_modules import DataProcessor, DataProcessorBackend, IIRFilter, get_available_backend
+
+
+class _SOSCascade:
+    """
+    consecutive IIR filters as one cascade of second-order sections. It has the fused stage interface of a data
+    processor, so a cascade is fused as one filter
+    """
+    def __init__(self, filters: list[IIRFilter]):
+        self.filters = filters
+        self.sos = np.concatenate([_filter._sos for _filter in filters])
+        section_ends = np.cumsum([len(_filter._sos) for _filter in filters])
+        self.section_slices = [slice(end - len(_filter._sos), end) for _filter, end in zip(filters, section_ends)]
+        self._zi = None
+
+    def get_zi(self):
+        """
+        the states of the filters, concatenated
+        """
+        num_channels = self.filters[0]._zi.shape[1]
+        if self._zi is None or self._zi.shape[1] != num_channels:
+            self._zi = np.empty((len(self.sos), num_channels, 2))
+        for _filter, section_slice in zip(self.filters, self.section_slices):
+            self._zi[section_slice] = _filter._zi
+        return self._zi
+
+    def set_zi(self, zi):
+        for _filter, section_slice in zip(self.filters, self.section_slices):
+            _filter._zi[:] = zi[section_slice]
+
+    def get_fused_stage(self):
+        return dsp_kernels.IIR_STAGE, (self.sos,), [self.get_zi()]
+
+    def set_fused_states(self, states):
+        self.set_zi(states[0])
+
+
+class _Stage:
+    def __init__(self, data_processors, name):
+        self.data_processors = data_processors
+        self.name = name
+
+    def run(self, data, out):
+        """
+        @param out: a scratch buffer of the data's shape, the stage may write its output to it
+        @return: the output, out or a new array
+        """
+        raise NotImplementedError
+
+
+class _CascadeStage(_Stage):
+    def __init__(self, cascade: _SOSCascade):
+        super().__init__(cascade.filters, name=f"SOS cascade ({', '.join(_get_name(_filter) for _filter in cascade.filters)})")
+        self.cascade = cascade
+
+    def run(self, data, out):
+        output, zf = sosfilt(self.cascade.sos, data, axis=1, zi=self.cascade.get_zi())
+        self.cascade.set_zi(zf)
+        return output
+
+
+class _FusedStage(_Stage):
+    def __init__(self, fusables):
+        data_processors = [data_processor for fusable in fusables for data_processor in (fusable.filters if isinstance(fusable, _SOSCascade) else [fusable])]
+        super().__init__(data_processors, name=f"fused ({', '.join(_get_name(data_processor) for data_processor in data_processors)})")
+        self.fusables = fusables
+
+    def run(self, data, out):
+        stages = [fusable.get_fused_stage() for fusable in self.fusables]
+        output = dsp_kernels.run_fused_stages(data, stages, out=out)
+        for fusable, (_, _, states) in zip(self.fusables, stages):
+            fusable.set_fused_states(states)
+        return output
+
+
+class _KernelStage(_Stage):
+    def __init__(self, data_processor: DataProcessor):
+        super().__init__([data_processor], name=_get_name(data_processor))
+
+    def run(self, data, out):
+        return self.data_processors[0].process_buffer_kernel(data, use_numba=False, out=out)
+
+
+class _DataProcessorStage(_Stage):
+    """
+    a data processor without a kernel for the backend, run by its process_buffer
+    """
+    def __init__(self, data_processor: DataProcessor, backend):
+        super().__init__([data_processor], name=_get_name(data_processor))
+        self.backend = backend
+
+    def run(self, data, out):
+        return self.data_processors[0].process_buffer(data, backend=self.backend)
+
+
+def _get_name(data_processor):
+    return type(data_processor).__name__
+
+
+def _get_version(data_processor):
+    return id(data_processor), getattr(data_processor, '_evoke_id', 0), data_processor.data_processor_valid, data_processor.data_processor_activated
+
+
+class DataProcessorPipeline:
+    """
+    A group's data processors compiled into stages, see the module docstring.
+
+    The pipeline keeps a reference to the list of data processors, so that adding and removing data processors in the
+    group's list is seen on the next run.
+    """
+    def __init__(self, data_processors: list[DataProcessor], profile=False):
+        """
+        @param data_processors: the group's list of data processors
+        @param profile: whether to time the stages, see get_stage_timings
+        """
+        self.data_processors = data_processors
+        self.profile = profile
+        self._version = None
+        self._stages = []
+        self._scratch_buffers = [np.empty(0), np.empty(0)]
+        self._stage_times = np.zeros(0)
+        self._last_stage_times = np.zeros(0)
+        self._num_runs = 0
+
+    def run(self, data, backend: DataProcessorBackend = DataProcessorBackend.numpy):
+        """
+        same as dsp_modules.run_data_processors with the pipeline compiled for the backend. The output may be one of
+        the scratch buffers, which is only valid until the next run
+        """
+        self._compile(get_available_backend(backend))
+        if len(self._stages) == 0 or data.shape[1] == 0:
+            return data
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        for stage_index, stage in enumerate(self._stages):
+            start_time = time.perf_counter() if self.profile else None
+            data = stage.run(data, self._get_scratch_buffer(stage_index % 2, data.shape))
+            if self.profile:
+                self._last_stage_times[stage_index] = time.perf_counter() - start_time
+        if self.profile:
+            self._stage_times += self._last_stage_times
+            self._num_runs += 1
+        return data
+
+    def get_stage_names(self):
+        return [stage.name for stage in self._stages]
+
+    def get_stage_timings(self):
+        """
+        the times of the stages when the pipeline is profiling, since it was last compiled
+        @return: list of (stage name, mean time, last time), the times are in seconds
+        """
+        return [(stage.name, total_time / max(self._num_runs, 1), last_time) for stage, total_time, last_time in zip(self._stages, self._stage_times, self._last_stage_times)]
+
+    def _compile(self, backend):
+        version = backend, tuple(_get_version(data_processor) for data_processor in self.data_processors)
+        if version == self._version:
+            return
+        self._version = version
+
+        active_data_processors = [data_processor for data_processor in self.data_processors if data_processor.data_processor_valid and data_processor.data_processor_activated]
+        items = []  # the data processors, with consecutive IIR filters merged into cascades
+        for data_processor in active_data_processors:
+            if backend != DataProcessorBackend.python and isinstance(data_processor, IIRFilter):
+                if len(items) > 0 and isinstance(items[-1], list):
+                    items[-1].append(data_processor)
+                else:
+                    items.append([data_processor])
+            else:
+                items.append(data_processor)
+        items = [_SOSCascade(item) if isinstance(item, list) else item for item in items]
+
+        self._stages = []
+        fusables = []
+        for item in items + [None]:
+            if backend == DataProcessorBackend.numba and item is not None and item.get_fused_stage() is not None:
+                fusables.append(item)
+                continue
+            if len(fusables) > 0:
+                self._stages.append(_FusedStage(fusables))
+                fusables = []
+            if isinstance(item, _SOSCascade):
+                self._stages.append(_CascadeStage(item))
+            elif item is not None and backend == DataProcessorBackend.numpy and item.get_fused_stage() is not None:  # has a numpy kernel
+                self._stages.append(_KernelStage(item))
+            elif item is not None:
+                self._stages.append(_DataProcessorStage(item, backend))
+        self._stage_times = np.zeros(len(self._stages))
+        self._last_stage_times = np.zeros(len(self._stages))
+        self._num_runs = 0
+
+    def _get_scratch_buffer(self, index, shape):
+        """
+        a contiguous array of the shape, on a buffer that only grows
+        """
+        size = int(np.prod(shape))
+        if len(self._scratch_buffers[index]) < size:
+            self._scratch_buffers[index] = np.empty(2 * size)
+        return self._scratch_buffers[index][:size].reshape(shape)
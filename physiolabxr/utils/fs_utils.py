@@ -20,16 +20,15 @@ def get_json_file_paths_from_multiple_dir(dir_paths: List[str], flatten=False) -
 
 
 def get_file_changes(dir_path, last_mod_times):
-    files = os.listdir(dir_path)
     current_mod_times = {}
     modifed_files = []
-    for file_name in files:
-        file_path = os.path.join(dir_path, file_name)
-        if os.path.isfile(file_path) and file_name.endswith('.json'):
-            current_mod_times[file_name] = os.path.getmtime(file_path)
-            if file_name not in last_mod_times or last_mod_times[file_name] != current_mod_times[file_name]:
-                print('file {} has been modified'.format(file_name))
-                modifed_files.append(file_path)
+    with os.scandir(dir_path) as entries:  # the directory entries carry the file type, only the json files are stat'ed
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                current_mod_times[entry.name] = entry.stat().st_mtime
+                if entry.name not in last_mod_times or last_mod_times[entry.name] != current_mod_times[entry.name]:
+                    print('file {} has been modified'.format(entry.name))
+                    modifed_files.append(entry.path)
     return modifed_files, current_mod_times
 
 def get_file_changes_multiple_dir(dir_paths, last_mod_times, flatten=False):
@@ -1,4 +1,3 @@
-import cv2
 import numpy
 
 from physiolabxr.presets.PlotConfig import ImageFormat, ChannelFormat
@@ -6,6 +5,7 @@ from physiolabxr.presets.PresetEnums import VideoDeviceChannelOrder
 
 
 def process_image(image, rgb_channel_order: VideoDeviceChannelOrder=None, scale: float=1.0):
+    import cv2
     if rgb_channel_order is not None:
         if rgb_channel_order == VideoDeviceChannelOrder.BGR:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
@@ -20,6 +20,7 @@ def process_image(image, rgb_channel_order: VideoDeviceChannelOrder=None, scale:
 
 
 def rotate_image(image, rotation_clockwise_degree: int=0):
+    import cv2
     if rotation_clockwise_degree==0:
         return image
     elif rotation_clockwise_degree==90:
@@ -30,3 +31,47 @@ def rotate_image(image, rotation_clockwise_degree: int=0):
         return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
 
 
+
+
+class FrameConverter:
+    """
+    Converts captured frames, (height, width, channels), to the layout the video stream widgets, the recording and
+    scripting use: (width, height, channels), flipped upside-down, in RGB.
+
+    Scaling, flipping and transposing are done in one cv2.remap pass with maps that are only recomputed when the frame
+    size or the scale changes, the channel swap is then done in place on the output. This gives the same frame as
+    np.swapaxes(np.flip(process_image(frame, channel_order, scale), axis=0), 0, 1), without the intermediate copies.
+    """
+    def __init__(self):
+        self.src_shape = None
+        self.scale = None
+        self.map_xy = None
+
+    def _update_maps(self, src_shape, scale):
+        import cv2
+        height, width = src_shape[:2]
+        new_width = max(1, int(width * scale))
+        new_height = max(1, int(height * scale))
+        # the source pixel of every output pixel, the same as cv2.resize with INTER_NEAREST
+        src_x = numpy.minimum(numpy.floor(numpy.arange(new_width) * (width / new_width)), width - 1).astype(numpy.float32)
+        src_y = numpy.minimum(numpy.floor(numpy.arange(new_height) * (height / new_height)), height - 1).astype(numpy.float32)
+        # output[i, j] = source[src_y[new_height - 1 - j], src_x[i]]
+        map_x = numpy.ascontiguousarray(numpy.broadcast_to(src_x[:, None], (new_width, new_height)))
+        map_y = numpy.ascontiguousarray(numpy.broadcast_to(src_y[::-1][None, :], (new_width, new_height)))
+        self.map_xy, _ = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2, nninterpolation=True)
+        self.src_shape = src_shape
+        self.scale = scale
+
+    def convert(self, image, rgb_channel_order: VideoDeviceChannelOrder=None, scale: float=1.0):
+        """
+        @return: a new array, it is safe to keep a reference to it
+        """
+        import cv2
+        if image.dtype != numpy.uint8:
+            image = image.astype(numpy.uint8)
+        if image.shape != self.src_shape or scale != self.scale:
+            self._update_maps(image.shape, scale)
+        frame = cv2.remap(image, self.map_xy, None, interpolation=cv2.INTER_NEAREST)
+        if rgb_channel_order == VideoDeviceChannelOrder.BGR and frame.ndim == 3 and frame.shape[-1] == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+        return frame
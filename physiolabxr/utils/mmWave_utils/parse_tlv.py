@@ -1,8 +1,8 @@
-import struct
 import sys
 import math
 
 import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
 
 
 #
@@ -12,25 +12,43 @@ import numpy as np
 #
 
 
-def tlvHeaderDecode(data):
-    tlvType, tlvLength = struct.unpack('2I', data)
+# little-endian layouts of the IWR6843 UART output, see the mmWave SDK's mmw_output.h
+frame_header_dtype = np.dtype([('magic', '<u8'), ('version', '<u4'), ('length', '<u4'), ('platform', '<u4'),
+                               ('frame_number', '<u4'), ('cpu_cycles', '<u4'), ('num_detected_obj', '<u4'),
+                               ('num_tlvs', '<u4')])
+tlv_header_dtype = np.dtype([('type', '<u4'), ('length', '<u4')])
+detected_object_dtype = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('doppler', '<f4')])
+stats_dtype = np.dtype([('inter_process', '<u4'), ('transmit_out', '<u4'), ('frame_margin', '<u4'),
+                        ('chirp_margin', '<u4'), ('active_cpu_load', '<u4'), ('inter_cpu_load', '<u4')])
+
+# the azimuth heatmap has the 12 virtual antennas of each range bin as (real, imag) int16 pairs, the ones used for the
+# azimuth follow the default order of 3 Tx's, TX0, TX1, TX2
+azi_virtual_antennas = 12
+azi_antenna_indices = [7, 5, 11, 9]
+azi_fft_size = 64
+
+
+def tlvHeaderDecode(data, offset=0):
+    tlvType, tlvLength = np.frombuffer(data, dtype=tlv_header_dtype, count=1, offset=offset).item()
     return tlvType, tlvLength
 
 
-def parseDetectedObjects(data, numObj, tlvLength):
-    detected_points = struct.unpack(str(numObj * 4) + 'f', data[:tlvLength])
-    detected_points = np.asarray(detected_points).reshape(numObj, 4)
-    return detected_points
+def parseDetectedObjects(data, numObj, tlvLength, offset=0):
+    """
+    :return: (numObj, 4) array of x, y, z and doppler of the detected points
+    """
+    if tlvLength != numObj * detected_object_dtype.itemsize:
+        raise ValueError(f'Detected objects TLV of {tlvLength} bytes does not match {numObj} detected objects')
+    detected_points = np.frombuffer(data, dtype=detected_object_dtype, count=numObj, offset=offset)
+    return structured_to_unstructured(detected_points, dtype=np.float64)
 
 
-def parseRangeProfile(data, tlvLength):
+def parseRangeProfile(data, tlvLength, offset=0):
     # an integer is 2 byte long
-    range_bins = tlvLength / 2
-    range_profile = struct.unpack(str(int(range_bins)) + 'H', data[:tlvLength])
-    return range_profile
+    return np.frombuffer(data, dtype='<u2', count=tlvLength // 2, offset=offset).astype(np.int64)
 
 
-def parseRDheatmap(data, tlvLength, range_bins, rm_clutter=True):
+def parseRDheatmap(data, tlvLength, range_bins, rm_clutter=True, offset=0):
     """
     range bins times doppler bins times 2, doppler bins = chirps/ frame divided by num of antennas TX (3)
     #default chirps per frame is (128/3) = 42 * 2 * 256
@@ -43,15 +61,13 @@ def parseRDheatmap(data, tlvLength, range_bins, rm_clutter=True):
     :param range_bins:
     :param data: the incoming byte stream to be interpreted as range-doppler heatmap/profile
     :param tlvLength:
+    :param offset: where the heatmap starts in data
     :return:
     """
-    doppler_bins = (tlvLength / 2) / range_bins
-    rd_heatmap = struct.unpack(str(int(range_bins * doppler_bins)) + 'H', data[:tlvLength])
-    rd_heatmap = np.reshape(rd_heatmap, (int(range_bins), int(doppler_bins)))
-
-    overall_mean = np.mean(rd_heatmap)
+    rd_heatmap = np.frombuffer(data, dtype='<u2', count=tlvLength // 2, offset=offset).reshape(range_bins, -1)
+    rd_heatmap = rd_heatmap.astype(np.float64)
     if rm_clutter:
-        rd_heatmap = np.array([row - np.mean(row) for row in rd_heatmap])
+        rd_heatmap -= rd_heatmap.mean(axis=1, keepdims=True)
 
     return replace_left_right(rd_heatmap)
 
@@ -60,46 +76,22 @@ def chg_val(val):
     return val - 65536 if val > 32767 else val
 
 
-def parseAziheatmap(data, tlvLength, range_bins):
+def parseAziheatmap(data, tlvLength, range_bins, offset=0):
     """
     :param range_bins:
     :param data: the incoming byte stream to be interpreted as range-doppler heatmap/profile
     :param tlvLength:
-    :return:
+    :param offset: where the heatmap starts in data
+    :return: (range_bins, azi_fft_size) magnitude of the azimuth FFT, with the zero frequency in the middle
     """
-    # range_bins = 256
-    azi_bins = (tlvLength / 2) / range_bins
-    azi_heatmap = struct.unpack(str(int(range_bins * azi_bins)) + 'H', data[:tlvLength])
-    # azi_heatmap = [chg_val(x) for x in azi_heatmap]
-    azi_heatmap = np.reshape(azi_heatmap, (int(range_bins), int(azi_bins)))
-
-    # use the default order of 3 Tx's and ordering is TX0, TX1, TX2
-    row_indices = [7, 5, 11, 9]
-    qrows = 4
-    qcols = range_bins
-    rowSizeBytes = 48
-    q = data[:tlvLength]
-    qq = []
-    for col in range(qcols):
-        real = []
-        img = []
-        for row in range(qrows):
-            index = col * rowSizeBytes + 4 * row_indices[row]
-            real.append(q[index + 1] * 256 + q[index])
-            img.append(q[index + 3] * 256 + q[index + 2])
-        real = [chg_val(x) for x in real]
-        img = [chg_val(x) for x in img]
-        # convert to complex numbers
-        data = np.array([real, img]).transpose()
-        data = np.pad(data, ((0, 60), (0, 0)), 'constant', constant_values=0)
-        data = data[..., 0] + 1j * data[..., 1]
-        transformed = np.fft.fft(data)
-
-        # take the magnitude
-        transformed = np.absolute(transformed)
-        qq.append(np.concatenate((transformed[int(len(transformed) / 2):], transformed[:int(len(transformed) / 2)])))
-    qq = np.array(qq)
-    return qq
+    if tlvLength % (2 * range_bins) != 0:
+        raise ValueError(f'Azimuth heatmap TLV of {tlvLength} bytes does not divide into {range_bins} range bins')
+    # (range bins, virtual antennas, real and imag), the values are signed
+    q = np.frombuffer(data, dtype='<i2', count=range_bins * azi_virtual_antennas * 2, offset=offset)
+    q = q.reshape(range_bins, azi_virtual_antennas, 2)[:, azi_antenna_indices]
+    # zero-padded FFT across the antennas
+    transformed = np.fft.fft(q[..., 0] + 1j * q[..., 1], n=azi_fft_size, axis=1)
+    return np.fft.fftshift(np.absolute(transformed), axes=1)
 
 
 def replace_left_right(a):
@@ -109,8 +101,8 @@ def replace_left_right(a):
     return rtn
 
 
-def parseStats(data):
-    interProcess, transmitOut, frameMargin, chirpMargin, activeCPULoad, interCPULoad = struct.unpack('6I', data[:24])
+def parseStats(data, offset=0):
+    interProcess, transmitOut, frameMargin, chirpMargin, activeCPULoad, interCPULoad = np.frombuffer(data, dtype=stats_dtype, count=1, offset=offset).item()
     return interProcess, transmitOut, frameMargin, chirpMargin, activeCPULoad, interCPULoad
     # print("\tOutputMsgStats:\t%d " % (6))
     # print("\t\tChirpMargin:\t%d " % (chirpMargin))
@@ -133,37 +125,34 @@ def decode_iwr_tlv(in_data):
     """
     Must disable range profile for the quick RD heatmap to work, this way the number of range bins will be be calculated
     from the absent range profile. You can still get the range profile by inferring it from the RD heatmap
+
+    The TLVs are read in place from in_data with np.frombuffer, the only copy made is the leftover data.
     :param in_data:
     :return: if no detected point at this frame, the detected point will be an empty a
     """
     magic = b'\x02\x01\x04\x03\x06\x05\x08\x07'
-    header_length = 36
+    header_length = frame_header_dtype.itemsize
 
     offset = in_data.find(magic)
-    data = in_data[offset:]
-    if len(data) < header_length:
-        return negative_rtn
-    try:
-        data_magic, version, length, platform, frameNum, cpuCycles, numObj, numTLVs = struct.unpack('Q7I',
-                                                                                                    data[
-                                                                                                    :header_length])
-    except struct.error:
-        print("Improper TLV structure found: ", (data,))
+    if offset == -1:
+        offset = max(len(in_data) - 1, 0)
+    if len(in_data) - offset < header_length:
         return negative_rtn
+    data_magic, version, length, platform, frameNum, cpuCycles, numObj, numTLVs = np.frombuffer(in_data, dtype=frame_header_dtype, count=1, offset=offset).item()
     # print("Packet ID:\t%d "%(frameNum))
     # print("Version:\t%x "%(version))
     # print("Data Len:\t\t%d", length)
     # print("TLV:\t\t%d "%(numTLVs))
     # print("Detect Obj:\t%d "%(numObj))
     # print("Platform:\t%X "%(platform))
-    if version >= 50462726 and len(data) >= length:
+    if version >= 50462726 and len(in_data) - offset >= length:
         # if version > 0x01000005 and len(data) >= length:
+        tlvType = None
         try:
-            sub_frame_num = struct.unpack('I', data[36:40])[0]
-            header_length = 40
+            sub_frame_num = np.frombuffer(in_data, dtype='<u4', count=1, offset=offset + header_length)[0]
+            header_length += 4
             # print("Subframe:\t%d "%(subFrameNum))
-            pending_bytes = length - header_length
-            data = data[header_length:]
+            position = offset + header_length  # where the next TLV starts in in_data
 
             detected_points = None
             range_profile = None
@@ -173,15 +162,14 @@ def decode_iwr_tlv(in_data):
             statistics = None
 
             for i in range(numTLVs):
-                tlvType, tlvLength = tlvHeaderDecode(data[:8])
-                data = data[8:]
+                tlvType, tlvLength = tlvHeaderDecode(in_data, position)
+                position += 8
                 if tlvType == 1:
                     # print('Outputting Points')
-                    detected_points = parseDetectedObjects(data, numObj,
-                                                           tlvLength)  # if no detected points, tlvType won't have 1
+                    detected_points = parseDetectedObjects(in_data, numObj, tlvLength, position)  # if no detected points, tlvType won't have 1
                 elif tlvType == 2:
                     # the range bins is modified in the range profile is enabled
-                    range_profile = parseRangeProfile(data, tlvLength)
+                    range_profile = parseRangeProfile(in_data, tlvLength, position)
 
                 elif tlvType == 4:
                     # resolving static azimuth heatmap
@@ -192,18 +180,18 @@ def decode_iwr_tlv(in_data):
                     # except AssertionError:
                     #     raise Exception('Must enable range-profile while enabling range-doppler-profile, in order to'
                     #                     'interpret the number of range bins')
-                    rd_heatmap = parseRDheatmap(data, tlvLength, range_bins)
+                    rd_heatmap = parseRDheatmap(in_data, tlvLength, range_bins, offset=position)
                 elif tlvType == 6:
                     # TODO why is the states' TLV not present?
-                    interProcess, transmitOut, frameMargin, chirpMargin, activeCPULoad, interCPULoad = parseStats(data)
+                    interProcess, transmitOut, frameMargin, chirpMargin, activeCPULoad, interCPULoad = parseStats(in_data, position)
                     pass
                 elif tlvType == 7:
                     pass
                 elif tlvType == 8:
                     # resolving static azimuth-elevation heatmap
                     try:
-                        azi_heatmap = parseAziheatmap(data, tlvLength, range_bins)
-                    except:
+                        azi_heatmap = parseAziheatmap(in_data, tlvLength, range_bins, position)
+                    except ValueError:
                         print('bad azimuth')
                         azi_heatmap = None
                     pass
@@ -211,22 +199,19 @@ def decode_iwr_tlv(in_data):
                     pass
                 else:
                     # print("Unidentified tlv type %d" % tlvType, '. Its len is ' + str(tlvLength))
-                    n_offset = data.find(magic)
-                    if n_offset != offset and n_offset != -1:
+                    n_position = in_data.find(magic, position)
+                    if n_position != -1 and n_position - position != offset:
                         print('New magic found, discarding previous frame with unknown tlv')
-                        data = data[n_offset:]
-                        return True, data, detected_points, range_profile, rd_heatmap, azi_heatmap
-                data = data[tlvLength:]
-                pending_bytes -= (8 + tlvLength)
-            data = data[pending_bytes:]  # data that are left
+                        return True, in_data[n_position:], detected_points, range_profile, rd_heatmap, azi_heatmap
+                position += tlvLength
 
             # infer range profile from heatmap is the former is not enabled
             if range_profile is None and rd_heatmap is not None and len(rd_heatmap) > 0:
                 range_profile = rd_heatmap[:, 0]
-            return True, data, detected_points, range_profile, rd_heatmap, azi_heatmap
-        except struct.error as se:
+            return True, in_data[offset + length:], detected_points, range_profile, rd_heatmap, azi_heatmap  # data that are left
+        except ValueError as e:  # np.frombuffer raises ValueError when the TLVs run past the data
             print('Failed to parse tlv message, type = ' + str(tlvType) + ', error: ')
-            print(se)
+            print(e)
             pass
 
     return negative_rtn
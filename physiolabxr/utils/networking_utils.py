@@ -1,9 +1,10 @@
 import numpy as np
 import zmq
 
-from physiolabxr.configs.shared import DATA_BUFFER_PREFIX
+from physiolabxr.configs.shared import DATA_BUFFER_PREFIX, TRACE_PREFIX
 from physiolabxr.utils.RNStream import max_dtype_len
 from physiolabxr.utils.buffers import flatten
+from physiolabxr.utils.performance_utils import TraceHop
 
 
 def send_string_router(message, routing_id, socket_interface):
@@ -11,9 +12,12 @@ def send_string_router(message, routing_id, socket_interface):
         [routing_id, message.encode('utf-8')])
 
 
-def send_router(data, routing_id, socket_interface):
+def send_router(data, routing_id, socket_interface, extra_frames=()):
+    """
+    @param extra_frames: more frames sent after data in the same multipart message, e.g., from traces_to_frames
+    """
     socket_interface.socket.send_multipart(
-        [routing_id, data])
+        [routing_id, data, *extra_frames])
 
 
 def recv_string_router(socket_interface, is_block):
@@ -42,7 +46,11 @@ def recv_string(socket_interface, is_block):
             return None  # no message has arrived at the socket yet
 
 
-def send_data_dict(data_dict: dict, socket_interface):
+def send_data_dict(data_dict: dict, socket_interface, traces: dict = None):
+    """
+    @param traces: optional, stream name -> array of the traces of the stream's chunks in data_dict, see TraceHop.
+    They are sent after the data, only when there are any
+    """
     keys = [k.encode('utf-8') for k in data_dict.keys()]
     data_timestamp_list = []
     for data, timestamps in data_dict.values():
@@ -50,6 +58,8 @@ def send_data_dict(data_dict: dict, socket_interface):
     # data_and_timestamps = [item for sublist in list(data_buffer.values()) for item in sublist]
     send_packet = [DATA_BUFFER_PREFIX] + flatten(
         [(k, get_dtype_bypes(d.dtype), np.array(d.shape[0]), np.array(d.shape[1]), d.tobytes(), t.tobytes()) for k, (d, t) in zip(keys, data_timestamp_list)])
+    if traces:
+        send_packet += traces_to_frames(traces)
     socket_interface.socket.send_multipart(send_packet)
 
 def get_dtype_bypes(dtype):
@@ -57,20 +67,43 @@ def get_dtype_bypes(dtype):
     return bytes(dtype_str + "".join(" " for x in range(max_dtype_len - len(dtype_str))), 'utf-8')
 
 
-def recv_data_dict(socket_interface):
+def recv_data_dict(socket_interface, return_traces=False):
+    """
+    @param return_traces: whether to also return the traces sent with the data, see send_data_dict
+    @return: the data dict, and the dict of traces if return_traces is True
+    """
     data_dict = socket_interface.socket.recv_multipart()[1:]  # remove the routing ID
     assert data_dict[0] == DATA_BUFFER_PREFIX
-    if len(data_dict) == 1:
-        return {}
-    else:
-        data_dict = data_dict[1:]  # remove the prefix
-        rtn = dict()
-        for i in range(0, len(data_dict), 6):
-            key = data_dict[i].decode('utf-8')
-            dtype = np.dtype(data_dict[i + 1].decode('utf-8').strip(' '))
-            shape = np.frombuffer(data_dict[i + 2], dtype=int)[0], np.frombuffer(data_dict[i + 3], dtype=int)[0]
-            data = np.frombuffer(data_dict[i + 4], dtype=dtype).reshape(shape)
-            timestamps = np.frombuffer(data_dict[i + 5], dtype=np.float64)
-            rtn[key] = (data, timestamps)
-        return rtn
+    data_dict = data_dict[1:]  # remove the prefix
+    rtn = dict()
+    i = 0
+    while i < len(data_dict) and data_dict[i] != TRACE_PREFIX:
+        key = data_dict[i].decode('utf-8')
+        dtype = np.dtype(data_dict[i + 1].decode('utf-8').strip(' '))
+        shape = np.frombuffer(data_dict[i + 2], dtype=int)[0], np.frombuffer(data_dict[i + 3], dtype=int)[0]
+        data = np.frombuffer(data_dict[i + 4], dtype=dtype).reshape(shape)
+        timestamps = np.frombuffer(data_dict[i + 5], dtype=np.float64)
+        rtn[key] = (data, timestamps)
+        i += 6
+    if return_traces:
+        return rtn, frames_to_traces(data_dict[i:])
+    return rtn
+
 
+def traces_to_frames(traces: dict):
+    """
+    @param traces: stream name -> trace or array of traces, see TraceHop
+    @return: the frames of a multipart message, starting with TRACE_PREFIX
+    """
+    return [TRACE_PREFIX] + flatten([(k.encode('utf-8'), np.ascontiguousarray(t, dtype=np.float64).tobytes()) for k, t in traces.items()])
+
+
+def frames_to_traces(frames):
+    """
+    @param frames: the frames made by traces_to_frames, or an empty list
+    @return: stream name -> array of traces with one trace per row, writable so that more hops can be stamped
+    """
+    if len(frames) == 0:
+        return {}
+    assert frames[0] == TRACE_PREFIX
+    return {frames[i].decode('utf-8'): np.frombuffer(frames[i + 1], dtype=np.float64).reshape(-1, len(TraceHop)).copy() for i in range(1, len(frames), 2)}
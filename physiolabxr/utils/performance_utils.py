@@ -1,4 +1,14 @@
+import csv
+import json
+import math
+import threading
 import time
+from enum import Enum, IntEnum
+
+import numpy as np
+
+from physiolabxr.utils.Singleton import Singleton
+
 
 def timeit(function: callable, args):
     """
@@ -9,4 +19,226 @@ def timeit(function: callable, args):
     """
     start_time = time.perf_counter()
     returns = function(*args)
-    return returns, time.perf_counter() - start_time
\ No newline at end of file
+    return returns, time.perf_counter() - start_time
+
+
+class MetricType(Enum):
+    """
+    The timings kept by MetricsRegistry, for each stream, or for each script for the script loop
+    """
+    acquisition = 'Acquisition'  # the worker pulling a frame from the source and emitting it
+    processing = 'Processing'  # the groups' data processors
+    processing_stage = 'Processing stage'  # one stage of a group's data processor pipeline, when profiling the stages
+    recording = 'Recording'  # adding the frame to the recording buffer
+    script_forwarding = 'Script forwarding'  # adding the frame to the input buffers of the scripts
+    script_loop = 'Script loop'  # one loop() of a script, reported by the script process
+    render = 'Render'  # plotting the stream's groups
+    # the latencies of the traced chunks since their worker pull, see TraceHop, for each stream or for each script's input
+    gui_receive_latency = 'Latency to GUI receive'
+    forward_latency = 'Latency to forward'
+    script_receive_latency = 'Latency to script receive'
+    output_send_latency = 'Latency to output send'
+
+
+class TraceHop(IntEnum):
+    """
+    The index of each timestamp in a trace. A trace is a float64 array tagged to a chunk when tracing is on, carried with
+    the data_dict in the main app and with the input and info messages of the scripts. The hops are stamped with
+    time.perf_counter, which is monotonic and shared by the processes on the same machine. The unreached hops are nan.
+    """
+    source = 0  # the timestamp of the chunk's last sample, in the source's clock
+    worker_pull = 1  # the worker pulled the chunk
+    gui_receive = 2  # the stream widget received the chunk
+    forward = 3  # the chunk is forwarded to a script
+    script_receive = 4  # the script process received the chunk
+    output_send = 5  # the script sent the outputs of the loop that first saw the chunk
+
+
+trace_hop_latency_metric_types = {TraceHop.gui_receive: MetricType.gui_receive_latency,
+                                  TraceHop.forward: MetricType.forward_latency,
+                                  TraceHop.script_receive: MetricType.script_receive_latency,
+                                  TraceHop.output_send: MetricType.output_send_latency}
+
+
+def create_trace(source_timestamp):
+    """
+    @return: a new trace stamped with the worker pull
+    """
+    trace = np.full(len(TraceHop), np.nan)
+    trace[TraceHop.source] = source_timestamp
+    trace[TraceHop.worker_pull] = time.perf_counter()
+    return trace
+
+
+def stamp_traces(traces, hop: TraceHop):
+    """
+    @param traces: a trace, or an array of traces with one trace per row
+    """
+    traces[..., hop] = time.perf_counter()
+
+
+class TimingMetric:
+    """
+    The durations of one metric. Adding a duration is O(1) and allocates nothing: the latest durations go into a ring,
+    and all of them are counted in a histogram with log-spaced bins, from which the percentiles are read. The bins are
+    12% apart, so are the percentiles.
+    """
+    min_duration = 1e-6  # the bins span 1 us to 100 s, the durations outside go into the first and the last bin
+    max_duration = 1e2
+    bins_per_decade = 20
+
+    def __init__(self, ring_size=1024):
+        self._log_min_duration = math.log10(self.min_duration)
+        self.num_bins = round((math.log10(self.max_duration) - self._log_min_duration) * self.bins_per_decade) + 2
+        self.histogram = np.zeros(self.num_bins, dtype=np.int64)
+        self.ring = np.zeros(ring_size)
+        self.reset()
+
+    def reset(self):
+        self.histogram.fill(0)
+        self.ring.fill(0)
+        self._ring_head = 0
+        self.count = 0
+        self.num_samples = 0
+        self.total_duration = 0.
+        self.max_duration_seen = 0.
+        self.last_duration = 0.
+        self.first_time = None
+        self.last_time = None
+
+    def add(self, duration, num_samples=0):
+        """
+        @param num_samples: the number of samples the duration was spent on, for the throughput
+        """
+        now = time.perf_counter()
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+        if duration > self.min_duration:
+            bin_index = min(int((math.log10(duration) - self._log_min_duration) * self.bins_per_decade) + 1, self.num_bins - 1)
+        else:
+            bin_index = 0
+        self.histogram[bin_index] += 1
+        self.ring[self._ring_head] = duration
+        self._ring_head = (self._ring_head + 1) % len(self.ring)
+        self.count += 1
+        self.num_samples += num_samples
+        self.total_duration += duration
+        self.last_duration = duration
+        if duration > self.max_duration_seen:
+            self.max_duration_seen = duration
+
+    def get_percentile(self, percentile):
+        """
+        @param percentile: between 0 and 100
+        @return: the geometric center of the histogram bin the percentile falls in, 0 if there's no duration
+        """
+        if self.count == 0:
+            return 0.
+        bin_index = int(np.searchsorted(np.cumsum(self.histogram), percentile / 100 * self.count))
+        if bin_index == 0:
+            return self.min_duration
+        return 10 ** (self._log_min_duration + (min(bin_index, self.num_bins - 2) - 0.5) / self.bins_per_decade)
+
+    def get_recent_durations(self):
+        """
+        @return: the durations in the ring, the oldest first
+        """
+        if self.count < len(self.ring):
+            return self.ring[:self.count].copy()
+        return np.roll(self.ring, -self._ring_head)
+
+    def get_summary(self):
+        """
+        @return: dict of the statistics, the durations are in milliseconds and the rates per second
+        """
+        elapsed_time = 0 if self.count < 2 else self.last_time - self.first_time
+        return {'count': self.count,
+                'mean_ms': 1e3 * self.total_duration / max(self.count, 1),
+                'recent_mean_ms': 1e3 * float(np.mean(self.get_recent_durations())) if self.count > 0 else 0.,
+                'p50_ms': 1e3 * self.get_percentile(50),
+                'p95_ms': 1e3 * self.get_percentile(95),
+                'p99_ms': 1e3 * self.get_percentile(99),
+                'max_ms': 1e3 * self.max_duration_seen,
+                'last_ms': 1e3 * self.last_duration,
+                'calls_per_second': (self.count - 1) / elapsed_time if elapsed_time > 0 else 0.,
+                'samples_per_second': self.num_samples / elapsed_time if elapsed_time > 0 else 0.}
+
+
+class MetricsRegistry(metaclass=Singleton):
+    """
+    The timings of the streams and scripts, see MetricType, shown in DiagnosticsWidget and exportable to JSON and CSV.
+
+    The metrics are created on their first record. Each metric is added to from one thread, the acquisition metrics
+    from the workers' threads and the rest from the main thread, so only their creation is locked.
+    """
+    summary_fields = ['source', 'metric', 'count', 'mean_ms', 'recent_mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+                      'last_ms', 'calls_per_second', 'samples_per_second']
+
+    def __init__(self):
+        self.metrics = {}  # (source, MetricType) -> TimingMetric
+        self._create_lock = threading.Lock()
+        self.is_tracing = False  # whether the workers tag the chunks they pull with a trace, see TraceHop
+        self.is_profiling_stages = False  # whether the stream widgets time each stage of their data processor pipelines
+
+    def get_metric(self, source: str, metric_type: MetricType) -> TimingMetric:
+        metric = self.metrics.get((source, metric_type))
+        if metric is None:
+            with self._create_lock:
+                metric = self.metrics.setdefault((source, metric_type), TimingMetric())
+        return metric
+
+    def record(self, source: str, metric_type: MetricType, duration: float, num_samples: int = 0):
+        self.get_metric(source, metric_type).add(duration, num_samples)
+
+    def time(self, source: str, metric_type: MetricType, function: callable, args, num_samples: int = 0):
+        """
+        calls the function and records its run time
+        @return: what the function returns
+        """
+        returns, duration = timeit(function, args)
+        self.record(source, metric_type, duration, num_samples)
+        return returns
+
+    def record_stage_timings(self, source: str, stage_timings, num_samples: int = 0):
+        """
+        records the last time of each stage of a data processor pipeline, under '<source>: <stage name>'
+        @param stage_timings: from DataProcessorPipeline.get_stage_timings
+        """
+        for stage_name, _, last_time in stage_timings:
+            self.record(f'{source}: {stage_name}', MetricType.processing_stage, last_time, num_samples)
+
+    def record_trace_latencies(self, source: str, traces, hops):
+        """
+        records the latency of each given hop since the worker pull, the unreached hops are skipped
+        @param traces: a trace, or an array of traces with one trace per row
+        @param hops: the TraceHops to record
+        """
+        traces = np.atleast_2d(traces)
+        for hop in hops:
+            metric = self.get_metric(source, trace_hop_latency_metric_types[hop])
+            for latency in traces[:, hop] - traces[:, TraceHop.worker_pull]:
+                if not np.isnan(latency):
+                    metric.add(float(latency))
+
+    def reset(self):
+        for metric in list(self.metrics.values()):
+            metric.reset()
+
+    def get_summaries(self):
+        """
+        @return: list of dict with the summary_fields, one for each metric, ordered by source and by metric type
+        """
+        metric_type_order = list(MetricType)
+        keys = sorted(list(self.metrics.keys()), key=lambda key: (key[0], metric_type_order.index(key[1])))
+        return [{'source': source, 'metric': metric_type.value, **self.metrics[(source, metric_type)].get_summary()} for source, metric_type in keys]
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.get_summaries(), f, indent=4)
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.summary_fields)
+            writer.writeheader()
+            writer.writerows(self.get_summaries())
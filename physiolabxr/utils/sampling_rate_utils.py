@@ -0,0 +1,176 @@
+import json
+import os
+
+import numpy as np
+
+
+class SamplingRateEstimator:
+    """
+    Estimates a stream's effective sampling rate over a window of its most recent sample intervals, and keeps track of
+    the stream's health: timestamp jitter, dropouts and clock drift against the nominal sampling rate.
+
+    The window's intervals are kept in a preallocated ring buffer along with their running sum and sum of squares, so
+    an update costs O(number of new samples), independent of the window size. The running sums are recomputed from the
+    ring buffer once every window to keep floating point errors from accumulating.
+
+    Dropouts and drift are only estimated for streams with a nominal sampling rate, i.e., not for irregular streams
+    whose nominal sampling rate is 0.
+    """
+    def __init__(self, window_size=1024, nominal_sampling_rate=None, dropout_threshold=2.):
+        """
+        @param window_size: number of sample intervals the sampling rate and jitter are computed over
+        @param nominal_sampling_rate: the stream's nominal sampling rate, can also be set later with
+        set_nominal_sampling_rate
+        @param dropout_threshold: an interval longer than this many nominal sampling periods counts as a dropout
+        """
+        self.window_size = window_size
+        self.nominal_sampling_rate = nominal_sampling_rate
+        self.dropout_threshold = dropout_threshold
+        self._intervals = np.zeros(window_size, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self._intervals[:] = 0
+        self._interval_sum = 0.
+        self._interval_square_sum = 0.
+        self._num_intervals_in_window = 0
+        self._write_index = 0
+        self._writes_since_recompute = 0
+
+        self.num_samples = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.dropped_sample_count = 0
+        self.dropout_count = 0
+
+    def set_nominal_sampling_rate(self, nominal_sampling_rate):
+        self.nominal_sampling_rate = nominal_sampling_rate
+
+    def update(self, timestamps):
+        """
+        add the timestamps of newly received samples
+        @param timestamps: the timestamps in the order the samples are received
+        @return: the sampling rate over the window, nan if fewer than two samples have been received
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(timestamps) == 0:
+            return self.get_sampling_rate()
+        if self.last_timestamp is None:
+            self.first_timestamp = timestamps[0]
+            intervals = np.diff(timestamps)
+        else:
+            intervals = np.diff(timestamps, prepend=self.last_timestamp)
+        self.last_timestamp = timestamps[-1]
+        self.num_samples += len(timestamps)
+        if len(intervals) > 0:
+            self._add_intervals(intervals)
+            self._count_dropouts(intervals)
+        return self.get_sampling_rate()
+
+    def _add_intervals(self, intervals):
+        if len(intervals) >= self.window_size:  # the whole window is replaced
+            self._intervals[:] = intervals[-self.window_size:]
+            self._write_index = 0
+            self._num_intervals_in_window = self.window_size
+            self._recompute_sums()
+            return
+        indices = np.arange(self._write_index, self._write_index + len(intervals)) % self.window_size
+        num_evicted = max(self._num_intervals_in_window + len(intervals) - self.window_size, 0)
+        if num_evicted > 0:  # the oldest intervals are at the write index
+            evicted = self._intervals[indices[:num_evicted]]
+            self._interval_sum -= evicted.sum()
+            self._interval_square_sum -= np.dot(evicted, evicted)
+        self._intervals[indices] = intervals
+        self._interval_sum += intervals.sum()
+        self._interval_square_sum += np.dot(intervals, intervals)
+        self._num_intervals_in_window = min(self._num_intervals_in_window + len(intervals), self.window_size)
+        self._write_index = (self._write_index + len(intervals)) % self.window_size
+
+        self._writes_since_recompute += len(intervals)
+        if self._writes_since_recompute >= self.window_size:
+            self._recompute_sums()
+
+    def _recompute_sums(self):
+        window = self._intervals[:self._num_intervals_in_window] if self._num_intervals_in_window < self.window_size else self._intervals
+        self._interval_sum = window.sum()
+        self._interval_square_sum = np.dot(window, window)
+        self._writes_since_recompute = 0
+
+    def _count_dropouts(self, intervals):
+        if not self.nominal_sampling_rate:
+            return
+        nominal_interval = 1 / self.nominal_sampling_rate
+        gaps = intervals[intervals > self.dropout_threshold * nominal_interval]
+        if len(gaps) > 0:
+            self.dropout_count += len(gaps)
+            self.dropped_sample_count += int(np.sum(np.round(gaps / nominal_interval) - 1))
+
+    def get_sampling_rate(self):
+        if self._num_intervals_in_window == 0 or self._interval_sum <= 0:
+            return np.nan
+        return self._num_intervals_in_window / self._interval_sum
+
+    def get_jitter(self):
+        """
+        @return: standard deviation of the sample intervals in the window, in seconds
+        """
+        if self._num_intervals_in_window < 2:
+            return np.nan
+        mean = self._interval_sum / self._num_intervals_in_window
+        return np.sqrt(max(self._interval_square_sum / self._num_intervals_in_window - mean ** 2, 0.))
+
+    def get_drift(self):
+        """
+        how much faster (positive) or slower (negative) the stream's clock runs compared to its nominal sampling rate,
+        in parts per million, since the first sample. Dropped samples are counted as received.
+        """
+        if not self.nominal_sampling_rate or self.num_samples < 2 or self.last_timestamp <= self.first_timestamp:
+            return np.nan
+        long_term_sampling_rate = (self.num_samples - 1 + self.dropped_sample_count) / (self.last_timestamp - self.first_timestamp)
+        return (long_term_sampling_rate / self.nominal_sampling_rate - 1) * 1e6
+
+    def get_health(self):
+        """
+        @return: the stream health metrics as a json serializable dict
+        """
+        return {'sampling_rate': float(self.get_sampling_rate()),
+                'nominal_sampling_rate': self.nominal_sampling_rate,
+                'jitter': float(self.get_jitter()),
+                'dropout_count': self.dropout_count,
+                'dropped_sample_count': self.dropped_sample_count,
+                'drift_ppm': float(self.get_drift()),
+                'num_samples': self.num_samples}
+
+
+def format_stream_health(stream_health: dict):
+    """
+    one line per metric, used for tooltips
+    """
+    lines = [f"sampling rate: {stream_health['sampling_rate']:.3f} Hz (nominal {stream_health['nominal_sampling_rate']})",
+             f"jitter: {stream_health['jitter'] * 1e3:.3f} ms",
+             f"dropouts: {stream_health['dropout_count']}, {stream_health['dropped_sample_count']} samples",
+             f"clock drift: {stream_health['drift_ppm']:.1f} ppm",
+             f"samples received: {stream_health['num_samples']}"]
+    if 'overflow_count' in stream_health:  # audio streams, see AudioInputDeviceWorker.get_stream_health
+        lines.append(f"overflowed samples: {stream_health['overflow_count']}")
+    return '\n'.join(lines)
+
+
+def get_stream_health_path(recording_path):
+    """
+    the stream health sidecar sits next to the recording, like the sidecar videos
+    """
+    return f'{os.path.splitext(recording_path)[0]}_stream_health.json'
+
+
+def save_stream_health(recording_path, stream_healths: dict):
+    """
+    @param stream_healths: dict of stream name to the stream's health, as given by SamplingRateEstimator.get_health
+    """
+    with open(get_stream_health_path(recording_path), 'w') as f:
+        json.dump(stream_healths, f, indent=4)
+
+
+def load_stream_health(recording_path):
+    with open(get_stream_health_path(recording_path), 'r') as f:
+        return json.load(f)
@@ -0,0 +1,287 @@
+"""
+Screen capture backends. Each backend captures the screen, or a region of it, into an RGB frame of
+(height, width, 3). The frame returned by capture() is a buffer owned by the backend and is overwritten by the next
+capture, copy it or convert it (see image_utils.FrameConverter) before capturing again.
+
+The XShm backend reads the X11 root window through the MIT shared memory extension into a preallocated shared memory
+image, so a capture involves no allocation and no round trip of the pixels through the X socket. It is used on X11
+when the extension is available, otherwise the captures fall back to pyscreeze, which creates a PIL image per capture.
+"""
+import ctypes
+import ctypes.util
+import os
+import platform
+
+import numpy as np
+
+
+class ScreenCapture:
+    """
+    @param region: (left, top, width, height) of the screen to capture, the whole screen if None
+    """
+    name = None
+
+    def __init__(self, region=None):
+        self.region = None if region is None else tuple(int(x) for x in region)
+
+    def capture(self) -> np.ndarray:
+        raise NotImplementedError
+
+    def get_screen_size(self):
+        """
+        @return: height and width of the whole screen
+        """
+        raise NotImplementedError
+
+    def get_capture_size(self):
+        """
+        @return: height and width of the captured frames
+        """
+        if self.region is None:
+            return self.get_screen_size()
+        return self.region[3], self.region[2]
+
+    def close(self):
+        pass
+
+
+class PILScreenCapture(ScreenCapture):
+    name = 'pil'
+
+    def __init__(self, region=None):
+        super().__init__(region)
+        import pyscreeze
+        from physiolabxr.configs.configs import AppConfigs
+        AppConfigs.apply_pyscreeze_patches()
+        self._screenshot = pyscreeze.screenshot
+
+    def capture(self):
+        return np.asarray(self._screenshot(region=self.region))
+
+    def get_screen_size(self):
+        image = self._screenshot()
+        return image.height, image.width
+
+
+class _XImage(ctypes.Structure):
+    # only the leading fields of XImage are read
+    _fields_ = [('width', ctypes.c_int), ('height', ctypes.c_int), ('xoffset', ctypes.c_int), ('format', ctypes.c_int),
+                ('data', ctypes.c_void_p), ('byte_order', ctypes.c_int), ('bitmap_unit', ctypes.c_int),
+                ('bitmap_bit_order', ctypes.c_int), ('bitmap_pad', ctypes.c_int), ('depth', ctypes.c_int),
+                ('bytes_per_line', ctypes.c_int), ('bits_per_pixel', ctypes.c_int)]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [('shmseg', ctypes.c_ulong), ('shmid', ctypes.c_int), ('shmaddr', ctypes.c_void_p), ('readOnly', ctypes.c_int)]
+
+
+class _XErrorEvent(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_int), ('display', ctypes.c_void_p), ('resourceid', ctypes.c_ulong),
+                ('serial', ctypes.c_ulong), ('error_code', ctypes.c_ubyte), ('request_code', ctypes.c_ubyte),
+                ('minor_code', ctypes.c_ubyte)]
+
+
+_XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(_XErrorEvent))
+_x_errors = []
+
+
+@_XErrorHandler
+def _record_x_error(display, event):
+    # the default handler exits the process, errors are recorded and raised by the calls that check them instead
+    _x_errors.append(event.contents.error_code)
+    return 0
+
+
+_z_pixmap = 2
+_all_planes = ctypes.c_ulong(-1)
+_ipc_private = 0
+_ipc_creat = 0o1000
+_ipc_rmid = 0
+
+
+def _load_x_libraries():
+    x11 = ctypes.cdll.LoadLibrary(ctypes.util.find_library('X11') or 'libX11.so.6')
+    xext = ctypes.cdll.LoadLibrary(ctypes.util.find_library('Xext') or 'libXext.so.6')
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+    x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    x11.XOpenDisplay.restype = ctypes.c_void_p
+    x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+    x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+    x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+    x11.XDefaultRootWindow.restype = ctypes.c_ulong
+    x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XDefaultVisual.restype = ctypes.c_void_p
+    x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XFree.argtypes = [ctypes.c_void_p]
+    x11.XSetErrorHandler.argtypes = [_XErrorHandler]
+    x11.XSetErrorHandler.restype = ctypes.c_void_p
+
+    xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+    xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_char_p,
+                                     ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+    xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+    xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+    xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+    xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage), ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+
+    libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    libc.shmat.restype = ctypes.c_void_p
+    libc.shmdt.argtypes = [ctypes.c_void_p]
+    libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    return x11, xext, libc
+
+
+class XShmScreenCapture(ScreenCapture):
+    """
+    Captures from the X11 root window with XShmGetImage. The shared memory image and the RGB frame are allocated once
+    for the capture region.
+
+    Not thread-safe, the capture must be created, used and closed on one thread at a time.
+    """
+    name = 'xshm'
+
+    def __init__(self, region=None):
+        super().__init__(region)
+        if platform.system() != 'Linux' or not os.environ.get('DISPLAY'):
+            raise RuntimeError('XShm screen capture needs an X11 display')
+        self._x11, self._xext, self._libc = _load_x_libraries()
+        self._display = None
+        self._image = None
+        self._segment_info = None
+        self._is_attached = False
+
+        self._display = self._x11.XOpenDisplay(None)
+        if not self._display:
+            raise RuntimeError(f'Unable to open X display {os.environ.get("DISPLAY")}')
+        try:
+            self._x11.XSetErrorHandler(_record_x_error)
+            if not self._xext.XShmQueryExtension(self._display):
+                raise RuntimeError('The X server does not support the MIT-SHM extension')
+            screen = self._x11.XDefaultScreen(self._display)
+            self._root_window = self._x11.XDefaultRootWindow(self._display)
+            self._screen_size = self._x11.XDisplayHeight(self._display, screen), self._x11.XDisplayWidth(self._display, screen)
+            if self.region is None:
+                self.region = 0, 0, self._screen_size[1], self._screen_size[0]
+            left, top, width, height = self.region
+            if width <= 0 or height <= 0 or left < 0 or top < 0 or left + width > self._screen_size[1] or top + height > self._screen_size[0]:
+                raise ValueError(f'Capture region {self.region} is not inside the screen of size {self._screen_size[1]}x{self._screen_size[0]}')
+            self._create_shared_image(screen, width, height)
+        except BaseException:
+            self.close()
+            raise
+
+        self._rgb_frame = np.empty((height, width, 3), dtype=np.uint8)
+
+    def _create_shared_image(self, screen, width, height):
+        self._segment_info = _XShmSegmentInfo(shmid=-1)
+        image = self._xext.XShmCreateImage(self._display, self._x11.XDefaultVisual(self._display, screen),
+                                           self._x11.XDefaultDepth(self._display, screen), _z_pixmap, None,
+                                           ctypes.byref(self._segment_info), width, height)
+        if not image:
+            raise RuntimeError('XShmCreateImage failed')
+        self._image = image
+        if image.contents.bits_per_pixel != 32:
+            raise RuntimeError(f'XShm screen capture only supports 32 bits per pixel, the screen has {image.contents.bits_per_pixel}')
+        size = image.contents.bytes_per_line * height
+        self._segment_info.shmid = self._libc.shmget(_ipc_private, size, _ipc_creat | 0o600)
+        if self._segment_info.shmid == -1:
+            raise OSError(ctypes.get_errno(), 'shmget failed')
+        address = self._libc.shmat(self._segment_info.shmid, None, 0)
+        if address is None or address == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_errno(), 'shmat failed')
+        self._segment_info.shmaddr = address
+        image.contents.data = self._segment_info.shmaddr
+        self._segment_info.readOnly = 0
+
+        _x_errors.clear()
+        attached = self._xext.XShmAttach(self._display, ctypes.byref(self._segment_info))
+        self._x11.XSync(self._display, 0)
+        if not attached or _x_errors:  # e.g., the display is remote and can't share memory with this process
+            raise RuntimeError('XShmAttach failed')
+        self._is_attached = True
+        # the segment is freed once both this process and the X server detach from it, even if the process crashes
+        self._libc.shmctl(self._segment_info.shmid, _ipc_rmid, None)
+        self._segment_info.shmid = -1
+
+        # (height, width, 4) BGRA view into the shared memory, rows may be padded
+        buffer = (ctypes.c_uint8 * size).from_address(self._segment_info.shmaddr)
+        self._bgra_frame = np.frombuffer(buffer, dtype=np.uint8).reshape(height, image.contents.bytes_per_line // 4, 4)[:, :width]
+
+    def capture(self):
+        import cv2
+        left, top = self.region[:2]
+        if not self._xext.XShmGetImage(self._display, self._root_window, self._image, left, top, _all_planes):
+            raise RuntimeError('XShmGetImage failed')
+        cv2.cvtColor(self._bgra_frame, cv2.COLOR_BGRA2RGB, dst=self._rgb_frame)
+        return self._rgb_frame
+
+    def get_screen_size(self):
+        return self._screen_size
+
+    def close(self):
+        if self._display is None:
+            return
+        if getattr(self, '_is_attached', False):
+            self._xext.XShmDetach(self._display, ctypes.byref(self._segment_info))
+            self._x11.XSync(self._display, 0)
+            self._is_attached = False
+        if self._image is not None:
+            self._image.contents.data = None  # the data is the shared memory, detached below
+            self._x11.XFree(self._image)
+            self._image = None
+        if self._segment_info is not None:
+            if self._segment_info.shmid != -1:  # not yet marked for removal, the attach failed
+                self._libc.shmctl(self._segment_info.shmid, _ipc_rmid, None)
+            if self._segment_info.shmaddr:
+                self._libc.shmdt(self._segment_info.shmaddr)
+                self._segment_info.shmaddr = None
+        self._x11.XCloseDisplay(self._display)
+        self._display = None
+
+
+screen_capture_backends = {XShmScreenCapture.name: XShmScreenCapture, PILScreenCapture.name: PILScreenCapture}
+
+
+def create_screen_capture(region=None, backend=None) -> ScreenCapture:
+    """
+    @param region: (left, top, width, height) of the screen to capture, the whole screen if None
+    @param backend: name of the backend to use, see screen_capture_backends. If None, the XShm backend is tried first
+    and pyscreeze is the fallback
+    """
+    if backend is not None:
+        return screen_capture_backends[backend](region)
+    try:
+        return XShmScreenCapture(region)
+    except (RuntimeError, OSError, AttributeError) as e:  # AttributeError when the X libraries are missing a function
+        print(f'ScreenCapture: XShm capture is not available, falling back to pyscreeze: {e}')
+        return PILScreenCapture(region)
+
+
+class FrameRateLimiter:
+    """
+    Decides which ticks of a timer capture a frame, so the frames are captured at the target frame rate on average.
+    A tick captures if it is at most half a tick interval early, otherwise a target rate close to the tick rate would
+    alias down to half of it. Late captures are not made up for with bursts.
+    """
+    def __init__(self, target_frame_rate, tick_interval):
+        """
+        @param target_frame_rate: frames per second, no limit if None or 0
+        @param tick_interval: in seconds, the interval of the timer ticks
+        """
+        self.frame_interval = 1 / target_frame_rate if target_frame_rate else 0.
+        self.tolerance = tick_interval / 2
+        self.next_frame_time = None
+
+    def is_due(self, now):
+        if self.next_frame_time is not None and now < self.next_frame_time - self.tolerance:
+            return False
+        if self.next_frame_time is None or now - self.next_frame_time > self.frame_interval:  # fell behind
+            self.next_frame_time = now + self.frame_interval
+        else:
+            self.next_frame_time += self.frame_interval
+        return True
@@ -1,3 +1,4 @@
+import importlib.util
 import os.path
 import platform
 import urllib.request
@@ -162,40 +163,39 @@ def is_package_installed(package_name):
         return False
 
 def install_pyaudio():
+    if importlib.util.find_spec('pyaudio') is not None:  # only check that it's installed, importing it loads PortAudio
+        return
     # check if we are on mac
-    try:
-        import pyaudio
-    except ModuleNotFoundError:
-        if platform.system() == 'Darwin':
-            # check if brew is installed
-            if shutil.which('brew') is None:
-                from PyQt6.QtWidgets import QDialogButtonBox
-                dialog_popup("Tried to brew install portaudio, a dependency of pyaudio, necessary for audio interface."
-                                  "But Brew is not installed, please install brew first from https://brew.sh/. Then restart the app if you need audio streams.", title="Warning", buttons=QDialogButtonBox.StandardButton.Ok)
-                from physiolabxr.configs.configs import AppConfigs
-                AppConfigs().is_audio_interface_available = False
-                return
-            # need to brew install portaudio
-            print("Brew installing portaudio ...")
-            subprocess.run(["brew", "install", "portaudio"])
-        elif platform.system() == "Linux":
-            # need to apt install portaudio
-            if not is_package_installed("portaudio19-dev") or not is_package_installed("python3-dev"):
-                from PyQt6.QtWidgets import QDialogButtonBox
-                dialog_popup("To use audio streams on Linux, you need to install portaudio, a dependency of pyaudio.\n"
-                             "To do so, please run the following two commands in your terminal: \n"
-                             "sudo apt-get install portaudio19-dev\n"
-                             "sudo apt install python3-dev\n"
-                             "Then restart the app if you need audio streams.",
-                             title="Warning", buttons=QDialogButtonBox.StandardButton.Ok)
-                return
-        # pip install pyaudio
-        print("pip installing pyaudio ...")
-        pip_install = subprocess.run(["pip", "install", "pyaudio"])
-        if pip_install.returncode == 0:
-            print("PyAudio has been successfully installed.")
-        else:
-            print("Error installing PyAudio:", pip_install.stderr)
+    if platform.system() == 'Darwin':
+        # check if brew is installed
+        if shutil.which('brew') is None:
+            from PyQt6.QtWidgets import QDialogButtonBox
+            dialog_popup("Tried to brew install portaudio, a dependency of pyaudio, necessary for audio interface."
+                              "But Brew is not installed, please install brew first from https://brew.sh/. Then restart the app if you need audio streams.", title="Warning", buttons=QDialogButtonBox.StandardButton.Ok)
+            from physiolabxr.configs.configs import AppConfigs
+            AppConfigs().is_audio_interface_available = False
+            return
+        # need to brew install portaudio
+        print("Brew installing portaudio ...")
+        subprocess.run(["brew", "install", "portaudio"])
+    elif platform.system() == "Linux":
+        # need to apt install portaudio
+        if not is_package_installed("portaudio19-dev") or not is_package_installed("python3-dev"):
+            from PyQt6.QtWidgets import QDialogButtonBox
+            dialog_popup("To use audio streams on Linux, you need to install portaudio, a dependency of pyaudio.\n"
+                         "To do so, please run the following two commands in your terminal: \n"
+                         "sudo apt-get install portaudio19-dev\n"
+                         "sudo apt install python3-dev\n"
+                         "Then restart the app if you need audio streams.",
+                         title="Warning", buttons=QDialogButtonBox.StandardButton.Ok)
+            return
+    # pip install pyaudio
+    print("pip installing pyaudio ...")
+    pip_install = subprocess.run(["pip", "install", "pyaudio"])
+    if pip_install.returncode == 0:
+        print("PyAudio has been successfully installed.")
+    else:
+        print("Error installing PyAudio:", pip_install.stderr)
 
 
 def run_setup_check():
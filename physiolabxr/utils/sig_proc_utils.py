@@ -1,9 +1,13 @@
+import atexit
+import functools
+import os
+import threading
 from multiprocessing import Pool
 
 import numpy as np
 from scipy import sparse
+from scipy.linalg import cholesky_banded, cho_solve_banded, solveh_banded
 from scipy.signal import butter, lfilter, freqz, iirnotch, filtfilt
-from scipy.sparse.linalg import spsolve
 
 def butter_lowpass(cutoff, fs, order=5):
     nyq = 0.5 * fs
@@ -33,32 +37,102 @@ def notch_filter(data, w0, bw, fs, channel_format='first'):
     return output_signal
 
 
+@functools.lru_cache(maxsize=4)
+def _get_als_system(length, lam):
+    """
+    the parts of the Asymmetric Least Squares system (W + lam * D D^T) z = w * y that only depend on the signal length:
+    the pentadiagonal penalty lam * D D^T in lower banded form, and the banded Cholesky factor of the system with all
+    weights being 1, which is the system of the first iteration of every signal of this length
+    """
+    D = sparse.diags([1, -2, 1], [0, -1, -2], shape=(length, length - 2))
+    D = lam * D.dot(D.transpose())
+    penalty = np.zeros((3, length))
+    for k in range(3):
+        penalty[k, :length - k] = D.diagonal(-k)
+    first_iteration_factor = cholesky_banded(penalty + [[1], [0], [0]], lower=True)
+    penalty.flags.writeable = False
+    first_iteration_factor.flags.writeable = False
+    return penalty, first_iteration_factor
+
+
+def _baseline_als_batch(ys, lam, p, niter):
+    """
+    baseline_als of a batch of signals of the same length
+    @param ys: (signals, length)
+    """
+    assert niter > 0, 'baseline_als: niter must be positive'
+    ys = np.asarray(ys, dtype=float)
+    penalty, first_iteration_factor = _get_als_system(ys.shape[1], lam)
+    zs = cho_solve_banded((first_iteration_factor, True), ys.T, check_finite=False).T  # the weights start as ones
+    for z, y in zip(zs, ys):
+        w = p * (y > z) + (1 - p) * (y < z)
+        for i in range(1, niter):
+            ab = penalty.copy()
+            ab[0] += w
+            z[:] = solveh_banded(ab, w * y, overwrite_ab=True, lower=True, check_finite=False)
+            new_w = p * (y > z) + (1 - p) * (y < z)
+            if np.array_equal(new_w, w):  # the remaining iterations would solve the same system again
+                break
+            w = new_w
+    return zs
+
+
 def baseline_als(y, lam, p, niter):
     """
     base line correction based on Asymmetric Least Squares Smoothing
     ref: https://stackoverflow.com/questions/29156532/python-baseline-correction-library
+
+    The system is pentadiagonal, it is solved with a banded Cholesky decomposition.
     :rtype: object
     """
-    L = len(y)
-    D = sparse.diags([1, -2, 1], [0, -1, -2], shape=(L, L - 2))
-    D = lam * D.dot(D.transpose())  # Precompute this term since it does not depend on `w`
-    w = np.ones(L)
-    W = sparse.spdiags(w, 0, L, L)
-    for i in range(niter):
-        W.setdiag(w)  # Do not create a new matrix, just update diagonal values
-        Z = W + D
-        z = spsolve(Z, w * y)
-        w = p * (y > z) + (1 - p) * (y < z)
-    return z
+    return _baseline_als_batch(np.asarray(y)[np.newaxis], lam, p, niter)[0]
+
+
+_baseline_correction_pool = None
+_baseline_correction_pool_size = None
+_baseline_correction_pool_lock = threading.Lock()
+
+
+def _get_baseline_correction_pool(njobs):
+    """
+    the pool is kept between calls, so are the ALS systems cached in its processes
+    """
+    global _baseline_correction_pool, _baseline_correction_pool_size
+    with _baseline_correction_pool_lock:
+        if _baseline_correction_pool is None or _baseline_correction_pool_size != njobs:
+            if _baseline_correction_pool is None:
+                atexit.register(close_baseline_correction_pool)
+            else:
+                _baseline_correction_pool.terminate()
+            _baseline_correction_pool = Pool(processes=njobs)
+            _baseline_correction_pool_size = njobs
+        return _baseline_correction_pool
+
+
+def close_baseline_correction_pool():
+    global _baseline_correction_pool, _baseline_correction_pool_size
+    with _baseline_correction_pool_lock:
+        if _baseline_correction_pool is not None:
+            _baseline_correction_pool.terminate()
+            _baseline_correction_pool = None
+            _baseline_correction_pool_size = None
+
 
 def baseline_correction(data, lam, p, niter=10, channel_format='first', njobs=20):
-    pool = Pool(processes=njobs)
+    """
+    baseline_als on every channel. The channels are split into batches that are processed in parallel by a pool of at
+    most njobs processes, which is kept for the next calls. Batches are processed in this process when njobs is 1.
+
+    @return: (channels, timesteps) regardless of the channel format
+    """
     if channel_format == 'last':
-        pool_result = [pool.apply(baseline_als, args=(data[:, i], lam, p, niter)) for i in range(data.shape[-1])]
-    elif channel_format == 'first':
-        pool_result = [pool.apply(baseline_als, args=(data[i, :], lam, p, niter)) for i in range(data.shape[0])]
-        # output_signal = np.array([baseline_als(data[i, :], lam, p, niter) for i in range(data.shape[0])])
-    else:
+        data = np.transpose(data)
+    elif channel_format != 'first':
         raise Exception('Unrecognized channgel format, must be either "first" or "last"')
-    output_signal = np.array(pool_result)
-    return output_signal
+    njobs = min(njobs, os.cpu_count() or 1, len(data))
+    if njobs <= 1:
+        return _baseline_als_batch(data, lam, p, niter)
+    batch_size = int(np.ceil(len(data) / (njobs * 2)))  # two batches per process, so a slow batch doesn't hold up the others
+    batches = [data[i:i + batch_size] for i in range(0, len(data), batch_size)]
+    pool = _get_baseline_correction_pool(njobs)
+    return np.concatenate(list(pool.imap(functools.partial(_baseline_als_batch, lam=lam, p=p, niter=niter), batches)))
@@ -5,6 +5,7 @@ import scipy.io
 
 from physiolabxr.utils.RNStream import RNStream
 from physiolabxr.utils.data_utils import CsvStoreLoad
+from physiolabxr.utils.video_recording_utils import decode_video_streams
 from physiolabxr.utils.xdf_utils import load_xdf
 
 
@@ -22,7 +23,7 @@ def stream_in(file_path):
         file_extension = file_path_obj.suffix
         if file_extension == '.dats':
             stream = RNStream(file_path)
-            return stream.stream_in()
+            return decode_video_streams(file_path, stream.stream_in())
         elif file_extension == '.mat' or file_extension == '.m':
             buffer = scipy.io.loadmat(file_path)
             data = {}
@@ -32,8 +33,8 @@ def stream_in(file_path):
                     data[stream_type_label] = [buffer[stream_type_label], data_array.squeeze()]
             return data
         elif file_extension == '.pickle' or file_extension == '.pkl' or file_extension == '.p':
-            return pickle.load(open(file_path, 'rb'))
+            return decode_video_streams(file_path, pickle.load(open(file_path, 'rb')))
         elif file_extension == '.xdf':
-            return load_xdf(file_path)
+            return decode_video_streams(file_path, load_xdf(file_path))
         else:
             raise Exception(f"Unknown file extension: {file_extension} {'are you trying to load a directory of CSVs?' if file_extension == '.csv' else ''}")
\ No newline at end of file
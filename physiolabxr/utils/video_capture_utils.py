@@ -1,4 +1,7 @@
-import cv2
+import threading
+import time
+
+from physiolabxr.utils.time_utils import get_clock_time
 
 from physiolabxr.ui.SplashScreen import SplashLoadingTextNotifier
 
@@ -8,6 +11,7 @@ def get_working_camera_id():
     deprecated, not in use. Use the more optimized version as in general.get_working_camera_ports()
     :return:
     """
+    import cv2
     # checks the first 10 indexes.
     index = 0
     arr = []
@@ -26,6 +30,7 @@ def get_working_camera_ports():
     """
     Test the ports and returns a tuple with the available ports and the ones that are working.
     """
+    import cv2
     non_working_ports = []
     dev_port = 0
     working_cams = []
@@ -47,4 +52,62 @@ def get_working_camera_ports():
                 available_ports.append(dev_port)
         dev_port +=1
         camera.release()
-    return available_ports, working_cams, non_working_ports
\ No newline at end of file
+    return available_ports, working_cams, non_working_ports
+
+
+class LatestFrameGrabber(threading.Thread):
+    """
+    Reads frames from a cv2.VideoCapture on its own thread as fast as the camera delivers them, and keeps only the
+    latest one, so a slow consumer never falls behind the camera.
+
+    The frames are read into three preallocated buffers that rotate: one is being read into by the grab thread, one
+    holds the latest frame, and one is lent to the consumer by get_latest_frame until its next call. A frame that is
+    replaced before the consumer takes it is counted as dropped.
+    """
+    def __init__(self, capture):
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.is_grabbing = True
+
+        self.buffers = [None, None, None]
+        self.write_index, self.latest_index, self.read_index = 0, 1, 2
+        self.latest_timestamp = None
+        self.has_new_frame = False
+        self.lock = threading.Lock()
+
+        self.grabbed_frame_count = 0
+        self.dropped_frame_count = 0
+
+    def run(self):
+        while self.is_grabbing:
+            is_reading, frame = self.capture.read(self.buffers[self.write_index])
+            if not is_reading or frame is None:
+                if not self.capture.isOpened():
+                    break
+                time.sleep(1e-3)  # don't spin on a camera that is temporarily not delivering
+                continue
+            timestamp = get_clock_time()  # the time the frame is read, uses lsl local clock for syncing
+            self.buffers[self.write_index] = frame  # the capture allocates a new buffer if the frame size changed
+            with self.lock:
+                if self.has_new_frame:
+                    self.dropped_frame_count += 1
+                self.write_index, self.latest_index = self.latest_index, self.write_index
+                self.latest_timestamp = timestamp
+                self.has_new_frame = True
+                self.grabbed_frame_count += 1
+
+    def get_latest_frame(self):
+        """
+        @return: the latest frame and the time it was read, or (None, None) if no frame arrived since the last call.
+        The returned frame is only valid until the next call.
+        """
+        with self.lock:
+            if not self.has_new_frame:
+                return None, None
+            self.read_index, self.latest_index = self.latest_index, self.read_index
+            self.has_new_frame = False
+            return self.buffers[self.read_index], self.latest_timestamp
+
+    def stop(self):
+        self.is_grabbing = False
+        self.join()
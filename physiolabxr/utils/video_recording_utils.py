@@ -0,0 +1,180 @@
+import os
+import queue
+import threading
+import warnings
+
+import numpy as np
+
+from physiolabxr.configs.configs import VideoRecordingCodec
+
+video_frame_table_prefix = 'frame_index:'  # RNStream labels are at most 32 characters, keep this short
+
+
+def get_video_frame_table_stream_name(stream_name):
+    return video_frame_table_prefix + stream_name
+
+
+def get_video_sidecar_path(recording_path, stream_name, codec: VideoRecordingCodec):
+    """
+    the sidecar video sits next to the recording, converted recordings (.p, .m, .xdf) share the same stem so they
+    find the same sidecar
+    """
+    return f'{os.path.splitext(recording_path)[0]}_{stream_name}{codec.get_file_extension()}'
+
+
+def to_video_file_frame(frame):
+    """
+    convert a frame as it is recorded, i.e., (width, height, channels) flipped upside-down in RGB, as emitted by the
+    video workers and swapped by VideoWidget, to what a video encoder expects: (height, width, 3) upright in BGR
+    """
+    import cv2
+    frame = np.flip(np.swapaxes(frame, 0, 1), axis=0)
+    if frame.ndim == 2:
+        return cv2.cvtColor(np.ascontiguousarray(frame), cv2.COLOR_GRAY2BGR)
+    elif frame.shape[-1] == 4:
+        return cv2.cvtColor(np.ascontiguousarray(frame), cv2.COLOR_RGBA2BGR)
+    return cv2.cvtColor(np.ascontiguousarray(frame), cv2.COLOR_RGB2BGR)
+
+
+def from_video_file_frame(frame):
+    """
+    inverse of to_video_file_frame
+    """
+    import cv2
+    return np.swapaxes(np.flip(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), axis=0), 0, 1)
+
+
+class VideoRecorder(threading.Thread):
+    """
+    Encodes the frames of one video stream to a sidecar video file on its own thread, so the GUI thread only pays for
+    putting the frame in a queue.
+
+    add_frame returns the index of the frame in the video file, which is what goes into the recording in place of
+    the frame. The frame must not be modified after it is added.
+
+    The queue holds at most max_queued_frames. If the encoder falls that far behind, the new frames are dropped and
+    counted in dropped_frame_count, and add_frame returns the index of the last frame that was queued, so the recording
+    repeats it instead of growing the memory without bound.
+    """
+    def __init__(self, video_path, codec: VideoRecordingCodec, frame_rate, max_queued_frames=64):
+        super().__init__(daemon=True)
+        self.video_path = video_path
+        self.codec = codec
+        self.frame_rate = frame_rate
+
+        self.frame_queue = queue.Queue(maxsize=max_queued_frames)
+        self.writer = None
+        self.frame_size = None
+        self.frame_count = 0
+        self.dropped_frame_count = 0
+
+    def add_frame(self, frame) -> int:
+        try:
+            self.frame_queue.put_nowait(frame)
+        except queue.Full:
+            self.dropped_frame_count += 1
+            return max(self.frame_count - 1, 0)
+        self.frame_count += 1
+        return self.frame_count - 1
+
+    def run(self):
+        import cv2
+        while True:
+            frame = self.frame_queue.get()
+            if frame is None:
+                break
+            frame = to_video_file_frame(frame)
+            if self.writer is None:
+                self.frame_size = frame.shape[1], frame.shape[0]
+                self.writer = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*self.codec.get_fourcc()), self.frame_rate, self.frame_size)
+            if (frame.shape[1], frame.shape[0]) != self.frame_size:  # the video scale may be changed during recording
+                frame = cv2.resize(frame, self.frame_size, interpolation=cv2.INTER_NEAREST)
+            self.writer.write(frame)
+        if self.writer is not None:
+            self.writer.release()
+
+    def stop(self):
+        """
+        encode the remaining frames and close the video file, blocks until done
+        """
+        self.frame_queue.put(None)
+        self.join()
+
+
+def iter_video_frames(video_path, start=0, stop=None):
+    """
+    decode the frames of a video one at a time, so only one frame is in memory
+    @param start: index of the first frame
+    @param stop: index after the last frame, None to read to the end
+    @return: generator of frames in the recorded layout, (width, height, 3)
+    """
+    import cv2
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if start > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frame_index = start
+        while stop is None or frame_index < stop:
+            is_reading, frame = capture.read()
+            if not is_reading:
+                break
+            yield from_video_file_frame(frame)
+            frame_index += 1
+    finally:
+        capture.release()
+
+
+def read_video_frames(video_path, start=0, stop=None):
+    """
+    @param start: index of the first frame
+    @param stop: index after the last frame, None to read to the end
+    @return: frames in the recorded layout, (width, height, 3, number of frames)
+    """
+    return np.stack(list(iter_video_frames(video_path, start, stop)), axis=-1)
+
+
+def read_indexed_video_frames(video_path, frame_indices):
+    """
+    decode the frames at <frame_indices> into one preallocated array, streaming through the video once, so the frames
+    are not also held in a list. Indices past the end of the video, e.g., when the encoder dropped trailing frames,
+    get the last frame.
+    @return: frames in the recorded layout, (width, height, 3, len(frame_indices)), None if the video has no frame
+    """
+    frame_positions = {}  # frame index -> positions in the output
+    for position, frame_index in enumerate(frame_indices):
+        frame_positions.setdefault(int(frame_index), []).append(position)
+    frames, frame = None, None
+    for frame_index, frame in enumerate(iter_video_frames(video_path, stop=max(frame_positions.keys(), default=-1) + 1)):
+        if frames is None:
+            frames = np.empty((*frame.shape, len(frame_indices)), dtype=frame.dtype)
+        frames[..., frame_positions.pop(frame_index, [])] = frame[..., None]
+    if frames is not None:
+        past_end_positions = [position for positions in frame_positions.values() for position in positions]
+        frames[..., past_end_positions] = frame[..., None]
+    return frames
+
+
+def decode_video_streams(recording_path, buffer: dict):
+    """
+    replace the frame index tables in a loaded recording with the frames decoded from their sidecar videos, so video
+    streams look the same as if they were recorded uncompressed.
+
+    @param recording_path: path of the loaded recording, used to find the sidecar videos
+    @param buffer: the loaded recording, modified in place
+    @return: the buffer
+    """
+    for table_name in [stream_name for stream_name in buffer.keys() if stream_name.startswith(video_frame_table_prefix)]:
+        stream_name = table_name[len(video_frame_table_prefix):]
+        video_paths = [get_video_sidecar_path(recording_path, stream_name, codec) for codec in VideoRecordingCodec if codec != VideoRecordingCodec.raw]
+        video_paths = [video_path for video_path in video_paths if os.path.exists(video_path)]
+        if len(video_paths) == 0:
+            warnings.warn(f'decode_video_streams: sidecar video for stream {stream_name} is not found next to {recording_path}, keeping its frame index table')
+            continue
+        frame_indices, timestamps = buffer[table_name]
+        frames = read_indexed_video_frames(video_paths[0], np.array(frame_indices).reshape(-1).astype(int))
+        if frames is None:
+            warnings.warn(f'decode_video_streams: sidecar video {video_paths[0]} has no frame, keeping its frame index table')
+            continue
+        del buffer[table_name]
+        buffer[stream_name] = [frames, timestamps]
+    return buffer
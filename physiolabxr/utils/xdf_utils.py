@@ -4,7 +4,6 @@ import xml.etree.ElementTree as ET
 from enum import Enum
 
 import numpy as np
-import pyxdf
 
 from physiolabxr.presets.presets_utils import get_stream_data_type, get_stream_nominal_sampling_rate
 
@@ -156,6 +155,7 @@ def save_xdf(file_path, buffer, sample_chunk_max_size=50):
     out_file.close()
 
 def load_xdf(filename):
+    import pyxdf  # imported here, only needed when loading .xdf files
     xdf_data = pyxdf.load_xdf(filename)
     dats_data = {}
     for stream_data in xdf_data[0]:
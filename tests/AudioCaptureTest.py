@@ -0,0 +1,111 @@
+"""
+Tests for the audio capture path of AudioInputInterface that don't need an audio device: de-interleaving, the ring
+buffer the PortAudio callback writes into, and the callback timestamps.
+"""
+import numpy as np
+import pytest
+
+from physiolabxr.interfaces.AudioInputInterface import frames_from_bytes, AudioRingBuffer, AudioInputInterface
+from physiolabxr.presets.PresetEnums import AudioInputDataType, PresetType
+
+
+@pytest.mark.parametrize('data_format, dtype', [(AudioInputDataType.paInt16, np.int16), (AudioInputDataType.paInt32, np.int32),
+                                                (AudioInputDataType.paFloat32, np.float32)])
+def test_frames_from_bytes(data_format, dtype):
+    num_channels, num_frames = 4, 256
+    expected = (np.random.random((num_channels, num_frames)) * 1000).astype(dtype)
+    in_data = expected.T.tobytes()  # interleaved
+    frames = frames_from_bytes(in_data, num_channels, data_format.value)
+    assert frames.shape == (num_channels, num_frames)
+    assert np.array_equal(frames, expected)
+
+
+def test_frames_from_bytes_int24():
+    num_channels, num_frames = 2, 64
+    expected = np.random.randint(-2 ** 23, 2 ** 23, size=(num_channels, num_frames), dtype=np.int32)
+    in_data = np.ascontiguousarray(expected.T, dtype='<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    assert np.array_equal(frames_from_bytes(in_data, num_channels, AudioInputDataType.paInt24.value), expected)
+
+
+def test_ring_buffer_wrap_around_and_overflow():
+    ring_buffer = AudioRingBuffer(num_channels=2, capacity=100, dtype=np.int16)
+    written = np.arange(2 * 250, dtype=np.int16).reshape(2, 250)
+    timestamps = np.arange(250, dtype=np.float64)
+
+    ring_buffer.write(written[:, :60], timestamps[:60])
+    frames, read_timestamps = ring_buffer.read()
+    assert np.array_equal(frames, written[:, :60]) and np.array_equal(read_timestamps, timestamps[:60])
+
+    ring_buffer.write(written[:, 60:130], timestamps[60:130])  # wraps around
+    frames, read_timestamps = ring_buffer.read()
+    assert np.array_equal(frames, written[:, 60:130]) and np.array_equal(read_timestamps, timestamps[60:130])
+
+    ring_buffer.write(written[:, 130:250], timestamps[130:250])  # more than the capacity, the oldest 20 are dropped
+    frames, read_timestamps = ring_buffer.read()
+    assert np.array_equal(frames, written[:, 150:250]) and np.array_equal(read_timestamps, timestamps[150:250])
+    assert ring_buffer.overflow_count == 20
+    assert ring_buffer.read()[0].shape == (2, 0)
+
+
+def test_callback_timestamps_from_adc_time():
+    sampling_rate, frames_per_buffer, num_channels = 48000, 128, 2
+    interface = AudioInputInterface('test audio', 0, num_channels, PresetType.AUDIO, AudioInputDataType.paInt16.value,
+                                    frames_per_buffer, sampling_rate, sampling_rate)
+    buffer_duration = frames_per_buffer / sampling_rate
+    stream_clock_offset = 100.  # local clock - stream clock
+    callback_latencies = [0.004, 0.001, 0.003, 0.002]  # the callback is late by a varying amount
+
+    timestamps = []
+    for i, callback_latency in enumerate(callback_latencies):
+        adc_time = 10. + i * buffer_duration
+        current_time = adc_time + buffer_duration + callback_latency
+        time_info = {'input_buffer_adc_time': adc_time, 'current_time': current_time}
+        timestamps.append(interface.get_buffer_timestamps(frames_per_buffer, time_info, current_time + stream_clock_offset))
+    assert np.allclose(np.diff(timestamps[-1]), 1 / sampling_rate)
+    assert np.allclose(timestamps[-1][0], 10. + 3 * buffer_duration + stream_clock_offset)
+
+
+def test_callback_writes_to_ring_buffer():
+    sampling_rate, frames_per_buffer, num_channels = 48000, 128, 2
+    interface = AudioInputInterface('test audio', 0, num_channels, PresetType.AUDIO, AudioInputDataType.paInt16.value,
+                                    frames_per_buffer, sampling_rate, sampling_rate)
+    interface.ring_buffer = AudioRingBuffer(num_channels, sampling_rate, np.int16)
+
+    expected = np.random.randint(-1000, 1000, size=(num_channels, 3 * frames_per_buffer), dtype=np.int16)
+    for i in range(3):  # host API without ADC time
+        in_data = np.ascontiguousarray(expected[:, i * frames_per_buffer:(i + 1) * frames_per_buffer].T).tobytes()
+        interface._stream_callback(in_data, frames_per_buffer, {'input_buffer_adc_time': 0, 'current_time': 0}, 0)
+    frames, timestamps = interface.process_frames()
+    assert np.array_equal(frames, expected)
+    assert len(timestamps) == 3 * frames_per_buffer
+
+
+def test_callback_clock_offset_follows_drift():
+    sampling_rate, frames_per_buffer, num_channels = 48000, 480, 1
+    interface = AudioInputInterface('test audio', 0, num_channels, PresetType.AUDIO, AudioInputDataType.paInt16.value,
+                                    frames_per_buffer, sampling_rate, sampling_rate, clock_offset_window=1.)
+    buffer_duration = frames_per_buffer / sampling_rate
+    drift = 1e-3  # the local clock gains 1 ms per second on the stream's clock
+    for i in range(500):  # 5 seconds
+        adc_time = 10. + i * buffer_duration
+        current_time = adc_time + buffer_duration + (0.001 if i % 2 else 0.003)  # the callback is late by a varying amount
+        stream_clock_offset = 100. + drift * i * buffer_duration
+        timestamps = interface.get_buffer_timestamps(frames_per_buffer, {'input_buffer_adc_time': adc_time, 'current_time': current_time},
+                                                     current_time + stream_clock_offset)
+    # the offset in use lags by at most two windows, the one it was found in and the one it is used in, instead of
+    # staying at the first one, 5 ms behind
+    assert adc_time + stream_clock_offset - 2 * drift * 1. <= timestamps[0] <= adc_time + stream_clock_offset
+
+
+def test_audio_worker_reports_overflows(monkeypatch):
+    from physiolabxr.threadings import AudioWorkers
+    from physiolabxr.utils.sampling_rate_utils import format_stream_health
+    interface = AudioInputInterface('test audio', 0, 2, PresetType.AUDIO, AudioInputDataType.paInt16.value, 128, 48000, 48000)
+    interface.ring_buffer = AudioRingBuffer(2, 100, np.int16)
+    monkeypatch.setattr(AudioWorkers, 'create_audio_input_interface', lambda stream_name: interface)
+    worker = AudioWorkers.AudioInputDeviceWorker('test audio')
+
+    interface.ring_buffer.write(np.zeros((2, 130), dtype=np.int16), np.arange(130, dtype=np.float64))
+    stream_health = worker.get_stream_health()
+    assert stream_health['overflow_count'] == 30
+    assert 'overflowed samples: 30' in format_stream_health(stream_health)
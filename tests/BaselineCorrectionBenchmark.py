@@ -0,0 +1,69 @@
+"""
+Benchmark of baseline_correction on 64 channels of 1M samples.
+
+The sparse LU solve baseline_als used before, kept here as the reference, takes too long to run on all the channels,
+so it is timed on one channel and its time for all the channels is extrapolated from it.
+
+Run with:
+    python -m pytest tests/BaselineCorrectionBenchmark.py -s
+
+Set PHYSIOLABXR_BASELINE_BENCHMARK_CHANNELS and PHYSIOLABXR_BASELINE_BENCHMARK_SAMPLES to change the size of the data.
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from physiolabxr.utils.sig_proc_utils import baseline_correction, close_baseline_correction_pool
+
+n_channels = int(os.environ.get('PHYSIOLABXR_BASELINE_BENCHMARK_CHANNELS', 64))
+n_samples = int(os.environ.get('PHYSIOLABXR_BASELINE_BENCHMARK_SAMPLES', 1_000_000))
+srate = 1000
+lam, p = 10, 0.05
+
+
+def spsolve_baseline_als(y, lam, p, niter):
+    L = len(y)
+    D = sparse.diags([1, -2, 1], [0, -1, -2], shape=(L, L - 2))
+    D = lam * D.dot(D.transpose())
+    w = np.ones(L)
+    W = sparse.spdiags(w, 0, L, L)
+    for i in range(niter):
+        W.setdiag(w)
+        Z = W + D
+        z = spsolve(Z, w * y)
+        w = p * (y > z) + (1 - p) * (y < z)
+    return z
+
+
+@pytest.fixture(scope='module')
+def eeg():
+    """
+    drifting oscillations with noise and spikes
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(n_samples) / srate
+    drift = 100 * np.sin(2 * np.pi * rng.uniform(0.001, 0.01, (n_channels, 1)) * t)
+    data = drift + 20 * np.sin(2 * np.pi * 10 * t) + rng.normal(0, 5, (n_channels, n_samples))
+    data += (rng.random((n_channels, n_samples)) < 1e-3) * 200
+    yield data
+    close_baseline_correction_pool()
+
+
+def test_baseline_correction(eeg):
+    start_time = time.perf_counter()
+    corrected = baseline_correction(eeg, lam, p)
+    correction_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    expected = spsolve_baseline_als(eeg[0], lam, p, 10)
+    spsolve_time = (time.perf_counter() - start_time) * n_channels
+    assert np.allclose(corrected[0], expected, atol=1e-6)
+    assert corrected.shape == eeg.shape
+
+    print(f"\nbaseline correction of {n_channels} channels x {n_samples} samples with {os.cpu_count()} cpus: {correction_time:.2f}s, "
+          f"sparse LU per channel (extrapolated from one channel): {spsolve_time:.2f}s, {spsolve_time / correction_time:.1f}x")
+    assert correction_time < spsolve_time
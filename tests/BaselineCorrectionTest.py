@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from physiolabxr.utils import sig_proc_utils
+from physiolabxr.utils.sig_proc_utils import baseline_als, baseline_correction, close_baseline_correction_pool
+from tests.BaselineCorrectionBenchmark import spsolve_baseline_als
+
+
+@pytest.fixture
+def signals():
+    rng = np.random.default_rng(0)
+    t = np.arange(5000) / 100
+    return 50 * np.sin(t[np.newaxis] * rng.uniform(0.05, 0.5, (6, 1))) + rng.normal(0, 5, (6, len(t))) + (rng.random((6, len(t))) < 0.01) * 100
+
+
+@pytest.mark.parametrize('lam, p', [(10, 0.05), (1e5, 0.01)])
+def test_baseline_als_matches_sparse_solve(signals, lam, p):
+    assert np.allclose(baseline_als(signals[0], lam, p, 10), spsolve_baseline_als(signals[0], lam, p, 10), atol=1e-6)
+
+
+def test_baseline_correction_in_pool(signals, monkeypatch):
+    expected = np.array([baseline_als(y, 10, 0.05, 10) for y in signals])
+    assert np.allclose(baseline_correction(signals, 10, 0.05, njobs=1), expected)
+
+    monkeypatch.setattr(sig_proc_utils.os, 'cpu_count', lambda: 2)
+    try:
+        assert np.allclose(baseline_correction(signals, 10, 0.05), expected)
+        pool = sig_proc_utils._baseline_correction_pool
+        assert pool is not None
+        assert np.allclose(baseline_correction(signals.T, 10, 0.05, channel_format='last'), expected)
+        assert sig_proc_utils._baseline_correction_pool is pool  # the pool is kept between calls
+    finally:
+        close_baseline_correction_pool()
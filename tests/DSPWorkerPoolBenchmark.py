@@ -0,0 +1,109 @@
+"""
+Benchmark of running the data processors in the DSP worker pool, against running them in process.
+
+The stream is 64 channels of EEG at 500 Hz pulled in frames of 10 samples, split into two groups of 32 channels, each
+with a 4th order Butterworth bandpass and a 60 Hz notch filter. Every frame is processed the way
+BaseStreamWidget.run_data_processor does, both groups submitted before either is collected.
+
+The added latency of the pool is its time per frame minus the in-process time, it is the round trip of the control
+messages and the copies in and out of the shared memory. For comparison, the round trip of the frames as zlib-compressed
+pickles, how the abandoned TCP processor sent them, is timed on a localhost pipe too.
+
+The worker processes only run in parallel with each other and with this process when there are cores for them, the
+throughput gain of the pool needs at least 3 cores.
+
+Run with:
+    python -m pytest tests/DSPWorkerPoolBenchmark.py -s
+
+Set PHYSIOLABXR_DSP_POOL_BENCHMARK_MAX_MS to change the regression threshold on the p99 added latency per frame.
+"""
+import copy
+import multiprocessing
+import os
+import pickle
+import time
+import zlib
+
+import numpy as np
+
+from physiolabxr.sub_process.processor import DSPWorkerPool
+from physiolabxr.utils.dsp_utils.dsp_modules import ButterworthBandpassFilter, NotchFilter, run_data_processors
+from tests.DSPWorkerPoolTest import create_pipeline
+
+num_channels = 64
+sampling_rate = 500
+frame_size = 10
+num_frames = 2000
+max_added_latency = float(os.environ.get('PHYSIOLABXR_DSP_POOL_BENCHMARK_MAX_MS', 5)) / 1e3
+
+
+def create_group_pipelines():
+    return {('EEG', f'group {i}'): create_pipeline(num_channels // 2, ButterworthBandpassFilter(lowcut=1, highcut=50, fs=sampling_rate, order=4),
+                                                   NotchFilter(w0=60, Q=20, fs=sampling_rate)) for i in range(2)}
+
+
+def zipped_pickle_echo(connection):
+    while (message := connection.recv_bytes()) != b'':
+        connection.send_bytes(zlib.compress(pickle.dumps(pickle.loads(zlib.decompress(message)), -1)))
+
+
+def print_latencies(name, frame_times):
+    frame_times = np.array(frame_times) * 1e3
+    print(f"{name}: {frame_times.mean():.3f} ms per frame, p50 {np.percentile(frame_times, 50):.3f} ms, "
+          f"p99 {np.percentile(frame_times, 99):.3f} ms, {1e3 / frame_times.mean():.0f} frames/s")
+
+
+def test_dsp_worker_pool_latency():
+    frames = np.random.default_rng(0).normal(size=(num_frames, num_channels, frame_size))
+    pipelines = create_group_pipelines()
+    group_slices = {key: slice(i * num_channels // 2, (i + 1) * num_channels // 2) for i, key in enumerate(pipelines)}
+
+    in_process_pipelines = copy.deepcopy(pipelines)
+    in_process_times, in_process_outputs = [], []
+    for frame in frames:
+        start_time = time.perf_counter()
+        frame = frame.copy()
+        for key, group_slice in group_slices.items():
+            frame[group_slice] = run_data_processors(frame[group_slice], in_process_pipelines[key])
+        in_process_times.append(time.perf_counter() - start_time)
+        in_process_outputs.append(frame)
+
+    for num_workers in (1, 2):
+        pool = DSPWorkerPool(num_workers=num_workers, timeout=5)
+        try:
+            pool_pipelines = copy.deepcopy(pipelines)
+            for key, group_slice in group_slices.items():  # wait for the workers to start
+                pool.run_data_processors(key, np.zeros((num_channels // 2, 1)), copy.deepcopy(pool_pipelines[key]))
+            pool_times = []
+            for frame, expected in zip(frames, in_process_outputs):
+                start_time = time.perf_counter()
+                frame = frame.copy()
+                for key, group_slice in group_slices.items():
+                    pool.submit(key, frame[group_slice], pool_pipelines[key])
+                for key, group_slice in group_slices.items():
+                    frame[group_slice] = pool.collect(key)
+                pool_times.append(time.perf_counter() - start_time)
+                np.testing.assert_allclose(frame, expected)
+        finally:
+            pool.close()
+        print_latencies(f"DSPWorkerPool, {num_workers} worker(s)", pool_times)
+        added_latency = np.array(pool_times) - np.array(in_process_times)
+        print(f"  added latency: p50 {np.percentile(added_latency, 50) * 1e3:.3f} ms, p99 {np.percentile(added_latency, 99) * 1e3:.3f} ms")
+        assert np.percentile(added_latency, 99) < max_added_latency
+    print_latencies("in process", in_process_times)
+
+    # the transport alone, as zipped pickles
+    context = multiprocessing.get_context('spawn')
+    connection, echo_connection = context.Pipe()
+    echo = context.Process(target=zipped_pickle_echo, args=(echo_connection,), daemon=True)
+    echo.start()
+    zipped_pickle_times = []
+    for frame in frames:
+        start_time = time.perf_counter()
+        for group_slice in group_slices.values():
+            connection.send_bytes(zlib.compress(pickle.dumps(frame[group_slice], -1)))
+            pickle.loads(zlib.decompress(connection.recv_bytes()))
+        zipped_pickle_times.append(time.perf_counter() - start_time)
+    connection.send_bytes(b'')
+    echo.join()
+    print_latencies("zipped pickle round trip, without processing", zipped_pickle_times)
@@ -0,0 +1,142 @@
+import copy
+import time
+
+import numpy as np
+import pytest
+
+from physiolabxr.configs.configs import AppConfigs
+from physiolabxr.exceptions.exceptions import DSPWorkerError
+from physiolabxr.sub_process.processor import DSPWorkerPool
+from physiolabxr.utils.dsp_utils.dsp_modules import ButterworthBandpassFilter, NotchFilter, RootMeanSquare, \
+    DataProcessor, DataProcessorBackend, run_data_processors
+
+
+class FailingProcessor(DataProcessor):
+    def process_buffer(self, data, backend=DataProcessorBackend.python):
+        raise ValueError('failed on purpose')
+
+
+class SlowProcessor(DataProcessor):
+    def process_buffer(self, data, backend=DataProcessorBackend.python):
+        time.sleep(1)
+        return data
+
+
+def create_pipeline(num_channels, *data_processors):
+    for data_processor in data_processors:
+        data_processor.set_channel_num(num_channels)
+        data_processor.evoke_data_processor()
+        data_processor.activate_data_processor()
+    return list(data_processors)
+
+
+def random_frames(num_channels, frame_sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.normal(size=(num_channels, frame_size)) for frame_size in frame_sizes]
+
+
+@pytest.fixture(scope='module')
+def dsp_worker_pool():
+    pool = DSPWorkerPool(num_workers=2, timeout=5)  # generous for the large frames on the per-sample backend
+    yield pool
+    pool.close()
+
+
+def test_pool_matches_in_process(dsp_worker_pool):
+    pipelines = {('stream', 'eeg'): create_pipeline(8, ButterworthBandpassFilter(lowcut=1, highcut=40, fs=250, order=4), NotchFilter(w0=60, Q=20, fs=250)),
+                 ('stream', 'emg'): create_pipeline(4, RootMeanSquare(fs=250, window=100))}
+    reference_pipelines = copy.deepcopy(pipelines)
+    frames = {key: random_frames(pipeline[0].channel_num, [10, 1, 50, 2000, 10], seed=i) for i, (key, pipeline) in enumerate(pipelines.items())}
+
+    for frame_index in range(5):  # the larger frames reallocate the shared memory
+        for key, pipeline in pipelines.items():
+            dsp_worker_pool.submit(key, frames[key][frame_index], pipeline)
+        for key in pipelines:
+            expected = run_data_processors(frames[key][frame_index], reference_pipelines[key])
+            np.testing.assert_allclose(dsp_worker_pool.collect(key), expected)
+    assert len(set(dsp_worker_pool._worker_indices.values())) == 2  # the pipelines are spread over the workers
+
+
+def test_pipeline_changes_are_sent(dsp_worker_pool):
+    key = ('stream', 'changing')
+    pipeline = create_pipeline(3, ButterworthBandpassFilter(lowcut=1, highcut=40, fs=250, order=2), NotchFilter(w0=50, Q=20, fs=250))
+    reference_pipeline = copy.deepcopy(pipeline)
+    frames = random_frames(3, [20] * 6)
+
+    def check(frame):
+        np.testing.assert_allclose(dsp_worker_pool.run_data_processors(key, frame, pipeline), run_data_processors(frame, reference_pipeline))
+
+    check(frames[0])
+    for data_processors in (pipeline, reference_pipeline):  # deactivating keeps the filter states
+        data_processors[1].deactivate_data_processor()
+    check(frames[1])
+    for data_processors in (pipeline, reference_pipeline):
+        data_processors[1].activate_data_processor()
+    check(frames[2])
+    for data_processors in (pipeline, reference_pipeline):  # evoking with new parameters resets the states
+        data_processors[0].set_data_processor_params(lowcut=2, highcut=30, fs=250, order=3)
+        data_processors[0].evoke_data_processor()
+    check(frames[3])
+    pipeline.pop(1)
+    reference_pipeline.pop(1)
+    check(frames[4])
+
+    for data_processor in pipeline:  # nothing active, the frame isn't sent
+        data_processor.deactivate_data_processor()
+    assert dsp_worker_pool.run_data_processors(key, frames[5], pipeline) is frames[5]
+
+    dsp_worker_pool.remove_stream('stream')
+    assert all(key[0] != 'stream' for key in dsp_worker_pool._worker_indices)
+
+
+def test_worker_errors(dsp_worker_pool):
+    failing_pipeline = create_pipeline(2, FailingProcessor())
+    with pytest.raises(DSPWorkerError, match='failed on purpose'):
+        dsp_worker_pool.run_data_processors(('failing', 'group'), np.zeros((2, 10)), failing_pipeline)
+
+    with pytest.raises(DSPWorkerError, match='already in process'):
+        dsp_worker_pool.submit(('failing', 'group'), np.zeros((2, 10)), failing_pipeline)
+        dsp_worker_pool.submit(('failing', 'group'), np.zeros((2, 10)), failing_pipeline)
+    with pytest.raises(DSPWorkerError):
+        dsp_worker_pool.collect(('failing', 'group'))
+    dsp_worker_pool.remove(('failing', 'group'))
+
+
+def test_worker_restarted_on_timeout():
+    pool = DSPWorkerPool(num_workers=1, timeout=5)
+    try:
+        pipeline = create_pipeline(2, NotchFilter(w0=60, Q=20, fs=250))
+        frame = np.ones((2, 10))
+        expected = run_data_processors(frame, copy.deepcopy(pipeline))
+        np.testing.assert_allclose(pool.run_data_processors('fast', frame, pipeline), expected)  # the worker has started
+
+        pool.timeout = pool.first_frame_timeout = 0.2
+        slow_pipeline = create_pipeline(2, SlowProcessor())
+        start_time = time.perf_counter()
+        with pytest.raises(DSPWorkerError, match='restarted'):
+            pool.run_data_processors('slow', frame, slow_pipeline)
+        assert time.perf_counter() - start_time < 0.9  # the added latency is bounded by the timeout
+
+        pool.timeout = pool.first_frame_timeout = AppConfigs().dsp_worker_timeout / 1e3  # the new worker has warmed up before the restart returns
+        np.testing.assert_allclose(pool.run_data_processors('fast', frame, pipeline), expected)  # the pipeline is sent again to the new worker
+    finally:
+        pool.close()
+
+
+def test_default_timeout_from_the_first_frame():
+    """
+    the workers warm up the kernels before the pool takes frames, so the frames are returned within the default timeout
+    from the first one, without restarting the worker
+    """
+    pool = DSPWorkerPool(num_workers=1, timeout=AppConfigs().dsp_worker_timeout / 1e3)
+    try:
+        worker_pid = pool._workers[0].process.pid
+        pipeline = create_pipeline(8, ButterworthBandpassFilter(lowcut=1, highcut=40, fs=250, order=4), NotchFilter(w0=60, Q=20, fs=250), RootMeanSquare(fs=250, window=100))
+        reference_pipeline = copy.deepcopy(pipeline)
+        for backend in (DataProcessorBackend.numba, DataProcessorBackend.numpy):
+            for frame in random_frames(8, [10] * 20):
+                np.testing.assert_allclose(pool.run_data_processors(('stream', 'eeg'), frame, pipeline, backend=backend), run_data_processors(frame, reference_pipeline))
+                time.sleep(0.02)  # a frame every 20 ms
+        assert pool._workers[0].process.pid == worker_pid
+    finally:
+        pool.close()
@@ -0,0 +1,36 @@
+"""
+Benchmark of the data processor backends, the time per frame of a group's pipeline run per sample, vectorized with
+numpy and compiled with numba.
+
+The group is 64 channels at 500 Hz with a 4th order Butterworth bandpass, a 60 Hz notch filter and a 200 ms
+root-mean-square, the frames are 10 samples, as pulled by the stream widgets, and 500 samples, as after a stall.
+
+Run with:
+    python -m pytest tests/DataProcessorKernelBenchmark.py -s
+"""
+import copy
+import time
+
+from physiolabxr.utils.dsp_utils.dsp_modules import ButterworthBandpassFilter, NotchFilter, RootMeanSquare, \
+    DataProcessorBackend, run_data_processors
+from tests.DSPWorkerPoolTest import create_pipeline, random_frames
+
+num_channels = 64
+sampling_rate = 500
+
+
+def test_data_processor_backends():
+    pipeline = create_pipeline(num_channels, ButterworthBandpassFilter(lowcut=1, highcut=50, fs=sampling_rate, order=4),
+                               NotchFilter(w0=60, Q=20, fs=sampling_rate), RootMeanSquare(fs=sampling_rate, window=200))
+    for frame_size in (10, 500):
+        frames = random_frames(num_channels, [frame_size] * (20000 // frame_size))
+        frame_times = {}
+        for backend in DataProcessorBackend:
+            backend_pipeline = copy.deepcopy(pipeline)
+            run_data_processors(frames[0], backend_pipeline, backend=backend)  # the numba kernels are compiled on first use
+            start_time = time.perf_counter()
+            for frame in frames:
+                run_data_processors(frame, backend_pipeline, backend=backend)
+            frame_times[backend] = (time.perf_counter() - start_time) / len(frames)
+            print(f"{frame_size} samples per frame, {backend.name}: {frame_times[backend] * 1e3:.3f} ms per frame")
+        assert frame_times[DataProcessorBackend.numpy] < frame_times[DataProcessorBackend.python]
@@ -0,0 +1,84 @@
+import copy
+
+import numpy as np
+import pytest
+
+from physiolabxr.utils.dsp_utils import dsp_kernels
+from physiolabxr.utils.dsp_utils.dsp_modules import ButterworthBandpassFilter, ButterworthHighpassFilter, NotchFilter, \
+    RootMeanSquare, ClutterRemoval, DataProcessor, DataProcessorBackend, run_data_processors
+from tests.DSPWorkerPoolTest import create_pipeline, random_frames
+
+num_channels = 4
+frame_sizes = [1, 7, 300, 2, 1000, 13]  # shorter and longer than the filter taps and the RMS window
+
+
+class ScaleProcessor(DataProcessor):
+    """
+    a data processor without kernels, it breaks the fused runs
+    """
+    def __init__(self):
+        super().__init__()
+        self.set_data_processor_valid(True)
+
+    def process_sample(self, data):
+        return 2 * data
+
+
+def create_pipelines():
+    return {'bandpass': create_pipeline(num_channels, ButterworthBandpassFilter(lowcut=1, highcut=40, fs=250, order=4)),
+            'notch': create_pipeline(num_channels, NotchFilter(w0=60, Q=20, fs=250)),
+            'rms': create_pipeline(num_channels, RootMeanSquare(fs=250, window=200)),
+            'clutter': create_pipeline(num_channels, ClutterRemoval(signal_clutter_ratio=0.9)),
+            'chain': create_pipeline(num_channels, ButterworthHighpassFilter(cutoff=1, fs=250, order=2), NotchFilter(w0=60, Q=20, fs=250),
+                                     ClutterRemoval(signal_clutter_ratio=0.5), RootMeanSquare(fs=250, window=40)),
+            'broken chain': create_pipeline(num_channels, NotchFilter(w0=60, Q=20, fs=250), ScaleProcessor(),
+                                            RootMeanSquare(fs=250, window=40), ClutterRemoval(signal_clutter_ratio=0.5))}
+
+
+@pytest.mark.parametrize('backend', [DataProcessorBackend.numpy, DataProcessorBackend.numba])
+@pytest.mark.parametrize('pipeline_name', list(create_pipelines()))
+def test_backend_matches_per_sample(backend, pipeline_name):
+    pipeline = create_pipelines()[pipeline_name]
+    reference_pipeline = copy.deepcopy(pipeline)
+    for frame in random_frames(num_channels, frame_sizes):
+        expected = run_data_processors(frame, reference_pipeline)
+        np.testing.assert_allclose(run_data_processors(frame, pipeline, backend=backend), expected, atol=1e-8)
+
+
+def test_switching_backends_keeps_states():
+    pipeline = create_pipelines()['chain']
+    reference_pipeline = copy.deepcopy(pipeline)
+    backends = [DataProcessorBackend.numba, DataProcessorBackend.python, DataProcessorBackend.numpy, DataProcessorBackend.numba]
+    for frame, backend in zip(random_frames(num_channels, [50, 20, 30, 40]), backends):
+        expected = run_data_processors(frame, reference_pipeline)
+        np.testing.assert_allclose(run_data_processors(frame, pipeline, backend=backend), expected, atol=1e-8)
+
+
+def test_inactive_processors_in_fused_run():
+    pipeline = create_pipelines()['chain']
+    pipeline[1].deactivate_data_processor()
+    reference_pipeline = copy.deepcopy(pipeline)
+    for frame in random_frames(num_channels, [10, 100]):
+        expected = run_data_processors(frame, reference_pipeline)
+        np.testing.assert_allclose(run_data_processors(frame, pipeline, backend=DataProcessorBackend.numba), expected, atol=1e-8)
+    np.testing.assert_array_equal(pipeline[1]._zi, 0)  # the inactive filter kept its state
+
+
+def test_rms_without_drift():
+    rms = create_pipeline(1, RootMeanSquare(fs=100, window=100))  # a window of 10 samples
+    frame = np.full((1, 100003), 1e6)
+    frame[:, -10:] = 1e-3  # the window sums must not be left with the rounding error of the large values
+    for backend in (DataProcessorBackend.numpy, DataProcessorBackend.numba):
+        output = run_data_processors(frame, copy.deepcopy(rms), backend=backend)
+        np.testing.assert_allclose(output[0, :10], np.sqrt(np.arange(1, 11) / 10) * 1e6)
+        np.testing.assert_allclose(output[0, -4], np.sqrt((1e12 * 3 + 1e-6 * 7) / 10))
+        np.testing.assert_allclose(output[0, -1], 1e-3)
+
+
+def test_numba_falls_back_to_numpy(monkeypatch):
+    monkeypatch.setattr(dsp_kernels, 'is_numba_available', False)
+    pipeline = create_pipelines()['chain']
+    reference_pipeline = copy.deepcopy(pipeline)
+    frame = random_frames(num_channels, [100])[0]
+    np.testing.assert_allclose(run_data_processors(frame, pipeline, backend=DataProcessorBackend.numba),
+                               run_data_processors(frame, reference_pipeline), atol=1e-8)
@@ -0,0 +1,45 @@
+"""
+Benchmark of the compiled data processor pipelines, against running the data processors one after another.
+
+The group is 64 channels at 500 Hz with a 60 Hz notch filter, a 4th order Butterworth bandpass and a 200 ms
+root-mean-square, the frames are 10 and 500 samples. The notch and the bandpass are merged into one cascade of second-
+order sections.
+
+Run with:
+    python -m pytest tests/DataProcessorPipelineBenchmark.py -s
+"""
+import copy
+import time
+
+from physiolabxr.utils.dsp_utils.dsp_modules import ButterworthBandpassFilter, NotchFilter, RootMeanSquare, \
+    DataProcessorBackend, run_data_processors
+from physiolabxr.utils.dsp_utils.dsp_pipeline import DataProcessorPipeline
+from tests.DSPWorkerPoolTest import create_pipeline, random_frames
+
+num_channels = 64
+sampling_rate = 500
+
+
+def time_frames(run, frames):
+    run(frames[0])  # the numba kernels are compiled on first use
+    start_time = time.perf_counter()
+    for frame in frames:
+        run(frame)
+    return (time.perf_counter() - start_time) / len(frames)
+
+
+def test_data_processor_pipeline():
+    data_processors = create_pipeline(num_channels, NotchFilter(w0=60, Q=20, fs=sampling_rate),
+                                      ButterworthBandpassFilter(lowcut=1, highcut=50, fs=sampling_rate, order=4),
+                                      RootMeanSquare(fs=sampling_rate, window=200))
+    for frame_size in (10, 500):
+        frames = random_frames(num_channels, [frame_size] * (20000 // frame_size))
+        for backend in (DataProcessorBackend.numpy, DataProcessorBackend.numba):
+            uncompiled_data_processors = copy.deepcopy(data_processors)
+            uncompiled_time = time_frames(lambda frame: run_data_processors(frame, uncompiled_data_processors, backend=backend), frames)
+            pipeline = DataProcessorPipeline(copy.deepcopy(data_processors), profile=True)
+            compiled_time = time_frames(lambda frame: pipeline.run(frame, backend=backend), frames)
+            print(f"{frame_size} samples per frame, {backend.name}: {uncompiled_time * 1e3:.3f} ms per frame uncompiled, {compiled_time * 1e3:.3f} ms compiled")
+            for name, mean_time, _ in pipeline.get_stage_timings():
+                print(f"  {name}: {mean_time * 1e3:.3f} ms")
+            assert compiled_time < 1.5 * uncompiled_time
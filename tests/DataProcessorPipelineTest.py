@@ -0,0 +1,82 @@
+import copy
+
+import numpy as np
+import pytest
+
+from physiolabxr.utils.dsp_utils.dsp_modules import ButterworthBandpassFilter, ButterworthLowpassFilter, NotchFilter, \
+    RootMeanSquare, ClutterRemoval, DataProcessorBackend, run_data_processors
+from physiolabxr.utils.dsp_utils.dsp_pipeline import DataProcessorPipeline
+from tests.DataProcessorKernelTest import ScaleProcessor
+from tests.DSPWorkerPoolTest import create_pipeline, random_frames
+
+num_channels = 4
+
+
+def create_data_processors():
+    return create_pipeline(num_channels, NotchFilter(w0=60, Q=20, fs=250), ButterworthBandpassFilter(lowcut=1, highcut=40, fs=250, order=4),
+                           RootMeanSquare(fs=250, window=40), ScaleProcessor(), ButterworthLowpassFilter(cutoff=20, fs=250, order=2),
+                           NotchFilter(w0=50, Q=20, fs=250), ClutterRemoval(signal_clutter_ratio=0.5))
+
+
+def check_frames(pipeline, reference_data_processors, frames, backend):
+    for frame in frames:
+        expected = run_data_processors(frame, reference_data_processors)
+        np.testing.assert_allclose(pipeline.run(frame, backend=backend), expected, atol=1e-8)
+
+
+@pytest.mark.parametrize('backend', list(DataProcessorBackend))
+def test_pipeline_matches_uncompiled(backend):
+    data_processors = create_data_processors()
+    reference_data_processors = copy.deepcopy(data_processors)
+    pipeline = DataProcessorPipeline(data_processors)
+    check_frames(pipeline, reference_data_processors, random_frames(num_channels, [1, 10, 300, 3, 1000]), backend)
+
+
+def test_stages():
+    pipeline = DataProcessorPipeline(create_data_processors())
+    pipeline.run(np.zeros((num_channels, 10)), backend=DataProcessorBackend.numpy)
+    assert pipeline.get_stage_names() == ['SOS cascade (NotchFilter, ButterworthBandpassFilter)', 'RootMeanSquare', 'ScaleProcessor',
+                                          'SOS cascade (ButterworthLowpassFilter, NotchFilter)', 'ClutterRemoval']
+    pipeline.run(np.zeros((num_channels, 10)), backend=DataProcessorBackend.numba)
+    assert pipeline.get_stage_names() == ['fused (NotchFilter, ButterworthBandpassFilter, RootMeanSquare)', 'ScaleProcessor',
+                                          'fused (ButterworthLowpassFilter, NotchFilter, ClutterRemoval)']
+
+
+def test_pipeline_changes_are_compiled():
+    data_processors = create_data_processors()
+    reference_data_processors = copy.deepcopy(data_processors)
+    pipeline = DataProcessorPipeline(data_processors)
+    frames = iter(random_frames(num_channels, [20] * 6))
+
+    check_frames(pipeline, reference_data_processors, [next(frames)], DataProcessorBackend.numpy)
+    for _data_processors in (data_processors, reference_data_processors):  # splits the first cascade, keeping the states
+        _data_processors[1].deactivate_data_processor()
+    check_frames(pipeline, reference_data_processors, [next(frames)], DataProcessorBackend.numpy)
+    assert pipeline.get_stage_names()[0] == 'SOS cascade (NotchFilter)'
+    for _data_processors in (data_processors, reference_data_processors):
+        _data_processors[1].activate_data_processor()
+        _data_processors[0].set_data_processor_params(w0=50, Q=10, fs=250)
+        _data_processors[0].evoke_data_processor()
+    check_frames(pipeline, reference_data_processors, [next(frames)], DataProcessorBackend.numba)
+    for _data_processors in (data_processors, reference_data_processors):  # the list is changed in place, as in the presets
+        _data_processors.pop(3)
+    check_frames(pipeline, reference_data_processors, [next(frames)], DataProcessorBackend.numba)
+    assert len(pipeline.get_stage_names()) == 1
+    check_frames(pipeline, reference_data_processors, [next(frames)], DataProcessorBackend.python)
+
+
+def test_scratch_buffers_are_reused():
+    pipeline = DataProcessorPipeline(create_pipeline(num_channels, RootMeanSquare(fs=250, window=40), ClutterRemoval(signal_clutter_ratio=0.5)))
+    first_output = pipeline.run(np.ones((num_channels, 100)), backend=DataProcessorBackend.numpy)
+    second_output = pipeline.run(np.ones((num_channels, 50)), backend=DataProcessorBackend.numpy)
+    assert np.shares_memory(first_output, second_output)
+    assert pipeline.run(np.ones((num_channels, 0)), backend=DataProcessorBackend.numpy).shape == (num_channels, 0)
+
+
+def test_stage_timings():
+    pipeline = DataProcessorPipeline(create_data_processors(), profile=True)
+    for frame in random_frames(num_channels, [10] * 3):
+        pipeline.run(frame, backend=DataProcessorBackend.numpy)
+    timings = pipeline.get_stage_timings()
+    assert [name for name, _, _ in timings] == pipeline.get_stage_names()
+    assert all(mean_time > 0 and last_time > 0 for _, mean_time, last_time in timings)
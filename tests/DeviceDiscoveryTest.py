@@ -0,0 +1,55 @@
+import time
+
+from physiolabxr.configs.configs import AppConfigs
+AppConfigs(_reset=True)  # create the singleton app configs object
+
+from physiolabxr.presets.PresetEnums import PresetType
+from physiolabxr.presets.Presets import VideoPreset, AudioPreset, create_default_audio_preset, \
+    save_device_presets_cache, load_device_presets_cache, invalidate_device_presets_cache
+
+
+def test_monitor_check_does_not_block():
+    start_time = time.perf_counter()
+    AppConfigs().check_monitor_availability()
+    assert time.perf_counter() - start_time < 0.1
+
+    AppConfigs().wait_monitor_check()
+    assert AppConfigs().is_monitor_check_done()
+    if AppConfigs().is_monitor_available:
+        assert len(AppConfigs().get_screen_capture_size()) == 2
+    else:  # headless machines
+        assert AppConfigs().get_screen_capture_size() is None
+        assert AppConfigs().monitor_error_message is not None
+
+
+def test_monitor_recheck_does_not_block():
+    AppConfigs().check_monitor_availability()
+    start_time = time.perf_counter()
+    AppConfigs().check_monitor_availability()  # chained after the running check instead of waiting for it
+    assert time.perf_counter() - start_time < 0.1
+
+    AppConfigs().wait_monitor_check()
+    assert AppConfigs().is_monitor_check_done()
+
+
+def test_device_presets_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(AppConfigs(), 'app_data_path', str(tmp_path))  # keep the app's device cache untouched
+    invalidate_device_presets_cache()
+    assert load_device_presets_cache(PresetType.WEBCAM) == []
+    assert load_device_presets_cache(PresetType.AUDIO) == []
+
+    video_presets = [VideoPreset(stream_name=f'Camera {i}', preset_type=PresetType.WEBCAM, video_id=i, height=480, width=640, nchannels=3) for i in range(2)]
+    audio_presets = [AudioPreset(**create_default_audio_preset('Microphone', audio_device_index=1, num_channels=2))]
+    save_device_presets_cache(PresetType.WEBCAM, video_presets)
+    save_device_presets_cache(PresetType.AUDIO, audio_presets)
+
+    assert load_device_presets_cache(PresetType.WEBCAM) == video_presets
+    assert load_device_presets_cache(PresetType.AUDIO) == audio_presets
+
+    # a new discovery replaces the cached devices
+    save_device_presets_cache(PresetType.WEBCAM, video_presets[:1])
+    assert load_device_presets_cache(PresetType.WEBCAM) == video_presets[:1]
+    assert load_device_presets_cache(PresetType.AUDIO) == audio_presets
+
+    invalidate_device_presets_cache()
+    assert load_device_presets_cache(PresetType.WEBCAM) == []
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from physiolabxr.scripting.physio.epochs import get_event_locked_data, buffer_event_locked_data, EpochBuffer, \
+    EventLockedDataBuffer
+
+
+def get_event_locked_data_per_event(event_marker, data, events_of_interest, tmin, tmax, srate, reject=None):
+    """
+    the per-event reference of get_event_locked_data
+    """
+    event_marker, event_marker_time = event_marker
+    data, data_time = data
+    epoch_length = int((tmax - tmin) * srate)
+    rtn = {}
+    latest_event_start_time = -1
+    for e in events_of_interest:
+        epochs = []
+        for s in event_marker_time[event_marker[0] == e]:
+            i = np.argmin(abs(data_time - (s + tmin)))
+            j = i + epoch_length
+            if j < len(data_time) and (reject is None or np.max(np.max(data[:, i:j], axis=0) - np.min(data[:, i:j], axis=0)) <= reject):
+                epochs.append(data[:, i:j])
+                latest_event_start_time = max(latest_event_start_time, s)
+        if len(epochs) > 0:
+            rtn[e] = np.array(epochs)
+    return rtn, latest_event_start_time
+
+
+def simulate_stream(duration, srate=128, n_channels=8, n_events=40, seed=0):
+    rng = np.random.default_rng(seed)
+    data_time = np.arange(int(duration * srate)) / srate + rng.uniform(0, 0.2 / srate, int(duration * srate))
+    data = rng.normal(0, 1, (n_channels, len(data_time)))
+    event_marker_time = np.sort(rng.uniform(0, duration, n_events))
+    event_marker = rng.integers(1, 4, (1, n_events))
+    return (event_marker, event_marker_time), (data, data_time)
+
+
+@pytest.mark.parametrize('reject', [None, 5.])
+def test_event_locked_data_matches_per_event_reference(reject):
+    event_marker, data = simulate_stream(30)
+    event_locked_data, last_event_time = get_event_locked_data(event_marker, data, [1, 2, 4], -0.1, 0.8, 128, return_last_event_time=True, reject=reject)
+    expected_event_locked_data, expected_last_event_time = get_event_locked_data_per_event(event_marker, data, [1, 2, 4], -0.1, 0.8, 128, reject=reject)
+    assert list(event_locked_data.keys()) == list(expected_event_locked_data.keys())
+    for e, epochs in event_locked_data.items():
+        assert np.array_equal(epochs, expected_event_locked_data[e])
+        assert epochs.flags['C_CONTIGUOUS']
+    assert last_event_time == expected_last_event_time
+    if reject is not None:
+        assert sum(len(v) for v in event_locked_data.values()) < sum(len(v) for v in get_event_locked_data(event_marker, data, [1, 2, 4], -0.1, 0.8, 128)[0].values())
+
+
+def test_multi_modal_event_locked_data():
+    event_marker, eeg = simulate_stream(30, srate=128)
+    _, eye = simulate_stream(30, srate=200, n_channels=2)
+    event_locked_data = get_event_locked_data(event_marker, {'eeg': eeg, 'eye': eye}, [1, 2], tmin={'eeg': -0.1, 'eye': -0.5},
+                                              tmax={'eeg': 0.8, 'eye': 3.}, srate={'eeg': 128, 'eye': 200})
+    assert event_locked_data[1]['eeg'].shape[1:] == (8, int(0.9 * 128))
+    assert event_locked_data[1]['eye'].shape[1:] == (2, int(3.5 * 200))
+
+
+def test_buffer_grows_in_place():
+    buffer = {}
+    epochs = []
+    previous_views = []
+    for i in range(100):
+        new_epochs = np.full((3, 2, 5), i, dtype=np.float32)
+        buffer = buffer_event_locked_data({1: new_epochs, 2: new_epochs[:1]}, buffer)
+        epochs.append(new_epochs)
+        previous_views.append(buffer[1])
+    assert isinstance(buffer, EventLockedDataBuffer)
+    assert np.array_equal(buffer[1], np.concatenate(epochs))
+    assert buffer[2].shape == (100, 2, 5)
+    assert all(np.array_equal(view, np.concatenate(epochs[:i + 1])) for i, view in enumerate(previous_views))  # appending doesn't change the epochs given out before
+    assert buffer_event_locked_data({}, buffer) is buffer
+
+
+def test_buffer_multi_modal():
+    buffer = buffer_event_locked_data({1: {'eeg': np.zeros((2, 3, 4)), 'eye': np.zeros((2, 1, 6))}}, {})
+    buffer = buffer_event_locked_data({1: {'eeg': np.ones((1, 3, 4))}, 2: {'eye': np.ones((1, 1, 6))}}, buffer)
+    assert buffer[1]['eeg'].shape == (3, 3, 4) and buffer[1]['eye'].shape == (2, 1, 6) and buffer[2]['eye'].shape == (1, 1, 6)
+    single_modal_buffer = buffer_event_locked_data({1: np.zeros((2, 3, 4))}, {})
+    with pytest.raises(ValueError):
+        buffer_event_locked_data({1: {'eeg': np.zeros((2, 3, 4))}}, single_modal_buffer)
+
+
+def test_epoch_buffer_shape_mismatch():
+    epoch_buffer = EpochBuffer(np.zeros((2, 3, 4)))
+    with pytest.raises(ValueError):
+        epoch_buffer.append(np.zeros((1, 3, 5)))
+    assert epoch_buffer.append(np.ones((1, 3, 4), dtype=np.float64)).shape == (3, 3, 4)
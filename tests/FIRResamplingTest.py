@@ -0,0 +1,70 @@
+import copy
+
+import numpy as np
+import pytest
+from scipy.signal import firwin, lfilter, upfirdn
+
+from physiolabxr.exceptions.exceptions import DataProcessorEvokeFailedError
+from physiolabxr.utils.dsp_utils.dsp_modules import FIRLowpassFilter, FIRBandpassFilter, NotchFilter, \
+    DataProcessorBackend, PolyphaseResampler, run_data_processors
+from physiolabxr.utils.dsp_utils.dsp_pipeline import DataProcessorPipeline
+from tests.DSPWorkerPoolTest import create_pipeline, random_frames
+
+num_channels = 3
+frame_sizes = [1, 7, 300, 2, 0, 1000, 13]  # shorter and longer than the filter taps
+
+
+@pytest.mark.parametrize('backend', list(DataProcessorBackend))
+def test_fir_filter_matches_lfilter(backend):
+    pipeline = create_pipeline(num_channels, FIRLowpassFilter(cutoff=40, fs=250, num_taps=51), FIRBandpassFilter(lowcut=1, highcut=30, fs=250, num_taps=32))
+    frames = random_frames(num_channels, frame_sizes)
+    expected = np.concatenate(frames, axis=1)
+    for fir_filter in pipeline:
+        expected = lfilter(fir_filter._taps, [1], expected, axis=1)
+    output = np.concatenate([run_data_processors(frame, pipeline, backend=backend) for frame in frames], axis=1)
+    np.testing.assert_allclose(output, expected, atol=1e-10)
+
+
+def test_fir_filter_in_compiled_pipeline():
+    data_processors = create_pipeline(num_channels, NotchFilter(w0=60, Q=20, fs=250), FIRLowpassFilter(cutoff=40, fs=250, num_taps=51))
+    reference_data_processors = copy.deepcopy(data_processors)
+    pipeline = DataProcessorPipeline(data_processors)
+    for frame, backend in zip(random_frames(num_channels, frame_sizes), [DataProcessorBackend.numpy, DataProcessorBackend.numba] * 4):
+        np.testing.assert_allclose(pipeline.run(frame, backend=backend), run_data_processors(frame, reference_data_processors), atol=1e-10)
+
+
+def test_fir_filter_invalid_params():
+    with pytest.raises(DataProcessorEvokeFailedError):
+        create_pipeline(num_channels, FIRLowpassFilter(cutoff=200, fs=250, num_taps=51))
+    with pytest.raises(DataProcessorEvokeFailedError):
+        create_pipeline(num_channels, FIRBandpassFilter(lowcut=1, highcut=30, fs=250, num_taps=0))
+
+
+@pytest.mark.parametrize('fs, target_fs', [(2000, 250), (1000, 300), (250, 1000), (1000, 1000)])
+def test_resampler_matches_upfirdn(fs, target_fs):
+    resampler = PolyphaseResampler(fs=fs, target_fs=target_fs, channel_num=num_channels)
+    assert resampler.target_fs == target_fs
+    frames = random_frames(num_channels, frame_sizes)
+    timestamps = np.arange(sum(frame_sizes)) / fs + 100
+    frame_ends = np.cumsum(frame_sizes)
+    outputs = [resampler.process_buffer(frame, timestamps[end - len(frame.T):end]) for frame, end in zip(frames, frame_ends)]
+    output = np.concatenate([frame for frame, _ in outputs], axis=1)
+    output_timestamps = np.concatenate([frame_timestamps for _, frame_timestamps in outputs])
+
+    # the same as resampling the whole stream, without the outputs that need input after the last frame
+    max_rate = max(resampler.up, resampler.down)
+    taps = firwin(20 * max_rate + 1, 1 / max_rate, window=('kaiser', 5.0)) * resampler.up if max_rate > 1 else np.ones(1)
+    assert output.shape[1] == -(-sum(frame_sizes) * resampler.up // resampler.down)
+    np.testing.assert_allclose(output, upfirdn(taps, np.concatenate(frames, axis=1), resampler.up, resampler.down, axis=1)[:, :output.shape[1]], atol=1e-10)
+
+    # the timestamps are at the target rate, shifted back by the delay of the filter
+    delay = (len(taps) - 1) / 2 / resampler.up / fs
+    np.testing.assert_allclose(output_timestamps, 100 + np.arange(output.shape[1]) / target_fs - delay)
+
+
+def test_resampler_removes_aliases():
+    fs, target_fs = 1000, 100
+    resampler = PolyphaseResampler(fs=fs, target_fs=target_fs, channel_num=1)
+    time = np.arange(4000) / fs
+    output, _ = resampler.process_buffer(np.sin(2 * np.pi * 5 * time)[None, :] + np.sin(2 * np.pi * 190 * time)[None, :], time)
+    np.testing.assert_allclose(output[0, 100:], np.sin(2 * np.pi * 5 * (np.arange(100, 400) / target_fs - resampler._delay / fs)), atol=1e-2)
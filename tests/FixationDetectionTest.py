@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from physiolabxr.scripting.physio.eyetracking import fixation_detection_idt, IDTFixationDetector, _calculate_gaze_angles
+from physiolabxr.scripting.physio.utils import time_to_index, times_to_indices
+
+
+def fixation_detection_idt_per_window(gaze_xyz, timestamps, window_size, dispersion_threshold_degree, saccade_min_sample=2):
+    """
+    the per-window reference of fixation_detection_idt
+    """
+    gaze_angles_degree = _calculate_gaze_angles(gaze_xyz)
+    fixations = []
+    for start, t in enumerate(timestamps):
+        end = time_to_index(timestamps, t + window_size)
+        if end - start < saccade_min_sample:
+            continue
+        fixations.append([int(np.std(gaze_angles_degree[start:end]) < dispersion_threshold_degree), t + window_size / 2])
+    return np.array(fixations).reshape(-1, 2).T
+
+
+def simulate_gaze(duration, sampling_rate=200, seed=0):
+    """
+    gaze vectors that fixate and jump between fixations, with jittered timestamps and gaps of nan
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = np.cumsum(rng.uniform(0.5, 1.5, int(duration * sampling_rate)) / sampling_rate)
+    fixation_angles = np.radians(rng.uniform(-20, 20, (int(duration * 4), 2)))
+    angles = fixation_angles[(timestamps * 4).astype(int)] + np.radians(rng.normal(0, 0.2, (len(timestamps), 2)))
+    gaze_xyz = np.stack([np.sin(angles[:, 0]), np.sin(angles[:, 1]), np.ones(len(timestamps))])
+    for gap_start in rng.integers(0, len(timestamps) - 10, 5):
+        gaze_xyz[:, gap_start:gap_start + 10] = np.nan
+    return gaze_xyz, timestamps
+
+
+def test_times_to_indices_matches_time_to_index():
+    timestamps = np.array([0., 1., 1., 2., 4., 4., 4., 7.])
+    times = np.array([-1., 0.4, 0.5, 0.9, 1.4, 1.5, 3., 3.1, 5.5, 6., 10.])
+    assert list(times_to_indices(timestamps, times)) == [time_to_index(timestamps, t) for t in times]
+
+
+@pytest.mark.parametrize('window_size, dispersion_threshold_degree', [(0.175, 0.5), (0.1, 0.3), (0.3, 1.)])
+def test_fixation_detection_matches_per_window_reference(window_size, dispersion_threshold_degree):
+    gaze_xyz, timestamps = simulate_gaze(10)
+    fixations, last_window_start = fixation_detection_idt(gaze_xyz, timestamps, window_size, dispersion_threshold_degree, return_last_window_start=True)
+    expected_fixations = fixation_detection_idt_per_window(gaze_xyz, timestamps, window_size, dispersion_threshold_degree)
+    assert np.array_equal(fixations, expected_fixations)
+    assert 0 < np.mean(fixations[0]) < 1
+    assert timestamps[last_window_start] + window_size / 2 == fixations[1, -1]
+
+
+def test_incremental_fixation_detection():
+    gaze_xyz, timestamps = simulate_gaze(10)
+    window_size = 0.175
+    expected_fixations = fixation_detection_idt(gaze_xyz, timestamps, window_size)
+
+    fixation_detector = IDTFixationDetector(window_size)
+    chunks = np.split(np.arange(len(timestamps)), np.sort(np.random.default_rng(1).integers(0, len(timestamps), 100)))
+    fixations = np.concatenate([fixation_detector.process(gaze_xyz[:, chunk], timestamps[chunk]) for chunk in chunks], axis=1)
+
+    # the same up to the windows that are cut short at the end of the data
+    complete_window_count = fixations.shape[1]
+    assert np.array_equal(fixations, expected_fixations[:, :complete_window_count])
+    assert np.all(expected_fixations[1, complete_window_count:] + window_size / 2 > timestamps[-1])
+    assert len(fixation_detector.timestamps) < window_size * 200 * 2  # only the samples of the incomplete windows are kept
+    assert fixation_detector.last_window_start_timestamp + window_size / 2 == fixations[1, -1]
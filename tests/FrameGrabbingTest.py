@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+import pytest
+
+from physiolabxr.presets.PresetEnums import VideoDeviceChannelOrder
+from physiolabxr.utils.image_utils import FrameConverter, process_image
+from physiolabxr.utils.screen_capture_utils import FrameRateLimiter, XShmScreenCapture
+from physiolabxr.utils.video_capture_utils import LatestFrameGrabber
+
+
+class CaptureFromArrays:
+    """
+    behaves like a cv2.VideoCapture that delivers a numbered frame every <frame_interval> seconds
+    """
+    def __init__(self, frame_shape, frame_interval):
+        self.frame_shape = frame_shape
+        self.frame_interval = frame_interval
+        self.frame_number = 0
+        self.is_opened = True
+
+    def read(self, image=None):
+        time.sleep(self.frame_interval)
+        if image is None or image.shape != self.frame_shape:
+            image = np.empty(self.frame_shape, dtype=np.uint8)
+        image[:] = self.frame_number % 256
+        self.frame_number += 1
+        return True, image
+
+    def isOpened(self):
+        return self.is_opened
+
+
+@pytest.mark.parametrize('frame_shape, scale', [((480, 640, 3), 1.0), ((1080, 1920, 3), 0.5), ((7, 13, 3), 2.3), ((720, 1280, 3), 0.37)])
+@pytest.mark.parametrize('channel_order', [VideoDeviceChannelOrder.BGR, VideoDeviceChannelOrder.RGB])
+def test_frame_converter_matches_process_image(frame_shape, scale, channel_order):
+    image = np.random.randint(0, 256, frame_shape, dtype=np.uint8)
+    expected = np.swapaxes(np.flip(process_image(image, channel_order, scale), axis=0), 0, 1)
+    frame_converter = FrameConverter()
+    for _ in range(2):  # the second call reuses the maps
+        frame = frame_converter.convert(image, channel_order, scale)
+        assert np.array_equal(frame, expected)
+        assert frame.flags['C_CONTIGUOUS']
+
+
+def test_latest_frame_grabber_drops_old_frames():
+    capture = CaptureFromArrays((48, 64, 3), frame_interval=1e-3)
+    frame_grabber = LatestFrameGrabber(capture)
+    frame_grabber.start()
+    time.sleep(0.1)  # a slow consumer
+    frame, timestamp = frame_grabber.get_latest_frame()
+    assert frame is not None and timestamp is not None
+    frame_grabber.stop()
+
+    # every grabbed frame is either consumed, dropped or still waiting to be consumed
+    assert frame_grabber.grabbed_frame_count > 1
+    assert frame_grabber.dropped_frame_count + 1 + int(frame_grabber.has_new_frame) == frame_grabber.grabbed_frame_count
+
+
+def test_latest_frame_grabber_lent_frame_is_not_overwritten():
+    capture = CaptureFromArrays((48, 64, 3), frame_interval=1e-4)
+    frame_grabber = LatestFrameGrabber(capture)
+    frame_grabber.start()
+    time.sleep(0.05)
+    frame, _ = frame_grabber.get_latest_frame()
+    frame_value = frame.copy()
+    time.sleep(0.05)  # the grab thread keeps reading in the meantime
+    assert np.array_equal(frame, frame_value)
+    frame_grabber.stop()
+
+
+@pytest.mark.parametrize('target_frame_rate, tick_interval', [(30, 33e-3), (30, 10e-3), (10, 33e-3), (60, 5e-3)])
+def test_frame_rate_limiter_keeps_target_rate(target_frame_rate, tick_interval):
+    frame_rate_limiter = FrameRateLimiter(target_frame_rate, tick_interval)
+    duration = 10
+    ticks = np.arange(0, duration, tick_interval) + np.random.uniform(0, tick_interval / 4, int(np.ceil(duration / tick_interval)))  # jittered timer
+    n_frames = sum(frame_rate_limiter.is_due(tick) for tick in ticks)
+    # the rate can't be higher than the tick rate, and a target close to the tick rate doesn't alias down to half of it
+    assert n_frames / duration == pytest.approx(min(target_frame_rate, 1 / tick_interval), rel=0.05)
+
+
+def test_frame_rate_limiter_does_not_burst_after_stall():
+    frame_rate_limiter = FrameRateLimiter(30, 10e-3)
+    assert frame_rate_limiter.is_due(0.)
+    assert frame_rate_limiter.is_due(1.)  # a stalled timer
+    assert not frame_rate_limiter.is_due(1.01)
+    assert frame_rate_limiter.is_due(1.03)
+
+
+def test_xshm_screen_capture_needs_display(monkeypatch):
+    monkeypatch.delenv('DISPLAY', raising=False)
+    with pytest.raises(RuntimeError):
+        XShmScreenCapture()
+
+
+def test_video_preset_sized_by_capture_region():
+    from physiolabxr.presets.PresetEnums import PresetType
+    from physiolabxr.presets.Presets import VideoPreset
+    video_preset = VideoPreset('monitor 0', PresetType.MONITOR, 0, height=1080, width=1920, nchannels=3, capture_region=[100, 50, 640, 480])
+    assert (video_preset.height, video_preset.width, video_preset.num_channels) == (480, 640, 480 * 640 * 3)
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from physiolabxr.scripting.illumiRead.AOIAugmentationScript.AOIAugmentationUtils import GazeAttentionMatrixTorch
+
+
+@pytest.mark.parametrize('image_shape, attention_patch_shape, sigma', [((1000, 2000), (20, 20), 20),
+                                                                       ((50, 75), (8, 10), 30)])  # with patches not dividing the image, and a filter map that doesn't fall to zero
+def test_separable_attention_grid_matches_conv2d(image_shape, attention_patch_shape, sigma):
+    gaze_attention_matrix = GazeAttentionMatrixTorch(image_shape=np.array(image_shape), attention_patch_shape=np.array(attention_patch_shape), sigma=sigma)
+    rng = np.random.default_rng(0)
+    centers = [(0, 0), (image_shape[0] - 1, image_shape[1] - 1)] + [tuple(rng.integers(0, image_shape)) for _ in range(5)]
+    for center in centers:
+        gaze_attention_matrix.get_image_attention_buffer(np.array(center))
+        gaze_attention_matrix.convolve_attention_grid_buffer()
+        conv2d_grid = gaze_attention_matrix.get_attention_grid_buffer().cpu().numpy()
+
+        gaze_attention_matrix.update_attention_grid_buffer(np.array(center))
+        separable_grid = gaze_attention_matrix.get_attention_grid_buffer().cpu().numpy()
+        assert separable_grid.shape == tuple(gaze_attention_matrix.attention_grid_shape)
+        np.testing.assert_allclose(separable_grid, conv2d_grid, atol=1e-12)
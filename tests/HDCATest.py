@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+
+from physiolabxr.scripting.physio.HDCA import HDCA, WindowLDA, compute_forward, split_by_window
+
+
+def random_erp_epochs(num_trials, num_channels, num_timepoints, seed=0):
+    """
+    noisy epochs where the second class has an added response that changes over time
+    """
+    rng = np.random.default_rng(seed)
+    y = np.arange(num_trials) % 3 == 0  # imbalanced, as targets usually are
+    x = rng.normal(size=(num_trials, num_channels, num_timepoints))
+    response = np.outer(rng.normal(size=num_channels), np.sin(np.linspace(0, 2 * np.pi, num_timepoints)))
+    x[y] += response
+    return x, y.astype(int)
+
+
+def loop_forward(x_windowed, y, projection):
+    """
+    the per-class and per-window reference
+    """
+    activation = np.zeros((2,) + x_windowed.shape[1:])
+    for class_index in np.unique(y):
+        this_x, this_projection = x_windowed[y == class_index], projection[y == class_index]
+        for j in range(x_windowed.shape[2]):
+            p = this_projection[:, j]
+            activation[class_index, :, j] = (this_x[:, :, j, :].reshape(len(this_x), -1).T @ p / (p @ p)).reshape(x_windowed.shape[1], -1)
+    return activation
+
+
+@pytest.mark.parametrize('num_trials', [200, 30])  # more trials than features, and fewer
+def test_window_lda_matches_sklearn(num_trials):
+    x, y = random_erp_epochs(num_trials, 8, 40)
+    x_windowed = split_by_window(x, 10)
+    lda = WindowLDA()
+    projection = lda.fit_transform(x_windowed, y)
+    assert projection.shape == (num_trials, 4)
+
+    for k in range(x_windowed.shape[2]):
+        this_x = x_windowed[:, :, k, :].reshape(num_trials, -1)
+        sklearn_lda = LinearDiscriminantAnalysis(solver='svd').fit(this_x, y)
+        sklearn_projection = sklearn_lda.transform(this_x)[:, 0]
+        sign = np.sign(sklearn_projection @ projection[:, k])
+        np.testing.assert_allclose(sign * projection[:, k], sklearn_projection, atol=1e-6)
+        np.testing.assert_allclose(lda.coef_[k], sklearn_lda.coef_[0], atol=1e-6)
+        assert np.mean(projection[y == 1, k]) > np.mean(projection[y == 0, k])  # the second class projects higher
+
+
+def test_window_lda_constant_feature():
+    x, y = random_erp_epochs(100, 4, 20)
+    x[:, 0] = 1.
+    x_windowed = split_by_window(x, 10)
+    projection = WindowLDA().fit_transform(x_windowed, y)
+    sklearn_projection = LinearDiscriminantAnalysis(solver='svd').fit_transform(x_windowed[:, :, 0, :].reshape(100, -1), y)[:, 0]
+    assert np.all(np.isfinite(projection))
+    np.testing.assert_allclose(np.abs(projection[:, 0]), np.abs(sklearn_projection), atol=1e-6)
+
+
+def test_compute_forward_matches_loop():
+    x, y = random_erp_epochs(50, 6, 40)
+    x_windowed = split_by_window(x, 10)
+    projection = np.random.default_rng(1).normal(size=(50, 4))
+    np.testing.assert_allclose(compute_forward(x_windowed, y, projection), loop_forward(x_windowed, y, projection))
+    assert np.all(compute_forward(x_windowed[y == 0], y[y == 0], projection[y == 0])[1] == 0)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_hdca_fit_folds(n_jobs):
+    x_eeg, y = random_erp_epochs(150, 6, 40)
+    x_pupil, _ = random_erp_epochs(150, 2, 40, seed=1)
+    model = HDCA(['distractor', 'target'])
+    roc_auc_combined, roc_auc_eeg, roc_auc_pupil = model.fit(x_eeg, x_eeg, x_pupil, y, num_folds=3, exg_srate=100, split_window_eeg=100e-3, eyetracking_srate=20, split_window_pupil=500e-3, random_seed=0, n_jobs=n_jobs)
+    assert roc_auc_eeg > 0.8
+    assert isinstance(model.window_eeg_ldas, WindowLDA) and isinstance(model.window_pupil_ldas, WindowLDA)
+    assert model.transform(x_eeg, x_pupil).shape == (150,)
+    y_pred, roc_auc_combined, roc_auc_eeg, roc_auc_pupil = model.eval(x_eeg, x_eeg, x_pupil, y)
+    assert roc_auc_eeg > 0.8
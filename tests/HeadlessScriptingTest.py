@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+from physiolabxr.presets.PresetEnums import PresetType, DataType
+from physiolabxr.presets.ScriptPresets import ScriptOutput
+from physiolabxr.scripting.headless_runner import run_script_headless, run_scripts_headless, load_recording
+from physiolabxr.utils.RNStream import RNStream
+
+script_code = """
+import numpy as np
+from physiolabxr.scripting.RenaScript import RenaScript
+
+class HeadlessScriptTest(RenaScript):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def init(self):
+        self.loop_count = 0
+
+    def loop(self):
+        self.loop_count += 1
+        if 'EEG' in self.inputs.keys():
+            eeg, timestamps = self.inputs['EEG']
+            self.set_output('mean', np.mean(eeg, axis=1) * self.params['gain'], timestamps[-1])
+
+    def cleanup(self):
+        print(f'Cleanup after {self.loop_count} loops')
+"""
+
+
+@pytest.fixture
+def recording_and_script(tmp_path):
+    srate = 128
+    duration = 10
+    n_channels = 4
+    timestamps = np.arange(srate * duration) / srate + 100
+    data = np.random.random((n_channels, len(timestamps)))
+    recording_path = os.path.join(tmp_path, 'recording.dats')
+    RNStream(recording_path).stream_out({'EEG': [data, timestamps]})
+
+    script_path = os.path.join(tmp_path, 'HeadlessScriptTest.py')
+    with open(script_path, 'w') as f:
+        f.write(script_code)
+    return recording_path, script_path, data, timestamps
+
+
+def test_headless_script_windows(recording_and_script, tmp_path):
+    recording_path, script_path, data, timestamps = recording_and_script
+    run_frequency = 4
+    time_window = 1
+    output_path = os.path.join(tmp_path, 'output.dats')
+    outputs = [ScriptOutput(stream_name='mean', num_channels=data.shape[0], interface_type=PresetType.LSL, data_type=DataType.float64)]
+
+    rtn = run_script_headless(script_path, recording_path, run_frequency, time_window, outputs=outputs, params={'gain': 1}, output_path=output_path)
+    output_data, output_timestamps = rtn['mean']
+
+    # one output per tick, each is the mean over the latest time_window of data
+    assert output_data.shape[1] == len(np.arange(timestamps[0] + 1 / run_frequency, timestamps[-1] + 1 / run_frequency, 1 / run_frequency))
+    last_index = np.searchsorted(timestamps, output_timestamps[-1], side='right')
+    buffer_size = int(time_window * len(timestamps) / (timestamps[-1] - timestamps[0]))
+    assert np.allclose(output_data[:, -1], np.mean(data[:, last_index - buffer_size:last_index], axis=1))
+    assert np.all(np.diff(output_timestamps) > 0)
+
+    saved = load_recording(output_path)
+    assert np.allclose(saved['mean'][0], output_data)
+
+
+def test_headless_scripts_parallel(recording_and_script):
+    recording_path, script_path, data, timestamps = recording_and_script
+    outputs = [ScriptOutput(stream_name='mean', num_channels=data.shape[0], interface_type=PresetType.LSL, data_type=DataType.float64)]
+    jobs = [{'script_path': script_path, 'recording_path': recording_path, 'run_frequency': 4, 'time_window': 1,
+             'outputs': outputs, 'params': {'gain': gain}} for gain in [1, 2]]
+    results = run_scripts_headless(jobs, num_processes=2)
+    assert np.allclose(results[0]['mean'][0] * 2, results[1]['mean'][0])
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy.interpolate import interp1d
+
+from physiolabxr.scripting.physio.interpolation import interpolate_nan_batched, interpolate_nan, interpolate_array_nan, \
+    interpolate_epochs_nan, interpolate_epoch_zeros
+
+
+def interp1d_interpolate_nan(x):
+    """
+    the per-series reference, with interp1d
+    """
+    not_nan = np.logical_not(np.isnan(x))
+    if np.sum(np.logical_not(not_nan)) / len(x) > 0.5:
+        raise ValueError("More than half of the given data array is nan")
+    indices = np.arange(len(x))
+    return interp1d(indices[not_nan], x[not_nan], fill_value="extrapolate")(indices)
+
+
+def random_epochs_with_nan(shape, nan_ratios, seed=0):
+    rng = np.random.default_rng(seed)
+    epochs = np.cumsum(rng.normal(size=shape), axis=-1)
+    nan_ratios = rng.choice(nan_ratios, shape[:-1])
+    epochs[rng.random(shape) < nan_ratios[..., np.newaxis]] = np.nan
+    epochs[..., :3][rng.random(shape[:-1]) < 0.3] = np.nan  # nan at the start and end are extrapolated
+    epochs[..., -3:][rng.random(shape[:-1]) < 0.3] = np.nan
+    return epochs
+
+
+def test_batched_interpolation_matches_interp1d():
+    epochs = random_epochs_with_nan((50, 4, 100), [0., 0.05, 0.3, 0.7])
+    interpolated, rejected = interpolate_nan_batched(epochs)
+    assert rejected.shape == (50, 4)
+    for index in np.ndindex(*epochs.shape[:-1]):
+        try:
+            expected = interp1d_interpolate_nan(epochs[index])
+        except ValueError:
+            assert rejected[index]
+            assert np.array_equal(interpolated[index], epochs[index], equal_nan=True)  # rejected series are left as they are
+        else:
+            assert not rejected[index]
+            assert np.allclose(interpolated[index], expected)
+    assert 0 < np.count_nonzero(rejected) < rejected.size
+    assert not np.any(np.isnan(interpolated[~rejected]))
+
+
+def test_series_with_less_than_two_valid_values_are_rejected():
+    interpolated, rejected = interpolate_nan_batched([[np.nan, 1.], [1., 2.], [np.nan, np.nan]])
+    assert list(rejected) == [True, False, True]
+    with pytest.raises(ValueError):
+        interpolate_nan(np.array([np.nan, np.nan, np.nan, 1.]))
+    with pytest.raises(ValueError):
+        interpolate_array_nan(np.array([[1., 2., 3.], [np.nan, np.nan, 1.]]))
+    assert np.array_equal(interpolate_nan(np.array([np.nan, 1., np.nan, 3., 4.])), [0., 1., 2., 3., 4.])
+
+
+def test_epoch_rejection_mask():
+    epochs = random_epochs_with_nan((30, 3, 50), [0., 0.2, 0.8], seed=1)
+    interpolated, rejected = interpolate_epochs_nan(epochs, return_rejection_mask=True)
+    expected_rejected = np.array([any(np.count_nonzero(np.isnan(x)) / len(x) > 0.5 for x in e) for e in epochs])
+    assert np.array_equal(rejected, expected_rejected)
+    assert interpolated.shape == (np.count_nonzero(~rejected), 3, 50)
+    assert np.allclose(interpolated, [[interp1d_interpolate_nan(x) for x in e] for e in epochs[~rejected]])
+
+    pupil = np.nan_to_num(epochs, nan=0.)
+    assert np.array_equal(interpolate_epoch_zeros(pupil, return_rejection_mask=True)[1], expected_rejected)
@@ -0,0 +1,107 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import zmq
+
+from physiolabxr.utils.networking_utils import send_data_dict, recv_data_dict, send_router, traces_to_frames, frames_to_traces
+from physiolabxr.utils.performance_utils import MetricsRegistry, MetricType, TraceHop, create_trace, stamp_traces
+
+
+@pytest.fixture
+def metrics_registry():
+    metrics_registry = MetricsRegistry()
+    metrics_registry.metrics.clear()
+    yield metrics_registry
+    metrics_registry.metrics.clear()
+
+
+@pytest.fixture
+def socket_interfaces():
+    """
+    a dealer sending to a router, like the main app forwarding the inputs to a script
+    """
+    context = zmq.Context()
+    router = context.socket(zmq.ROUTER)
+    router.bind('inproc://latency_trace_test')
+    dealer = context.socket(zmq.DEALER)
+    dealer.connect('inproc://latency_trace_test')
+    yield SimpleNamespace(socket=dealer), SimpleNamespace(socket=router)
+    dealer.close()
+    router.close()
+    context.term()
+
+
+def test_trace_hops_are_stamped_in_order():
+    trace = create_trace(source_timestamp=123.)
+    assert trace[TraceHop.source] == 123.
+    assert np.all(np.isnan(trace[TraceHop.gui_receive:]))
+    for hop in list(TraceHop)[2:]:
+        stamp_traces(trace, hop)
+    assert np.all(np.diff(trace[TraceHop.worker_pull:]) >= 0)
+
+
+def test_data_dict_with_traces_over_the_wire(socket_interfaces):
+    sender, receiver = socket_interfaces
+    data_dict = {'stream a': (np.random.rand(2, 5), np.arange(5, dtype=np.float64)),
+                 'stream b': (np.random.randint(0, 10, (3, 1), dtype=np.int32), np.arange(1, dtype=np.float64))}
+    traces = {'stream a': np.stack([create_trace(1.), create_trace(2.)])}
+    stamp_traces(traces['stream a'], TraceHop.forward)
+
+    send_data_dict(data_dict, sender, traces)
+    received_data_dict, received_traces = recv_data_dict(receiver, return_traces=True)
+    assert received_data_dict.keys() == data_dict.keys()
+    for stream_name, (data, timestamps) in data_dict.items():
+        np.testing.assert_array_equal(received_data_dict[stream_name][0], data)
+        np.testing.assert_array_equal(received_data_dict[stream_name][1], timestamps)
+    np.testing.assert_array_equal(received_traces['stream a'], traces['stream a'])
+    stamp_traces(received_traces['stream a'], TraceHop.script_receive)  # the received traces are writable
+
+    # without traces, the message is the same as before tracing
+    send_data_dict(data_dict, sender)
+    assert recv_data_dict(receiver, return_traces=True)[1] == {}
+    send_data_dict({}, sender, traces)
+    assert recv_data_dict(receiver, return_traces=True)[0] == {}
+
+
+def test_send_router_with_trace_frames(socket_interfaces):
+    dealer, router = socket_interfaces
+    dealer.socket.send(b'info request')
+    routing_id, _ = router.socket.recv_multipart()
+    traces = {'stream a': np.stack([create_trace(1.), create_trace(2.)])}
+
+    send_router(np.arange(3, dtype=np.float64), routing_id, router, traces_to_frames(traces))
+    reply = dealer.socket.recv_multipart()
+    np.testing.assert_array_equal(np.frombuffer(reply[0]), np.arange(3))
+    np.testing.assert_array_equal(frames_to_traces(reply[1:])['stream a'], traces['stream a'])
+
+    send_router(np.arange(3, dtype=np.float64), routing_id, router)  # without extra frames, the reply is a single frame
+    assert len(dealer.socket.recv_multipart()) == 1
+
+
+def test_record_trace_latencies(metrics_registry):
+    traces = np.stack([create_trace(0.) for _ in range(3)])
+    traces[:, TraceHop.forward] = traces[:, TraceHop.worker_pull] + [1e-3, 2e-3, 3e-3]
+    traces[1, TraceHop.output_send] = traces[1, TraceHop.worker_pull] + 1e-2
+    metrics_registry.record_trace_latencies('script: stream', traces, [TraceHop.forward, TraceHop.output_send])
+
+    forward_summary = metrics_registry.get_metric('script: stream', MetricType.forward_latency).get_summary()
+    assert forward_summary['count'] == 3
+    np.testing.assert_allclose(forward_summary['mean_ms'], 2)
+    assert metrics_registry.get_metric('script: stream', MetricType.output_send_latency).count == 1  # the unreached hops are skipped
+    assert ('script: stream', MetricType.script_receive_latency) not in metrics_registry.metrics
+
+
+def test_tracing_is_opt_in(metrics_registry):
+    from physiolabxr.threadings.workers import RenaWorker
+    data_dict = {'stream_name': 'stream', 'frames': np.zeros((1, 4)), 'timestamps': np.arange(4.)}
+    RenaWorker.trace_data_dict(None, data_dict)
+    assert 'trace' not in data_dict
+    metrics_registry.is_tracing = True
+    try:
+        before_pull_time = time.perf_counter()
+        RenaWorker.trace_data_dict(None, data_dict)
+    finally:
+        metrics_registry.is_tracing = False
+    assert data_dict['trace'][TraceHop.source] == 3. and data_dict['trace'][TraceHop.worker_pull] >= before_pull_time
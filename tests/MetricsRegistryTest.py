@@ -0,0 +1,96 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from physiolabxr.utils.performance_utils import MetricsRegistry, MetricType, TimingMetric
+
+
+@pytest.fixture
+def metrics_registry():
+    metrics_registry = MetricsRegistry()
+    metrics_registry.metrics.clear()
+    yield metrics_registry
+    metrics_registry.metrics.clear()
+
+
+def test_percentiles_within_a_bin():
+    metric = TimingMetric()
+    durations = np.random.default_rng(0).lognormal(mean=np.log(1e-3), sigma=1, size=10000)
+    for duration in durations:
+        metric.add(duration)
+    bin_ratio = 10 ** (1 / TimingMetric.bins_per_decade)
+    for percentile in (50, 95, 99):
+        expected = np.percentile(durations, percentile)
+        assert expected / bin_ratio <= metric.get_percentile(percentile) <= expected * bin_ratio
+    summary = metric.get_summary()
+    assert summary['count'] == len(durations)
+    np.testing.assert_allclose(summary['mean_ms'], 1e3 * np.mean(durations))
+    np.testing.assert_allclose(summary['max_ms'], 1e3 * np.max(durations))
+
+
+def test_out_of_range_durations():
+    metric = TimingMetric()
+    for duration in (0., 1e-9, 1e3):
+        metric.add(duration)
+    assert metric.histogram[0] == 2 and metric.histogram[-1] == 1
+    assert metric.get_percentile(10) == TimingMetric.min_duration
+    assert metric.get_percentile(100) <= TimingMetric.max_duration
+
+
+def test_ring_keeps_the_latest_durations():
+    metric = TimingMetric(ring_size=8)
+    for duration in range(5):
+        metric.add(duration * 1e-3)
+    np.testing.assert_allclose(metric.get_recent_durations(), np.arange(5) * 1e-3)
+    for duration in range(5, 20):
+        metric.add(duration * 1e-3)
+    np.testing.assert_allclose(metric.get_recent_durations(), np.arange(12, 20) * 1e-3)
+    assert metric.count == 20
+
+
+def test_registry_summaries_and_reset(metrics_registry):
+    metrics_registry.record('stream b', MetricType.render, 2e-3)
+    metrics_registry.record('stream a', MetricType.render, 1e-3)
+    assert metrics_registry.time('stream a', MetricType.processing, sum, ([1, 2], ), num_samples=10) == 3
+    summaries = metrics_registry.get_summaries()
+    assert [(summary['source'], summary['metric']) for summary in summaries] == [('stream a', 'Processing'), ('stream a', 'Render'), ('stream b', 'Render')]
+    assert all(list(summary.keys()) == MetricsRegistry.summary_fields for summary in summaries)
+
+    metrics_registry.reset()
+    assert all(summary['count'] == 0 for summary in metrics_registry.get_summaries())
+
+
+def test_export(metrics_registry, tmp_path):
+    for duration in (1e-3, 2e-3, 3e-3):
+        metrics_registry.record('stream', MetricType.acquisition, duration, num_samples=4)
+    metrics_registry.export_json(tmp_path / 'metrics.json')
+    metrics_registry.export_csv(tmp_path / 'metrics.csv')
+    with open(tmp_path / 'metrics.json') as f:
+        exported_json = json.load(f)
+    with open(tmp_path / 'metrics.csv', newline='') as f:
+        exported_csv = list(csv.DictReader(f))
+    assert exported_json == metrics_registry.get_summaries()
+    assert len(exported_csv) == 1 and exported_csv[0]['metric'] == 'Acquisition' and int(exported_csv[0]['count']) == 3
+    np.testing.assert_allclose(float(exported_csv[0]['mean_ms']), 2)
+
+
+def test_record_stage_timings(metrics_registry):
+    stage_timings = [('Butterworth bandpass filter', 2e-3, 1e-3), ('Scale', 4e-3, 3e-3)]  # as from DataProcessorPipeline.get_stage_timings
+    metrics_registry.record('stream', MetricType.processing, 5e-3)
+    metrics_registry.record_stage_timings('stream: group', stage_timings, num_samples=8)
+    summaries = metrics_registry.get_summaries()
+    assert [(summary['source'], summary['metric']) for summary in summaries] == [('stream', 'Processing'), ('stream: group: Butterworth bandpass filter', 'Processing stage'), ('stream: group: Scale', 'Processing stage')]
+    np.testing.assert_allclose(summaries[2]['mean_ms'], 3)  # the last time is recorded
+
+
+def test_video_worker_acquisition(metrics_registry):
+    from types import SimpleNamespace
+    from physiolabxr.presets.PresetEnums import VideoDeviceChannelOrder
+    from physiolabxr.threadings.ScreenCaptureWorker import ScreenCaptureWorker
+    worker = ScreenCaptureWorker('Screen 0', 1., VideoDeviceChannelOrder.RGB, target_frame_rate=1000)
+    worker.screen_capture = SimpleNamespace(capture=lambda: np.zeros((8, 6, 3), dtype=np.uint8), close=lambda: None)  # a stand-in for the screen
+    worker.process_on_tick()
+    worker.stop_stream()
+    assert metrics_registry.get_metric('Screen 0', MetricType.acquisition).count == 1
@@ -0,0 +1,127 @@
+"""
+Benchmark of the mmWave TLV decoding on a recorded stream of IWR6843 frames.
+
+The stream is 10 seconds of 30 fps frames with detected points, range-doppler and azimuth heatmaps and stats, built with
+the frame layout in MmWaveTlvTest. It is decoded frame by frame the way MmWaveSensorLSLInterface does, once with
+decode_iwr_tlv and once with the struct-based decoder it replaced, which is kept here as the reference.
+
+Run with:
+    python -m pytest tests/MmWaveTlvBenchmark.py -s
+
+Set PHYSIOLABXR_TLV_BENCHMARK_MAX_MS to change the regression threshold on the mean decoding time per frame.
+"""
+import os
+import struct
+import time
+
+import numpy as np
+import pytest
+
+from physiolabxr.utils.mmWave_utils.parse_tlv import decode_iwr_tlv, replace_left_right
+from tests.MmWaveTlvTest import random_iwr_frame
+
+frame_rate = 30
+duration = 10
+max_decode_time = float(os.environ.get('PHYSIOLABXR_TLV_BENCHMARK_MAX_MS', 1)) / 1e3
+
+
+def chg_val(val):
+    return val - 65536 if val > 32767 else val
+
+
+def struct_decode_iwr_tlv(in_data):
+    """
+    the struct-based decoder of the TLV types in the recorded stream, as it was before decode_iwr_tlv used np.frombuffer
+    """
+    magic = b'\x02\x01\x04\x03\x06\x05\x08\x07'
+    offset = in_data.find(magic)
+    data = in_data[offset:]
+    if len(data) < 36:
+        return False, None, None, None, None, None
+    data_magic, version, length, platform, frameNum, cpuCycles, numObj, numTLVs = struct.unpack('Q7I', data[:36])
+    if len(data) < length:
+        return False, None, None, None, None, None
+    pending_bytes = length - 40
+    data = data[40:]
+    detected_points = range_profile = rd_heatmap = azi_heatmap = None
+    range_bins = 8
+    for i in range(numTLVs):
+        tlvType, tlvLength = struct.unpack('2I', data[:8])
+        data = data[8:]
+        if tlvType == 1:
+            detected_points = np.asarray(struct.unpack(str(numObj * 4) + 'f', data[:tlvLength])).reshape(numObj, 4)
+        elif tlvType == 5:
+            doppler_bins = (tlvLength / 2) / range_bins
+            rd_heatmap = struct.unpack(str(int(range_bins * doppler_bins)) + 'H', data[:tlvLength])
+            rd_heatmap = np.reshape(rd_heatmap, (int(range_bins), int(doppler_bins)))
+            rd_heatmap = replace_left_right(np.array([row - np.mean(row) for row in rd_heatmap]))
+        elif tlvType == 6:
+            struct.unpack('6I', data[:24])
+        elif tlvType == 8:
+            q = data[:tlvLength]
+            qq = []
+            for col in range(range_bins):
+                real = []
+                img = []
+                for row_index in [7, 5, 11, 9]:
+                    index = col * 48 + 4 * row_index
+                    real.append(q[index + 1] * 256 + q[index])
+                    img.append(q[index + 3] * 256 + q[index + 2])
+                real = [chg_val(x) for x in real]
+                img = [chg_val(x) for x in img]
+                antennas = np.array([real, img]).transpose()
+                antennas = np.pad(antennas, ((0, 60), (0, 0)), 'constant', constant_values=0)
+                transformed = np.absolute(np.fft.fft(antennas[..., 0] + 1j * antennas[..., 1]))
+                qq.append(np.concatenate((transformed[int(len(transformed) / 2):], transformed[:int(len(transformed) / 2)])))
+            azi_heatmap = np.array(qq)
+        data = data[tlvLength:]
+        pending_bytes -= (8 + tlvLength)
+    data = data[pending_bytes:]
+    if range_profile is None and rd_heatmap is not None:
+        range_profile = rd_heatmap[:, 0]
+    return True, data, detected_points, range_profile, rd_heatmap, azi_heatmap
+
+
+@pytest.fixture(scope='module')
+def recorded_stream():
+    rng = np.random.default_rng(0)
+    return b''.join(random_iwr_frame(frame_number, rng)[0] for frame_number in range(frame_rate * duration))
+
+
+def decode_stream(decode, stream):
+    """
+    decodes the stream as it arrives on the data port, the buffer holds a frame and the start of the next one when a
+    frame is decoded
+
+    @return: the decoded frames and the time it took to decode each of them
+    """
+    decoded_frames = []
+    decode_times = []
+    buffer = b''
+    chunk_size = 512
+    for chunk_start in range(0, len(stream) + chunk_size, chunk_size):
+        buffer += stream[chunk_start:chunk_start + chunk_size]
+        start_time = time.perf_counter()
+        is_packet_complete, leftover_data, *decoded = decode(buffer)
+        if is_packet_complete:
+            decode_times.append(time.perf_counter() - start_time)
+            decoded_frames.append(decoded)
+            buffer = leftover_data
+    return decoded_frames, np.array(decode_times)
+
+
+def test_tlv_decoding(recorded_stream):
+    decode_stream(decode_iwr_tlv, recorded_stream)  # warm up
+    decoded_frames, decode_times = decode_stream(decode_iwr_tlv, recorded_stream)
+    struct_decoded_frames, struct_decode_times = decode_stream(struct_decode_iwr_tlv, recorded_stream)
+
+    assert len(decoded_frames) == len(struct_decoded_frames) == frame_rate * duration
+    for decoded, struct_decoded in zip(decoded_frames, struct_decoded_frames):
+        for array, struct_array in zip(decoded, struct_decoded):
+            assert np.allclose(array, struct_array)
+
+    print(f"\nTLV decoding per frame: np.frombuffer mean {np.mean(decode_times) * 1e3:.3f}ms, "
+          f"p99 {np.percentile(decode_times, 99) * 1e3:.3f}ms; struct mean {np.mean(struct_decode_times) * 1e3:.3f}ms, "
+          f"p99 {np.percentile(struct_decode_times, 99) * 1e3:.3f}ms, {np.mean(struct_decode_times) / np.mean(decode_times):.1f}x")
+    assert np.mean(decode_times) < max_decode_time
+    assert np.mean(decode_times) < np.mean(struct_decode_times)
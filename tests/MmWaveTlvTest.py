@@ -0,0 +1,84 @@
+import struct
+
+import numpy as np
+import pytest
+
+from physiolabxr.utils.mmWave_utils.parse_tlv import decode_iwr_tlv, parseAziheatmap, azi_antenna_indices
+
+magic = b'\x02\x01\x04\x03\x06\x05\x08\x07'
+version = 0x03060000
+
+
+def build_iwr_frame(frame_number, detected_points=None, rd_heatmap=None, azi_antennas=None, stats=None, packet_length=32):
+    """
+    builds a frame as sent by the IWR6843 on its data port
+
+    @param detected_points: (n, 4) float x, y, z, doppler
+    @param rd_heatmap: (range bins, doppler bins) uint16
+    @param azi_antennas: (range bins, 12, 2) int16, real and imag of the virtual antennas
+    @param stats: six ints
+    @param packet_length: the frame is padded to a multiple of this
+    """
+    tlvs = []
+    if detected_points is not None:
+        tlvs.append((1, np.asarray(detected_points, dtype='<f4').tobytes()))
+    if rd_heatmap is not None:
+        tlvs.append((5, np.asarray(rd_heatmap, dtype='<u2').tobytes()))
+    if stats is not None:
+        tlvs.append((6, struct.pack('<6I', *stats)))
+    if azi_antennas is not None:
+        tlvs.append((8, np.asarray(azi_antennas, dtype='<i2').tobytes()))
+    body = b''.join(struct.pack('<2I', tlv_type, len(tlv_data)) + tlv_data for tlv_type, tlv_data in tlvs)
+    num_detected_obj = 0 if detected_points is None else len(detected_points)
+    length = 40 + len(body)
+    length += -length % packet_length
+    header = magic + struct.pack('<7I', version, length, 0xA6843, frame_number, 0, num_detected_obj, len(tlvs)) + struct.pack('<I', 0)
+    return (header + body).ljust(length, b'\x00')
+
+
+def random_iwr_frame(frame_number, rng, num_detected_obj=5, rd_shape=(8, 16)):
+    detected_points = rng.normal(size=(num_detected_obj, 4)).astype(np.float32)
+    rd_heatmap = rng.integers(0, 2 ** 16, size=rd_shape, dtype=np.uint16)
+    azi_antennas = rng.integers(-2 ** 15, 2 ** 15, size=(rd_shape[0], 12, 2), dtype=np.int16)
+    return build_iwr_frame(frame_number, detected_points, rd_heatmap, azi_antennas, stats=range(6)), detected_points, rd_heatmap, azi_antennas
+
+
+def test_decode_frame():
+    rng = np.random.default_rng(0)
+    frame, detected_points, rd_heatmap, azi_antennas = random_iwr_frame(0, rng)
+    next_frame = random_iwr_frame(1, rng)[0]
+    is_packet_complete, leftover_data, decoded_points, range_profile, decoded_rd_heatmap, azi_heatmap = decode_iwr_tlv(b'garbage' + frame + next_frame[:10])
+    assert is_packet_complete
+    assert leftover_data == next_frame[:10]
+    assert np.array_equal(decoded_points, detected_points)
+
+    # the rows are clutter removed, then the left and right halves are swapped
+    expected_rd_heatmap = rd_heatmap - rd_heatmap.mean(axis=1, keepdims=True)
+    expected_rd_heatmap = np.concatenate([expected_rd_heatmap[:, 8:], expected_rd_heatmap[:, :8]], axis=1)
+    assert np.allclose(decoded_rd_heatmap, expected_rd_heatmap)
+    assert np.array_equal(range_profile, decoded_rd_heatmap[:, 0])
+    assert azi_heatmap.shape == (8, 64)
+
+
+def test_azimuth_heatmap_matches_per_antenna_fft():
+    rng = np.random.default_rng(1)
+    azi_antennas = rng.integers(-2 ** 15, 2 ** 15, size=(8, 12, 2), dtype=np.int16)
+    azi_heatmap = parseAziheatmap(azi_antennas.tobytes(), azi_antennas.nbytes, 8)
+    for range_bin in range(8):
+        antennas = azi_antennas[range_bin, azi_antenna_indices].astype(np.int64)
+        spectrum = np.abs(np.fft.fft(np.pad(antennas[:, 0] + 1j * antennas[:, 1], (0, 60))))
+        assert np.allclose(azi_heatmap[range_bin], np.concatenate([spectrum[32:], spectrum[:32]]))
+
+
+@pytest.mark.parametrize('cut', [0, 20, 39, 100])
+def test_incomplete_frame_is_not_decoded(cut):
+    frame = random_iwr_frame(0, np.random.default_rng(2))[0]
+    assert not decode_iwr_tlv(frame[:cut])[0]
+
+
+def test_frame_without_detected_points():
+    frame = build_iwr_frame(0, rd_heatmap=np.ones((8, 16), dtype=np.uint16))
+    is_packet_complete, leftover_data, detected_points, range_profile, rd_heatmap, azi_heatmap = decode_iwr_tlv(frame)
+    assert is_packet_complete and leftover_data == b''
+    assert detected_points is None and azi_heatmap is None
+    assert np.array_equal(rd_heatmap, np.zeros((8, 16)))
@@ -0,0 +1,242 @@
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import pytest
+
+from physiolabxr.configs.configs import AppConfigs
+AppConfigs(_reset=False)  # create the singleton app configs object
+
+from physiolabxr.presets.PresetStore import PresetStore, LazyPresetDict, DebouncedPresetSaver, SerializedPresets, \
+    get_preset_file_name, get_preset_key
+from physiolabxr.presets import Presets as Presets_module
+from physiolabxr.presets.Presets import Presets, save_presets_locally
+from physiolabxr.utils.Singleton import Singleton
+
+
+@pytest.fixture
+def temporary_presets(tmp_path):
+    """
+    creates Presets instances saving to a temporary app data folder, and restores the app's Presets singleton after
+    the test
+    """
+    app_presets = Singleton._instances.pop(Presets, None)
+    created_presets = []
+
+    def create_presets():
+        Singleton._instances.pop(Presets, None)
+        presets = Presets(_preset_root=AppConfigs()._preset_path, _reset=False, _app_data_path=str(tmp_path),
+                          _last_mod_time_path=str(tmp_path / 'last_mod_times.json'),
+                          _preset_path=str(tmp_path / '_presets.json'),
+                          _preset_store_path=str(tmp_path / '_presets'))
+        created_presets.append(presets)
+        return presets
+
+    yield create_presets
+    for presets in created_presets:
+        presets._preset_saver.stop()
+    Singleton._instances.pop(Presets, None)
+    if app_presets is not None:
+        Singleton._instances[Presets] = app_presets
+
+
+def test_preset_file_names():
+    keys = ['EEG', 'eeg', 'stream/with\\separators:*?', 'Unicode 流', 'name-with-dashes-0']
+    file_names = [get_preset_file_name(key) for key in keys]
+    assert len({file_name.lower() for file_name in file_names}) == len(keys)  # no collision on case-insensitive file systems
+    assert all('/' not in file_name and '\\' not in file_name for file_name in file_names)
+    assert [get_preset_key(file_name) for file_name in file_names] == keys
+
+
+def test_store_writes_changed_presets_only(tmp_path):
+    store = PresetStore(str(tmp_path / 'store'))
+    assert store.write_preset('stream_presets', 'a', '{"x": 1}')
+    assert not store.write_preset('stream_presets', 'a', '{"x": 1}')
+    assert store.write_preset('stream_presets', 'a', '{"x": 2}')
+    store.write_preset('stream_presets', 'b', '{}')
+    assert list(store.get_preset_paths('stream_presets').keys()) == ['a', 'b']
+    assert len(os.listdir(store.get_category_path('stream_presets'))) == 2  # no temporary files left behind
+
+    store.remove_presets_not_in('stream_presets', ['b'])
+    assert list(store.get_preset_paths('stream_presets').keys()) == ['b']
+
+
+def test_lazy_preset_dict(tmp_path):
+    store = PresetStore(str(tmp_path / 'store'))
+    for key in ['a', 'b', 'broken']:
+        store.write_preset('experiment_presets', key, json.dumps([key]) if key != 'broken' else '{')
+    loaded_keys = []
+
+    def loader(key, value):
+        loaded_keys.append(key)
+        return value
+
+    presets = LazyPresetDict(loader, store.get_preset_paths('experiment_presets'))
+    assert 'a' in presets and len(presets) == 3 and list(presets.keys()) == ['a', 'b', 'broken']
+    assert loaded_keys == []
+
+    assert presets['a'] == ['a']
+    assert presets['a'] == ['a']
+    assert loaded_keys == ['a']
+    assert presets.loaded_items() == [('a', ['a'])]
+
+    with pytest.raises(KeyError):  # a preset that fails to load is dropped
+        presets['broken']
+    assert 'broken' not in presets
+
+    presets['c'] = ['c']
+    assert {**presets} == {'a': ['a'], 'b': ['b'], 'c': ['c']}
+    assert pickle.loads(pickle.dumps(presets)) == {'a': ['a'], 'b': ['b'], 'c': ['c']}
+    assert presets.pop('b') == ['b'] and 'b' not in presets
+
+
+def serialize_dirty_presets(dirty_presets):
+    if dirty_presets is None:
+        return SerializedPresets(kept_keys={'stream_presets': set()})
+    return SerializedPresets(texts={dirty_preset: threading.current_thread().name for dirty_preset in dirty_presets})
+
+
+def test_debounced_saver_coalesces_edits():
+    saves = []
+    saved = threading.Event()
+
+    def write(serialized_presets):
+        saves.append(serialized_presets)
+        saved.set()
+
+    saver = DebouncedPresetSaver(serialize_dirty_presets, write, debounce_interval=0.1, max_delay=10)
+    for i in range(5):
+        saver.request_save([('stream_presets', f'stream {i % 2}')])
+        time.sleep(0.02)
+    assert saves == []  # the edits have not settled yet
+    assert saved.wait(2)
+    time.sleep(0.2)
+    assert len(saves) == 1
+    # the presets are serialized on the requesting thread
+    assert saves[0].texts == {('stream_presets', 'stream 0'): threading.current_thread().name,
+                              ('stream_presets', 'stream 1'): threading.current_thread().name}
+
+    saver.request_save()
+    saver.stop()  # pending saves are written when stopped
+    assert saves[-1].kept_keys == {'stream_presets': set()} and not saver.is_pending()
+
+
+def test_debounced_saver_max_delay():
+    save_times = []
+    saver = DebouncedPresetSaver(serialize_dirty_presets, lambda serialized_presets: save_times.append(time.monotonic()), debounce_interval=0.2, max_delay=0.3)
+    start_time = time.monotonic()
+    while time.monotonic() - start_time < 0.8:  # edits keep coming faster than the debounce interval
+        saver.request_save([('stream_presets', 'stream')])
+        time.sleep(0.05)
+    saver.stop()
+    assert len(save_times) >= 2
+    assert save_times[0] - start_time < 0.5
+
+
+class SlowSaverLock:
+    """
+    a lock the background thread of DebouncedPresetSaver is slow to acquire
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if threading.current_thread().name == 'DebouncedPresetSaver':
+            time.sleep(0.2)
+        self._lock.acquire()
+
+    def __exit__(self, *args):
+        self._lock.release()
+
+
+def test_debounced_saver_writes_in_order():
+    """
+    a flush writes while the background thread is on its way to save, the newer presets of the flush must not be
+    overwritten by the older ones of the background thread
+    """
+    written_texts = []
+    text = ['v1']
+    saver = DebouncedPresetSaver(lambda dirty_presets: SerializedPresets(texts={dirty_preset: text[0] for dirty_preset in dirty_presets}),
+                                 lambda serialized_presets: written_texts.append(serialized_presets.texts[('stream_presets', 'stream')]),
+                                 debounce_interval=0.05, max_delay=10)
+    saver._save_lock = SlowSaverLock()
+    saver.request_save([('stream_presets', 'stream')])
+    time.sleep(0.1)  # the background thread is due to save v1, and is acquiring the save lock
+    text[0] = 'v2'
+    saver.flush([('stream_presets', 'stream')])
+    time.sleep(0.3)
+    saver.stop()
+    assert written_texts[-1] == 'v2'
+
+
+def test_serialized_presets_update(tmp_path):
+    serialized_presets = SerializedPresets(texts={('stream_presets', 'a'): '{"x": 1}', ('stream_presets', 'b'): '{}',
+                                                  ('script_presets', 'c'): '{}'})
+    # saving all the stream presets supersedes the earlier ones, b has been removed since
+    serialized_presets.update(SerializedPresets(texts={('stream_presets', 'a'): '{"x": 2}'}, kept_keys={'stream_presets': {'a'}}))
+    serialized_presets.update(SerializedPresets(texts={('stream_presets', 'd'): '{}'}))
+    assert serialized_presets.texts == {('script_presets', 'c'): '{}', ('stream_presets', 'a'): '{"x": 2}', ('stream_presets', 'd'): '{}'}
+    assert serialized_presets.kept_keys == {'stream_presets': {'a', 'd'}}
+
+    store = PresetStore(str(tmp_path / 'store'))
+    store.write_preset('stream_presets', 'b', '{}')
+    serialized_presets.write(store)
+    assert list(store.get_preset_paths('stream_presets').keys()) == ['a', 'd']
+    assert list(store.get_preset_paths('script_presets').keys()) == ['c']
+
+
+def test_presets_saved_per_preset_and_loaded_lazily(temporary_presets):
+    presets = temporary_presets()
+    stream_names = list(presets.stream_presets.keys())
+    assert len(stream_names) > 0
+    stream_name = stream_names[0]
+    presets.stream_presets[stream_name].display_duration = 42.
+    presets.save(is_async=True, dirty_presets=[('stream_presets', stream_name)])
+    presets.__del__()
+
+    presets = temporary_presets()
+    assert isinstance(presets.stream_presets, LazyPresetDict)
+    assert list(presets.stream_presets.keys()) == sorted(stream_names)
+    assert presets.stream_presets.loaded_items() == []
+    assert presets.stream_presets[stream_name].display_duration == 42.
+    assert presets.stream_presets.loaded_items() == [(stream_name, presets.stream_presets[stream_name])]
+
+    presets.stream_presets.pop(stream_name)
+    presets.save(is_async=False)
+    assert stream_name not in presets._preset_store.get_preset_paths('stream_presets')
+
+
+def test_presets_migrated_from_single_file(temporary_presets, tmp_path):
+    presets = temporary_presets()
+    stream_name = list(presets.stream_presets.keys())[0]
+    stream_preset = presets.stream_presets[stream_name]
+    stream_preset.display_duration = 24.
+    presets._preset_saver.stop()
+    save_presets_locally(str(tmp_path), {'stream_presets': {stream_name: stream_preset}, 'script_presets': {},
+                                         'experiment_presets': {'experiment': [stream_name]}}, '_presets.json')
+    shutil.rmtree(tmp_path / '_presets')
+
+    presets = temporary_presets()
+    assert not os.path.exists(tmp_path / '_presets.json')
+    assert presets.stream_presets[stream_name].display_duration == 24.
+    assert presets.experiment_presets['experiment'] == [stream_name]
+    assert stream_name in presets._preset_store.get_preset_paths('stream_presets')
+
+
+def test_preset_files_loaded_from_cache(temporary_presets, tmp_path, monkeypatch):
+    presets = temporary_presets()
+    stream_presets = dict(presets.stream_presets.items())
+    experiment_presets = dict(presets.experiment_presets.items())
+    assert os.path.exists(tmp_path / '_preset_files_cache.pickle')
+
+    parsed_files = []
+    load_preset_file = Presets_module._load_preset_file
+    monkeypatch.setattr(Presets_module, '_load_preset_file', lambda category, preset_path: parsed_files.append(preset_path) or load_preset_file(category, preset_path))
+    presets.reload_stream_presets()  # all preset files are reloaded, none of them changed
+    assert parsed_files == []
+    assert dict(presets.stream_presets.items()) == stream_presets
+    assert dict(presets.experiment_presets.items()) == experiment_presets
+    assert all(presets.stream_presets[stream_name] is not stream_preset for stream_name, stream_preset in stream_presets.items())
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from PyQt6 import QtCore
+
+from physiolabxr.configs.configs import AppConfigs
+AppConfigs(_reset=True)  # create the singleton app configs object
+
+from physiolabxr.presets.Presets import Presets
+from physiolabxr.presets.StreamRenderPlan import StreamRenderPlan, get_channel_index
+from physiolabxr.presets.load_user_preset import create_default_group_entry
+from physiolabxr.presets.presets_utils import create_default_lsl_preset, pop_stream_preset_from_settings, \
+    pop_group_from_stream_preset, add_group_entry_to_stream, set_time_series_channels_constant_offset, \
+    is_stream_name_in_presets
+
+stream_name = 'render plan test stream'
+num_channels = 8
+nominal_sampling_rate = 100
+
+
+class PlotFormatSignal(QtCore.QObject):
+    plot_format_changed_signal = QtCore.pyqtSignal(dict)
+
+
+@pytest.fixture
+def stream_preset():
+    Presets(_preset_root=AppConfigs()._preset_path, _reset=False)
+    if is_stream_name_in_presets(stream_name):
+        pop_stream_preset_from_settings(stream_name)
+    create_default_lsl_preset(stream_name, num_channels, nominal_sampling_rate)
+    group_name = list(Presets().stream_presets[stream_name].group_info.keys())[0]
+    pop_group_from_stream_preset(stream_name, group_name)
+    add_group_entry_to_stream(stream_name, create_default_group_entry(4, 'contiguous', channel_indices=[0, 1, 2, 3]))
+    add_group_entry_to_stream(stream_name, create_default_group_entry(4, 'scattered', channel_indices=[7, 5, 4, 6]))
+    yield Presets().stream_presets[stream_name]
+    pop_stream_preset_from_settings(stream_name)
+
+
+def test_channel_index():
+    assert get_channel_index([2, 3, 4]) == slice(2, 5)
+    assert np.array_equal(get_channel_index([4, 2, 3]), [4, 2, 3])
+    data = np.random.random((8, 10))
+    assert np.shares_memory(data[get_channel_index([2, 3, 4])], data)
+
+
+def test_render_plan_compiles_groups(stream_preset):
+    render_plan = StreamRenderPlan(stream_name)
+    assert list(render_plan.groups.keys()) == ['contiguous', 'scattered']
+    assert render_plan.num_points_to_plot == int(stream_preset.display_duration * nominal_sampling_rate)
+
+    data = np.random.random((num_channels, 50))
+    assert np.array_equal(data[render_plan.groups['contiguous'].channel_index], data[[0, 1, 2, 3]])
+    assert np.array_equal(data[render_plan.groups['scattered'].channel_index], data[[7, 5, 4, 6]])
+    assert np.allclose(render_plan.groups['contiguous'].get_time_vector(50), np.linspace(0, 0.5, 50))
+
+    # configs changed in place by the preset setters are seen without recompiling
+    set_time_series_channels_constant_offset(stream_name, 'scattered', 2.5)
+    assert render_plan.groups['scattered'].time_series_config.channels_constant_offset == 2.5
+
+
+def test_group_plot_widget_plots_from_render_plan(stream_preset, qtbot):
+    from physiolabxr.ui.GroupPlotWidget import GroupPlotWidget
+    render_plan = StreamRenderPlan(stream_name)
+    plot_format_signal = PlotFormatSignal()
+    group_plot_widget = GroupPlotWidget(None, stream_name, 'scattered', [f'c {i}' for i in [7, 5, 4, 6]], nominal_sampling_rate,
+                                        plot_format_signal.plot_format_changed_signal)
+    qtbot.addWidget(group_plot_widget)
+    data = np.random.random((num_channels, render_plan.num_points_to_plot))
+    for plot_format_index in range(4):  # line chart, image, bar chart and spectrogram
+        group_plot_widget.plot_tabs.setCurrentIndex(plot_format_index)
+        group_plot_widget.plot_data(data, render_plan.groups['scattered'])
+    group_plot_widget.plot_tabs.setCurrentIndex(0)
+    group_plot_widget.plot_data(data, render_plan.groups['scattered'])
+    x, y = group_plot_widget.linechart_widget.plotItem.curves[0].getData()
+    assert np.allclose(y, data[7])
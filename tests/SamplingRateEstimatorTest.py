@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from physiolabxr.utils.sampling_rate_utils import SamplingRateEstimator, save_stream_health, load_stream_health
+
+
+def feed_in_chunks(estimator, timestamps, max_chunk_size=50, seed=0):
+    rng = np.random.default_rng(seed)
+    start = 0
+    while start < len(timestamps):
+        chunk_size = rng.integers(1, max_chunk_size)
+        estimator.update(timestamps[start:start + chunk_size])
+        start += chunk_size
+
+
+def test_windowed_rate_and_jitter_match_reference():
+    window_size = 256
+    rng = np.random.default_rng(0)
+    intervals = 1 / 500 + rng.normal(0, 1e-4, size=5000)
+    timestamps = np.cumsum(intervals) + 100.
+    estimator = SamplingRateEstimator(window_size=window_size, nominal_sampling_rate=500)
+    feed_in_chunks(estimator, timestamps)
+
+    window_intervals = np.diff(timestamps)[-window_size:]
+    assert estimator.get_sampling_rate() == pytest.approx(1 / np.mean(window_intervals))
+    assert estimator.get_jitter() == pytest.approx(np.std(window_intervals), rel=1e-6)
+    assert estimator.dropout_count == 0
+    assert estimator.num_samples == len(timestamps)
+
+
+def test_chunk_larger_than_window():
+    estimator = SamplingRateEstimator(window_size=64)
+    estimator.update(np.arange(10) / 100)
+    estimator.update(10 / 100 + np.arange(1000) / 250)
+    assert estimator.get_sampling_rate() == pytest.approx(250)
+    assert estimator.get_jitter() == pytest.approx(0, abs=1e-9)
+
+
+def test_dropouts_and_drift():
+    nominal_sampling_rate = 1000
+    timestamps = np.arange(10000) / (nominal_sampling_rate * (1 + 50e-6))  # the device clock is 50 ppm fast
+    dropped = np.zeros(len(timestamps), dtype=bool)
+    dropped[2000:2010] = True  # 10 samples lost in one dropout
+    dropped[5000:5003] = True  # 3 samples lost in another
+    estimator = SamplingRateEstimator(nominal_sampling_rate=nominal_sampling_rate)
+    feed_in_chunks(estimator, timestamps[~dropped])
+
+    assert estimator.dropout_count == 2
+    assert estimator.dropped_sample_count == 13
+    assert estimator.get_drift() == pytest.approx(50, abs=1)
+
+
+def test_irregular_stream_and_too_few_samples():
+    estimator = SamplingRateEstimator(nominal_sampling_rate=0)
+    assert np.isnan(estimator.update([]))
+    assert np.isnan(estimator.update([1.]))
+    estimator.update([1.5, 3., 10.])
+    assert estimator.dropout_count == 0
+    assert np.isnan(estimator.get_drift())
+    estimator.reset()
+    assert np.isnan(estimator.get_sampling_rate()) and estimator.num_samples == 0
+
+
+def test_stream_health_sidecar(tmp_path):
+    estimator = SamplingRateEstimator(nominal_sampling_rate=100)
+    estimator.update(np.arange(500) / 100)
+    recording_path = str(tmp_path / 'recording.dats')
+    save_stream_health(recording_path, {'EEG': estimator.get_health()})
+    stream_health = load_stream_health(recording_path)['EEG']
+    assert stream_health['sampling_rate'] == pytest.approx(100)
+    assert stream_health['num_samples'] == 500
+    json.dumps(stream_health)
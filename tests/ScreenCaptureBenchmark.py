@@ -0,0 +1,82 @@
+"""
+Screen capture benchmark at 1080p and 4K.
+
+The conversion benchmark runs on synthetic frames, so it runs without a display. It compares the pyscreeze path, which
+creates a PIL image per capture and converts it with fresh allocations at each step, to the XShm path, which converts
+the BGRA shared memory image into a preallocated RGB buffer and then makes the emitted frame with the FrameConverter.
+
+The capture benchmark measures the frame rate of each screen capture backend, and is skipped for the backends that are
+not available, for example, when there is no X11 display.
+
+Run with:
+    python -m pytest tests/ScreenCaptureBenchmark.py -s
+"""
+import time
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from physiolabxr.presets.PresetEnums import VideoDeviceChannelOrder
+from physiolabxr.utils.image_utils import FrameConverter, process_image
+from physiolabxr.utils.screen_capture_utils import screen_capture_backends
+
+resolutions = {'1080p': (1080, 1920), '4K': (2160, 3840)}
+n_frames = 30
+video_scale = 0.5
+
+
+def time_per_frame(function):
+    function()  # warm up
+    start_time = time.perf_counter()
+    for _ in range(n_frames):
+        function()
+    return (time.perf_counter() - start_time) / n_frames
+
+
+@pytest.mark.parametrize('resolution', resolutions.keys())
+def test_capture_conversion(resolution):
+    height, width = resolutions[resolution]
+    bgra_frame = np.random.randint(0, 256, (height, width, 4), dtype=np.uint8)  # what XShmGetImage writes
+    pil_image = Image.fromarray(cv2.cvtColor(bgra_frame, cv2.COLOR_BGRA2RGB))  # what pyscreeze returns
+
+    def pil_conversion():
+        frame = np.array(pil_image).astype(np.uint8)
+        frame = process_image(frame, VideoDeviceChannelOrder.RGB, video_scale)
+        return np.swapaxes(np.flip(frame, axis=0), 0, 1)
+
+    rgb_frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame_converter = FrameConverter()
+
+    def xshm_conversion():
+        cv2.cvtColor(bgra_frame, cv2.COLOR_BGRA2RGB, dst=rgb_frame)
+        return frame_converter.convert(rgb_frame, VideoDeviceChannelOrder.RGB, video_scale)
+
+    assert np.array_equal(pil_conversion(), xshm_conversion())
+    pil_time, xshm_time = time_per_frame(pil_conversion), time_per_frame(xshm_conversion)
+    print(f"\n{resolution} conversion per frame: pyscreeze path {pil_time * 1e3:.2f}ms, XShm path {xshm_time * 1e3:.2f}ms, "
+          f"{pil_time / xshm_time:.1f}x")
+    assert xshm_time < pil_time
+
+
+@pytest.mark.parametrize('backend', screen_capture_backends.keys())
+@pytest.mark.parametrize('resolution', resolutions.keys())
+def test_capture_frame_rate(backend, resolution):
+    height, width = resolutions[resolution]
+    try:
+        screen_capture = screen_capture_backends[backend]()
+        screen_height, screen_width = screen_capture.get_screen_size()
+    except Exception as e:  # pyscreeze raises a generic exception when no screenshot tool is found
+        pytest.skip(f'{backend} screen capture is not available: {e}')
+    try:
+        if screen_height < height or screen_width < width:
+            pytest.skip(f'the screen of {screen_width}x{screen_height} is smaller than {resolution}')
+        screen_capture.close()
+        screen_capture = screen_capture_backends[backend]((0, 0, width, height))
+        frame = screen_capture.capture()
+        assert frame.shape == (height, width, 3)
+        capture_time = time_per_frame(screen_capture.capture)
+        print(f"\n{backend} capture at {resolution}: {capture_time * 1e3:.2f}ms per frame, {1 / capture_time:.1f} fps")
+    finally:
+        screen_capture.close()
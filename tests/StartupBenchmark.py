@@ -0,0 +1,63 @@
+"""
+Cold-start benchmark: time from launching the app to the main window being shown.
+
+Each run is a fresh python process with startup profiling enabled, see physiolabxr/startup/startup_profiler.py. The
+app exits as soon as the main window is shown and the startup profile is read back.
+
+Run with:
+    python -m pytest tests/StartupBenchmark.py -s
+
+Set PHYSIOLABXR_STARTUP_BENCHMARK_MAX_SECONDS to change the regression threshold on the median time to first window.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from physiolabxr.startup.startup_profiler import profile_startup_env, profile_startup_exit_env, profile_startup_report_env
+
+n_runs = 5
+max_time_to_first_window = float(os.environ.get('PHYSIOLABXR_STARTUP_BENCHMARK_MAX_SECONDS', 10))
+startup_timeout = 120
+
+# optional dependencies that must not be imported on the main thread before the first window is shown
+lazy_modules = ['cv2', 'pyaudio', 'pyxdf', 'torch']
+
+
+def run_cold_start(report_path):
+    env = dict(os.environ)
+    env[profile_startup_env] = '1'
+    env[profile_startup_exit_env] = '1'
+    env[profile_startup_report_env] = report_path
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', 'from physiolabxr import physiolabxr; physiolabxr()'], env=env, cwd=project_root,
+                   timeout=startup_timeout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(report_path, 'r') as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def startup_reports(tmp_path_factory):
+    report_root = tmp_path_factory.mktemp('startup_profiles')
+    return [run_cold_start(os.path.join(report_root, f'startup_profile_{i}.json')) for i in range(n_runs)]
+
+
+def test_time_to_first_window(startup_reports):
+    times_to_first_window = np.array([report['time_to_first_window'] for report in startup_reports])
+    print(f"Time to first window over {n_runs} runs: median {np.median(times_to_first_window):.3f}s, "
+          f"min {np.min(times_to_first_window):.3f}s, max {np.max(times_to_first_window):.3f}s")
+    phase_names = [phase['phase'] for phase in startup_reports[0]['phases']]
+    for phase_name in phase_names:
+        durations = [phase['duration'] for report in startup_reports for phase in report['phases'] if phase['phase'] == phase_name]
+        print(f"    {phase_name:<32}median {np.median(durations):.3f}s")
+    assert np.median(times_to_first_window) < max_time_to_first_window
+
+
+def test_optional_dependencies_are_lazy(startup_reports):
+    for report in startup_reports:
+        main_thread_imports = [module_import['module'] for module_import in report['imports'] if module_import['thread'] == 'MainThread']
+        for lazy_module in lazy_modules:
+            assert lazy_module not in main_thread_imports, f'{lazy_module} is imported at startup'
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+
+from physiolabxr.configs.configs import VideoRecordingCodec
+from physiolabxr.utils.RNStream import RNStream
+from physiolabxr.utils.video_recording_utils import VideoRecorder, get_video_sidecar_path, read_video_frames, \
+    read_indexed_video_frames, get_video_frame_table_stream_name, decode_video_streams
+
+
+def create_test_frames(n_frames, width=320, height=240):
+    """
+    smooth moving gradients, so lossy codecs stay close to the original. Frames are in the recorded layout:
+    (width, height, 3)
+    """
+    x, y = np.meshgrid(np.arange(width), np.arange(height), indexing='ij')
+    frames = []
+    for i in range(n_frames):
+        frame = np.stack([(x + 4 * i) % 256, (y + 2 * i) % 256, np.full_like(x, 128)], axis=-1)
+        frames.append(frame.astype(np.uint8))
+    return frames
+
+
+@pytest.mark.parametrize('codec', [VideoRecordingCodec.mp4v, VideoRecordingCodec.mjpg])
+def test_video_recording_round_trip(tmp_path, codec):
+    stream_name = 'Camera 0'
+    n_frames = 30
+    recording_path = os.path.join(tmp_path, 'recording.dats')
+    frames = create_test_frames(n_frames)
+    timestamps = np.arange(n_frames) / 30
+
+    video_recorder = VideoRecorder(get_video_sidecar_path(recording_path, stream_name, codec), codec, 30)
+    video_recorder.start()
+    frame_indices = [video_recorder.add_frame(frame) for frame in frames]
+    video_recorder.stop()
+
+    RNStream(recording_path).stream_out({get_video_frame_table_stream_name(stream_name): [np.array([frame_indices]), timestamps]})
+    buffer = decode_video_streams(recording_path, RNStream(recording_path).stream_in(jitter_removal=False))
+
+    decoded_frames, decoded_timestamps = buffer[stream_name]
+    assert decoded_frames.shape == (*frames[0].shape, n_frames)
+    assert np.allclose(decoded_timestamps, timestamps)
+    assert np.mean(np.abs(decoded_frames.astype(float) - np.stack(frames, axis=-1))) < 8
+
+
+def test_video_recorder_drops_frames_when_full(tmp_path):
+    codec = VideoRecordingCodec.mjpg
+    frames = create_test_frames(10)
+    video_recorder = VideoRecorder(get_video_sidecar_path(os.path.join(tmp_path, 'recording.dats'), 'Camera 0', codec), codec, 30, max_queued_frames=4)
+    frame_indices = [video_recorder.add_frame(frame) for frame in frames]  # the encoder thread is not started yet
+    assert frame_indices == [0, 1, 2, 3] + [3] * 6  # the dropped frames repeat the last queued one
+    assert video_recorder.dropped_frame_count == 6 and video_recorder.frame_queue.qsize() == 4
+    video_recorder.start()
+    video_recorder.stop()
+
+
+def test_read_indexed_video_frames(tmp_path):
+    codec = VideoRecordingCodec.mjpg
+    video_path = get_video_sidecar_path(os.path.join(tmp_path, 'recording.dats'), 'Camera 0', codec)
+    video_recorder = VideoRecorder(video_path, codec, 30)
+    video_recorder.start()
+    for frame in create_test_frames(8):
+        video_recorder.add_frame(frame)
+    video_recorder.stop()
+
+    all_frames = read_video_frames(video_path)
+    assert all_frames.shape[-1] == 8
+    assert np.array_equal(read_video_frames(video_path, 2, 5), all_frames[..., 2:5])
+    frame_indices = [0, 0, 3, 7, 9, 12]  # repeated, skipped and past the end
+    assert np.array_equal(read_indexed_video_frames(video_path, frame_indices), all_frames[..., [0, 0, 3, 7, 7, 7]])
@@ -0,0 +1,242 @@
+"""
+Tests for the wait-pull mode of the stream workers, see RenaWorker: workers wake up only when data arrives, and emits are
+coalesced.
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+import zmq
+from PyQt6.QtCore import Qt
+
+from physiolabxr.configs.configs import AppConfigs, PullDataMode
+AppConfigs(_reset=True)  # create the singleton app configs object
+
+from physiolabxr.interfaces import LSLInletInterface
+from physiolabxr.interfaces.DeviceInterface.DeviceInterface import DeviceInterface
+from physiolabxr.threadings import workers
+from physiolabxr.threadings.workers import ZMQWorker, LSLInletWorker, CustomDeviceWorker
+
+
+class EmitCounter:
+    def __init__(self, worker):
+        self.data_dicts = []
+        self.process_count = 0
+        self.lock = threading.Lock()
+        worker.signal_data.connect(self.on_data, type=Qt.ConnectionType.DirectConnection)  # called on the wait-pull thread
+        original_process_on_tick = worker.process_on_tick
+
+        def counted_process_on_tick():
+            self.process_count += 1
+            original_process_on_tick()
+        worker.process_on_tick = counted_process_on_tick
+
+    def on_data(self, data_dict):
+        with self.lock:
+            self.data_dicts.append(data_dict)
+
+    def get_num_samples(self):
+        with self.lock:
+            return sum(len(data_dict['timestamps']) for data_dict in self.data_dicts)
+
+
+@pytest.fixture
+def wait_pull_mode():
+    AppConfigs().pull_data_mode = PullDataMode.wait
+    AppConfigs().pull_data_coalesce_interval = 20
+    yield
+    AppConfigs().revert_to_default()
+
+
+@pytest.fixture
+def zmq_publisher():
+    context = zmq.Context()
+    socket = context.socket(zmq.PUB)
+    port = socket.bind_to_random_port('tcp://*')
+    yield socket, port
+    socket.close()
+    context.term()
+
+
+class QueueInlet:
+    """
+    stands in for a pylsl StreamInlet, pull_chunk blocks up to its timeout for the first sample like pylsl does
+    """
+    def __init__(self):
+        self.samples = queue.Queue()
+
+    def pull_chunk(self, timeout=0.0, max_samples=1024):
+        frames, timestamps = [], []
+        try:
+            while len(frames) < max_samples:
+                sample, timestamp = self.samples.get(timeout=timeout) if len(frames) == 0 and timeout > 0 else self.samples.get_nowait()
+                frames.append(sample)
+                timestamps.append(timestamp)
+        except queue.Empty:
+            pass
+        return frames, timestamps
+
+    def close_stream(self):
+        pass
+
+
+class QueueDeviceInterface(DeviceInterface):
+    """
+    a custom device whose samples arrive with put, waited on in wait_for_data
+    """
+    def __init__(self, num_channels):
+        super().__init__('test queue device', None)
+        self.num_channels = num_channels
+        self.samples = []
+        self.samples_condition = threading.Condition()
+        self.device_worker = None
+        self.pull_threads = set()
+
+    def put(self, sample, timestamp):
+        with self.samples_condition:
+            self.samples.append((sample, timestamp))
+            self.samples_condition.notify()
+
+    def wait_for_data(self, timeout):
+        self.pull_threads.add(threading.current_thread())
+        with self.samples_condition:
+            return self.samples_condition.wait_for(lambda: len(self.samples) > 0, timeout=timeout)
+
+    def process_frames(self):
+        self.pull_threads.add(threading.current_thread())
+        assert not self.device_worker.is_interruption_requested()
+        with self.samples_condition:
+            samples, self.samples = self.samples, []
+        frames = np.array([sample for sample, _ in samples]).reshape(-1, self.num_channels).T
+        return frames, [timestamp for _, timestamp in samples]
+
+
+def publish(socket, topic, data, n):
+    for i in range(n):
+        socket.send_multipart([bytes(topic, 'utf-8'), np.array([time.time()]), data[:, i].copy()])
+
+
+def test_zmq_worker_wakes_only_on_data(wait_pull_mode, zmq_publisher):
+    socket, port = zmq_publisher
+    topic, num_channels = 'test zmq stream', 4
+    worker = ZMQWorker(port, topic, 'float32')
+    counter = EmitCounter(worker)
+    assert worker.is_wait_pull()
+    worker.start_stream()
+    try:
+        time.sleep(0.5)  # idle, the worker should not wake up
+        assert counter.process_count == 0
+
+        data = np.random.random((num_channels, 200)).astype(np.float32)
+        publish(socket, topic, data, 200)
+        time.sleep(0.5)
+        assert counter.get_num_samples() == 200
+        received = np.concatenate([data_dict['frames'] for data_dict in counter.data_dicts], axis=-1)
+        assert np.array_equal(received, data)
+        assert len(counter.data_dicts) < 200  # samples arriving within the coalesce interval are emitted together
+        assert worker.is_stream_available()
+    finally:
+        worker.stop_stream()
+    assert not worker.is_wait_pull_running()
+
+
+def test_zmq_worker_errored_does_not_spin(wait_pull_mode, zmq_publisher):
+    socket, port = zmq_publisher
+    topic = 'test zmq stream'
+    worker = ZMQWorker(port, topic, 'float32')
+    counter = EmitCounter(worker)
+    worker.start_stream()
+    try:
+        time.sleep(0.2)
+        socket.send_multipart([bytes(topic, 'utf-8')] * 4)  # invalid message, the worker stops taking messages
+        time.sleep(0.2)
+        assert worker.interrupted and 'e' in counter.data_dicts[-1]
+        process_count = counter.process_count
+        time.sleep(0.5)
+        assert counter.process_count == process_count  # waits the timeout instead of waking every coalesce interval
+    finally:
+        worker.stop_stream()
+
+
+def test_lsl_worker_wait_pull_on_inlet(wait_pull_mode, monkeypatch):
+    num_channels = 3
+    worker = LSLInletWorker('test wait pull inlet', num_channels)
+    inlet = QueueInlet()
+    monkeypatch.setattr(worker._lslInlet_interface, 'start_stream', lambda: setattr(worker._lslInlet_interface, 'inlet', inlet))
+    counter = EmitCounter(worker)
+    worker.start_stream()
+    try:
+        time.sleep(0.3)
+        assert counter.process_count == 0
+        data = np.random.random((num_channels, 50))
+        for i in range(data.shape[1]):
+            inlet.samples.put((data[:, i].tolist(), float(i)))
+            time.sleep(0.001)
+        time.sleep(0.3)
+        assert counter.get_num_samples() == 50
+        received = np.concatenate([data_dict['frames'] for data_dict in counter.data_dicts], axis=-1)
+        assert np.allclose(received, data)  # including the sample taken while waiting
+        assert len(counter.data_dicts) < 50
+    finally:
+        worker.stop_stream()
+    assert not worker.is_wait_pull_running()
+
+
+def test_custom_device_worker_wait_pull(wait_pull_mode, monkeypatch):
+    num_channels = 2
+    device_interface = QueueDeviceInterface(num_channels)
+    monkeypatch.setattr(workers, 'create_custom_device_interface', lambda stream_name: device_interface)
+    worker = CustomDeviceWorker('test queue device')
+    counter = EmitCounter(worker)
+    worker.start_stream()
+    try:
+        time.sleep(0.3)
+        assert counter.process_count == 0
+        data = np.random.random((num_channels, 40))
+        for i in range(data.shape[1]):
+            device_interface.put(data[:, i], float(i))
+            time.sleep(0.001)
+        time.sleep(0.3)
+        assert counter.get_num_samples() == 40
+        assert np.allclose(np.concatenate([data_dict['frames'] for data_dict in counter.data_dicts], axis=-1), data)
+        assert device_interface.pull_threads == {worker._wait_pull_thread}  # the source is only pulled on the wait-pull thread
+    finally:
+        worker.stop_stream()
+    assert not worker.is_wait_pull_running()
+
+
+@pytest.mark.skipif(not hasattr(LSLInletInterface, 'resolve_byprop'), reason='the installed pylsl is not supported by LSLInletInterface')
+def test_lsl_worker_wait_pull(wait_pull_mode):
+    from pylsl import StreamInfo, StreamOutlet
+    stream_name, num_channels = 'test wait pull lsl stream', 8
+    outlet = StreamOutlet(StreamInfo(stream_name, 'EEG', num_channels, 250, 'float32', 'test_wait_pull_source'))
+    worker = LSLInletWorker(stream_name, num_channels)
+    counter = EmitCounter(worker)
+    worker.start_stream()
+    try:
+        time.sleep(0.5)
+        data = np.random.random((num_channels, 100)).astype(np.float32)
+        for i in range(data.shape[1]):
+            outlet.push_sample(data[:, i])
+            time.sleep(0.001)
+        time.sleep(0.5)
+        assert counter.get_num_samples() == 100
+        received = np.concatenate([data_dict['frames'] for data_dict in counter.data_dicts], axis=-1)
+        assert np.allclose(received, data)
+        assert counter.process_count <= len(counter.data_dicts) + 1  # no idle wake ups besides the one per wait timeout
+    finally:
+        worker.stop_stream()
+
+
+def test_timer_mode_does_not_start_wait_pull(zmq_publisher):
+    _, port = zmq_publisher
+    AppConfigs().pull_data_mode = PullDataMode.timer
+    try:
+        worker = ZMQWorker(port, 'test zmq stream', 'float32')
+        worker.start_stream()
+        assert not worker.is_wait_pull() and not worker.is_wait_pull_running()
+        worker.stop_stream()
+    finally:
+        AppConfigs().revert_to_default()
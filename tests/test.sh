@@ -26,6 +26,28 @@ test_modules=(
   CsvTest
   MatTest
   RenaScriptingTest
+  HeadlessScriptingTest
+  VideoRecordingTest
+  FrameGrabbingTest
+  DeviceDiscoveryTest
+  AudioCaptureTest
+  WaitPullTest
+  SamplingRateEstimatorTest
+  RenderPlanTest
+  PresetStoreTest
+  MmWaveTlvTest
+  FixationDetectionTest
+  EpochsTest
+  BaselineCorrectionTest
+  InterpolationTest
+  HDCATest
+  GazeAttentionMatrixTest
+  DSPWorkerPoolTest
+  DataProcessorKernelTest
+  DataProcessorPipelineTest
+  FIRResamplingTest
+  MetricsRegistryTest
+  LatencyTraceTest
 )
 
 warning_text="You should create a venv-dev and install packages using pip install -r requirements-dev.txt"